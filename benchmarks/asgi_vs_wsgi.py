@@ -0,0 +1,211 @@
+"""
+Load test: FAQ generation concurrency under WSGI (thread pool) vs ASGI (one event loop)
+with a slow local Anthropic stand-in.
+
+    python -m benchmarks.asgi_vs_wsgi --requests 200 --wsgi-threads 8 --ai-latency 1.0
+
+The WSGI run drives the sync DRF endpoint through a fixed pool of threads, the way a
+gunicorn worker with N threads would; the ASGI run drives the async endpoint with every
+request in flight on a single event loop. Results are printed as JSON.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def start_ai_stub(latency):
+    """
+    Anthropic Messages API stand-in that answers after `latency` seconds.
+    """
+    body = json.dumps({
+        "model": "claude-3-haiku-20240307",
+        "content": [{"text": json.dumps({
+            "fr": [{"question": "Q?", "answer": "R."}],
+            "en": [{"question": "Q?", "answer": "A."}],
+            "es": [{"question": "P?", "answer": "R."}],
+        })}],
+        "usage": {"input_tokens": 300, "output_tokens": 600},
+    }).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        request_queue_size = 1024 # Default backlog of 5 resets bursts of concurrent connections
+
+    server = Server(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def summarize(name, latencies, statuses, wall):
+    return {
+        "server": name,
+        "requests": len(latencies),
+        "ok": sum(1 for s in statuses if s == 200),
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0,
+        "latency_p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "latency_p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "latency_p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "latency_mean_ms": round(statistics.mean(latencies) * 1000, 1) if latencies else 0,
+    }
+
+
+def run_wsgi(app, token, product_ids, threads):
+    # Latency is measured from batch start so time spent queued for a free thread counts
+    batch_started = time.perf_counter()
+
+    def call(product_id):
+        payload = json.dumps({"productId": product_id, "num_questions": 1}).encode()
+        environ = {
+            'REQUEST_METHOD': 'POST',
+            'PATH_INFO': '/api/faq/generate-faq/',
+            'QUERY_STRING': '',
+            'SERVER_NAME': 'bench', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(payload)),
+            'HTTP_AUTHORIZATION': f'Bearer {token}',
+            'wsgi.input': io.BytesIO(payload),
+            'wsgi.url_scheme': 'http',
+            'wsgi.errors': sys.stderr,
+        }
+        status_holder = {}
+
+        def start_response(status, headers, exc_info=None):
+            status_holder['status'] = int(status.split()[0])
+
+        b''.join(app(environ, start_response))
+        return time.perf_counter() - batch_started, status_holder.get('status')
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(call, product_ids))
+    wall = time.perf_counter() - started
+    return summarize(f"wsgi ({threads} threads)", [r[0] for r in results], [r[1] for r in results], wall)
+
+
+def run_asgi(app, token, product_ids):
+    batch_started = time.perf_counter()
+
+    async def call(product_id):
+        payload = json.dumps({"productId": product_id, "num_questions": 1}).encode()
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': 'POST', 'scheme': 'http',
+            'path': '/api/async/faq/generate-faq/', 'raw_path': b'/api/async/faq/generate-faq/',
+            'query_string': b'', 'root_path': '',
+            'headers': [
+                (b'host', b'bench'),
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(payload)).encode()),
+                (b'authorization', f'Bearer {token}'.encode()),
+            ],
+            'client': ('127.0.0.1', 0), 'server': ('bench', 80),
+        }
+        sent = False
+        status_holder = {}
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {'type': 'http.request', 'body': payload, 'more_body': False}
+            await asyncio.sleep(3600)
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status_holder['status'] = message['status']
+
+        await app(scope, receive, send)
+        return time.perf_counter() - batch_started, status_holder.get('status')
+
+    async def main():
+        return await asyncio.gather(*(call(pid) for pid in product_ids))
+
+    started = time.perf_counter()
+    results = asyncio.run(main())
+    wall = time.perf_counter() - started
+    return summarize("asgi (1 event loop)", [r[0] for r in results], [r[1] for r in results], wall)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--wsgi-threads', type=int, default=8)
+    parser.add_argument('--ai-latency', type=float, default=1.0, help="Seconds the AI stub waits before answering")
+    args = parser.parse_args()
+
+    stub = start_ai_stub(args.ai_latency)
+    os.environ['ANTHROPIC_API_URL'] = f'http://127.0.0.1:{stub.server_address[1]}/v1/messages'
+    os.environ.setdefault('ANTHROPIC_API_KEY', 'bench-key')
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+    db_path = os.environ.setdefault('BENCH_DB_PATH', '/tmp/faq_bench_asgi.sqlite3')
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    import django
+    django.setup()
+
+    import jwt
+    from django.core.management import call_command
+    from django.core.asgi import get_asgi_application
+    from django.core.wsgi import get_wsgi_application
+    from faq_app.models import Shop, Product
+
+    call_command('migrate', run_syncdb=True, verbosity=0)
+
+    shop = Shop.objects.create(shop_domain='bench.myshopify.com', shop_name='Bench')
+    Product.objects.bulk_create([
+        Product(shop=shop, shopify_id=str(i), title=f"Product {i}", body_html="Benchmark product")
+        for i in range(args.requests)
+    ])
+    product_ids = [str(i) for i in range(args.requests)]
+
+    now = datetime.now(dt_timezone.utc)
+    token = jwt.encode(
+        {"dest": "https://bench.myshopify.com", "exp": now + timedelta(hours=1), "iat": now},
+        os.environ.get('SHOPIFY_API_SECRET', 'your_secret_here'),
+        algorithm='HS256',
+    )
+
+    results = [
+        run_wsgi(get_wsgi_application(), token, product_ids, args.wsgi_threads),
+        run_asgi(get_asgi_application(), token, product_ids),
+    ]
+    print(json.dumps({"ai_latency_seconds": args.ai_latency, "results": results}, indent=2))
+    stub.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Microbenchmark: ShopifyAuthentication.authenticate() throughput with cold
+caches (JWT decode + HMAC + shop query every call) vs warm caches.
+
+    python -m benchmarks.auth_throughput --iterations 20000
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+    db_path = os.environ.setdefault('BENCH_DB_PATH', '/tmp/faq_bench_auth.sqlite3')
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    import django
+    django.setup()
+
+    import jwt
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test import RequestFactory
+    from django.test.utils import CaptureQueriesContext
+    from faq_app.authentication import ShopifyAuthentication, _token_cache, _shop_cache
+    from faq_app.models import Shop
+
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    Shop.objects.create(shop_domain='bench.myshopify.com', shop_name='Bench')
+
+    now = datetime.now(dt_timezone.utc)
+    token = jwt.encode(
+        {"dest": "https://bench.myshopify.com", "exp": now + timedelta(hours=1), "iat": now},
+        os.environ.get('SHOPIFY_API_SECRET', 'your_secret_here'),
+        algorithm='HS256',
+    )
+    request = RequestFactory().get('/api/products/', HTTP_AUTHORIZATION=f'Bearer {token}')
+    auth = ShopifyAuthentication()
+
+    def run(clear_caches):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for _ in range(args.iterations):
+                if clear_caches:
+                    _token_cache.clear()
+                    _shop_cache.clear()
+                auth.authenticate(request)
+            elapsed = time.perf_counter() - started
+        return {
+            "calls_per_second": round(args.iterations / elapsed),
+            "us_per_call": round(elapsed / args.iterations * 1e6, 2),
+            "queries_per_call": round(len(queries) / args.iterations, 3),
+        }
+
+    cold = run(clear_caches=True)
+    auth.authenticate(request)
+    warm = run(clear_caches=False)
+    print(json.dumps({
+        "iterations": args.iterations,
+        "cold": cold,
+        "warm": warm,
+        "speedup": round(warm["calls_per_second"] / cold["calls_per_second"], 1),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
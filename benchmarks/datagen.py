@@ -0,0 +1,135 @@
+"""
+Synthetic data: N shops x M products, a share of them with an FAQ in
+French, English and Spanish, plus default designs, API configurations and
+an active subscription to an uncapped "Unlimited" plan (so sync and bulk
+generation are not stopped by free-tier limits). Deterministic for a given seed.
+
+    python -m benchmarks.datagen --shops 10 --products 500 --faq-ratio 0.8
+"""
+import argparse
+import json
+import os
+import random
+import zlib
+
+WORDS = (
+    'cotton', 'linen', 'wool', 'shirt', 'dress', 'jacket', 'scarf', 'boots', 'sneakers', 'bag',
+    'organic', 'vintage', 'classic', 'slim', 'oversized', 'waterproof', 'summer', 'winter', 'blue', 'black',
+)
+LANGUAGES = {
+    'questions_answers': ("Question {n} sur {title} ?", "Réponse détaillée {n} pour {title}. "),
+    'questions_answers_en': ("Question {n} about {title}?", "Detailed answer {n} for {title}. "),
+    'questions_answers_es': ("¿Pregunta {n} sobre {title}?", "Respuesta detallada {n} para {title}. "),
+}
+
+BENCH_PLAN_FEATURES = {
+    'products_limit': 1000000,
+    'max_questions': 50,
+    'max_ai_questions': 10,
+    'design_customization': True,
+    'ai_generation': True,
+}
+
+
+def shop_domain(index):
+    return f"bench-{index:04d}.myshopify.com"
+
+
+def product_id(domain, index):
+    # Product.shopify_id is the primary key: ids must differ across shops
+    return 8000000000000 + (zlib.crc32(domain.encode()) % 1000000) * 1000000 + index
+
+
+def product_title(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(3)).capitalize()
+
+
+def faq_content(title, questions, answer_repeat=4):
+    return {
+        field: [
+            {"question": question.format(n=n, title=title), "answer": answer.format(n=n, title=title) * answer_repeat}
+            for n in range(questions)
+        ]
+        for field, (question, answer) in LANGUAGES.items()
+    }
+
+
+def generate(shops=1, products=100, faq_ratio=1.0, questions=5, seed=0, batch_size=1000):
+    """
+    Create the data set and return the created shops.
+    """
+    from django.utils import timezone
+    from faq_app.models import APIConfiguration, FAQ, FAQDesign, Product, Shop
+    from subscriptions.models import Plan, Subscription
+
+    rng = random.Random(seed)
+    now = timezone.now()
+    created = Shop.objects.bulk_create([
+        Shop(shop_domain=shop_domain(i), shop_name=f"Bench shop {i}", shopify_access_token_encrypted='bench-token')
+        for i in range(shops)
+    ])
+    # bulk_create only returns primary keys on some backends
+    created = list(Shop.objects.filter(shop_domain__in=[shop.shop_domain for shop in created]).order_by('id'))
+    APIConfiguration.objects.bulk_create([
+        APIConfiguration(shop=shop, shopify_store_url=f"https://{shop.shop_domain}",
+                         shopify_access_token_encrypted='bench-token', use_default_keys=True)
+        for shop in created
+    ])
+    FAQDesign.objects.bulk_create([FAQDesign(shop=shop) for shop in created])
+    plan, _ = Plan.objects.get_or_create(name='Unlimited', defaults={'price': 49, 'features': BENCH_PLAN_FEATURES})
+    Subscription.objects.bulk_create([
+        Subscription(shop=shop, plan=plan, status='active', activated_on=now) for shop in created
+    ])
+
+    for shop in created:
+        rows, faqs = [], []
+        for i in range(products):
+            title = product_title(rng)
+            has_faq = rng.random() < faq_ratio
+            product = Product(
+                shop=shop,
+                shopify_id=str(product_id(shop.shop_domain, i)),
+                title=f"{title} {i}",
+                handle=f"product-{i}",
+                vendor='Bench Vendor',
+                product_type='Bench',
+                body_html=f"<p>{title}. Soft, durable and easy to care for.</p>",
+                has_faq=has_faq,
+                shopify_created_at=now,
+                shopify_updated_at=now,
+            )
+            rows.append(product)
+            if has_faq:
+                content = faq_content(product.title, questions)
+                faqs.append(FAQ(product=product, html_content='', num_questions=questions, **content))
+        Product.objects.bulk_create(rows, batch_size=batch_size)
+        FAQ.objects.bulk_create(faqs, batch_size=batch_size)
+    return created
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--shops', type=int, default=1)
+    parser.add_argument('--products', type=int, default=100, help='Products per shop')
+    parser.add_argument('--faq-ratio', type=float, default=1.0, help='Share of products with an FAQ')
+    parser.add_argument('--questions', type=int, default=5, help='Questions per language')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    from faq_app.models import FAQ, Product
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    shops = generate(args.shops, args.products, args.faq_ratio, args.questions, args.seed)
+    print(json.dumps({
+        "shops": len(shops),
+        "products": Product.objects.count(),
+        "faqs": FAQ.objects.count(),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
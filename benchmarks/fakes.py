@@ -0,0 +1,235 @@
+"""
+Local stand-ins for Shopify and Anthropic, for benchmarks and load tests.
+
+Both run a ThreadingHTTPServer on 127.0.0.1 (random port) in a daemon
+thread, sleep `latency` seconds per call and, when `rate_limit` is set,
+answer 429 with Retry-After once a token bucket of `burst` requests
+refilled at `rate_limit` per second is empty (Shopify REST uses a bucket
+of 40 leaking 2/s).
+
+    shopify = FakeShopify(products_per_shop=500, latency=0.05, rate_limit=2, burst=40).start()
+    os.environ['SHOPIFY_API_BASE_URL'] = shopify.base_url   # http://127.0.0.1:<port>/{shop}
+
+    anthropic = FakeAnthropic(latency=1.0).start()
+    os.environ['ANTHROPIC_API_URL'] = anthropic.url
+"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from .datagen import product_id
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """
+        (allowed, seconds until a token is available).
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True, 0.0
+            return False, (1 - self.tokens) / self.rate
+
+
+class FakeServer:
+    """
+    Base class: subclasses implement handle(method, path, query, body) -> (status, headers, payload).
+    """
+    def __init__(self, latency=0.0, rate_limit=None, burst=40):
+        self.latency = latency
+        self.buckets = {}
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.calls = 0
+        self.throttled = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    def bucket(self, key):
+        with self._lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = TokenBucket(self.rate_limit, self.burst)
+            return bucket
+
+    def rate_limit_key(self, path):
+        return 'global'
+
+    def start(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _serve(self, method):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0) or 0))
+                url = urlparse(self.path)
+                status, headers, payload = fake.dispatch(method, url.path, parse_qs(url.query), body, self.headers)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._serve('GET')
+
+            def do_POST(self):
+                self._serve('POST')
+
+            def log_message(self, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            request_queue_size = 1024 # Default backlog of 5 resets bursts of concurrent connections
+
+        self._server = Server(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    @property
+    def origin(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def dispatch(self, method, path, query, body, headers):
+        with self._lock:
+            self.calls += 1
+        if self.rate_limit:
+            allowed, wait = self.bucket(self.rate_limit_key(path)).take()
+            if not allowed:
+                with self._lock:
+                    self.throttled += 1
+                return 429, {'Retry-After': f"{wait:.2f}"}, {"errors": "Exceeded rate limit"}
+        if self.latency:
+            time.sleep(self.latency)
+        return self.handle(method, path, query, body)
+
+    def handle(self, method, path, query, body):
+        raise NotImplementedError
+
+    def stats(self):
+        return {"calls": self.calls, "throttled": self.throttled}
+
+
+SHOP_PATH = re.compile(r'^/(?P<shop>[^/]+)/admin/api/(?P<version>[^/]+)/(?P<resource>.+)$')
+
+
+class FakeShopify(FakeServer):
+    """
+    Admin API subset used by the app: REST products.json (cursor pagination
+    through the Link header, like Shopify) and GraphQL for app subscriptions.
+    Every shop has `products_per_shop` deterministic products, with the ids
+    and handles benchmarks.datagen uses, so a sync updates generated
+    products and creates the rest. Rate limits are per shop.
+    """
+
+    def __init__(self, products_per_shop=100, **kwargs):
+        super().__init__(**kwargs)
+        self.products_per_shop = products_per_shop
+
+    @property
+    def base_url(self):
+        return f"{self.origin}/{{shop}}"
+
+    def rate_limit_key(self, path):
+        match = SHOP_PATH.match(path)
+        return match.group('shop') if match else 'global'
+
+    def handle(self, method, path, query, body):
+        match = SHOP_PATH.match(path)
+        if match is None:
+            return 404, {}, {"errors": "Not Found"}
+        shop, version, resource = match.group('shop', 'version', 'resource')
+        if method == 'GET' and resource == 'products.json':
+            return self.products(shop, version, query)
+        if method == 'POST' and resource == 'graphql.json':
+            return self.graphql(json.loads(body or b'{}'))
+        return 404, {}, {"errors": "Not Found"}
+
+    def product(self, shop, index):
+        stamp = '2024-01-01T00:00:00Z'
+        return {
+            "id": product_id(shop, index),
+            "title": f"{shop.split('.')[0].title()} product {index}",
+            "handle": f"product-{index}",
+            "vendor": "Bench Vendor",
+            "product_type": "Bench",
+            "body_html": f"<p>Description of product {index}. Soft cotton, machine washable.</p>",
+            "images": [{"src": f"https://cdn.example.com/{shop}/{index}.jpg"}],
+            "created_at": stamp,
+            "updated_at": stamp,
+        }
+
+    def products(self, shop, version, query):
+        limit = min(int(query.get('limit', ['50'])[0]), 250)
+        start = int(query.get('page_info', ['0'])[0])
+        end = min(start + limit, self.products_per_shop)
+        headers = {}
+        if end < self.products_per_shop:
+            next_url = f"{self.origin}/{shop}/admin/api/{version}/products.json?limit={limit}&page_info={end}"
+            headers['Link'] = f'<{next_url}>; rel="next"'
+        return 200, headers, {"products": [self.product(shop, i) for i in range(start, end)]}
+
+    def graphql(self, payload):
+        query = payload.get('query', '')
+        if 'appSubscriptionCreate' in query:
+            return 200, {}, {"data": {"appSubscriptionCreate": {
+                "appSubscription": {"id": "gid://shopify/AppSubscription/1", "status": "PENDING"},
+                "confirmationUrl": "https://example.com/confirm",
+                "userErrors": [],
+            }}}
+        if 'AppSubscription' in query:
+            return 200, {}, {"data": {"node": {"status": "ACTIVE"}}}
+        return 200, {}, {"data": {}}
+
+
+class FakeAnthropic(FakeServer):
+    """
+    Messages API stand-in answering with a valid FAQ in three languages.
+    """
+    def __init__(self, questions=5, input_tokens=300, output_tokens=600, **kwargs):
+        super().__init__(**kwargs)
+        self.questions = questions
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+
+    @property
+    def url(self):
+        return f"{self.origin}/v1/messages"
+
+    def handle(self, method, path, query, body):
+        if method != 'POST' or path != '/v1/messages':
+            return 404, {}, {"type": "error", "error": {"type": "not_found_error"}}
+        request = json.loads(body or b'{}')
+        faq = {
+            lang: [{"question": f"{lang} question {n}?", "answer": f"{lang} answer {n}."} for n in range(self.questions)]
+            for lang in ('fr', 'en', 'es')
+        }
+        return 200, {}, {
+            "model": request.get('model', 'claude-3-haiku-20240307'),
+            "content": [{"type": "text", "text": json.dumps(faq)}],
+            "usage": {"input_tokens": self.input_tokens, "output_tokens": self.output_tokens},
+        }
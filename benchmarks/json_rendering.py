@@ -0,0 +1,114 @@
+"""
+Benchmark: GET /api/faq/ and the storefront FAQ endpoint with the previous
+stack (decoded JSONFields, DRF's stdlib JSONRenderer) vs ORJSONRenderer with
+raw JSON pass-through, plus rendering alone on the FAQ list payload.
+
+    python -m benchmarks.json_rendering --faqs 100 --questions 10
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from contextlib import ExitStack
+from unittest.mock import patch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--faqs', type=int, default=100, help='FAQs on the list page')
+    parser.add_argument('--questions', type=int, default=10, help='Questions per language')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+    db_path = os.environ.setdefault('BENCH_DB_PATH', '/tmp/faq_bench_json.sqlite3')
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    from django.test import override_settings
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.settings import api_settings
+    from rest_framework.test import APIClient
+    from faq_app.models import FAQ, Product, Shop
+    from faq_app.renderers import ORJSON_FRAGMENT, ORJSONRenderer, RawJSON, orjson
+    from faq_app.views import FAQViewSet
+    from faq_app.views_storefront import StorefrontFAQView
+
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    shop = Shop.objects.create(shop_domain='bench.myshopify.com', shop_name='Bench')
+    for i in range(args.faqs):
+        product = Product.objects.create(shop=shop, shopify_id=f"{i:06d}", title=f"Product {i}", handle=f"product-{i}")
+        qa = [
+            {"question": f"Question {n} à propos du produit {i} ?", "answer": "Réponse détaillée. " * 20}
+            for n in range(args.questions)
+        ]
+        FAQ.objects.create(product=product, questions_answers=qa, questions_answers_en=qa, questions_answers_es=qa,
+                           html_content="", num_questions=args.questions)
+
+    client = APIClient()
+    client.force_authenticate(user=shop)
+
+    def measure(path, params, renderer_paths, raw_json):
+        rest_framework = dict(django.conf.settings.REST_FRAMEWORK, DEFAULT_RENDERER_CLASSES=renderer_paths, PAGE_SIZE=args.faqs)
+        with override_settings(REST_FRAMEWORK=rest_framework), ExitStack() as stack:
+            if not raw_json:
+                for module in ('faq_app.views', 'faq_app.views_storefront'):
+                    stack.enter_context(patch(f'{module}.with_raw_json', lambda queryset: queryset))
+            api_settings.reload()
+            # Views resolve renderer classes at import time
+            FAQViewSet.renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+            StorefrontFAQView.renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+            timings = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                response = client.get(path, params)
+                timings.append((time.perf_counter() - t0) * 1000)
+            assert response.status_code == 200, response.status_code
+        api_settings.reload()
+        return {"p50_ms": round(statistics.median(timings), 3), "bytes": len(response.content)}, json.loads(response.content)
+
+    stdlib = ['rest_framework.renderers.JSONRenderer']
+    fast = ['faq_app.renderers.ORJSONRenderer']
+    list_std, body_std = measure('/api/faq/', {}, stdlib, raw_json=False)
+    list_fast, body_fast = measure('/api/faq/', {}, fast, raw_json=True)
+    assert body_std == body_fast
+    faq_list = body_fast['results']
+    store_params = {'shop': shop.shop_domain, 'handle': 'product-0'}
+    store_std, body_std = measure('/api/storefront/faq/', store_params, stdlib, raw_json=False)
+    store_fast, body_fast = measure('/api/storefront/faq/', store_params, fast, raw_json=True)
+    assert body_std == body_fast
+
+    # Rendering only: decoded payload through the stdlib vs raw text through orjson
+    json_fields = ('questions_answers', 'questions_answers_en', 'questions_answers_es')
+    raw = {"results": [{**faq, **{k: RawJSON(json.dumps(faq[k])) for k in json_fields}} for faq in faq_list]}
+
+    def render_only(renderer, data):
+        timings = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            renderer.render(data)
+            timings.append((time.perf_counter() - t0) * 1000)
+        return round(statistics.median(timings), 3)
+
+    results = {
+        "orjson": getattr(orjson, '__version__', None),
+        "fragment_pass_through": ORJSON_FRAGMENT is not None,
+        "faq_list": {"stdlib": list_std, "orjson": list_fast,
+                     "speedup": round(list_std["p50_ms"] / list_fast["p50_ms"], 2)},
+        "storefront_faq": {"stdlib": store_std, "orjson": store_fast,
+                           "speedup": round(store_std["p50_ms"] / store_fast["p50_ms"], 2)},
+        "render_only_faq_list_ms": {
+            "stdlib": render_only(JSONRenderer(), {"results": faq_list}),
+            "orjson_raw": render_only(ORJSONRenderer(), raw),
+        },
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark: deep-page latency on GET /api/products/ for one large shop,
+page-number pagination (COUNT(*) + OFFSET) vs keyset pagination. Reports the
+full request and the pagination queries alone (the serializer adds two
+queries per product either way).
+
+    python -m benchmarks.keyset_pagination --rows 200000 --page 500
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from datetime import timedelta
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--page', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+    db_path = os.environ.setdefault('BENCH_DB_PATH', '/tmp/faq_bench_pages.sqlite3')
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from django.utils import timezone
+    from rest_framework.request import Request
+    from rest_framework.test import APIClient, APIRequestFactory
+    from faq_app.models import Product, Shop
+    from faq_app.pagination import KeysetPagination
+    from faq_app.views import ProductViewSet
+
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    shop = Shop.objects.create(shop_domain='bench.myshopify.com', shop_name='Bench')
+    Shop.objects.create(shop_domain='other.myshopify.com', shop_name='Other')
+
+    started = time.perf_counter()
+    base = timezone.now()
+    batch = []
+    for i in range(args.rows):
+        # 50 rows per timestamp so the pk tie-breaker is exercised
+        batch.append(Product(shop=shop, shopify_id=f"{i:09d}", title=f"Product {i}", updated_at=base - timedelta(seconds=i // 50)))
+        if len(batch) == 5000:
+            Product.objects.bulk_create(batch)
+            batch = []
+    Product.objects.bulk_create(batch)
+    # auto_now overwrote updated_at on insert: restore the spread timestamps
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "UPDATE products SET updated_at = datetime(%s, '-' || (CAST(shopify_id AS INTEGER) / 50) || ' seconds')",
+            [base.strftime('%Y-%m-%d %H:%M:%S.%f')]
+        )
+    seed_seconds = time.perf_counter() - started
+
+    page_size = KeysetPagination.page_size
+    anchor = Product.objects.filter(shop=shop).order_by(*ProductViewSet.cursor_ordering)[(args.page - 1) * page_size - 1]
+    keyset = KeysetPagination()
+    keyset.ordering = ProductViewSet.cursor_ordering
+    cursor_token = keyset.encode_cursor(anchor, reverse=False)
+
+    client = APIClient()
+    client.force_authenticate(user=shop)
+
+    def measure(params):
+        timings = []
+        for _ in range(args.repeat):
+            with CaptureQueriesContext(connection) as queries:
+                t0 = time.perf_counter()
+                response = client.get('/api/products/', params)
+                timings.append((time.perf_counter() - t0) * 1000)
+            assert response.status_code == 200, response.status_code
+        return {
+            "p50_ms": round(statistics.median(timings), 2),
+            "max_ms": round(max(timings), 2),
+            "queries": len(queries),
+            "first_id": response.data['results'][0]['shopify_id'],
+        }
+
+    factory = APIRequestFactory()
+    view = ProductViewSet()
+    queryset = Product.objects.filter(shop=shop)
+
+    def measure_paginate(params):
+        timings = []
+        for _ in range(args.repeat):
+            request = Request(factory.get('/api/products/', params))
+            paginator = ProductViewSet.pagination_class()
+            t0 = time.perf_counter()
+            page = paginator.paginate_queryset(queryset, request, view=view)
+            timings.append((time.perf_counter() - t0) * 1000)
+        return {"p50_ms": round(statistics.median(timings), 2), "first_id": page[0].shopify_id}
+
+    results = {
+        "rows": args.rows,
+        "page": args.page,
+        "seed_seconds": round(seed_seconds, 1),
+        "page_number_page_1": measure({'page': 1}),
+        "page_number_deep": measure({'page': args.page}),
+        "cursor_page_1": measure({'pagination': 'cursor'}),
+        "cursor_deep": measure({'cursor': cursor_token}),
+        "paginate_only": {
+            "page_number_page_1": measure_paginate({'page': 1}),
+            "page_number_deep": measure_paginate({'page': args.page}),
+            "cursor_page_1": measure_paginate({'pagination': 'cursor'}),
+            "cursor_deep": measure_paginate({'cursor': cursor_token}),
+        },
+    }
+    results["deep_page_speedup"] = round(results["page_number_deep"]["p50_ms"] / results["cursor_deep"]["p50_ms"], 1)
+    paginate_only = results["paginate_only"]
+    results["deep_paginate_only_speedup"] = round(paginate_only["page_number_deep"]["p50_ms"] / paginate_only["cursor_deep"]["p50_ms"], 1)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
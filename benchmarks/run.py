@@ -0,0 +1,122 @@
+"""
+Benchmark suite: builds a synthetic data set, starts the local Shopify and
+Anthropic fakes and runs the selected scenarios, printing one JSON document
+(or writing it to --output) for regression tracking.
+
+    python -m benchmarks.run --shops 5 --products 200 --scenarios storefront,search,sync,generate,bulk
+    python -m benchmarks.run --scenarios storefront --requests 5000 --concurrency 16 --output results.json
+
+Scenarios: storefront (FAQ reads), search (storefront product search), sync
+(full product sync per shop), generate (single FAQ generation), bulk (bulk
+generation job). Set BENCH_DB_PATH to choose the SQLite file.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+SCENARIOS = ('storefront', 'search', 'sync', 'generate', 'bulk')
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default='storefront,search,sync,generate,bulk',
+                        help=f"Comma-separated, from: {', '.join(SCENARIOS)}")
+    parser.add_argument('--shops', type=int, default=3)
+    parser.add_argument('--products', type=int, default=100, help='Products per shop')
+    parser.add_argument('--faq-ratio', type=float, default=0.9)
+    parser.add_argument('--requests', type=int, default=1000, help='Requests for storefront / search')
+    parser.add_argument('--generate-requests', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--shopify-products', type=int, default=500, help='Products the fake Shopify serves per shop')
+    parser.add_argument('--shopify-latency', type=float, default=0.05)
+    parser.add_argument('--shopify-rate-limit', type=float, default=2.0, help='Requests/s per shop, 0 = unlimited')
+    parser.add_argument('--shopify-burst', type=int, default=40)
+    parser.add_argument('--ai-latency', type=float, default=0.5)
+    parser.add_argument('--ai-rate-limit', type=float, default=0, help='Requests/s, 0 = unlimited')
+    parser.add_argument('--bulk-shops', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the JSON here instead of stdout')
+    args = parser.parse_args()
+
+    selected = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(selected) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    from .fakes import FakeAnthropic, FakeShopify
+    shopify = FakeShopify(products_per_shop=args.shopify_products, latency=args.shopify_latency,
+                          rate_limit=args.shopify_rate_limit or None, burst=args.shopify_burst).start()
+    anthropic = FakeAnthropic(latency=args.ai_latency, rate_limit=args.ai_rate_limit or None).start()
+
+    # Read by settings at import time
+    os.environ['SHOPIFY_API_BASE_URL'] = shopify.base_url
+    os.environ['ANTHROPIC_API_URL'] = anthropic.url
+    os.environ.setdefault('ANTHROPIC_API_KEY', 'bench-key')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('BULK_GENERATION_DELAY', '0')
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+    db_path = os.environ.setdefault('BENCH_DB_PATH', '/tmp/faq_bench_suite.sqlite3')
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    import django
+    django.setup()
+
+    from django.core.management import call_command
+    from django.core.wsgi import get_wsgi_application
+    from . import datagen, scenarios
+
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    t0 = time.perf_counter()
+    datagen.generate(args.shops, args.products, args.faq_ratio, seed=args.seed)
+    datagen_seconds = time.perf_counter() - t0
+
+    app = get_wsgi_application()
+    results = []
+    for name in selected:
+        if name == 'storefront':
+            results.append(scenarios.storefront(app, args.shops, args.products, args.requests, args.concurrency, args.seed))
+        elif name == 'search':
+            results.append(scenarios.search(app, args.shops, args.requests, args.concurrency, args.seed))
+        elif name == 'sync':
+            results.append(scenarios.sync(app, args.shops, shopify, min(args.concurrency, args.shops)))
+        elif name == 'generate':
+            results.append(scenarios.generate(app, args.shops, args.products, anthropic, args.generate_requests, args.concurrency, args.seed))
+        elif name == 'bulk':
+            results.append(scenarios.bulk(args.shops, anthropic, args.bulk_shops))
+
+    shopify.stop()
+    anthropic.stop()
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": django.conf.settings.DATABASES['default']['ENGINE'],
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            "datagen_seconds": round(datagen_seconds, 2),
+            "params": vars(args),
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        sys.stdout.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
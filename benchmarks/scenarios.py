@@ -0,0 +1,203 @@
+"""
+Benchmark scenarios, driven in-process through the WSGI application by a
+thread pool (closed loop: each thread sends its next request when the
+previous one returns). Every scenario returns a JSON-ready dict with
+throughput, p50/p95/p99 latency and queries per request, counted with the
+instrumentation recorder (faq_app/instrumentation.py).
+
+Expects Django set up on a database filled by benchmarks.datagen, and the
+Shopify / Anthropic fakes from benchmarks.fakes configured (see benchmarks.run).
+"""
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+from urllib.parse import urlencode
+
+from .datagen import WORDS, shop_domain
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def summarize(name, results, wall, **extra):
+    """
+    results: [(status, latency seconds, queries)].
+    """
+    latencies = [r[1] for r in results]
+    queries = [r[2] for r in results]
+    return {
+        "scenario": name,
+        "requests": len(results),
+        "ok": sum(1 for r in results if 200 <= r[0] < 300),
+        # Storefront reads of products without an FAQ answer 404 by design
+        "not_found": sum(1 for r in results if r[0] == 404),
+        "errors": sum(1 for r in results if r[0] is None or (r[0] >= 400 and r[0] != 404)),
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(results) / wall, 2) if wall else 0,
+        "latency_p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "latency_p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "latency_p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "latency_mean_ms": round(statistics.mean(latencies) * 1000, 2) if latencies else 0,
+        "queries_per_request": round(statistics.mean(queries), 2) if queries else 0,
+        "queries_max": max(queries) if queries else 0,
+        **extra,
+    }
+
+
+def session_token(domain):
+    import jwt
+    now = datetime.now(dt_timezone.utc)
+    return jwt.encode(
+        {"dest": f"https://{domain}", "exp": now + timedelta(hours=1), "iat": now},
+        os.environ.get('SHOPIFY_API_SECRET', 'your_secret_here'),
+        algorithm='HS256',
+    )
+
+
+def call(app, method, path, params=None, body=None, token=None):
+    """
+    One request through the WSGI app. Returns (status, latency seconds, queries).
+    """
+    from faq_app.instrumentation import RequestRecorder
+
+    payload = json.dumps(body).encode() if body is not None else b''
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': urlencode(params or {}),
+        'SERVER_NAME': 'bench', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(payload)),
+        'wsgi.input': io.BytesIO(payload),
+        'wsgi.url_scheme': 'http',
+        'wsgi.errors': sys.stderr,
+    }
+    if token:
+        environ['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    status_holder = {}
+
+    def start_response(status, headers, exc_info=None):
+        status_holder['status'] = int(status.split()[0])
+
+    started = time.perf_counter()
+    with RequestRecorder() as recorder:
+        b''.join(app(environ, start_response))
+    return status_holder.get('status'), time.perf_counter() - started, len(recorder.queries)
+
+
+def run_load(app, requests, concurrency):
+    """
+    requests: [(method, path, params, body, token)]. Returns (results, wall seconds).
+    """
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda r: call(app, *r), requests))
+    return results, time.perf_counter() - started
+
+
+def storefront(app, shops, products, requests=1000, concurrency=8, seed=0):
+    """
+    Storefront FAQ reads spread over random shops and products.
+    """
+    rng = random.Random(seed)
+    batch = [
+        ('GET', '/api/storefront/faq/', {'shop': shop_domain(rng.randrange(shops)), 'handle': f"product-{rng.randrange(products)}"}, None, None)
+        for _ in range(requests)
+    ]
+    results, wall = run_load(app, batch, concurrency)
+    return summarize('storefront', results, wall, concurrency=concurrency)
+
+
+def search(app, shops, requests=1000, concurrency=8, seed=0):
+    """
+    Storefront product search with one-word queries.
+    """
+    rng = random.Random(seed)
+    batch = [
+        ('GET', '/api/storefront/products/search/', {'shop': shop_domain(rng.randrange(shops)), 'q': rng.choice(WORDS)}, None, None)
+        for _ in range(requests)
+    ]
+    results, wall = run_load(app, batch, concurrency)
+    return summarize('search', results, wall, concurrency=concurrency)
+
+
+def sync(app, shops, shopify, concurrency=4):
+    """
+    One full product sync per shop against the fake Shopify.
+    """
+    from faq_app.models import Product
+    before = Product.objects.count()
+    calls_before = shopify.stats()
+    batch = [('POST', '/api/products/sync/', None, {}, session_token(shop_domain(i))) for i in range(shops)]
+    results, wall = run_load(app, batch, concurrency)
+    calls = shopify.stats()
+    return summarize(
+        'sync', results, wall, concurrency=concurrency,
+        products_created=Product.objects.count() - before,
+        products_per_shop=shopify.products_per_shop,
+        shopify_calls=calls['calls'] - calls_before['calls'],
+        shopify_throttled=calls['throttled'] - calls_before['throttled'],
+    )
+
+
+def generate(app, shops, products, anthropic, requests=50, concurrency=8, seed=0):
+    """
+    Single FAQ generations through the sync endpoint against the fake Anthropic.
+    """
+    from faq_app.models import Product
+    rng = random.Random(seed)
+    product_ids = {}
+    batch = []
+    for _ in range(requests):
+        domain = shop_domain(rng.randrange(shops))
+        if domain not in product_ids:
+            product_ids[domain] = list(Product.objects.filter(shop__shop_domain=domain).values_list('shopify_id', flat=True)[:products])
+        token = session_token(domain)
+        batch.append(('POST', '/api/faq/generate-faq/', None, {'productId': rng.choice(product_ids[domain]), 'num_questions': 5}, token))
+    calls_before = anthropic.stats()
+    results, wall = run_load(app, batch, concurrency)
+    calls = anthropic.stats()
+    return summarize('generate', results, wall, concurrency=concurrency,
+                     ai_latency_seconds=anthropic.latency, ai_calls=calls['calls'] - calls_before['calls'])
+
+
+def bulk(shops, anthropic, max_shops=1):
+    """
+    Bulk generation jobs (mode ALL), run inline one shop after the other.
+    Latency is per job; queries are for the whole job.
+    """
+    from faq_app.instrumentation import RequestRecorder
+    from faq_app.models import BulkGenerationJob, Shop
+    from faq_app.services.bulk_service import BulkFAQGenerator
+
+    results, processed = [], 0
+    calls_before = anthropic.stats()
+    started = time.perf_counter()
+    for i in range(min(shops, max_shops)):
+        shop = Shop.objects.get(shop_domain=shop_domain(i))
+        BulkGenerationJob.objects.filter(shop=shop).delete()
+        job = BulkGenerationJob.objects.create(shop=shop, mode='ALL')
+        job_started = time.perf_counter()
+        with RequestRecorder() as recorder:
+            BulkFAQGenerator(job.id).run()
+        job.refresh_from_db()
+        processed += job.processed_products
+        results.append((200 if job.status == 'COMPLETED' else 500, time.perf_counter() - job_started, len(recorder.queries)))
+    wall = time.perf_counter() - started
+    calls = anthropic.stats()
+    return summarize('bulk', results, wall,
+                     products_processed=processed,
+                     products_per_second=round(processed / wall, 2) if wall else 0,
+                     queries_per_product=round(sum(r[2] for r in results) / processed, 2) if processed else 0,
+                     ai_latency_seconds=anthropic.latency, ai_calls=calls['calls'] - calls_before['calls'])
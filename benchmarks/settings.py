@@ -0,0 +1,20 @@
+"""
+Settings for local benchmark runs: a throwaway SQLite file with the schema
+built straight from the models (migration 0003 is MySQL-only SQL).
+"""
+import os
+from faq_project.test_settings import *
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('BENCH_DB_PATH', '/tmp/faq_bench.sqlite3'),
+        # IMMEDIATE: concurrent writers wait on the lock instead of failing
+        # with "database is locked" when upgrading a read transaction
+        'OPTIONS': {'timeout': 30, 'transaction_mode': 'IMMEDIATE'},
+    }
+}
+
+MIGRATION_MODULES = {'faq_app': None, 'subscriptions': None}
+
+DEBUG = False
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class FaqAppConfig(AppConfig):
     default_auto_field = 'django.db.models.AutoField'
     name = 'faq_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from . import db_connections, instrumentation
+        instrumentation.install()
+        db_connections.install()
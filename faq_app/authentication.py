@@ -1,23 +1,147 @@
 import jwt
 import os
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
 from rest_framework import authentication
 from rest_framework import exceptions
 from .models import Shop
+from .metrics import AUTH_SHOP_CACHE
+from .sharding import activate_shop
+
+# Shop rows live in the shared cache (settings.CACHES), so an uninstall or a
+# token refresh invalidates them for every worker; the TTL bounds a missed one
+AUTH_SHOP_CACHE_TTL = getattr(settings, 'AUTH_SHOP_CACHE_TTL', 60)
+AUTH_CACHE_MAX_ENTRIES = getattr(settings, 'AUTH_CACHE_MAX_ENTRIES', 10000)
+
+
+class TTLCache:
+    """
+    Small thread-safe LRU cache with a per-entry expiry time.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# Verified session token -> shop_domain, kept until the token's own `exp`
+_token_cache = TTLCache(AUTH_CACHE_MAX_ENTRIES)
+
+_SHOP_FIELDS = tuple(f.attname for f in Shop._meta.concrete_fields)
+
+
+def shop_cache_key(shop_domain):
+    # -> (db alias, field values) used to rebuild a fresh Shop per request
+    return f"auth_shop:{shop_domain}"
+
+
+def get_cached_shop(shop_domain):
+    """
+    Shop for a domain, from the shared cache when possible. Each call returns a
+    new instance so per-request state (e.g. entitlement memo) never leaks.
+    Raises Shop.DoesNotExist.
+    """
+    entry = cache.get(shop_cache_key(shop_domain))
+    AUTH_SHOP_CACHE.inc(result='miss' if entry is None else 'hit')
+    if entry is None:
+        shop = Shop.objects.get(shop_domain=shop_domain)
+        cache_shop(shop)
+        return shop
+    db, values = entry
+    return Shop.from_db(db, _SHOP_FIELDS, values)
+
+
+def get_active_shop(shop_domain):
+    """
+    get_cached_shop() for public lookups: an uninstalled (inactive) shop is
+    not found either. Raises Shop.DoesNotExist.
+    """
+    shop = get_cached_shop(shop_domain)
+    if not shop.is_active:
+        raise Shop.DoesNotExist(f"Shop {shop_domain} is not active")
+    return shop
+
+
+def peek_cached_shop(shop_domain):
+    """
+    Shop from the cache only (never queries the shop table), or None.
+    """
+    entry = cache.get(shop_cache_key(shop_domain))
+    if entry is None:
+        return None
+    db, values = entry
+    return Shop.from_db(db, _SHOP_FIELDS, values)
+
+
+def cache_shop(shop):
+    values = tuple(getattr(shop, name) for name in _SHOP_FIELDS)
+    cache.set(shop_cache_key(shop.shop_domain), (shop._state.db, values), AUTH_SHOP_CACHE_TTL)
+
+
+def invalidate_shop_cache(shop_domain):
+    cache.delete(shop_cache_key(shop_domain))
+
+
+def shop_domain_hint(request):
+    """
+    Shop domain a request is about, known before authentication runs:
+    X-Shop-Domain, the storefront `shop` parameter, or a session token this
+    process already verified. Not proof of identity; the views still authenticate.
+    """
+    shop_domain = request.headers.get('X-Shop-Domain') or request.GET.get('shop')
+    if shop_domain:
+        return shop_domain
+    auth_header = request.META.get('HTTP_AUTHORIZATION') or ''
+    if auth_header.startswith('Bearer '):
+        return _token_cache.get(auth_header[len('Bearer '):])
+    return None
+
 
 class ShopifyAuthentication(authentication.BaseAuthentication):
     def authenticate(self, request):
         # 1. Check for S2S Internal Auth (X-Shop-Domain + X-Internal-Secret)
         internal_secret = request.headers.get('X-Internal-Secret')
         shop_domain_header = request.headers.get('X-Shop-Domain')
-        
+
         env_secret = os.environ.get('INTERNAL_API_SECRET', 'my_dev_secret')
 
         if internal_secret == env_secret and shop_domain_header:
             try:
-                shop = Shop.objects.get(shop_domain=shop_domain_header)
+                shop = get_active_shop(shop_domain_header)
+                activate_shop(shop.pk)
                 return (shop, None)
             except Shop.DoesNotExist:
-                 # In S2S, if shop doesn't exist, we might fail or auto-create. 
+                 # In S2S, if shop doesn't exist, we might fail or auto-create.
                  # Given sync happens on install, it should exist. Fail safely.
                  raise exceptions.AuthenticationFailed(f'Shop {shop_domain_header} not found')
 
@@ -33,27 +157,41 @@ class ShopifyAuthentication(authentication.BaseAuthentication):
             return None
 
         try:
-            # Decode the token without verification first to get the payload
-            # In a real app, you MUST verify the signature using your App Secret
-            # For this implementation, we will assume the secret is in env
-            secret = os.environ.get('SHOPIFY_API_SECRET', 'your_secret_here')
-            
-            # NOTE: In production, verify audience, issuer, etc.
-            payload = jwt.decode(token, secret, algorithms=['HS256'], options={"verify_aud": False})
-            
-            shop_domain = payload.get('dest').replace('https://', '')
-            
+            # Tokens already verified by this process skip the decode + HMAC.
+            # Keyed by the whole token: header and payload are covered, not just the signature.
+            shop_domain = _token_cache.get(token)
+
+            if shop_domain is None:
+                # In a real app, you MUST verify the signature using your App Secret
+                # For this implementation, we will assume the secret is in env
+                secret = os.environ.get('SHOPIFY_API_SECRET', 'your_secret_here')
+
+                # NOTE: In production, verify audience, issuer, etc.
+                payload = jwt.decode(token, secret, algorithms=['HS256'], options={"verify_aud": False})
+
+                shop_domain = payload.get('dest').replace('https://', '')
+
+                # Never cache past the token's expiry
+                expires_at = payload.get('exp') or (time.time() + AUTH_SHOP_CACHE_TTL)
+                _token_cache.set(token, shop_domain, expires_at)
+
             try:
-                shop = Shop.objects.get(shop_domain=shop_domain)
+                shop = get_cached_shop(shop_domain)
             except Shop.DoesNotExist:
                 # Auto-create shop if it doesn't exist (optional, depends on flow)
                 shop = Shop.objects.create(shop_domain=shop_domain, shop_name=shop_domain)
-            
+            if not shop.is_active:
+                # Uninstalled: its data is being deleted
+                raise exceptions.AuthenticationFailed(f'Shop {shop_domain} is not active')
+
+            activate_shop(shop.pk)
             return (shop, None) # (user, auth)
 
         except jwt.ExpiredSignatureError:
             raise exceptions.AuthenticationFailed('Token has expired')
         except jwt.InvalidTokenError:
             raise exceptions.AuthenticationFailed('Invalid token')
+        except exceptions.AuthenticationFailed:
+            raise
         except Exception as e:
             raise exceptions.AuthenticationFailed(str(e))
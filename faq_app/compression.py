@@ -0,0 +1,83 @@
+"""
+Content-Encoding helpers shared by CompressionMiddleware and the storefront
+payload cache. Brotli is optional: without the `brotli` package only gzip
+is offered.
+"""
+import gzip
+from django.conf import settings
+
+try:
+    import brotli
+except ImportError: # Optional: gzip only
+    brotli = None
+
+# Bodies below this size gain little and cost a round of CPU
+COMPRESSION_MIN_SIZE = getattr(settings, 'COMPRESSION_MIN_SIZE', 860)
+
+COMPRESSIBLE_TYPES = (
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+    'text/',
+)
+
+# Per-request compression favours speed; cached payloads are compressed once, so go max
+DYNAMIC_LEVELS = {'br': 5, 'gzip': 6}
+STATIC_LEVELS = {'br': 11, 'gzip': 9}
+
+# Server preference when the client weighs several encodings equally
+SUPPORTED_ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def is_compressible(content_type):
+    return (content_type or '').split(';')[0].strip().lower().startswith(COMPRESSIBLE_TYPES)
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    Best supported encoding for an Accept-Encoding header, or None.
+    """
+    weights = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+
+    best, best_q = None, 0.0
+    for encoding in SUPPORTED_ENCODINGS:
+        q = weights.get(encoding, weights.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(body, encoding, static=False):
+    level = (STATIC_LEVELS if static else DYNAMIC_LEVELS)[encoding]
+    if encoding == 'br':
+        return brotli.compress(body, quality=level)
+    # mtime=0 keeps the output stable for identical bodies (cacheable, ETag-friendly)
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def precompress(body):
+    """
+    {encoding: bytes} for every supported encoding that actually shrinks `body`.
+    """
+    if len(body) < COMPRESSION_MIN_SIZE:
+        return {}
+    encoded = {}
+    for encoding in SUPPORTED_ENCODINGS:
+        compressed = compress(body, encoding, static=True)
+        if len(compressed) < len(body):
+            encoded[encoding] = compressed
+    return encoded
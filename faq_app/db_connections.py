@@ -0,0 +1,58 @@
+"""
+Database connection lifecycle outside (and around) the request cycle.
+
+Connections persist for CONN_MAX_AGE seconds and are health-checked
+(CONN_HEALTH_CHECKS) before being reused by a new request. Django only does
+that housekeeping on request_started / request_finished, so threads that run
+outside requests (bulk jobs, shop deletion, the log and webhook flushers)
+call release_connections() between units of work and
+close_thread_connections() when they finish; otherwise a long job keeps a
+connection past its max age, or dies on one the server has dropped.
+
+install() swaps Django's request-cycle close_old_connections for
+release_connections and counts opened connections, so connection churn
+shows up in /metrics (faq_db_connections_opened_total / _closed_total).
+"""
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connections
+from django.db.backends.signals import connection_created
+from .metrics import DB_CONNECTIONS_CLOSED, DB_CONNECTIONS_OPENED
+
+
+def release_connections(**kwargs):
+    """
+    close_old_connections() that counts what it closes. Connections inside a
+    transaction are left alone.
+    """
+    for conn in connections.all(initialized_only=True):
+        if conn.in_atomic_block or conn.connection is None:
+            continue
+        conn.close_if_unusable_or_obsolete()
+        if conn.connection is None:
+            DB_CONNECTIONS_CLOSED.inc(alias=conn.alias, reason='obsolete')
+
+
+def close_thread_connections():
+    """
+    Close the calling thread's connections (connections are per thread, a
+    finished background thread would otherwise leave its own open).
+    """
+    for conn in connections.all(initialized_only=True):
+        if conn.in_atomic_block or conn.connection is None:
+            continue
+        conn.close()
+        DB_CONNECTIONS_CLOSED.inc(alias=conn.alias, reason='thread_exit')
+
+
+def _connection_opened(sender, connection, **kwargs):
+    DB_CONNECTIONS_OPENED.inc(alias=connection.alias)
+
+
+def install():
+    """
+    Idempotent; called from AppConfig.ready().
+    """
+    connection_created.connect(_connection_opened, dispatch_uid='faq_app.db_connections')
+    for signal in (request_started, request_finished):
+        signal.disconnect(close_old_connections)
+        signal.connect(release_connections, dispatch_uid='faq_app.db_connections')
@@ -0,0 +1,222 @@
+"""
+Read-replica routing.
+
+Replicas are the DATABASE_REPLICAS aliases (settings: one per
+DB_REPLICA_HOSTS entry). ReplicaRoutingMiddleware opens a routing state for
+each request; only safe-method requests to views that opt in through
+`replica_read_actions` (viewset actions or lowercase HTTP methods, default
+('list',)) or the @replica_reads decorator may read from a replica. Anything
+else, background threads and management commands included, uses `default`.
+
+Read-your-writes: the first write of a request pins the rest of it to the
+primary, and a shop that wrote is pinned for REPLICA_PIN_SECONDS across
+requests (a key in the shared cache, settings.CACHES).
+Replicas whose lag, checked at most every REPLICA_LAG_CHECK_INTERVAL seconds
+per process, is over REPLICA_MAX_LAG_SECONDS are skipped; with none left the
+primary serves the read.
+"""
+import contextvars
+import logging
+import random
+import threading
+import time
+import jwt
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from .metrics import DB_READ_ROUTING
+
+logger = logging.getLogger(__name__)
+
+_state = contextvars.ContextVar('db_routing', default=None)
+
+DEFAULT_REPLICA_READ_ACTIONS = ('list',)
+SAFE_METHODS = ('GET', 'HEAD')
+
+_lag_lock = threading.Lock()
+_lag_checked = {} # alias -> (monotonic time, lag seconds)
+
+
+def replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+class RoutingState:
+    def __init__(self, pin_key=None, pinned=False):
+        self.pin_key = pin_key
+        self.pinned = pinned
+        self.replica_allowed = False
+        self.replica = None # Alias chosen for this request, once
+        self.wrote = False
+
+
+def current_state():
+    return _state.get()
+
+
+def replica_reads(view_func):
+    """
+    Let a function view's GET requests read from a replica.
+    """
+    view_func.replica_reads = True
+    return view_func
+
+
+def allows_replica_reads(view_func, method):
+    if method not in SAFE_METHODS:
+        return False
+    cls = getattr(view_func, 'cls', None) # DRF as_view()
+    if cls is None:
+        return getattr(view_func, 'replica_reads', False)
+    action = (getattr(view_func, 'actions', None) or {}).get(method.lower(), method.lower())
+    return action in getattr(cls, 'replica_read_actions', DEFAULT_REPLICA_READ_ACTIONS)
+
+
+def measure_lag(alias):
+    """
+    Seconds the replica is behind (inf if replication is stopped or the check fails).
+    """
+    connection = connections[alias]
+    if connection.vendor != 'mysql':
+        return 0.0
+    try:
+        with connection.cursor() as cursor:
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
+            except Exception:
+                cursor.execute("SHOW SLAVE STATUS") # MySQL < 8.0.22
+            row = cursor.fetchone()
+            if row is None:
+                return 0.0 # Not a replica (e.g. a second primary in development)
+            status = dict(zip([col[0] for col in cursor.description], row))
+        lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+        return float('inf') if lag is None else float(lag)
+    except Exception as e:
+        logger.warning("Replica lag check on %s failed: %s", alias, e)
+        return float('inf')
+
+
+def replica_lag(alias):
+    interval = getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 5.0)
+    now = time.monotonic()
+    checked = _lag_checked.get(alias)
+    if checked is not None and now - checked[0] < interval:
+        return checked[1]
+    with _lag_lock:
+        checked = _lag_checked.get(alias)
+        if checked is None or now - checked[0] >= interval:
+            checked = (now, measure_lag(alias))
+            _lag_checked[alias] = checked
+    return checked[1]
+
+
+def choose_replica():
+    """
+    A random replica within the lag threshold, or None.
+    """
+    max_lag = getattr(settings, 'REPLICA_MAX_LAG_SECONDS', 5.0)
+    healthy = [alias for alias in replicas() if replica_lag(alias) <= max_lag]
+    return random.choice(healthy) if healthy else None
+
+
+def pin_cache_key(pin_key):
+    return f"db_pin:{pin_key}"
+
+
+def pin_key_for(request):
+    """
+    The shop a request acts for, from the storefront `shop` parameter or the
+    session token's `dest` (not verified: it only steers reads to the primary).
+    """
+    shop = request.GET.get('shop')
+    if shop:
+        return shop
+    auth = request.headers.get('Authorization', '')
+    if auth.startswith('Bearer '):
+        try:
+            dest = jwt.decode(auth[7:], options={"verify_signature": False}).get('dest', '')
+        except jwt.PyJWTError:
+            return None
+        return dest.replace('https://', '') or None
+    return None
+
+
+# DatabaseCache's table: always the primary, and cache writes are not data writes
+CACHE_APP_LABEL = 'django_cache'
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.replica_allowed or state.pinned or model._meta.app_label == CACHE_APP_LABEL:
+            return DEFAULT_DB_ALIAS
+        if state.replica is None:
+            state.replica = choose_replica() or DEFAULT_DB_ALIAS
+            DB_READ_ROUTING.inc(target='primary' if state.replica == DEFAULT_DB_ALIAS else 'replica')
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None and model._meta.app_label != CACHE_APP_LABEL:
+            state.wrote = True
+            state.pinned = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Opens the per-request routing state (see module docstring). A no-op
+    when no replica is configured.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def begin(self, request):
+        if not replicas():
+            return None
+        pin_key = pin_key_for(request)
+        pinned = bool(pin_key) and bool(cache.get(pin_cache_key(pin_key)))
+        return _state.set(RoutingState(pin_key=pin_key, pinned=pinned))
+
+    def end(self, token):
+        state = _state.get()
+        _state.reset(token)
+        if state.wrote and state.pin_key:
+            cache.set(pin_cache_key(state.pin_key), True, getattr(settings, 'REPLICA_PIN_SECONDS', 5))
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = self.begin(request)
+        if token is None:
+            return self.get_response(request)
+        try:
+            return self.get_response(request)
+        finally:
+            self.end(token)
+
+    async def __acall__(self, request):
+        token = self.begin(request)
+        if token is None:
+            return await self.get_response(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            self.end(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _state.get()
+        if state is not None:
+            state.replica_allowed = allows_replica_reads(view_func, request.method)
+        return None
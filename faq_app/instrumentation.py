@@ -0,0 +1,266 @@
+"""
+Per-request cost instrumentation.
+
+For a sampled request RequestInstrumentationMiddleware activates a
+RequestRecorder; a DB execute wrapper (installed on every connection) and
+hooks on the requests / httpx clients add query and outbound HTTP timings. When the
+request ends its totals go to per-endpoint histograms and, above the slow
+thresholds, a slow-request warning with the heaviest queries is logged.
+Unsampled requests only pay one random() call; the hooks then only read a
+context variable.
+"""
+import contextvars
+import logging
+import random
+import threading
+import time
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+REQUEST_INSTRUMENTATION_SAMPLE_RATE = getattr(settings, 'REQUEST_INSTRUMENTATION_SAMPLE_RATE', 0.0)
+REQUEST_SLOW_MS = getattr(settings, 'REQUEST_SLOW_MS', 1000)
+REQUEST_SLOW_QUERY_COUNT = getattr(settings, 'REQUEST_SLOW_QUERY_COUNT', 50)
+SLOW_LOG_TOP_QUERIES = 5
+
+# Upper bounds in milliseconds; the last bucket is +Inf
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_current = contextvars.ContextVar('request_recorder', default=None)
+
+
+class RequestRecorder:
+    __slots__ = ('started', 'queries', 'db_ms', 'outbound_ms', 'outbound_count', '_token')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []
+        self.db_ms = 0.0
+        self.outbound_ms = 0.0
+        self.outbound_count = 0
+        self._token = None
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        _current.reset(self._token)
+
+    def add_query(self, sql, duration_ms):
+        self.queries.append((duration_ms, sql))
+        self.db_ms += duration_ms
+
+    def add_outbound(self, duration_ms):
+        self.outbound_count += 1
+        self.outbound_ms += duration_ms
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+
+def current_recorder():
+    return _current.get()
+
+
+def should_sample():
+    rate = REQUEST_INSTRUMENTATION_SAMPLE_RATE
+    return rate > 0 and (rate >= 1 or random.random() < rate)
+
+
+def _db_wrapper(execute, sql, params, many, context):
+    recorder = _current.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        recorder.add_query(sql, (time.perf_counter() - started) * 1000)
+
+
+def _install_db_wrapper(connection, **kwargs):
+    if _db_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_db_wrapper)
+
+
+def _timed_send(original_send):
+    def send(self, request, *args, **kwargs):
+        recorder = _current.get()
+        if recorder is None:
+            return original_send(self, request, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return original_send(self, request, *args, **kwargs)
+        finally:
+            recorder.add_outbound((time.perf_counter() - started) * 1000)
+    send._instrumented = True
+    return send
+
+
+def _atimed_send(original_send):
+    async def send(self, request, *args, **kwargs):
+        recorder = _current.get()
+        if recorder is None:
+            return await original_send(self, request, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return await original_send(self, request, *args, **kwargs)
+        finally:
+            recorder.add_outbound((time.perf_counter() - started) * 1000)
+    send._instrumented = True
+    return send
+
+
+def _install_outbound_hook():
+    """
+    Time outbound calls made through requests (Shopify, Anthropic) and httpx (async AI path).
+    """
+    targets = []
+    try:
+        from requests.adapters import HTTPAdapter
+        targets.append((HTTPAdapter, _timed_send))
+    except ImportError:
+        pass
+    try:
+        import httpx
+        targets.append((httpx.Client, _timed_send))
+        targets.append((httpx.AsyncClient, _atimed_send))
+    except ImportError:
+        pass
+    for cls, wrap in targets:
+        if not getattr(cls.send, '_instrumented', False):
+            cls.send = wrap(cls.send)
+
+
+def install():
+    """
+    Hook DB connections (current and future, every thread) and outbound
+    HTTP clients. Idempotent; called from AppConfig.ready().
+    """
+    connection_created.connect(_install_db_wrapper, dispatch_uid='faq_app.instrumentation')
+    for connection in connections.all(initialized_only=True):
+        _install_db_wrapper(connection)
+    _install_outbound_hook()
+
+
+class EndpointStats:
+    __slots__ = ('count', 'latency_ms_sum', 'buckets', 'queries_sum', 'db_ms_sum',
+                 'outbound_ms_sum', 'outbound_count_sum', 'response_bytes_sum', 'slow_count')
+
+    def __init__(self):
+        self.count = 0
+        self.latency_ms_sum = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.queries_sum = 0
+        self.db_ms_sum = 0.0
+        self.outbound_ms_sum = 0.0
+        self.outbound_count_sum = 0
+        self.response_bytes_sum = 0
+        self.slow_count = 0
+
+    def to_dict(self):
+        count = self.count or 1
+        return {
+            "count": self.count,
+            "slow": self.slow_count,
+            "latency_ms": {
+                "avg": round(self.latency_ms_sum / count, 2),
+                "buckets": {
+                    **{f"le_{bound}": n for bound, n in zip(LATENCY_BUCKETS_MS, self.buckets)},
+                    "le_inf": self.buckets[-1],
+                },
+            },
+            "avg_queries": round(self.queries_sum / count, 2),
+            "avg_db_ms": round(self.db_ms_sum / count, 2),
+            "avg_outbound_ms": round(self.outbound_ms_sum / count, 2),
+            "avg_outbound_calls": round(self.outbound_count_sum / count, 2),
+            "avg_response_bytes": round(self.response_bytes_sum / count),
+        }
+
+
+class RequestStatsRegistry:
+    """
+    Per-endpoint aggregates for sampled requests (this process only).
+    Buckets are cumulative counts of requests at or under each bound.
+    """
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, latency_ms, queries, db_ms, outbound_ms, outbound_count, response_bytes, slow):
+        with self._lock:
+            stats = self._stats.get(endpoint)
+            if stats is None:
+                stats = self._stats[endpoint] = EndpointStats()
+            stats.count += 1
+            stats.latency_ms_sum += latency_ms
+            for i, bound in enumerate(LATENCY_BUCKETS_MS):
+                if latency_ms <= bound:
+                    stats.buckets[i] += 1
+            stats.buckets[-1] += 1
+            stats.queries_sum += queries
+            stats.db_ms_sum += db_ms
+            stats.outbound_ms_sum += outbound_ms
+            stats.outbound_count_sum += outbound_count
+            stats.response_bytes_sum += response_bytes
+            stats.slow_count += int(slow)
+
+    def snapshot(self):
+        with self._lock:
+            return {endpoint: stats.to_dict() for endpoint, stats in sorted(self._stats.items())}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+registry = RequestStatsRegistry()
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return (match.view_name or match._func_path) if match else 'unresolved'
+
+
+def endpoint_name(request):
+    return f"{request.method} {view_name(request)}"
+
+
+def response_size(response):
+    length = response.get('Content-Length')
+    if length is not None:
+        return int(length)
+    if getattr(response, 'streaming', False):
+        return 0
+    return len(response.content)
+
+
+def finish_request(recorder, request, response):
+    """
+    Record a sampled request; log a slow-request warning over the thresholds.
+    """
+    latency_ms = recorder.elapsed_ms()
+    endpoint = endpoint_name(request)
+    size = response_size(response)
+    slow = latency_ms >= REQUEST_SLOW_MS or len(recorder.queries) >= REQUEST_SLOW_QUERY_COUNT
+
+    registry.observe(endpoint, latency_ms, len(recorder.queries), recorder.db_ms,
+                     recorder.outbound_ms, recorder.outbound_count, size, slow)
+
+    if slow:
+        top = sorted(recorder.queries, key=lambda q: q[0], reverse=True)[:SLOW_LOG_TOP_QUERIES]
+        logger.warning("Slow request %s", endpoint, extra={
+            "endpoint": endpoint,
+            "path": request.path,
+            "status": response.status_code,
+            "latency_ms": round(latency_ms, 2),
+            "queries": len(recorder.queries),
+            "db_ms": round(recorder.db_ms, 2),
+            "outbound_calls": recorder.outbound_count,
+            "outbound_ms": round(recorder.outbound_ms, 2),
+            "response_bytes": size,
+            "top_queries": [{"ms": round(ms, 2), "sql": sql[:500]} for ms, sql in top],
+        })
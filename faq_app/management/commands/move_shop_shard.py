@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from faq_app.models import Shop
+from faq_app.services.shard_moves import ShardMoveError, move_shop
+
+
+class Command(BaseCommand):
+    help = "Move a shop's products, FAQs, logs, design and bulk job to another shard while it stays online"
+
+    def add_arguments(self, parser):
+        parser.add_argument('shop', help='Shop domain')
+        parser.add_argument('target', help='Target database alias (one of TENANT_SHARDS)')
+        parser.add_argument('--chunk-size', type=int, default=getattr(settings, 'SHARD_MOVE_CHUNK_SIZE', 1000),
+                            help='Rows per copy / DELETE')
+        parser.add_argument('--settle', type=float, default=None,
+                            help='Seconds to wait for every process to see a shard map change (default: SHARD_MAP_CACHE_TTL)')
+        parser.add_argument('--keep-source', action='store_true',
+                            help='Leave the copied rows on the old shard')
+
+    def handle(self, *args, **options):
+        try:
+            shop = Shop.objects.get(shop_domain=options['shop'])
+        except Shop.DoesNotExist:
+            raise CommandError(f"Shop {options['shop']} not found")
+
+        try:
+            copied = move_shop(
+                shop, options['target'], chunk_size=options['chunk_size'],
+                settle=options['settle'], keep_source=options['keep_source'],
+            )
+        except ShardMoveError as e:
+            raise CommandError(str(e))
+
+        for table, rows in copied.items():
+            self.stdout.write(f"{table}: {rows} rows")
+        self.stdout.write(self.style.SUCCESS(f"Moved {shop.shop_domain} to {options['target']}"))
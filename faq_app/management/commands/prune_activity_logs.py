@@ -0,0 +1,53 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from faq_app.services.log_retention import ensure_future_partitions, is_partitioned, prune_activity_logs
+from faq_app.sharding import shards
+
+
+class Command(BaseCommand):
+    help = 'Drop (or archive then drop) activity logs older than the retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'ACTIVITY_LOG_RETENTION_DAYS', 90),
+                            help='Retention period in days')
+        parser.add_argument('--archive-dir', default=getattr(settings, 'ACTIVITY_LOG_ARCHIVE_DIR', None),
+                            help='Write expired rows to gzip JSONL files here before removing them')
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Rows per DELETE when the table is not partitioned')
+        parser.add_argument('--months-ahead', type=int, default=3,
+                            help='Future monthly partitions to keep ready (MySQL)')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        today = timezone.now().date()
+        cutoff = today - timedelta(days=options['days'])
+
+        # Logs live on every tenant shard
+        for alias in shards():
+            self.prune(alias, today, cutoff, options)
+
+    def prune(self, alias, today, cutoff, options):
+        prefix = f"[{alias}] " if len(shards()) > 1 else ""
+        if is_partitioned(alias) and not options['dry_run']:
+            created = ensure_future_partitions(today, months_ahead=options['months_ahead'], using=alias)
+            if created:
+                self.stdout.write(f"{prefix}Created partitions: {', '.join(created)}")
+
+        result = prune_activity_logs(
+            cutoff,
+            archive_dir=options['archive_dir'],
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run'],
+            using=alias,
+        )
+
+        if result['mode'] == 'partitions':
+            names = ', '.join(name for name, _ in result['dropped']) or 'none'
+            verb = 'Would drop' if options['dry_run'] else 'Dropped'
+            self.stdout.write(self.style.SUCCESS(f"{prefix}{verb} partitions before {cutoff}: {names} ({result['archived']} rows archived)"))
+        elif options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"{prefix}Would delete {result['would_delete']} logs before {cutoff}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"{prefix}Deleted {result['deleted']} logs before {cutoff} ({result['archived']} archived)"))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from faq_app.models import Shop
+from faq_app.services.activity_stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild ActivityLog daily stat counters from the raw logs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shop', help='Shop domain (default: all shops)')
+        parser.add_argument('--start', help='First day to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last day to rebuild (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        shop = None
+        if options['shop']:
+            try:
+                shop = Shop.objects.get(shop_domain=options['shop'])
+            except Shop.DoesNotExist:
+                raise CommandError(f"Shop {options['shop']} not found")
+
+        dates = {}
+        for name in ('start', 'end'):
+            value = options[name]
+            dates[name] = parse_date(value) if value else None
+            if value and dates[name] is None:
+                raise CommandError(f"--{name} must be YYYY-MM-DD")
+
+        written = rebuild_stats(shop=shop, start=dates['start'], end=dates['end'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} stat rows"))
@@ -0,0 +1,30 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from faq_app.models import ShopDeletionJob
+from faq_app.services.shop_deletion import run_shop_deletion
+
+
+class Command(BaseCommand):
+    help = 'Resume failed or interrupted shop deletion jobs (runs them in this process)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale-minutes', type=int, default=30,
+                            help='Pending/running jobs not updated for this long are considered interrupted')
+        parser.add_argument('--chunk-size', type=int, default=getattr(settings, 'SHOP_DELETION_CHUNK_SIZE', 1000),
+                            help='Rows per DELETE')
+
+    def handle(self, *args, **options):
+        stale_before = timezone.now() - timedelta(minutes=options['stale_minutes'])
+        jobs = ShopDeletionJob.objects.filter(
+            Q(status='FAILED') | Q(status__in=['PENDING', 'RUNNING'], updated_at__lt=stale_before)
+        ).order_by('created_at')
+
+        resumed = 0
+        for job_id in jobs.values_list('id', flat=True):
+            job = run_shop_deletion(job_id, chunk_size=options['chunk_size'])
+            resumed += 1
+            self.stdout.write(f"{job.shop_domain}: {job.status} {job.deleted_rows}")
+        self.stdout.write(self.style.SUCCESS(f"Resumed {resumed} shop deletion jobs"))
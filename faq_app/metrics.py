@@ -0,0 +1,399 @@
+"""
+In-process metrics (counters, gauges, histograms) with Prometheus text
+exposition, served at /metrics.
+
+Single process: values live in memory. With METRICS_MULTIPROC_DIR set (point
+every gunicorn worker at the same directory, emptied on deploy) each process
+also writes its values to <dir>/metrics-<pid>-<start>.json (<start>: the
+process start time, so a reused pid never overwrites a dead worker's file),
+from a background thread every METRICS_FLUSH_INTERVAL seconds and at exit, and
+/metrics merges all files: counters and histograms are summed, gauges are
+summed over live processes only. The counters of exited workers are folded
+into metrics-dead.json and their files deleted, so totals never go backwards
+and the directory does not grow with every restart.
+"""
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+METRICS_MULTIPROC_DIR = getattr(settings, 'METRICS_MULTIPROC_DIR', None)
+METRICS_FLUSH_INTERVAL = getattr(settings, 'METRICS_FLUSH_INTERVAL', 5.0)
+
+DEAD_FILE = 'metrics-dead.json'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class MetricsRegistry:
+    def __init__(self, multiproc_dir=None, flush_interval=5.0):
+        self.multiproc_dir = multiproc_dir
+        self.flush_interval = flush_interval
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self._flusher = None
+        self._pid = None
+        self._file_name = None # (pid, name of this process's file)
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self.metrics[metric.name] = metric
+
+    def touched(self):
+        """
+        Called on every update: starts the per-process file writer in multiprocess mode.
+        """
+        if self.multiproc_dir and (self._pid != os.getpid() or self._flusher is None):
+            self._start_flusher()
+
+    def _start_flusher(self):
+        # Threads do not survive fork: one writer per worker process
+        with self.lock:
+            if self._pid == os.getpid() and self._flusher is not None:
+                return
+            self._pid = os.getpid()
+            self._flusher = threading.Thread(target=self._run_flusher, name='metrics-flush', daemon=True)
+            self._flusher.start()
+
+    def _run_flusher(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.write_process_file()
+            except Exception as e:
+                logger.exception("Metrics flush error: %s", e)
+
+    def local_samples(self):
+        """
+        {name: {labels tuple: value}} for this process.
+        """
+        with self.lock:
+            return {name: dict(metric.values) for name, metric in self.metrics.items()}
+
+    def process_file_name(self):
+        pid = os.getpid()
+        if self._file_name is None or self._file_name[0] != pid:
+            start = process_start_time(pid) or f"u{uuid.uuid4().hex}"
+            self._file_name = (pid, f"metrics-{pid}-{start}.json")
+        return self._file_name[1]
+
+    @contextmanager
+    def files_lock(self):
+        # Every worker's /metrics merges and reads the directory
+        with open(os.path.join(self.multiproc_dir, 'metrics-dead.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def write_process_file(self):
+        if not self.multiproc_dir:
+            return
+        os.makedirs(self.multiproc_dir, exist_ok=True)
+        data = {
+            name: [[list(labels), value] for labels, value in values.items()]
+            for name, values in self.local_samples().items()
+        }
+        write_json(os.path.join(self.multiproc_dir, self.process_file_name()), data)
+
+    def merge_dead_files(self):
+        """
+        Fold the counters and histograms of exited processes into DEAD_FILE and
+        delete their files. Call with files_lock() held.
+        """
+        own = self.process_file_name()
+        dead = []
+        for path in glob.glob(os.path.join(self.multiproc_dir, 'metrics-*-*.json')):
+            name = os.path.basename(path)
+            try:
+                pid, start = name[len('metrics-'):-len('.json')].split('-', 1)
+                pid = int(pid)
+            except ValueError:
+                continue
+            if name != own and not process_alive(pid, start):
+                dead.append(path)
+        if not dead:
+            return
+
+        dead_path = os.path.join(self.multiproc_dir, DEAD_FILE)
+        merged = {}
+        for path in [dead_path] + dead:
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (ValueError, OSError):
+                continue
+            for name, samples in data.items():
+                metric = self.metrics.get(name)
+                if metric is None or metric.kind == 'gauge':
+                    continue
+                values = merged.setdefault(name, {})
+                for labels, value in samples:
+                    key = tuple(labels)
+                    values[key] = metric.merge(values.get(key), value)
+        write_json(dead_path, {
+            name: [[list(labels), value] for labels, value in values.items()]
+            for name, values in merged.items()
+        })
+        # A crash before these removes would merge the files again next time:
+        # counted twice rather than lost
+        for path in dead:
+            os.remove(path)
+
+    def collect(self):
+        """
+        Merged samples of every process: {name: {labels tuple: value}}.
+        """
+        if not self.multiproc_dir:
+            return self.local_samples()
+
+        self.write_process_file()
+        merged = {name: {} for name in self.metrics}
+        with self.files_lock():
+            self.merge_dead_files()
+            # Live processes' files and DEAD_FILE (which holds no gauges) are left
+            for path in glob.glob(os.path.join(self.multiproc_dir, 'metrics-*.json')):
+                try:
+                    with open(path) as f:
+                        data = json.load(f)
+                except (ValueError, OSError):
+                    continue
+                for name, samples in data.items():
+                    metric = self.metrics.get(name)
+                    if metric is None:
+                        continue
+                    for labels, value in samples:
+                        key = tuple(labels)
+                        merged[name][key] = metric.merge(merged[name].get(key), value)
+        return merged
+
+    def expose(self):
+        """
+        Prometheus text exposition format (version 0.0.4).
+        """
+        samples = self.collect()
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for labels, value in sorted(samples.get(name, {}).items()):
+                lines.extend(metric.expose(labels, value))
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self.lock:
+            for metric in self.metrics.values():
+                metric.values.clear()
+
+
+def write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def process_start_time(pid):
+    """
+    Start time of a process in clock ticks since boot (Linux), or None.
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # Fields after the parenthesised command name, which may contain spaces
+    return stat.rsplit(')', 1)[1].split()[19]
+
+
+def pid_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def process_alive(pid, start):
+    """
+    Whether the process that wrote a file is still running: its pid exists and,
+    when the start time is known, belongs to the same process.
+    """
+    if not pid_alive(pid):
+        return False
+    if start.startswith('u'):
+        return True
+    current = process_start_time(pid)
+    return current is None or current == start
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label_value(value)}"' for name, value in pairs) + '}'
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = registry or REGISTRY
+        self.values = {}
+        self.registry.register(self)
+
+    def key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def merge(self, current, value):
+        return value if current is None else current + value
+
+    def expose(self, labels, value):
+        return [f"{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}"]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        self.registry.touched()
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self.key(labels)
+        with self.registry.lock:
+            self.values[key] = value
+        self.registry.touched()
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+        self.registry.touched()
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """
+    Stored per label set as [count per bucket..., count above the last bucket, sum].
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self.registry.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[index] += 1
+            entry[-1] += value
+        self.registry.touched()
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def merge(self, current, value):
+        if current is None:
+            return list(value)
+        return [a + b for a, b in zip(current, value)]
+
+    def expose(self, labels, value):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), value[:-1]):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{format_labels(self.labelnames, labels, [('le', format_value(bound))])} {cumulative}")
+        lines.append(f"{self.name}_sum{format_labels(self.labelnames, labels)} {format_value(value[-1])}")
+        lines.append(f"{self.name}_count{format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+REGISTRY = MetricsRegistry(METRICS_MULTIPROC_DIR, METRICS_FLUSH_INTERVAL)
+atexit.register(REGISTRY.write_process_file)
+
+
+# --- Application metrics ---
+
+HTTP_REQUESTS = Counter('faq_http_requests_total', 'HTTP requests by view, method and status', ['view', 'method', 'status'])
+HTTP_REQUEST_DURATION = Histogram('faq_http_request_duration_seconds', 'HTTP request latency', ['view', 'method'])
+
+STOREFRONT_CACHE = Counter('faq_storefront_cache_requests_total', 'Storefront payload cache lookups', ['result'])
+AUTH_SHOP_CACHE = Counter('faq_auth_shop_cache_requests_total', 'Authentication shop cache lookups', ['result'])
+
+SHOPIFY_REQUESTS = Counter('faq_shopify_requests_total', 'Shopify Admin API calls made by product sync', ['status'])
+SHOPIFY_THROTTLE_WAIT = Histogram('faq_shopify_throttle_wait_seconds', 'Time slept after Shopify 429 responses',
+                                  buckets=(0.5, 1, 2, 5, 10, 30, 60))
+SYNC_PRODUCTS = Counter('faq_sync_products_total', 'Products written by sync', ['result'])
+
+AI_REQUEST_DURATION = Histogram('faq_ai_request_duration_seconds', 'Anthropic API call latency', ['model', 'outcome'])
+AI_TOKENS = Counter('faq_ai_tokens_total', 'Anthropic tokens used', ['model', 'direction'])
+
+BULK_PRODUCTS = Counter('faq_bulk_products_total', 'Products processed by bulk generation jobs', ['result'])
+BULK_JOBS = Counter('faq_bulk_jobs_total', 'Bulk generation jobs finished', ['status'])
+BULK_JOBS_RUNNING = Gauge('faq_bulk_jobs_running', 'Bulk generation jobs running')
+
+SHOP_DELETION_ROWS = Counter('faq_shop_deletion_rows_total', 'Rows removed by shop deletion jobs', ['table'])
+SHOP_DELETION_JOBS = Counter('faq_shop_deletion_jobs_total', 'Shop deletion job runs finished', ['status'])
+
+WEBHOOK_EVENTS = Counter('faq_product_webhook_events_total', 'Product webhooks received', ['topic', 'result'])
+WEBHOOK_PRODUCT_WRITES = Counter('faq_product_webhook_writes_total', 'Products written by coalesced webhook batches', ['operation'])
+
+DB_READ_ROUTING = Counter('faq_db_read_routing_total', 'Requests whose reads went to a replica or fell back to the primary', ['target'])
+
+DB_CONNECTIONS_OPENED = Counter('faq_db_connections_opened_total', 'Database connections opened', ['alias'])
+DB_CONNECTIONS_CLOSED = Counter('faq_db_connections_closed_total', 'Database connections closed by the app', ['alias', 'reason'])
+
+SHARD_MOVE_ROWS = Counter('faq_shard_move_rows_total', 'Tenant rows copied to another shard by shop moves', ['table'])
+SHARD_MOVES = Counter('faq_shard_moves_total', 'Shop moves between shards finished', ['status'])
@@ -0,0 +1,203 @@
+import logging
+import time
+from contextlib import ExitStack
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.regex_helper import _lazy_re_compile
+from .compression import COMPRESSION_MIN_SIZE, compress, is_compressible, negotiate_encoding
+from .instrumentation import RequestRecorder, current_recorder, finish_request, should_sample, view_name
+from .metrics import HTTP_REQUESTS, HTTP_REQUEST_DURATION
+from .models import Shop
+from .profiling import RequestProfiler, profiling_trigger, save_profile, shop_profile_quota_reached
+from .structured_logging import (
+    REQUEST_ID_HEADER, bind_request_id, new_request_id, request_id_from_header, reset_request_id,
+)
+
+logger = logging.getLogger(__name__)
+
+re_strong_etag = _lazy_re_compile(r'^"[^"]*"$')
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    Brotli / gzip response compression negotiated from Accept-Encoding.
+    Small bodies, streaming responses and non-text types are left alone.
+    A response may carry `precompressed` ({encoding: bytes}, see
+    services/storefront_cache.py) to skip compressing on every request.
+    """
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if not is_compressible(response.get('Content-Type')):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        encoding = negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING'))
+        if encoding is None:
+            return response
+
+        precompressed = getattr(response, 'precompressed', None) or {}
+        compressed = precompressed.get(encoding)
+        if compressed is None:
+            if len(response.content) < COMPRESSION_MIN_SIZE:
+                return response
+            compressed = compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+
+        # Same as GZipMiddleware: the compressed body is not byte-identical
+        etag = response.get('ETag')
+        if etag and re_strong_etag.match(etag):
+            response['ETag'] = 'W/' + etag
+
+        return response
+
+
+class RequestInstrumentationMiddleware:
+    """
+    Samples REQUEST_INSTRUMENTATION_SAMPLE_RATE of requests and records their
+    latency, queries, DB time, outbound HTTP time and response size per
+    endpoint (see instrumentation.py). Place it right after RequestIdMiddleware
+    and MetricsMiddleware: it measures everything below it, and those two
+    only tag the request and count it.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not should_sample():
+            return self.get_response(request)
+        with RequestRecorder() as recorder:
+            response = self.get_response(request)
+        finish_request(recorder, request, response)
+        return response
+
+    async def __acall__(self, request):
+        if not should_sample():
+            return await self.get_response(request)
+        with RequestRecorder() as recorder:
+            response = await self.get_response(request)
+        await sync_to_async(finish_request)(recorder, request, response)
+        return response
+
+
+class MetricsMiddleware(MiddlewareMixin):
+    """
+    Request count and latency per view / method / status for /metrics.
+    """
+    def process_request(self, request):
+        request._metrics_started = time.perf_counter()
+
+    def process_response(self, request, response):
+        started = getattr(request, '_metrics_started', None)
+        if started is not None:
+            view = view_name(request)
+            HTTP_REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, view=view, method=request.method)
+        return response
+
+
+class RequestIdMiddleware:
+    """
+    Binds a request id (the caller's X-Request-ID if valid, else a new one)
+    for log correlation and echoes it in the response header.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def bind(self, request):
+        request.request_id = request_id_from_header(request.headers.get(REQUEST_ID_HEADER)) or new_request_id()
+        return bind_request_id(request.request_id)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = self.bind(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            reset_request_id(token)
+        response[REQUEST_ID_HEADER] = request.request_id
+        return response
+
+    async def __acall__(self, request):
+        token = self.bind(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            reset_request_id(token)
+        response[REQUEST_ID_HEADER] = request.request_id
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests opted in by a signed X-Profile-Request token or the
+    shop's profile_requests_until flag and stores a RequestProfile (see
+    profiling.py). Other requests only pay a header / cache lookup.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        trigger, shop = profiling_trigger(request)
+        if trigger is None or (trigger == 'flag' and shop_profile_quota_reached(shop)):
+            return self.get_response(request)
+        with ExitStack() as stack:
+            # Reuse the sampled-request recorder if instrumentation is already recording
+            recorder = current_recorder() or stack.enter_context(RequestRecorder())
+            with RequestProfiler() as profiler:
+                response = self.get_response(request)
+        self.store(profiler, recorder, request, response, shop)
+        return response
+
+    async def __acall__(self, request):
+        trigger, shop = profiling_trigger(request)
+        if trigger is None or (trigger == 'flag' and await sync_to_async(shop_profile_quota_reached)(shop)):
+            return await self.get_response(request)
+        with ExitStack() as stack:
+            recorder = current_recorder() or stack.enter_context(RequestRecorder())
+            # cProfile would also catch every other task on the event loop
+            with RequestProfiler('sampling') as profiler:
+                response = await self.get_response(request)
+        await sync_to_async(self.store)(profiler, recorder, request, response, shop)
+        return response
+
+    def store(self, profiler, recorder, request, response, shop):
+        user = getattr(request, 'user', None)
+        if shop is None and isinstance(user, Shop):
+            shop = user
+        try:
+            profile = save_profile(profiler, recorder, request, response, shop)
+        except Exception as e:
+            logger.exception("Storing request profile failed: %s", e)
+            return
+        response['X-Profile-Id'] = str(profile.id)
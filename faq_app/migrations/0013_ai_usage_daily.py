@@ -0,0 +1,37 @@
+# Generated by Django 6.0.1 on 2026-10-19 06:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('faq_app', '0012_bulkgenerationjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apiconfiguration',
+            name='monthly_token_budget',
+            field=models.BigIntegerField(blank=True, help_text='Max AI tokens (input + output) per calendar month. Empty = unlimited', null=True),
+        ),
+        migrations.CreateModel(
+            name='AIUsageDaily',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(db_index=True)),
+                ('model', models.CharField(max_length=100)),
+                ('request_count', models.IntegerField(default=0)),
+                ('error_count', models.IntegerField(default=0)),
+                ('input_tokens', models.BigIntegerField(default=0)),
+                ('output_tokens', models.BigIntegerField(default=0)),
+                ('total_latency_ms', models.BigIntegerField(default=0)),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ai_usage', to='faq_app.shop')),
+            ],
+            options={
+                'db_table': 'ai_usage_daily',
+                'constraints': [models.UniqueConstraint(fields=('shop', 'date', 'model'), name='uniq_ai_usage_shop_date_model')],
+            },
+        ),
+    ]
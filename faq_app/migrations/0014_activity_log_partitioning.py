@@ -0,0 +1,56 @@
+# Generated by Django 6.0.1 on 2026-10-19 06:39
+
+import django.db.models.deletion
+from datetime import date
+from django.db import migrations, models
+
+
+def month_bound(today, months):
+    index = today.year * 12 + (today.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_activity_logs(apps, schema_editor):
+    """
+    MySQL only: monthly RANGE partitions on TO_DAYS(timestamp). Existing rows go
+    to p_legacy; prune_activity_logs keeps future months split off p_future.
+    The partition key must be part of every unique key, hence (id, timestamp).
+    """
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    today = date.today()
+    clauses = [f"PARTITION p_legacy VALUES LESS THAN (TO_DAYS('{month_bound(today, 0).isoformat()}'))"]
+    for months in range(1, 5):
+        start, bound = month_bound(today, months - 1), month_bound(today, months)
+        clauses.append(f"PARTITION p{start.year:04d}{start.month:02d} VALUES LESS THAN (TO_DAYS('{bound.isoformat()}'))")
+    clauses.append("PARTITION p_future VALUES LESS THAN MAXVALUE")
+    schema_editor.execute("ALTER TABLE activity_logs DROP PRIMARY KEY, ADD PRIMARY KEY (id, timestamp)")
+    schema_editor.execute(f"ALTER TABLE activity_logs PARTITION BY RANGE (TO_DAYS(timestamp)) ({', '.join(clauses)})")
+
+
+def unpartition_activity_logs(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute("ALTER TABLE activity_logs REMOVE PARTITIONING")
+    schema_editor.execute("ALTER TABLE activity_logs DROP PRIMARY KEY, ADD PRIMARY KEY (id)")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('faq_app', '0013_ai_usage_daily'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='activitylog',
+            name='product',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='logs', to='faq_app.product'),
+        ),
+        migrations.AlterField(
+            model_name='activitylog',
+            name='shop',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='logs', to='faq_app.shop'),
+        ),
+        migrations.RunPython(partition_activity_logs, unpartition_activity_logs),
+    ]
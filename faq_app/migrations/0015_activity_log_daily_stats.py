@@ -0,0 +1,29 @@
+# Generated by Django 6.0.1 on 2026-10-19 06:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('faq_app', '0014_activity_log_partitioning'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityLogDailyStat',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('level', models.CharField(max_length=20)),
+                ('operation', models.CharField(max_length=100)),
+                ('count', models.IntegerField(default=0)),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='log_stats', to='faq_app.shop')),
+            ],
+            options={
+                'db_table': 'activity_log_daily_stats',
+                'constraints': [models.UniqueConstraint(fields=('shop', 'date', 'level', 'operation'), name='uniq_log_stat_shop_date_level_op')],
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 6.0.1 on 2026-10-19 06:57
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('faq_app', '0015_activity_log_daily_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shop',
+            name='profile_requests_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('request_id', models.CharField(blank=True, max_length=64)),
+                ('method', models.CharField(max_length=10)),
+                ('path', models.CharField(max_length=500)),
+                ('status_code', models.IntegerField(null=True)),
+                ('duration_ms', models.FloatField()),
+                ('query_count', models.IntegerField(default=0)),
+                ('db_ms', models.FloatField(default=0)),
+                ('profiler', models.CharField(max_length=20)),
+                ('pstats', models.BinaryField(blank=True, null=True)),
+                ('collapsed_stacks', models.TextField(blank=True, default='')),
+                ('sql_trace', models.JSONField(blank=True, default=list)),
+                ('size_bytes', models.IntegerField(default=0)),
+                ('truncated', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('shop', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='request_profiles', to='faq_app.shop')),
+            ],
+            options={
+                'db_table': 'request_profiles',
+                'indexes': [models.Index(fields=['shop', 'created_at'], name='request_pro_shop_id_adcfae_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.1 on 2026-10-19 07:09
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('faq_app', '0016_request_profiles'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShopDeletionJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shop_id', models.BigIntegerField(db_index=True)),
+                ('shop_domain', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('COMPLETED', 'Completed'), ('CANCELLED', 'Cancelled'), ('FAILED', 'Failed')], db_index=True, default='PENDING', max_length=20)),
+                ('current_step', models.CharField(blank=True, max_length=50, null=True)),
+                ('deleted_rows', models.JSONField(blank=True, default=dict)),
+                ('attempts', models.IntegerField(default=0)),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'shop_deletion_jobs',
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0.1 on 2026-10-19 07:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('faq_app', '0017_shop_deletion_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShopShard',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shop_id', models.BigIntegerField(unique=True)),
+                ('alias', models.CharField(max_length=50)),
+                ('state', models.CharField(choices=[('ACTIVE', 'Active'), ('MOVING', 'Being copied to another shard'), ('READ_ONLY', 'Read-only until the move completes')], default='ACTIVE', max_length=20)),
+                ('moved_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'shop_shards',
+            },
+        ),
+    ]
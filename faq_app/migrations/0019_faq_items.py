@@ -0,0 +1,57 @@
+# Generated by Django 6.0.1 on 2026-10-19 07:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copy of services/faq_items.LANGUAGE_FIELDS
+LANGUAGE_FIELDS = {'fr': 'questions_answers', 'en': 'questions_answers_en', 'es': 'questions_answers_es'}
+
+
+def backfill_faq_items(apps, schema_editor):
+    """
+    One FAQItem per valid entry of each FAQ's JSON lists, in list order.
+    Runs on every database migrated (each shard backfills its own FAQs).
+    """
+    FAQ = apps.get_model('faq_app', 'FAQ')
+    FAQItem = apps.get_model('faq_app', 'FAQItem')
+    alias = schema_editor.connection.alias
+    batch = []
+    for faq in FAQ.objects.using(alias).only('id', *LANGUAGE_FIELDS.values()).iterator(chunk_size=500):
+        for language, field in LANGUAGE_FIELDS.items():
+            entries = [e for e in getattr(faq, field) or [] if isinstance(e, dict) and 'question' in e and 'answer' in e]
+            batch.extend(
+                FAQItem(faq_id=faq.id, language=language, position=position,
+                        question=str(entry['question']), answer=str(entry['answer']))
+                for position, entry in enumerate(entries)
+            )
+        if len(batch) >= 1000:
+            FAQItem.objects.using(alias).bulk_create(batch)
+            batch = []
+    FAQItem.objects.using(alias).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('faq_app', '0018_shop_shards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FAQItem',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language', models.CharField(max_length=10)),
+                ('position', models.PositiveIntegerField()),
+                ('question', models.TextField()),
+                ('answer', models.TextField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('faq', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='faq_app.faq')),
+            ],
+            options={
+                'db_table': 'faq_items',
+                'constraints': [models.UniqueConstraint(fields=('faq', 'language', 'position'), name='uniq_faq_item_position')],
+            },
+        ),
+        migrations.RunPython(backfill_faq_items, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-10-19 07:33
+
+import faq_app.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('faq_app', '0019_faq_items'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shop',
+            name='languages',
+            field=models.JSONField(default=faq_app.models.default_shop_languages),
+        ),
+    ]
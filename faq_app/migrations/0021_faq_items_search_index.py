@@ -0,0 +1,69 @@
+# Generated by Django 6.0.1 on 2026-10-19 09:12
+
+from django.db import migrations
+
+MYSQL_INDEX = 'ft_faq_items'
+
+SQLITE_TRIGGERS = ('faq_items_fts_insert', 'faq_items_fts_delete', 'faq_items_fts_update')
+
+# IF NOT EXISTS: databases migrated before this migration existed already have them
+SQLITE_SCHEMA = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS faq_items_fts USING fts5(
+        question, answer, content='faq_items', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS faq_items_fts_insert AFTER INSERT ON faq_items BEGIN
+        INSERT INTO faq_items_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS faq_items_fts_delete AFTER DELETE ON faq_items BEGIN
+        INSERT INTO faq_items_fts(faq_items_fts, rowid, question, answer) VALUES ('delete', old.id, old.question, old.answer);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS faq_items_fts_update AFTER UPDATE ON faq_items BEGIN
+        INSERT INTO faq_items_fts(faq_items_fts, rowid, question, answer) VALUES ('delete', old.id, old.question, old.answer);
+        INSERT INTO faq_items_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer);
+    END""",
+    # Index the rows written before the table existed
+    "INSERT INTO faq_items_fts(faq_items_fts) VALUES ('rebuild')",
+)
+
+
+def add_search_index(apps, schema_editor):
+    """
+    Full-text index over faq_items (question, answer), read by
+    services/faq_search.py: a FULLTEXT index on MySQL, an external-content
+    FTS5 table kept in sync by triggers on SQLite, nothing elsewhere.
+    """
+    connection = schema_editor.connection
+    if connection.vendor == 'mysql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM information_schema.statistics"
+                " WHERE table_schema = DATABASE() AND table_name = 'faq_items' AND index_name = %s LIMIT 1",
+                [MYSQL_INDEX],
+            )
+            exists = cursor.fetchone() is not None
+        if not exists:
+            schema_editor.execute(f"ALTER TABLE faq_items ADD FULLTEXT INDEX {MYSQL_INDEX} (question, answer)")
+    elif connection.vendor == 'sqlite':
+        for statement in SQLITE_SCHEMA:
+            schema_editor.execute(statement)
+
+
+def remove_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'mysql':
+        schema_editor.execute(f"ALTER TABLE faq_items DROP INDEX {MYSQL_INDEX}")
+    elif connection.vendor == 'sqlite':
+        for trigger in SQLITE_TRIGGERS:
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        schema_editor.execute("DROP TABLE IF EXISTS faq_items_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('faq_app', '0020_shop_languages'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_index, remove_search_index),
+    ]
@@ -1,6 +1,13 @@
 from django.db import models
 from django.utils import timezone
 
+# Languages of shops that never configured theirs (the original fr/en/es columns)
+DEFAULT_SHOP_LANGUAGES = ('fr', 'en', 'es')
+
+
+def default_shop_languages():
+    return list(DEFAULT_SHOP_LANGUAGES)
+
 class Shop(models.Model):
     """
     Represents a shop (tenant).
@@ -13,11 +20,20 @@ class Shop(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     last_activity_at = models.DateTimeField(default=timezone.now)
+    # Requests for this shop are profiled until then (see faq_app/profiling.py)
+    profile_requests_until = models.DateTimeField(null=True, blank=True)
+    # Locales FAQs are generated in, in order; the first one is the primary
+    # language, whose question count is FAQ.num_questions
+    languages = models.JSONField(default=default_shop_languages)
 
     @property
     def is_authenticated(self):
         return True
 
+    @property
+    def primary_language(self):
+        return (self.languages or DEFAULT_SHOP_LANGUAGES)[0]
+
     def __str__(self):
         return f"{self.shop_domain}: {self.shop_name}"
 
@@ -64,7 +80,7 @@ class FAQ(models.Model):
     Generated FAQ content.
     """
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='faqs')
-    questions_answers = models.JSONField() # List of {"question": "...", "answer": "..."} - Default/French
+    questions_answers = models.JSONField() # List of {"question": "...", "answer": "..."} - the shop's primary language
     questions_answers_en = models.JSONField(null=True, blank=True) # English
     questions_answers_es = models.JSONField(null=True, blank=True) # Spanish
     html_content = models.TextField()
@@ -90,16 +106,43 @@ class FAQ(models.Model):
         ]
 
 
+class FAQItem(models.Model):
+    """
+    One question/answer of an FAQ in one language. Items are the source of
+    truth; the FAQ's questions_answers* columns are a denormalized copy kept
+    for reads (see services/faq_items.py).
+    """
+    faq = models.ForeignKey(FAQ, on_delete=models.CASCADE, related_name='items')
+    language = models.CharField(max_length=10)
+    position = models.PositiveIntegerField()
+    question = models.TextField()
+    answer = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.faq_id} [{self.language}] #{self.position}"
+
+    class Meta:
+        db_table = 'faq_items'
+        constraints = [
+            # Also the index behind per-language counts and ordered reads
+            models.UniqueConstraint(fields=['faq', 'language', 'position'], name='uniq_faq_item_position'),
+        ]
+
+
 class ActivityLog(models.Model):
     """
     System activity logs.
+    On MySQL the table is RANGE partitioned by month on timestamp (see
+    services/log_retention.py): partitioned tables cannot carry foreign keys,
+    so the relations below are enforced by the ORM only.
     """
     id = models.CharField(max_length=50, primary_key=True) # UUID
-    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name='logs')
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name='logs', db_constraint=False)
     level = models.CharField(max_length=20, db_index=True) # info, warning, error, success
     operation = models.CharField(max_length=100, db_index=True)
     
-    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True, related_name='logs')
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True, related_name='logs', db_constraint=False)
     product_title = models.CharField(max_length=500, null=True, blank=True)
     
     message = models.TextField()
@@ -152,6 +195,7 @@ class APIConfiguration(models.Model):
     )
     
     custom_prompt = models.TextField(null=True, blank=True, help_text="Custom system prompt for FAQ generation")
+    monthly_token_budget = models.BigIntegerField(null=True, blank=True, help_text="Max AI tokens (input + output) per calendar month. Empty = unlimited")
     
     use_default_keys = models.BooleanField(default=True)
     
@@ -274,3 +318,142 @@ class BulkGenerationJob(models.Model):
 
     class Meta:
         db_table = 'bulk_generation_jobs'
+
+
+class ShopDeletionJob(models.Model):
+    """
+    Chunked background removal of an uninstalled shop's data
+    (see services/shop_deletion.py). Keeps the shop id rather than a
+    foreign key: the shop row is deleted last and the job outlives it.
+    """
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('COMPLETED', 'Completed'),
+        ('CANCELLED', 'Cancelled'),
+        ('FAILED', 'Failed')
+    ]
+
+    shop_id = models.BigIntegerField(db_index=True)
+    shop_domain = models.CharField(max_length=255)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING', db_index=True)
+
+    current_step = models.CharField(max_length=50, null=True, blank=True)
+    deleted_rows = models.JSONField(default=dict, blank=True) # {table label: rows deleted}
+    attempts = models.IntegerField(default=0)
+    error_message = models.TextField(null=True, blank=True)
+
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Deletion of {self.shop_domain} ({self.status})"
+
+    class Meta:
+        db_table = 'shop_deletion_jobs'
+
+
+class AIUsageDaily(models.Model):
+    """
+    Aggregated AI token usage per shop, model and day.
+    Rows are updated with atomic increments, never read-modify-write.
+    """
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name='ai_usage')
+    date = models.DateField(db_index=True)
+    model = models.CharField(max_length=100)
+
+    request_count = models.IntegerField(default=0)
+    error_count = models.IntegerField(default=0)
+    input_tokens = models.BigIntegerField(default=0)
+    output_tokens = models.BigIntegerField(default=0)
+    total_latency_ms = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Usage for {self.shop_id} on {self.date} ({self.model})"
+
+    class Meta:
+        db_table = 'ai_usage_daily'
+        constraints = [
+            models.UniqueConstraint(fields=['shop', 'date', 'model'], name='uniq_ai_usage_shop_date_model'),
+        ]
+
+
+class ActivityLogDailyStat(models.Model):
+    """
+    ActivityLog counts per shop, day, level and operation.
+    Maintained alongside log writes (services/activity_stats.py) so the
+    dashboard stats never scan raw logs; rebuild_activity_stats reconciles.
+    """
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name='log_stats')
+    date = models.DateField()
+    level = models.CharField(max_length=20)
+    operation = models.CharField(max_length=100)
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.shop_id} {self.date} {self.level}/{self.operation}: {self.count}"
+
+    class Meta:
+        db_table = 'activity_log_daily_stats'
+        constraints = [
+            models.UniqueConstraint(fields=['shop', 'date', 'level', 'operation'], name='uniq_log_stat_shop_date_level_op'),
+        ]
+
+
+class RequestProfile(models.Model):
+    """
+    Profile of one request captured by ProfilingMiddleware: pstats (cProfile)
+    or collapsed stacks (sampling profiler) plus the SQL trace. Size-capped
+    at PROFILE_MAX_BYTES and deleted after expires_at.
+    """
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, null=True, blank=True, related_name='request_profiles')
+    request_id = models.CharField(max_length=64, blank=True)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    status_code = models.IntegerField(null=True)
+    duration_ms = models.FloatField()
+    query_count = models.IntegerField(default=0)
+    db_ms = models.FloatField(default=0)
+    profiler = models.CharField(max_length=20) # cprofile, sampling
+    pstats = models.BinaryField(null=True, blank=True)
+    collapsed_stacks = models.TextField(blank=True, default='')
+    sql_trace = models.JSONField(default=list, blank=True)
+    size_bytes = models.IntegerField(default=0)
+    truncated = models.BooleanField(default=False)
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
+
+    class Meta:
+        db_table = 'request_profiles'
+        indexes = [
+            models.Index(fields=['shop', 'created_at']),
+        ]
+
+
+class ShopShard(models.Model):
+    """
+    Shard map entry: the database alias holding a shop's tenant rows
+    (see faq_app/sharding.py). Lives on `default` and keeps the shop id
+    rather than a foreign key, like ShopDeletionJob.
+    """
+    STATE_CHOICES = [
+        ('ACTIVE', 'Active'),
+        ('MOVING', 'Being copied to another shard'),
+        ('READ_ONLY', 'Read-only until the move completes'),
+    ]
+
+    shop_id = models.BigIntegerField(unique=True)
+    alias = models.CharField(max_length=50)
+    state = models.CharField(max_length=20, choices=STATE_CHOICES, default='ACTIVE')
+    moved_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Shop {self.shop_id} on {self.alias} ({self.state})"
+
+    class Meta:
+        db_table = 'shop_shards'
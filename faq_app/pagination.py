@@ -0,0 +1,161 @@
+"""
+Keyset (cursor) pagination, opt-in per request.
+
+The default PageNumberPagination runs COUNT(*) plus OFFSET, both linear in
+page depth. With ?pagination=cursor (or any ?cursor=) list endpoints instead
+seek on the view's `cursor_ordering`, e.g. ('-updated_at', '-pk'): the last
+field must be unique so rows sharing a timestamp are never skipped or repeated.
+Cursor mode ignores ?ordering= and returns no `count`.
+"""
+import base64
+import json
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    cursor_query_param = 'cursor'
+    page_size = PageNumberPagination.page_size
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_ordering(self, view):
+        ordering = getattr(view, 'cursor_ordering', None)
+        if not ordering:
+            raise AssertionError(f"{view.__class__.__name__} needs `cursor_ordering` for cursor pagination")
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(view)
+        self.model = queryset.model
+        self.page_size = self.page_size or 20
+
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor['reverse'])
+
+        ordering = [self.flip(f) for f in self.ordering] if reverse else list(self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if self.cursor:
+            queryset = queryset.filter(self.seek_filter(ordering, self.cursor['values']))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+
+        self.page = results
+        return results
+
+    @staticmethod
+    def flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    def seek_filter(self, ordering, values):
+        """
+        Rows strictly after `values` in `ordering`:
+        (a > x) OR (a = x AND b > y) OR ... with > becoming < on descending fields.
+        The redundant leading `a >= x` gives the planner an index range to seek on.
+        """
+        first = ordering[0]
+        bound = Q(**{f"{first.lstrip('-')}__{'lte' if first.startswith('-') else 'gte'}": values[0]})
+        condition = Q()
+        for i, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            clause = Q(**{f'{name}__{lookup}': values[i]})
+            for previous, value in zip(ordering[:i], values[:i]):
+                clause &= Q(**{previous.lstrip('-'): value})
+            condition |= clause
+        return bound & condition
+
+    def encode_cursor(self, obj, reverse):
+        values = []
+        for field in self.ordering:
+            value = getattr(obj, field.lstrip('-'))
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        raw = json.dumps({'v': values, 'r': reverse}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def get_field(self, name):
+        return self.model._meta.pk if name == 'pk' else self.model._meta.get_field(name)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)))
+            if len(data['v']) != len(self.ordering):
+                raise ValueError('cursor does not match ordering')
+            values = [
+                self.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, data['v'])
+            ]
+            return {'values': values, 'reverse': bool(data.get('r'))}
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_link(self, obj, reverse):
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, 'page')
+        url = replace_query_param(url, 'pagination', 'cursor')
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(obj, reverse))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.get_link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.get_link(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class OptionalCursorPagination(PageNumberPagination):
+    """
+    Page numbers by default (the admin relies on `count`), keyset pagination
+    when the client asks for it with ?pagination=cursor or sends a cursor.
+    """
+    def wants_cursor(self, request):
+        return (
+            request.query_params.get('pagination') == 'cursor'
+            or KeysetPagination.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = KeysetPagination() if self.wants_cursor(request) else None
+        if self.keyset is not None:
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,257 @@
+"""
+On-demand request profiling.
+
+A request is profiled when it carries a valid X-Profile-Request token
+(signed, short-lived, minted by the internal profiles endpoint) or when
+its shop has `profile_requests_until` in the future. ProfilingMiddleware
+then runs it under PROFILER ('cprofile': deterministic, stored as pstats;
+'sampling': wall-clock stack samples every PROFILE_SAMPLE_INTERVAL seconds,
+stored as collapsed stacks for flame graphs) and records its SQL through
+the instrumentation recorder. Async requests, and requests arriving while
+another cProfile run is active (one per interpreter), use the sampler.
+
+The shop flag is read from the authentication shop cache (never a query
+on the request path), so it applies once the shop's entry is refreshed.
+Profiles are trimmed to PROFILE_MAX_BYTES, at most PROFILE_MAX_PER_SHOP
+are kept per shop, and rows are deleted PROFILE_RETENTION_HOURS after capture.
+"""
+import cProfile
+import logging
+import marshal
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+from .authentication import peek_cached_shop, shop_domain_hint
+from .models import RequestProfile
+
+logger = logging.getLogger(__name__)
+
+PROFILER = getattr(settings, 'PROFILER', 'cprofile')
+PROFILE_SAMPLE_INTERVAL = getattr(settings, 'PROFILE_SAMPLE_INTERVAL', 0.005)
+PROFILE_MAX_BYTES = getattr(settings, 'PROFILE_MAX_BYTES', 2 * 1024 * 1024)
+PROFILE_MAX_PER_SHOP = getattr(settings, 'PROFILE_MAX_PER_SHOP', 50)
+PROFILE_RETENTION_HOURS = getattr(settings, 'PROFILE_RETENTION_HOURS', 72)
+PROFILE_TOKEN_MAX_AGE = getattr(settings, 'PROFILE_TOKEN_MAX_AGE', 3600)
+
+PROFILE_HEADER = 'X-Profile-Request'
+TOKEN_SALT = 'faq_app.profiling'
+# Share of the size budget the SQL trace may use; the profile gets the rest
+SQL_BUDGET_SHARE = 0.25
+SQL_MAX_LENGTH = 2000
+
+
+def make_profile_token(label='ops'):
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(label)
+
+
+def valid_profile_token(token):
+    try:
+        signing.TimestampSigner(salt=TOKEN_SALT).unsign(token, max_age=PROFILE_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def profiling_trigger(request):
+    """
+    ('token' | 'flag' | None, shop or None) for a request. Never queries the database.
+    """
+    shop_domain = shop_domain_hint(request)
+    shop = peek_cached_shop(shop_domain) if shop_domain else None
+
+    token = request.headers.get(PROFILE_HEADER)
+    if token and valid_profile_token(token):
+        return 'token', shop
+    if shop is not None and shop.profile_requests_until and shop.profile_requests_until > timezone.now():
+        return 'flag', shop
+    return None, shop
+
+
+def shop_profile_quota_reached(shop):
+    # A flag left on for hours must not fill the table
+    return RequestProfile.objects.filter(shop=shop, expires_at__gt=timezone.now()).count() >= PROFILE_MAX_PER_SHOP
+
+
+def frame_label(code):
+    module = code.co_filename.rsplit('/', 1)[-1].removesuffix('.py')
+    return f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class SamplingProfiler:
+    """
+    Samples one thread's Python stack from a helper thread. Low overhead on
+    the profiled thread; results are collapsed stacks ("a;b;c count").
+    """
+    def __init__(self, interval=PROFILE_SAMPLE_INTERVAL, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame.f_code))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return [f"{stack} {count}" for stack, count in self.stacks.most_common()]
+
+
+_cprofile_lock = threading.Lock()
+
+
+class RequestProfiler:
+    """
+    Uniform start/stop around cProfile and SamplingProfiler.
+    """
+    def __init__(self, kind=None):
+        self.kind = kind or PROFILER
+        self.started = None
+        self.duration_ms = None
+        self._profiler = None
+
+    def __enter__(self):
+        if self.kind == 'cprofile' and not _cprofile_lock.acquire(blocking=False):
+            self.kind = 'sampling'
+        self.started = time.perf_counter()
+        if self.kind == 'cprofile':
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._profiler = SamplingProfiler()
+            self._profiler.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.kind == 'cprofile':
+            self._profiler.disable()
+            _cprofile_lock.release()
+        else:
+            self._profiler.stop()
+        self.duration_ms = (time.perf_counter() - self.started) * 1000
+
+    def result(self):
+        """
+        (cProfile stats dict or None, collapsed stack lines).
+        """
+        if self.kind == 'cprofile':
+            self._profiler.create_stats()
+            return self._profiler.stats, []
+        return None, self._profiler.collapsed()
+
+
+def trim_pstats(stats, budget):
+    """
+    Marshalled pstats within `budget` bytes, keeping the functions with the
+    highest cumulative time. Returns (bytes or None, truncated).
+    """
+    data = marshal.dumps(stats)
+    if len(data) <= budget:
+        return data, False
+    ranked = sorted(stats, key=lambda func: stats[func][3], reverse=True)
+    keep = len(ranked)
+    while keep > 1:
+        keep //= 2
+        kept = set(ranked[:keep])
+        # Callers must only reference kept functions for pstats to load it
+        trimmed = {
+            func: (cc, nc, tt, ct, {caller: v for caller, v in callers.items() if caller in kept})
+            for func, (cc, nc, tt, ct, callers) in stats.items() if func in kept
+        }
+        data = marshal.dumps(trimmed)
+        if len(data) <= budget:
+            return data, True
+    return None, True
+
+
+def trim_lines(lines, budget):
+    """
+    Leading lines (heaviest first) that fit in `budget` bytes. Returns (text, truncated).
+    """
+    kept, size = [], 0
+    for line in lines:
+        size += len(line.encode()) + 1
+        if size > budget:
+            return '\n'.join(kept), True
+        kept.append(line)
+    return '\n'.join(kept), False
+
+
+def trim_sql(queries, budget):
+    """
+    SQL trace entries in execution order within `budget`. Returns (trace, size, truncated).
+    """
+    trace, size = [], 0
+    for duration_ms, sql in queries:
+        entry = {"ms": round(duration_ms, 3), "sql": sql[:SQL_MAX_LENGTH]}
+        entry_size = len(entry["sql"].encode()) + 32
+        if size + entry_size > budget:
+            return trace, size, True
+        trace.append(entry)
+        size += entry_size
+    return trace, size, False
+
+
+def purge_expired_profiles():
+    deleted, _ = RequestProfile.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
+
+
+def save_profile(profiler, recorder, request, response, shop):
+    """
+    Store a captured profile within the size cap. Returns the RequestProfile.
+    """
+    stats, collapsed = profiler.result()
+    sql_budget = int(PROFILE_MAX_BYTES * SQL_BUDGET_SHARE)
+    sql_trace, sql_size, sql_truncated = trim_sql(recorder.queries, sql_budget)
+    profile_budget = PROFILE_MAX_BYTES - sql_size
+
+    pstats_data, text, truncated = None, '', False
+    if stats is not None:
+        pstats_data, truncated = trim_pstats(stats, profile_budget)
+    else:
+        text, truncated = trim_lines(collapsed, profile_budget)
+
+    now = timezone.now()
+    purge_expired_profiles()
+    profile = RequestProfile.objects.create(
+        shop=shop,
+        request_id=getattr(request, 'request_id', '') or '',
+        method=request.method,
+        path=request.get_full_path()[:500],
+        status_code=getattr(response, 'status_code', None),
+        duration_ms=profiler.duration_ms,
+        query_count=len(recorder.queries),
+        db_ms=recorder.db_ms,
+        profiler=profiler.kind,
+        pstats=pstats_data,
+        collapsed_stacks=text,
+        sql_trace=sql_trace,
+        size_bytes=len(pstats_data or b'') + len(text.encode()) + sql_size,
+        truncated=truncated or sql_truncated,
+        created_at=now,
+        expires_at=now + timedelta(hours=PROFILE_RETENTION_HOURS),
+    )
+    logger.info("Stored request profile %s for %s %s", profile.id, request.method, request.path,
+                extra={'duration_ms': round(profiler.duration_ms, 2), 'size_bytes': profile.size_bytes})
+    return profile
@@ -0,0 +1,103 @@
+"""
+orjson-backed renderer and parser for the REST layer.
+
+Both fall back to DRF's stdlib implementations when orjson is not installed.
+RawJSON wraps JSON text that is already serialized (e.g. a JSONField read
+as text from the database) so it is spliced into the response as-is:
+orjson >= 3.10 embeds it with orjson.Fragment, older versions and the
+stdlib fallback decode it once.
+"""
+import json
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError: # Optional: DRF's stdlib JSON is used instead
+    orjson = None
+
+ORJSON_FRAGMENT = getattr(orjson, 'Fragment', None)
+
+
+class RawJSON:
+    """
+    Pre-serialized JSON text (str or bytes) to embed without re-encoding.
+    """
+    __slots__ = ('raw',)
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def decode(self):
+        return json.loads(self.raw)
+
+    def __eq__(self, other):
+        if isinstance(other, RawJSON):
+            return self.decode() == other.decode()
+        return self.decode() == other
+
+    def __repr__(self):
+        return f"RawJSON({self.raw!r})"
+
+
+class RawJSONEncoder(JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, RawJSON):
+            return obj.decode()
+        return super().default(obj)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    Same output as JSONRenderer (compact, UTF-8, DRF formatting for dates,
+    decimals, lazy strings...), encoded by orjson. `indent` maps to 2 spaces,
+    the only indentation orjson supports.
+    """
+    encoder_class = RawJSONEncoder
+
+    def __init__(self):
+        super().__init__()
+        self._drf_default = RawJSONEncoder().default
+
+    def default(self, obj):
+        if isinstance(obj, RawJSON):
+            if ORJSON_FRAGMENT is not None:
+                return ORJSON_FRAGMENT(obj.raw)
+            return obj.decode()
+        return self._drf_default(obj)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+
+        # Datetimes go through DRF's encoder so their format matches the stdlib renderer
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            option |= orjson.OPT_INDENT_2
+
+        try:
+            ret = orjson.dumps(data, default=self.default, option=option)
+        except orjson.JSONEncodeError:
+            # e.g. integers beyond 64 bits: let the stdlib encoder handle it
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Keep output a strict JavaScript subset, as JSONRenderer does
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class ORJSONParser(JSONParser):
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -1,5 +1,68 @@
+from django.db.models import Count, Prefetch, Q, TextField
+from django.db.models.functions import Cast
 from rest_framework import serializers
-from .models import Shop, Product, FAQ, ActivityLog, APIConfiguration, WebhookRegistration, FAQDesign
+from .models import Shop, Product, FAQ, FAQItem, ActivityLog, APIConfiguration, WebhookRegistration, FAQDesign
+from .renderers import RawJSON
+from .services.faq_items import (
+    DEFAULT_LANGUAGE, LANGUAGE_FIELDS, MAX_LANGUAGES, is_valid_language, language_fields, rebuild_caches, replace_items,
+    uncached_languages,
+)
+from subscriptions.entitlements import get_entitlements, FREE_FEATURES
+
+FAQ_JSON_FIELDS = ('questions_answers', 'questions_answers_en', 'questions_answers_es')
+
+def with_raw_json(queryset, fields=FAQ_JSON_FIELDS):
+    """
+    Read JSON columns as text (`<field>_raw`) instead of decoding them, for
+    RawJSONField to splice into the response untouched.
+    """
+    return queryset.defer(*fields).annotate(
+        **{f"{field}_raw": Cast(field, output_field=TextField()) for field in fields}
+    )
+
+def with_active_faqs(queryset, language=DEFAULT_LANGUAGE):
+    """
+    Prefetch each product's active FAQs with their question count in the
+    shop's primary `language` (`item_count`, counted from FAQItem rows) as
+    `active_faqs`, so ProductSerializer costs one query per page instead of
+    two per product.
+    """
+    return queryset.prefetch_related(Prefetch(
+        'faqs',
+        queryset=FAQ.objects.filter(is_active=True).only('id', 'product_id').annotate(
+            item_count=Count('items', filter=Q(items__language=language))
+        ),
+        to_attr='active_faqs',
+    ))
+
+def with_translations(queryset, languages):
+    """
+    Prefetch the items of the shop's `languages` that have no JSON column as
+    `translation_items`, for FAQSerializer.translations. No query when all of
+    them have one.
+    """
+    return queryset.prefetch_related(Prefetch(
+        'items',
+        queryset=FAQItem.objects.filter(language__in=uncached_languages(languages)).order_by('language', 'position'),
+        to_attr='translation_items',
+    ))
+
+class RawJSONField(serializers.JSONField):
+    """
+    JSONField that outputs the `<source>_raw` annotation from with_raw_json()
+    as RawJSON when present, and behaves like JSONField otherwise.
+    """
+    def get_attribute(self, instance):
+        raw_attr = f"{self.source_attrs[-1]}_raw"
+        if raw_attr in instance.__dict__:
+            raw = instance.__dict__[raw_attr]
+            return None if raw is None else RawJSON(raw)
+        return super().get_attribute(instance)
+
+    def to_representation(self, value):
+        if isinstance(value, RawJSON):
+            return value
+        return super().to_representation(value)
 
 class ShopSerializer(serializers.ModelSerializer):
     class Meta:
@@ -10,6 +73,26 @@ class ShopSerializer(serializers.ModelSerializer):
             'shopify_access_token_encrypted': {'write_only': True}
         }
 
+    def validate_languages(self, value):
+        if not isinstance(value, list) or not value:
+            raise serializers.ValidationError("Expected a non-empty list of locale codes.")
+        if len(value) > MAX_LANGUAGES:
+            raise serializers.ValidationError(f"At most {MAX_LANGUAGES} languages.")
+        invalid = [code for code in value if not is_valid_language(code)]
+        if invalid:
+            raise serializers.ValidationError(f"Invalid locale codes: {', '.join(map(str, invalid))}.")
+        if len(set(value)) != len(value):
+            raise serializers.ValidationError("Duplicate locale codes.")
+        return value
+
+    def update(self, instance, validated_data):
+        primary_language = instance.primary_language
+        shop = super().update(instance, validated_data)
+        # questions_answers holds the primary language: re-cache every FAQ from its items
+        if shop.primary_language != primary_language:
+            rebuild_caches(shop)
+        return shop
+
 class ProductSerializer(serializers.ModelSerializer):
     faqs_count = serializers.SerializerMethodField()
     has_faq = serializers.SerializerMethodField()
@@ -22,24 +105,99 @@ class ProductSerializer(serializers.ModelSerializer):
         """
         Check if product has any active FAQs
         """
+        faqs = getattr(obj, 'active_faqs', None)
+        if faqs is not None:
+            return bool(faqs)
         return obj.faqs.filter(is_active=True).exists()
     
     def get_faqs_count(self, obj):
         """
         Calculate total number of questions across all FAQs for this product
         """
-        total = 0
-        for faq in obj.faqs.filter(is_active=True):
-            if faq.questions_answers:
-                total += len(faq.questions_answers)
-        return total
+        # Prefetched by with_active_faqs(), counted per product otherwise
+        faqs = getattr(obj, 'active_faqs', None)
+        if faqs is not None:
+            return sum(faq.item_count for faq in faqs)
+        request = self.context.get('request')
+        shop = request.user if request is not None and getattr(request.user, 'pk', None) == obj.shop_id else obj.shop
+        return FAQItem.objects.filter(faq__product=obj, faq__is_active=True, language=shop.primary_language).count()
 
 class FAQSerializer(serializers.ModelSerializer):
+    questions_answers = RawJSONField()
+    questions_answers_en = RawJSONField(required=False, allow_null=True)
+    questions_answers_es = RawJSONField(required=False, allow_null=True)
+    translations = serializers.SerializerMethodField()
+
     class Meta:
         model = FAQ
-        fields = ['id', 'product', 'questions_answers', 'questions_answers_en', 'questions_answers_es', 'num_questions', 'html_content', 'is_active', 'created_at']
+        fields = ['id', 'product', 'questions_answers', 'questions_answers_en', 'questions_answers_es', 'translations', 'num_questions', 'html_content', 'is_active', 'created_at']
         read_only_fields = ['id', 'created_at']
 
+    def get_translations(self, obj):
+        """
+        {language: [{question, answer}, ...]} for the shop's languages without a JSON column
+        """
+        # Prefetched by with_translations(), queried per FAQ otherwise
+        items = getattr(obj, 'translation_items', None)
+        if items is None:
+            request = self.context.get('request')
+            shop_languages = getattr(getattr(request, 'user', None), 'languages', None)
+            languages = uncached_languages(shop_languages) if shop_languages is not None else None
+            if languages == []:
+                return {}
+            items = obj.items.order_by('language', 'position')
+            items = items.filter(language__in=languages) if languages else items.exclude(language__in=LANGUAGE_FIELDS)
+        translations = {}
+        for item in items:
+            translations.setdefault(item.language, []).append({'question': item.question, 'answer': item.answer})
+        return translations
+
+    def primary_language(self):
+        # questions_answers holds the shop's primary language
+        request = self.context.get('request')
+        return getattr(getattr(request, 'user', None), 'primary_language', DEFAULT_LANGUAGE)
+
+    def create(self, validated_data):
+        faq = super().create(validated_data)
+        replace_items(faq, primary_language=self.primary_language())
+        return faq
+
+    def update(self, instance, validated_data):
+        faq = super().update(instance, validated_data)
+        # Only the languages whose list was sent
+        primary_language = self.primary_language()
+        languages = [lang for lang, field in language_fields(primary_language).items() if field in validated_data]
+        if languages:
+            replace_items(faq, languages, primary_language)
+        return faq
+
+
+class FAQItemSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = FAQItem
+        fields = ['id', 'faq', 'language', 'position', 'question', 'answer', 'updated_at']
+        read_only_fields = ['id', 'position', 'updated_at']
+
+    def validate_language(self, value):
+        # One of the shop's languages (Shop.languages)
+        if self.instance is not None and value == self.instance.language:
+            return value
+        request = self.context.get('request')
+        languages = request.user.languages if request is not None else list(LANGUAGE_FIELDS)
+        if value not in languages:
+            raise serializers.ValidationError(f"'{value}' is not one of the shop's languages ({', '.join(languages)}).")
+        return value
+
+    def validate(self, attrs):
+        # Moving an item to another FAQ or language is a delete + create
+        if self.instance is not None:
+            current = {'faq': self.instance.faq_id, 'language': self.instance.language}
+            for field, value in current.items():
+                if field in attrs and getattr(attrs[field], 'pk', attrs[field]) != value:
+                    raise serializers.ValidationError({field: "Cannot be changed, create a new item instead."})
+        return attrs
+
 class FAQDesignSerializer(serializers.ModelSerializer):
     class Meta:
         model = FAQDesign
@@ -57,37 +215,23 @@ class FAQDesignSerializer(serializers.ModelSerializer):
     plan_features = serializers.SerializerMethodField()
     plan_name = serializers.SerializerMethodField()
 
+    def _entitlements(self, obj):
+        # Prefer the request's shop instance: it carries the per-request memo
+        request = self.context.get('request')
+        shop = request.user if request is not None and getattr(request.user, 'pk', None) == obj.shop_id else obj.shop
+        return get_entitlements(shop)
+
     def get_plan_name(self, obj):
         try:
-             # Use case-insensitive filter, fallback to highest price
-             subscription = obj.shop.subscriptions.filter(status__iexact='active').order_by('-plan__price', '-created_at').first()
-             if subscription:
-                 return subscription.plan.name
-             return "Free"
+            return self._entitlements(obj).plan_name or "Free"
         except Exception:
-             return "Free"
+            return "Free"
 
     def get_plan_features(self, obj):
         try:
-            # Check if shop has an active subscription
-            # Use subscriptions manager and filter for active status (due to ForeignKey change)
-            subscription = obj.shop.subscriptions.filter(status='active').first()
-            if subscription:
-                return subscription.plan.features
-            
-            # Default to Free plan features if no active subscription found
-            # You might want to cache this or fetch "Free" plan from DB
-            return {
-                'max_questions': 10,
-                'design_customization': False,
-                'ai_generation': False
-            }
+            return self._entitlements(obj).features
         except Exception:
-            return {
-                'max_questions': 10,
-                'design_customization': False,
-                'ai_generation': False
-            }
+            return dict(FREE_FEATURES)
 
 
 class ActivityLogSerializer(serializers.ModelSerializer):
@@ -0,0 +1,143 @@
+"""
+Buffered ActivityLog writer.
+
+log_activity() queues ActivityLog rows in-process and a background thread
+writes them with bulk_create once ACTIVITY_LOG_FLUSH_SIZE rows are waiting or
+every ACTIVITY_LOG_FLUSH_INTERVAL seconds, and once more at process exit.
+With ACTIVITY_LOG_BUFFERED = False (tests) every call is a plain INSERT.
+Daily stat counters are updated in the same transaction as the rows (when
+the rows are on a shard, the counters on `default` commit separately).
+"""
+import atexit
+import logging
+import os
+import threading
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from ..db_connections import release_connections
+from ..models import ActivityLog
+from ..sharding import group_by_shard
+from .activity_stats import increment_stats
+
+logger = logging.getLogger(__name__)
+
+
+def new_log_id():
+    return str(os.urandom(16).hex())
+
+
+class ActivityLogSink:
+    def __init__(self, flush_size=200, flush_interval=2.0, autostart=True):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.autostart = autostart
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def enqueue(self, entry):
+        with self._lock:
+            self._buffer.append(entry)
+            pending = len(self._buffer)
+        if self.autostart:
+            self._ensure_thread()
+        if pending >= self.flush_size:
+            self._wakeup.set()
+
+    def pending(self):
+        with self._lock:
+            return len(self._buffer)
+
+    def flush(self):
+        """
+        Write everything queued so far. Returns the number of rows written.
+        """
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return 0
+
+        # The background thread has no tenant context: route by each row's shop
+        return sum(self._write(alias, entries) for alias, entries in group_by_shard(batch))
+
+    def _write(self, alias, entries):
+        try:
+            with transaction.atomic(using=alias):
+                ActivityLog.objects.using(alias).bulk_create(entries, batch_size=self.flush_size)
+                increment_stats(entries)
+            return len(entries)
+        except Exception as e:
+            # One bad row (e.g. its shop was deleted meanwhile) must not drop the batch
+            logger.warning("Bulk flush of %s rows failed (%s), retrying row by row", len(entries), e)
+            written = 0
+            for entry in entries:
+                try:
+                    with transaction.atomic(using=alias):
+                        entry.save(force_insert=True, using=alias)
+                        increment_stats([entry])
+                    written += 1
+                except Exception as row_error:
+                    logger.error("Dropped activity log %s: %s", entry.id, row_error)
+            return written
+
+    def _ensure_thread(self):
+        # Threads do not survive fork: start one per worker process
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='activity-log-sink', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            release_connections()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.exception("Activity log flush error: %s", e)
+
+
+_sink = ActivityLogSink(
+    flush_size=getattr(settings, 'ACTIVITY_LOG_FLUSH_SIZE', 200),
+    flush_interval=getattr(settings, 'ACTIVITY_LOG_FLUSH_INTERVAL', 2.0),
+)
+atexit.register(_sink.flush)
+
+
+def log_activity(shop, level, operation, message, product=None, product_title=None, details=None):
+    """
+    Record an ActivityLog entry, buffered unless ACTIVITY_LOG_BUFFERED is False.
+    """
+    entry = ActivityLog(
+        id=new_log_id(),
+        shop=shop,
+        level=level,
+        operation=operation,
+        product=product,
+        product_title=product_title,
+        message=message,
+        details=details,
+        timestamp=timezone.now(),
+    )
+    if getattr(settings, 'ACTIVITY_LOG_BUFFERED', True):
+        _sink.enqueue(entry)
+    else:
+        with transaction.atomic():
+            entry.save(force_insert=True)
+            increment_stats([entry])
+    return entry
+
+
+def flush_activity_log():
+    """
+    Write any buffered entries now (end of a bulk job, before reading logs back).
+    """
+    return _sink.flush()
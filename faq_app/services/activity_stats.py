@@ -0,0 +1,101 @@
+"""
+Daily ActivityLog counters (ActivityLogDailyStat).
+
+Counts are incremented in the same transaction as the log rows they describe,
+so `ActivityLogViewSet.stats` reads at most one row per (day, level,
+operation) instead of grouping over the raw history.
+"""
+from collections import Counter
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from ..models import ActivityLog, ActivityLogDailyStat
+from ..sharding import db_for_shop, shards
+
+
+def stat_key(entry):
+    return (entry.shop_id, entry.timestamp.date(), entry.level, entry.operation)
+
+
+def increment_stats(entries):
+    """
+    Add ActivityLog entries (saved or about to be) to their daily counters.
+    One increment per distinct key, however many entries share it.
+    """
+    for (shop_id, date, level, operation), count in Counter(stat_key(e) for e in entries).items():
+        row, _ = ActivityLogDailyStat.objects.get_or_create(shop_id=shop_id, date=date, level=level, operation=operation)
+        ActivityLogDailyStat.objects.filter(pk=row.pk).update(count=F('count') + count)
+
+
+def get_log_stats(shop, start=None, end=None, by_operation=False):
+    """
+    Level counts (and optionally per-operation counts) for a shop, from the
+    rollup table. `start` / `end` are inclusive dates, None = unbounded.
+    """
+    rows = ActivityLogDailyStat.objects.filter(shop=shop)
+    if start:
+        rows = rows.filter(date__gte=start)
+    if end:
+        rows = rows.filter(date__lte=end)
+
+    data = {"level_counts": {}}
+    for item in rows.values('level').annotate(total=Sum('count')).order_by('level'):
+        data["level_counts"][item['level']] = item['total']
+
+    if by_operation:
+        operations = {}
+        for item in rows.values('operation', 'level').annotate(total=Sum('count')).order_by('operation', 'level'):
+            operations.setdefault(item['operation'], {})[item['level']] = item['total']
+        data["operation_counts"] = operations
+
+    return data
+
+
+def discard_stats(shop=None, before=None):
+    """
+    Drop counters together with the logs they describe (clear, retention).
+    """
+    rows = ActivityLogDailyStat.objects.all()
+    if shop is not None:
+        rows = rows.filter(shop=shop)
+    if before is not None:
+        rows = rows.filter(date__lt=before)
+    return rows.delete()[0]
+
+
+def rebuild_stats(shop=None, start=None, end=None):
+    """
+    Recompute counters from raw logs for the given shop / date range.
+    Returns the number of counter rows written.
+    """
+    logs = ActivityLog.objects.all()
+    counters = ActivityLogDailyStat.objects.all()
+    if shop is not None:
+        logs = logs.filter(shop=shop)
+        counters = counters.filter(shop=shop)
+    if start:
+        logs = logs.filter(timestamp__date__gte=start)
+        counters = counters.filter(date__gte=start)
+    if end:
+        logs = logs.filter(timestamp__date__lte=end)
+        counters = counters.filter(date__lte=end)
+
+    # Counters are on `default`, the logs on every shard (or the shop's)
+    aliases = [db_for_shop(shop.pk)] if shop is not None else shards()
+    rows = []
+    for alias in aliases:
+        grouped = (
+            logs.using(alias).annotate(day=TruncDate('timestamp'))
+            .values('shop_id', 'day', 'level', 'operation')
+            .annotate(total=Count('id'))
+            .order_by()
+        )
+        rows += [
+            ActivityLogDailyStat(shop_id=g['shop_id'], date=g['day'], level=g['level'], operation=g['operation'], count=g['total'])
+            for g in grouped
+        ]
+
+    with transaction.atomic():
+        counters.delete()
+        ActivityLogDailyStat.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
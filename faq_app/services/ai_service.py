@@ -1,46 +1,79 @@
 import os
 import json
+import time
+import asyncio
+import logging
+import weakref
 import requests
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from .usage_service import check_token_budget, record_usage
+from ..metrics import AI_REQUEST_DURATION, AI_TOKENS
 
-def generate_faq_for_product(product, api_config=None, num_questions=5, language="fr"):
+try:
+    import httpx
+except ImportError: # Async path is optional; sync callers never need it
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+ANTHROPIC_API_URL = os.environ.get('ANTHROPIC_API_URL', 'https://api.anthropic.com/v1/messages')
+ANTHROPIC_TIMEOUT_SECONDS = float(os.environ.get('ANTHROPIC_TIMEOUT_SECONDS', 120))
+
+# Output budget: per question and language, plus the JSON wrapper
+TOKENS_PER_ANSWER = 120
+MAX_OUTPUT_TOKENS = 4096
+
+LANGUAGE_NAMES = {
+    'fr': 'French', 'en': 'English', 'es': 'Spanish', 'de': 'German', 'it': 'Italian',
+    'pt': 'Portuguese', 'nl': 'Dutch', 'pl': 'Polish', 'sv': 'Swedish', 'da': 'Danish',
+    'ja': 'Japanese', 'zh': 'Chinese', 'ko': 'Korean', 'ar': 'Arabic',
+}
+
+
+def language_label(code):
+    name = LANGUAGE_NAMES.get(code.split('-')[0])
+    return f"{name} ({code})" if name else code
+
+
+def build_anthropic_request(product, api_config=None, num_questions=5, languages=None):
     """
-    Generate FAQ for a product using Anthropic/Claude (with fallback logic).
-    Language: 'fr', 'en', or 'both'
+    Resolve API key/model and build the Messages API request for `languages`
+    (default: the product's shop languages).
+    Returns (model, headers, payload) or (None, None, error_dict).
     """
-    
     # 1. Determine API Key and Model
     api_key = None
     model = "claude-3-haiku-20240307" # Default cheap model
-    
+
     if api_config and api_config.has_custom_anthropic_key and api_config.anthropic_api_key_encrypted:
         api_key = api_config.anthropic_api_key_encrypted # TODO: Add decryption
         model = api_config.claude_model or model
-        print(f"[AI Service] Using CUSTOM API Key. Model: {model}")
+        key_source = 'custom'
     else:
         # System-wide default key
         api_key = os.environ.get("ANTHROPIC_API_KEY")
-        print(f"[AI Service] Using DEFAULT API Key. Present: {bool(api_key)}")
-        
+        key_source = 'default'
+
     if not api_key:
-        print("[AI Service] ERROR: No API Key available.")
-        return {"error": "No API Key available (Anthropic)"}
+        logger.error("No Anthropic API key available", extra={'shop': product.shop.shop_domain, 'key_source': key_source})
+        return None, None, {"error": "No API Key available (Anthropic)"}
 
     # 2. Determine Prompt
-    system_prompt = f"""You are a helpful assistant for an e-commerce store. 
+    languages = list(languages or product.shop.languages)
+    structure = ',\n'.join(f'        "{code}": [ {{ "question": "...", "answer": "..." }}, ... ]' for code in languages)
+    system_prompt = f"""You are a helpful assistant for an e-commerce store.
     Generate {num_questions} Frequently Asked Questions (FAQ) with answers based on the product description provided.
-    
-    You MUST output the content in THREE languages: French (fr), English (en), and Spanish (es).
-    
+
+    You MUST output the content in {len(languages)} language(s): {', '.join(language_label(code) for code in languages)}.
+
     Return the output STRICTLY as a JSON object with the following structure:
     {{
-        "fr": [ {{ "question": "...", "answer": "..." }}, ... ],
-        "en": [ {{ "question": "...", "answer": "..." }}, ... ],
-        "es": [ {{ "question": "...", "answer": "..." }}, ... ]
+{structure}
     }}
-    
+
     Do not include any other text, markdown formatting, or explanations. Only the JSON object."""
-    
+
     if api_config and api_config.custom_prompt:
         system_prompt = api_config.custom_prompt # Note: Custom prompts might break the strict JSON structure if not careful.
 
@@ -52,43 +85,158 @@ def generate_faq_for_product(product, api_config=None, num_questions=5, language
     Description: {product.body_html}
     """
 
-    # 4. Call Anthropic API
+    # 4. Build Anthropic request
     headers = {
         "content-type": "application/json",
         "x-api-key": api_key,
         "anthropic-version": "2023-06-01"
     }
-    
+
     # Anthropic Messages format
     payload = {
         "model": model,
-        "max_tokens": 2000, # Increased for 3 languages
+        "max_tokens": min(MAX_OUTPUT_TOKENS, 250 + TOKENS_PER_ANSWER * num_questions * len(languages)),
         "system": system_prompt,
         "messages": [
-            {"role": "user", "content": f"Generate trilingual FAQ for this product:\n{product_context}"}
+            {"role": "user", "content": f"Generate the FAQ for this product:\n{product_context}"}
         ],
         "temperature": 0.7
     }
-    
+    return model, headers, payload
+
+
+def budget_error(product, api_config):
+    """
+    Enforce optional per-shop token budget before dispatch. Returns an error dict or None.
+    """
+    allowed, used, budget = check_token_budget(product.shop, api_config)
+    if allowed:
+        return None
+    logger.warning("Token budget exceeded for %s: %s/%s", product.shop.shop_domain, used, budget)
+    return {"error": f"Monthly token budget exceeded ({used}/{budget})", "code": "token_budget_exceeded"}
+
+
+def record_call_usage(product, model, data, latency_ms):
+    """
+    Persist usage for a call. `data` is the decoded response, or None if the call failed.
+    """
+    AI_REQUEST_DURATION.observe(latency_ms / 1000, model=model, outcome='error' if data is None else 'success')
     try:
-        print(f"[AI Service] Sending request to Anthropic... Model: {model}")
-        response = requests.post("https://api.anthropic.com/v1/messages", headers=headers, json=payload)
+        if data is None:
+            # The call itself failed; still count it so error rates show up in usage
+            record_usage(product.shop, model, latency_ms=latency_ms, error=True)
+            return
+        usage = data.get('usage') or {}
+        AI_TOKENS.inc(usage.get('input_tokens', 0), model=model, direction='input')
+        AI_TOKENS.inc(usage.get('output_tokens', 0), model=model, direction='output')
+        record_usage(
+            product.shop,
+            data.get('model') or model,
+            input_tokens=usage.get('input_tokens', 0),
+            output_tokens=usage.get('output_tokens', 0),
+            latency_ms=latency_ms,
+        )
+    except Exception as usage_error:
+        logger.exception("Usage recording failed: %s", usage_error)
+
+
+def parse_faq_content(data):
+    content = data['content'][0]['text']
+    logger.debug("Anthropic response received", extra={'length': len(content)})
+
+    # Clean potential markdown block if AI included it
+    if "```json" in content:
+        content = content.split("```json")[1].split("```")[0].strip()
+    elif "```" in content:
+        content = content.split("```")[1].split("```")[0].strip()
+
+    return json.loads(content)
+
+
+def generate_faq_for_product(product, api_config=None, num_questions=5, languages=None):
+    """
+    Generate FAQ for a product using Anthropic/Claude (with fallback logic).
+    Languages: locale codes to generate (default: the shop's languages)
+    """
+    model, headers, payload = build_anthropic_request(product, api_config, num_questions, languages)
+    if model is None:
+        return payload
+
+    error = budget_error(product, api_config)
+    if error:
+        return error
+
+    started = time.monotonic()
+    data = None
+    try:
+        logger.debug("Sending request to Anthropic", extra={'model': model})
+        response = requests.post(ANTHROPIC_API_URL, headers=headers, json=payload, timeout=ANTHROPIC_TIMEOUT_SECONDS)
+        latency_ms = int((time.monotonic() - started) * 1000)
         response.raise_for_status()
         data = response.json()
-        
-        content = data['content'][0]['text']
-        print(f"[AI Service] Response received. Length: {len(content)}")
-        
-        # Clean potential markdown block if AI included it
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0].strip()
-        elif "```" in content:
-            content = content.split("```")[1].split("```")[0].strip()
-            
-        return json.loads(content)
-        
+        record_call_usage(product, model, data, latency_ms)
+        return parse_faq_content(data)
+
+    except Exception as e:
+        logger.error("Anthropic API error: %s", e, extra={
+            'model': model,
+            'shop': product.shop.shop_domain,
+            'response_text': response.text[:1000] if 'response' in locals() else None,
+        })
+        if data is None:
+            record_call_usage(product, model, None, int((time.monotonic() - started) * 1000))
+        return {"error": str(e)}
+
+
+_async_clients = weakref.WeakKeyDictionary()
+
+def get_async_client():
+    """
+    One pooled httpx.AsyncClient per event loop, so concurrent calls share connections.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(timeout=ANTHROPIC_TIMEOUT_SECONDS)
+        _async_clients[loop] = client
+    return client
+
+
+async def agenerate_faq_for_product(product, api_config=None, num_questions=5, languages=None):
+    """
+    Async variant of generate_faq_for_product. Awaiting the Anthropic call does not
+    hold a worker thread, so one ASGI worker can keep many generations in flight.
+    `product.shop` must already be loaded (select_related).
+    """
+    if httpx is None:
+        return await sync_to_async(generate_faq_for_product)(product, api_config, num_questions=num_questions, languages=languages)
+
+    model, headers, payload = build_anthropic_request(product, api_config, num_questions, languages)
+    if model is None:
+        return payload
+
+    error = await sync_to_async(budget_error)(product, api_config)
+    if error:
+        return error
+
+    started = time.monotonic()
+    data = None
+    response = None
+    try:
+        logger.debug("Sending async request to Anthropic", extra={'model': model})
+        response = await get_async_client().post(ANTHROPIC_API_URL, headers=headers, json=payload)
+        latency_ms = int((time.monotonic() - started) * 1000)
+        response.raise_for_status()
+        data = response.json()
+        await sync_to_async(record_call_usage)(product, model, data, latency_ms)
+        return parse_faq_content(data)
+
     except Exception as e:
-        print(f"[AI Service] Anthropic API Error: {str(e)}")
-        if 'response' in locals():
-            print(f"[AI Service] Response text: {response.text}")
+        logger.error("Anthropic API error: %s", e, extra={
+            'model': model,
+            'shop': product.shop.shop_domain,
+            'response_text': response.text[:1000] if response is not None else None,
+        })
+        if data is None:
+            await sync_to_async(record_call_usage)(product, model, None, int((time.monotonic() - started) * 1000))
         return {"error": str(e)}
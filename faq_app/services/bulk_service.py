@@ -1,64 +1,45 @@
+import logging
 import threading
 import time
-import os
+from django.conf import settings
 from django.utils import timezone
-from ..models import BulkGenerationJob, Product, FAQ, ActivityLog
+from ..db_connections import close_thread_connections, release_connections
+from ..models import BulkGenerationJob, Product, FAQ
+from .activity_log import log_activity, flush_activity_log
 from .ai_service import generate_faq_for_product
+from .faq_service import extract_valid_faqs, question_count, save_generated_faq
+from ..metrics import BULK_JOBS, BULK_JOBS_RUNNING, BULK_PRODUCTS
+from ..sharding import current_shop_id, tenant
+from ..structured_logging import bind_request_id
+from subscriptions.entitlements import get_entitlements
 
-def validate_and_save_faq(product, faqs_data, shop):
+logger = logging.getLogger(__name__)
+
+# Pause between products, to be nice to the AI API
+BULK_GENERATION_DELAY = getattr(settings, 'BULK_GENERATION_DELAY', 0.5)
+
+def validate_and_save_faq(product, faqs_data, shop, duration_seconds=None):
     """
     Validates AI response and saves FAQ to database.
     Returns (success, count, error_message)
     """
-    def is_valid_faq(f):
-        return isinstance(f, dict) and 'question' in f and 'answer' in f
-
-    def filter_valid_faqs(raw_list):
-        if not isinstance(raw_list, list):
-            return []
-        return [f for f in raw_list if is_valid_faq(f)]
-
-    valid_faqs_fr = []
-    valid_faqs_en = []
-    valid_faqs_es = []
-
-    if isinstance(faqs_data, dict):
-        valid_faqs_fr = filter_valid_faqs(faqs_data.get('fr', []))
-        valid_faqs_en = filter_valid_faqs(faqs_data.get('en', []))
-        valid_faqs_es = filter_valid_faqs(faqs_data.get('es', []))
-    elif isinstance(faqs_data, list):
-        valid_faqs_fr = filter_valid_faqs(faqs_data)
-
-    if not valid_faqs_fr and not valid_faqs_en and not valid_faqs_es:
+    languages = extract_valid_faqs(faqs_data, shop.languages)
+
+    if not any(languages.values()):
         return False, 0, "AI generated empty or invalid content"
 
     # Update or create
     try:
-        faq, created = FAQ.objects.get_or_create(product=product, defaults={
-            'questions_answers': valid_faqs_fr or [],
-            'questions_answers_en': valid_faqs_en,
-            'questions_answers_es': valid_faqs_es,
-            'num_questions': len(valid_faqs_fr),
-            'html_content': "", 
-            'is_active': True
-        })
-        
-        if not created:
-            faq.questions_answers = valid_faqs_fr or []
-            faq.questions_answers_en = valid_faqs_en
-            faq.questions_answers_es = valid_faqs_es
-            faq.num_questions = len(valid_faqs_fr)
-            faq.save()
+        save_generated_faq(product, languages, duration_seconds=duration_seconds)
             
         # Log success
-        ActivityLog.objects.create(
-            id=str(os.urandom(16).hex()),
+        log_activity(
             shop=shop,
             level='success',
             operation='generate_faq_bulk',
-            message=f"Generated {len(valid_faqs_fr)} questions for product '{product.title}'."
+            message=f"Generated {question_count(languages)} questions for product '{product.title}'."
         )
-        return True, len(valid_faqs_fr), None
+        return True, question_count(languages), None
 
     except Exception as e:
         return False, 0, str(e)
@@ -69,17 +50,29 @@ class BulkFAQGenerator(threading.Thread):
         super().__init__()
         self.job_id = job_id
         self.daemon = True # Daemon thread dies if main process dies
+        # Started from the shop's request: its rows are on that shop's shard
+        self.shop_id = current_shop_id()
 
     def run(self):
+        # Threads start with an empty context: correlate this job's lines instead
+        bind_request_id(f"bulk-{self.job_id}")
+        try:
+            with tenant(self.shop_id):
+                self.process()
+        finally:
+            close_thread_connections()
+
+    def process(self):
         try:
             job = BulkGenerationJob.objects.get(id=self.job_id)
         except BulkGenerationJob.DoesNotExist:
-            print(f"[Bulk] Job {self.job_id} not found.")
+            logger.error("Bulk job %s not found", self.job_id)
             return
 
-        print(f"[Bulk] Starting job {self.job_id} for shop {job.shop.shop_domain}")
+        logger.info("Starting bulk job %s for shop %s", self.job_id, job.shop.shop_domain)
         job.status = 'RUNNING'
         job.save()
+        BULK_JOBS_RUNNING.inc()
 
         try:
             # 1. Select Products
@@ -112,16 +105,16 @@ class BulkFAQGenerator(threading.Thread):
             # Assuming 'Unlimited' or 'Pro' allows bulk.
             
             # Retrieve max questions from plan
-            max_questions = 3
-            active_sub = shop.subscriptions.filter(status='active').first()
-            if active_sub and active_sub.plan:
-                max_questions = active_sub.plan.features.get('max_ai_questions', 3)
+            max_questions = get_entitlements(shop).features.get('max_ai_questions', 3)
 
             for product in products:
+                # A job outlives CONN_MAX_AGE: recycle a dropped or expired connection between products
+                release_connections()
+
                 # Refresh job status to check cancellation
                 job.refresh_from_db()
                 if job.status == 'CANCELLED':
-                    print(f"[Bulk] Job {self.job_id} cancelled.")
+                    logger.info("Bulk job %s cancelled", self.job_id)
                     return
 
                 # Update current product
@@ -129,24 +122,37 @@ class BulkFAQGenerator(threading.Thread):
                 job.save()
 
                 # Generate
-                print(f"[Bulk] Generating for {product.title}...")
+                logger.debug("Generating FAQ for %s", product.title, extra={'job_id': self.job_id})
+                started = time.monotonic()
                 faqs_data = generate_faq_for_product(
                     product, 
                     api_config, 
-                    num_questions=max_questions
+                    num_questions=max_questions,
+                    languages=shop.languages
                 )
+                duration_seconds = int(round(time.monotonic() - started))
+
+                if isinstance(faqs_data, dict) and faqs_data.get('code') == 'token_budget_exceeded':
+                    # No point burning through the rest of the catalogue
+                    job.refresh_from_db()
+                    job.status = 'FAILED'
+                    job.error_message = faqs_data['error']
+                    job.current_product_title = None
+                    job.save()
+                    logger.warning("Bulk job %s stopped: %s", self.job_id, faqs_data['error'])
+                    return
 
                 # Save
-                success, count, error = validate_and_save_faq(product, faqs_data, shop)
+                success, count, error = validate_and_save_faq(product, faqs_data, shop, duration_seconds=duration_seconds)
                 
+                BULK_PRODUCTS.inc(result='success' if success else 'error')
                 if success:
                     # Update product status
                     product.has_faq = True
                     product.save()
                 else:
-                    print(f"[Bulk] Failed for {product.title}: {error}")
-                    ActivityLog.objects.create(
-                        id=str(os.urandom(16).hex()),
+                    logger.warning("Bulk generation failed for %s: %s", product.title, error, extra={'job_id': self.job_id})
+                    log_activity(
                         shop=shop,
                         level='error',
                         operation='generate_faq_bulk',
@@ -160,19 +166,23 @@ class BulkFAQGenerator(threading.Thread):
                 job.processed_products = processed_count
                 job.save()
                 
-                # Small delay to be nice to API
-                time.sleep(0.5)
+                time.sleep(BULK_GENERATION_DELAY)
 
             # Done
             job.status = 'COMPLETED'
             job.completed_at = timezone.now()
             job.current_product_title = None
             job.save()
-            print(f"[Bulk] Job {self.job_id} completed.")
+            logger.info("Bulk job %s completed", self.job_id, extra={'processed': processed_count})
 
         except Exception as e:
-            print(f"[Bulk] Job {self.job_id} failed: {e}")
+            logger.exception("Bulk job %s failed: %s", self.job_id, e)
             job.refresh_from_db()
             job.status = 'FAILED'
             job.error_message = str(e)
             job.save()
+        finally:
+            BULK_JOBS_RUNNING.dec()
+            BULK_JOBS.inc(status=job.status)
+            # Make the job's logs visible as soon as it ends
+            flush_activity_log()
@@ -0,0 +1,168 @@
+"""
+FAQ items: one FAQItem row per question/answer and language.
+
+Items are the source of truth for FAQ content; they make per-item edits,
+question counts and search plain indexed row operations, and hold any
+number of languages (a shop's Shop.languages) without widening FAQ rows.
+The FAQ's JSON columns remain as a read cache (language_fields()):
+questions_answers holds the shop's primary language, _en / _es English and
+Spanish, so the storefront and the FAQ API still serve those from one row;
+other languages are served from items (FAQSerializer.translations).
+Everything that writes FAQ content goes through this module:
+
+- generation replaces every item of the FAQ (set_items());
+- FAQ API create/update call replace_items() for the cached languages they
+  wrote, once the JSON columns are saved;
+- item edits change their row, then refresh_cache() rewrites the JSON
+  column of that one language and num_questions for the primary one;
+- a new primary language (Shop.languages[0]) changes which language
+  questions_answers holds: rebuild_caches() rewrites every FAQ of the shop.
+"""
+import re
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from ..models import FAQ, FAQItem
+from .storefront_cache import invalidate_storefront_cache
+
+DEFAULT_LANGUAGE = 'fr' # Primary language of shops that did not pick theirs
+PRIMARY_FIELD = 'questions_answers' # The one required column
+
+# ISO 639 code with an optional region/script subtag: fr, pt-BR, zh-Hant
+LANGUAGE_RE = re.compile(r'^[a-z]{2,3}(-[A-Za-z0-9]{2,4})?$')
+MAX_LANGUAGES = 10
+REBUILD_CHUNK_SIZE = 500 # FAQs per bulk update in rebuild_caches()
+
+
+def is_valid_language(code):
+    return isinstance(code, str) and bool(LANGUAGE_RE.match(code))
+
+
+def language_fields(primary_language=DEFAULT_LANGUAGE):
+    """
+    Language -> FAQ JSON cache column, for a shop whose primary language is
+    `primary_language`.
+    """
+    fields = {primary_language: PRIMARY_FIELD}
+    fields.setdefault('en', 'questions_answers_en')
+    fields.setdefault('es', 'questions_answers_es')
+    return fields
+
+
+LANGUAGE_FIELDS = language_fields() # Shops on the default languages
+
+
+def uncached_languages(languages):
+    """
+    Those of a shop's `languages` (primary first) without a JSON column,
+    served from items only.
+    """
+    fields = language_fields(languages[0]) if languages else LANGUAGE_FIELDS
+    return [code for code in languages if code not in fields]
+
+
+def is_valid_faq(f):
+    return isinstance(f, dict) and 'question' in f and 'answer' in f
+
+
+def build_items(faq, language, entries):
+    return [
+        FAQItem(faq=faq, language=language, position=position,
+                question=str(entry['question']), answer=str(entry['answer']))
+        for position, entry in enumerate(entries)
+    ]
+
+
+def items_from_json(faq, languages=None, primary_language=DEFAULT_LANGUAGE):
+    """
+    Unsaved FAQItems for the valid entries of `faq`'s JSON lists.
+    """
+    fields = language_fields(primary_language)
+    items = []
+    for language in languages or fields:
+        entries = [e for e in getattr(faq, fields[language]) or [] if is_valid_faq(e)]
+        items.extend(build_items(faq, language, entries))
+    return items
+
+
+def replace_items(faq, languages=None, primary_language=DEFAULT_LANGUAGE):
+    """
+    Rewrite `faq`'s items of `languages` (default: all cached ones) from its JSON columns.
+    """
+    languages = list(languages or language_fields(primary_language))
+    with transaction.atomic(using=faq._state.db):
+        FAQItem.objects.filter(faq=faq, language__in=languages).delete()
+        FAQItem.objects.bulk_create(items_from_json(faq, languages, primary_language))
+
+
+def set_items(faq, lists):
+    """
+    Replace all of `faq`'s items with `lists` ({language: [entry, ...]}).
+    """
+    items = [item for language, entries in lists.items() for item in build_items(faq, language, entries)]
+    with transaction.atomic(using=faq._state.db):
+        FAQItem.objects.filter(faq=faq).delete()
+        FAQItem.objects.bulk_create(items)
+
+
+def item_entries(faq, language):
+    return [
+        {'question': question, 'answer': answer}
+        for question, answer in FAQItem.objects.filter(faq=faq, language=language)
+        .order_by('position').values_list('question', 'answer')
+    ]
+
+
+def refresh_cache(faq, language, primary_language=DEFAULT_LANGUAGE):
+    """
+    Rebuild the JSON column of `language` (if it has one) from the items, and
+    num_questions if it is the shop's primary language. Saving the FAQ also
+    invalidates its storefront payload.
+    """
+    field = language_fields(primary_language).get(language)
+    update_fields = ['updated_at']
+    if field is not None:
+        entries = item_entries(faq, language)
+        setattr(faq, field, entries if entries or field == PRIMARY_FIELD else None)
+        update_fields.append(field)
+        if language == primary_language:
+            faq.num_questions = len(entries)
+            update_fields.append('num_questions')
+    faq.save(update_fields=update_fields)
+
+
+def rebuild_caches(shop, chunk_size=REBUILD_CHUNK_SIZE):
+    """
+    Rewrite the JSON columns and num_questions of every FAQ of `shop` from its
+    items, for the shop's current primary language. Returns the number of FAQs.
+    """
+    fields = language_fields(shop.primary_language)
+    columns = ['questions_answers', 'questions_answers_en', 'questions_answers_es']
+    now = timezone.now()
+    rebuilt, last_pk = 0, 0
+    while True:
+        faqs = list(FAQ.objects.filter(product__shop=shop, pk__gt=last_pk).order_by('pk').only('id')[:chunk_size])
+        if not faqs:
+            break
+        entries = {}
+        items = FAQItem.objects.filter(faq__in=faqs, language__in=list(fields)).order_by('faq_id', 'language', 'position')
+        for faq_id, language, question, answer in items.values_list('faq_id', 'language', 'question', 'answer'):
+            entries.setdefault((faq_id, language), []).append({'question': question, 'answer': answer})
+        for faq in faqs:
+            for column in columns:
+                setattr(faq, column, None) # No longer cached (e.g. _en once English is primary)
+            for language, field in fields.items():
+                setattr(faq, field, entries.get((faq.pk, language)) or ([] if field == PRIMARY_FIELD else None))
+            faq.num_questions = len(faq.questions_answers)
+            faq.updated_at = now
+        FAQ.objects.bulk_update(faqs, columns + ['num_questions', 'updated_at'])
+        rebuilt += len(faqs)
+        last_pk = faqs[-1].pk
+    # bulk_update sends no signals
+    invalidate_storefront_cache(shop.pk)
+    return rebuilt
+
+
+def next_position(faq, language):
+    last = FAQItem.objects.filter(faq=faq, language=language).aggregate(last=Max('position'))['last']
+    return 0 if last is None else last + 1
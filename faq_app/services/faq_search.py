@@ -0,0 +1,81 @@
+"""
+Full-text search over FAQ items (question + answer), per language.
+
+The index is created by migration 0021_faq_items_search_index:
+
+- MySQL: FULLTEXT index (question, answer), queried in natural language
+  mode; MATCH() is the relevance.
+- SQLite (tests, development): external-content FTS5 table faq_items_fts,
+  kept in sync by triggers, ranked with bm25().
+- Other backends: icontains on every term, unranked.
+
+A query is reduced to its words, so user input never reaches the MATCH
+syntax; an item matches any of them and ranks higher the more it matches.
+"""
+import html
+import re
+from django.db import connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+MAX_TERMS = 10
+SNIPPET_LENGTH = 160
+WORD_RE = re.compile(r'\w+')
+
+MYSQL_MATCH = "MATCH(faq_items.question, faq_items.answer) AGAINST (%s IN NATURAL LANGUAGE MODE)"
+
+SQLITE_MATCH_IDS = "SELECT rowid FROM faq_items_fts WHERE faq_items_fts MATCH %s"
+SQLITE_RANK = "SELECT -bm25(faq_items_fts) FROM faq_items_fts WHERE faq_items_fts MATCH %s AND rowid = faq_items.id"
+
+
+def search_terms(query):
+    return WORD_RE.findall((query or '').lower())[:MAX_TERMS]
+
+
+def with_search_rank(queryset, query):
+    """
+    FAQItem `queryset` narrowed to the items matching `query`, annotated with
+    `rank` (higher is more relevant). Empty if the query has no words.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset.none()
+    vendor = connections[queryset.db].vendor
+    if vendor == 'mysql':
+        return queryset.annotate(
+            rank=RawSQL(MYSQL_MATCH, [' '.join(terms)], output_field=FloatField())
+        ).filter(rank__gt=0)
+    if vendor == 'sqlite':
+        match = ' OR '.join(f'"{term}"' for term in terms)
+        return queryset.filter(pk__in=RawSQL(SQLITE_MATCH_IDS, [match])).annotate(
+            rank=RawSQL(SQLITE_RANK, [match], output_field=FloatField())
+        )
+    condition = Q()
+    for term in terms:
+        condition |= Q(question__icontains=term) | Q(answer__icontains=term)
+    return queryset.filter(condition).annotate(rank=Value(0.0, output_field=FloatField()))
+
+
+def highlight(text, query, length=SNIPPET_LENGTH):
+    """
+    HTML-escaped excerpt of `text` around the first match of `query`, with
+    every matched word wrapped in <mark>. `length=None` keeps the whole text.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return html.escape(text[:length] if length else text)
+    pattern = re.compile(r'\b(?:' + '|'.join(re.escape(term) for term in terms) + r')\w*', re.IGNORECASE)
+    start, end = 0, len(text)
+    if length and len(text) > length:
+        first = pattern.search(text)
+        start = max(0, (first.start() if first else 0) - length // 4)
+        end = min(len(text), start + length)
+    excerpt = text[start:end]
+
+    parts, last = [], 0
+    for match in pattern.finditer(excerpt):
+        parts.append(html.escape(excerpt[last:match.start()]))
+        parts.append(f"<mark>{html.escape(match.group())}</mark>")
+        last = match.end()
+    parts.append(html.escape(excerpt[last:]))
+    return ('…' if start else '') + ''.join(parts) + ('…' if end < len(text) else '')
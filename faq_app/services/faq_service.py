@@ -0,0 +1,64 @@
+from ..models import DEFAULT_SHOP_LANGUAGES, FAQ
+from .faq_items import DEFAULT_LANGUAGE, PRIMARY_FIELD, is_valid_faq, language_fields, set_items
+
+
+def filter_valid_faqs(raw_list):
+    if not isinstance(raw_list, list):
+        return []
+    return [f for f in raw_list if is_valid_faq(f)]
+
+
+def extract_valid_faqs(faqs_data, languages=DEFAULT_SHOP_LANGUAGES):
+    """
+    Split an AI response into validated lists for `languages` (the shop's, in
+    order). Returns {'fr': [...], 'en': [...], ...}.
+    """
+    lists = {lang: [] for lang in languages}
+
+    if isinstance(faqs_data, dict):
+        for lang in lists:
+            lists[lang] = filter_valid_faqs(faqs_data.get(lang, []))
+    elif isinstance(faqs_data, list) and lists:
+        # Fallback if AI messes up and returns a flat list (assume the primary language)
+        lists[next(iter(lists))] = filter_valid_faqs(faqs_data)
+
+    return lists
+
+
+def question_count(languages):
+    """
+    Questions of the primary (first) language of extract_valid_faqs() lists.
+    """
+    return len(next(iter(languages.values()), []))
+
+
+def save_generated_faq(product, languages, duration_seconds=None):
+    """
+    Create or update the product's FAQ from validated per-language lists
+    (primary language first). Returns the FAQ instance.
+    """
+    # questions_answers gets the primary language, the one question_count() counts
+    fields = language_fields(next(iter(languages), DEFAULT_LANGUAGE))
+    columns = {field: languages.get(language) for language, field in fields.items()}
+    columns[PRIMARY_FIELD] = columns[PRIMARY_FIELD] or [] # Required by the model
+    for field in ('questions_answers_en', 'questions_answers_es'):
+        columns.setdefault(field, None) # No column when English is the primary language
+
+    faq, created = FAQ.objects.get_or_create(product=product, defaults={
+        **columns,
+        'num_questions': question_count(languages), # Primary language count
+        'html_content': "",
+        'generation_duration_seconds': duration_seconds,
+        'is_active': True
+    })
+
+    if not created:
+        for field, value in columns.items():
+            setattr(faq, field, value)
+        faq.num_questions = question_count(languages)
+        faq.generation_duration_seconds = duration_seconds
+        faq.save()
+
+    # Every language, including those without a JSON column
+    set_items(faq, languages)
+    return faq
@@ -0,0 +1,199 @@
+"""
+ActivityLog retention: monthly partitions, expiry and archival.
+
+On MySQL `activity_logs` is RANGE partitioned by month on TO_DAYS(timestamp)
+(migration 0014, which also makes the primary key (id, timestamp)), so expiring a month is an O(1) DROP PARTITION instead of a
+large DELETE. On other backends, or an unpartitioned table, expired rows are
+deleted in bounded primary-key chunks. Either way rows can first be archived
+to gzip-compressed JSONL files, one per month. With tenant shards every
+function works on one database alias (`using`); the command visits them all.
+"""
+import gzip
+import json
+import os
+from datetime import date
+from django.db import DEFAULT_DB_ALIAS, connections
+from ..models import ActivityLog
+from .activity_stats import discard_stats
+
+TABLE = ActivityLog._meta.db_table
+FUTURE_PARTITION = 'p_future'
+
+# MySQL TO_DAYS('0001-01-01') is 366, Python's ordinal for that date is 1
+TO_DAYS_OFFSET = 365
+
+
+def month_start(d):
+    return date(d.year, d.month, 1)
+
+
+def add_months(d, months):
+    month_index = d.year * 12 + (d.month - 1) + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def partition_name(d):
+    return f"p{d.year:04d}{d.month:02d}"
+
+
+def partition_clause(upper_bound):
+    """
+    Partition holding the month before `upper_bound` (a first-of-month date).
+    """
+    return f"PARTITION {partition_name(add_months(upper_bound, -1))} VALUES LESS THAN (TO_DAYS('{upper_bound.isoformat()}'))"
+
+
+def is_partitioned(using=DEFAULT_DB_ALIAS):
+    if connections[using].vendor != 'mysql':
+        return False
+    return bool(list_partitions(using))
+
+
+def list_partitions(using=DEFAULT_DB_ALIAS):
+    """
+    [(name, upper_bound date or None for MAXVALUE)] in partition order.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION",
+            [TABLE]
+        )
+        partitions = []
+        for name, description in cursor.fetchall():
+            if description == 'MAXVALUE':
+                partitions.append((name, None))
+            else:
+                partitions.append((name, date.fromordinal(int(description) - TO_DAYS_OFFSET)))
+        return partitions
+
+
+def ensure_future_partitions(today, months_ahead=3, using=DEFAULT_DB_ALIAS):
+    """
+    Split p_future so there is a dedicated partition for each of the next
+    `months_ahead` months. Returns the names of created partitions.
+    """
+    existing = list_partitions(using)
+    if not existing:
+        return []
+    bounds = [upper for _, upper in existing if upper is not None]
+    last_bound = max(bounds) if bounds else month_start(today)
+    target = add_months(month_start(today), months_ahead + 1)
+
+    new_bounds = []
+    bound = add_months(last_bound, 1)
+    while bound <= target:
+        new_bounds.append(bound)
+        bound = add_months(bound, 1)
+    if not new_bounds:
+        return []
+
+    clauses = [partition_clause(b) for b in new_bounds]
+    clauses.append(f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN MAXVALUE")
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {TABLE} REORGANIZE PARTITION {FUTURE_PARTITION} INTO ({', '.join(clauses)})")
+    return [partition_name(add_months(b, -1)) for b in new_bounds]
+
+
+ARCHIVE_FIELDS = ['id', 'shop_id', 'level', 'operation', 'product_id', 'product_title', 'message', 'details', 'timestamp']
+
+
+def serialize_log(row):
+    data = {field: row[field] for field in ARCHIVE_FIELDS}
+    data['timestamp'] = row['timestamp'].isoformat()
+    return data
+
+
+class LogArchiver:
+    """
+    Appends rows to <archive_dir>/activity_logs-YYYY-MM.jsonl.gz (one gzip member per write).
+    """
+    def __init__(self, archive_dir):
+        self.archive_dir = archive_dir
+        os.makedirs(archive_dir, exist_ok=True)
+
+    def path_for(self, month):
+        return os.path.join(self.archive_dir, f"activity_logs-{month.year:04d}-{month.month:02d}.jsonl.gz")
+
+    def write(self, rows):
+        by_month = {}
+        for row in rows:
+            by_month.setdefault(month_start(row['timestamp'].date()), []).append(row)
+        for month, month_rows in by_month.items():
+            with gzip.open(self.path_for(month), 'at', encoding='utf-8') as f:
+                for row in month_rows:
+                    f.write(json.dumps(serialize_log(row), default=str) + '\n')
+        return sum(len(r) for r in by_month.values())
+
+
+def drop_expired_partitions(cutoff, archiver=None, dry_run=False, using=DEFAULT_DB_ALIAS):
+    """
+    Drop every partition whose upper bound is at or before `cutoff`.
+    Returns [(partition, archived_rows)].
+    """
+    dropped = []
+    for name, upper in list_partitions(using):
+        if upper is None or upper > cutoff:
+            continue
+        archived = 0
+        if archiver is not None and not dry_run:
+            with connections[using].cursor() as cursor:
+                cursor.execute(f"SELECT {', '.join(ARCHIVE_FIELDS)} FROM {TABLE} PARTITION ({name})")
+                while True:
+                    chunk = cursor.fetchmany(5000)
+                    if not chunk:
+                        break
+                    rows = [dict(zip(ARCHIVE_FIELDS, values)) for values in chunk]
+                    for row in rows:
+                        if isinstance(row['details'], str):
+                            row['details'] = json.loads(row['details'])
+                    archived += archiver.write(rows)
+        if not dry_run:
+            with connections[using].cursor() as cursor:
+                cursor.execute(f"ALTER TABLE {TABLE} DROP PARTITION {name}")
+        dropped.append((name, archived))
+    return dropped
+
+
+def delete_in_chunks(queryset, chunk_size=1000, archiver=None):
+    """
+    Delete the rows of `queryset` in primary-key batches so no single statement
+    holds locks on a large range. Returns the number of deleted rows.
+    """
+    deleted = 0
+    while True:
+        if archiver is not None:
+            rows = list(queryset.order_by('pk').values(*ARCHIVE_FIELDS)[:chunk_size])
+            pks = [row['id'] for row in rows]
+        else:
+            pks = list(queryset.order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return deleted
+        if archiver is not None:
+            archiver.write(rows)
+        count, _ = ActivityLog.objects.using(queryset.db).filter(pk__in=pks).delete()
+        deleted += count
+
+
+def prune_activity_logs(cutoff, archive_dir=None, chunk_size=5000, dry_run=False, using=DEFAULT_DB_ALIAS):
+    """
+    Remove logs older than `cutoff` (a date). Partitioned tables lose whole
+    months (rows are kept until their month is entirely expired); otherwise
+    rows are deleted in chunks. Daily stat counters for the removed days go
+    with them. Returns a summary dict.
+    """
+    archiver = LogArchiver(archive_dir) if archive_dir else None
+
+    if is_partitioned(using):
+        dropped = drop_expired_partitions(month_start(cutoff), archiver=archiver, dry_run=dry_run, using=using)
+        if dropped and not dry_run:
+            discard_stats(before=month_start(cutoff))
+        return {'mode': 'partitions', 'dropped': dropped, 'archived': sum(a for _, a in dropped)}
+
+    expired = ActivityLog.objects.using(using).filter(timestamp__date__lt=cutoff)
+    if dry_run:
+        return {'mode': 'rows', 'deleted': 0, 'would_delete': expired.count()}
+    deleted = delete_in_chunks(expired, chunk_size=chunk_size, archiver=archiver)
+    discard_stats(before=cutoff)
+    return {'mode': 'rows', 'deleted': deleted, 'archived': deleted if archiver else 0}
@@ -0,0 +1,314 @@
+"""
+Shopify product webhooks (products/create, products/update, products/delete).
+
+The receiver verifies the HMAC and queues the event; nothing is written
+during the request. While a merchant edits a product Shopify sends a burst
+of products/update for it, so queued events are keyed by (shop, product)
+and only the latest one survives: a background thread applies what is left
+every PRODUCT_WEBHOOK_COALESCE_WINDOW seconds (or as soon as
+PRODUCT_WEBHOOK_FLUSH_SIZE products are waiting), with one bulk upsert and
+one DELETE per shop. WebhookRegistration counters are bumped with F()
+expressions by the number of events received, never read-modify-write.
+With PRODUCT_WEBHOOK_BUFFERED = False (tests) events are applied at once.
+
+Shopify gets its 200 once the event is queued, and the queue is in memory
+only: events of a worker that dies before its next flush are lost (Shopify
+will not resend them) until the next product sync. If a shop's batch fails
+its events are applied one by one and the ones that still fail are logged
+and dropped; a batch that hits a database outage is requeued, up to
+PRODUCT_WEBHOOK_MAX_ATTEMPTS flushes.
+"""
+import atexit
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import threading
+from collections import Counter
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from ..db_connections import release_connections
+from ..metrics import WEBHOOK_EVENTS, WEBHOOK_PRODUCT_WRITES
+from ..models import Product, Shop, WebhookRegistration
+from ..sharding import db_for_shop, tenant
+from .storefront_cache import invalidate_storefront_cache
+from subscriptions.entitlements import get_entitlements
+
+logger = logging.getLogger(__name__)
+
+PRODUCT_TOPICS = ('products/create', 'products/update', 'products/delete')
+
+# Payload keys product_defaults() cannot do without
+REQUIRED_FIELDS = {
+    'products/create': ('id', 'title', 'handle'),
+    'products/update': ('id', 'title', 'handle'),
+    'products/delete': ('id',),
+}
+
+# Database down or connection lost: worth another flush, unlike a bad payload
+RETRYABLE_ERRORS = (OperationalError, InterfaceError)
+
+# Columns a webhook (or sync) may overwrite on an existing product
+UPSERT_FIELDS = [
+    'title', 'handle', 'vendor', 'product_type', 'body_html', 'image_url',
+    'shopify_created_at', 'shopify_updated_at', 'last_synced_at', 'updated_at',
+]
+
+
+def verify_webhook(body, signature, secret=None):
+    """
+    True if `signature` (X-Shopify-Hmac-Sha256) is the base64 HMAC-SHA256 of the raw body.
+    """
+    if not signature:
+        return False
+    secret = secret or os.environ.get('SHOPIFY_API_SECRET', 'your_secret_here')
+    digest = base64.b64encode(hmac.new(secret.encode(), body, hashlib.sha256).digest()).decode()
+    return hmac.compare_digest(digest, signature)
+
+
+def missing_fields(topic, payload):
+    """
+    Required keys absent (or null) from a webhook payload.
+    """
+    return [name for name in REQUIRED_FIELDS[topic] if payload.get(name) is None]
+
+
+def product_defaults(p_data):
+    """
+    Product columns from a Shopify REST / webhook product payload.
+    """
+    image_url = None
+    if p_data.get('images'):
+        image_url = p_data['images'][0].get('src')
+    return {
+        'title': p_data['title'],
+        'handle': p_data['handle'],
+        'vendor': p_data.get('vendor'),
+        'product_type': p_data.get('product_type'),
+        'body_html': p_data.get('body_html') or "",
+        'image_url': image_url,
+        'shopify_created_at': p_data.get('created_at'),
+        'shopify_updated_at': p_data.get('updated_at'),
+        'last_synced_at': timezone.now(),
+    }
+
+
+def is_older(payload, than):
+    """
+    Shopify does not guarantee delivery order: an update stamped before the queued one is stale.
+    """
+    new, queued = parse_datetime(payload.get('updated_at') or ''), parse_datetime(than.get('updated_at') or '')
+    return new is not None and queued is not None and new < queued
+
+
+def write_shop_events(shop_id, shop, rows, delete_ids, now):
+    """
+    One shop's upserts (`rows`: [(product_id, payload)]) and deletes, in one
+    transaction on the shard holding its products. Returns (upserted, deleted).
+    """
+    upserted = deleted = 0
+    alias = db_for_shop(shop_id)
+    with tenant(shop_id), transaction.atomic(using=alias):
+        if rows and shop is not None:
+            existing = set(
+                Product.objects.filter(shop_id=shop_id, shopify_id__in=[pid for pid, _ in rows]).values_list('shopify_id', flat=True)
+            )
+            new_ids = [pid for pid, _ in rows if pid not in existing]
+            if new_ids:
+                # Same plan limit as the manual sync
+                limit = get_entitlements(shop).features.get('products_limit', 250)
+                room = max(0, limit - Product.objects.filter(shop_id=shop_id).count())
+                skipped = set(new_ids[room:])
+                if skipped:
+                    logger.info("Ignored %s new products over the plan limit of %s", len(skipped), shop.shop_domain)
+                    rows = [(pid, payload) for pid, payload in rows if pid not in skipped]
+            products = [
+                Product(shop_id=shop_id, shopify_id=pid, updated_at=now, **product_defaults(payload))
+                for pid, payload in rows
+            ]
+            # MySQL upserts on any unique key and rejects an explicit conflict target
+            unique_fields = ['shopify_id'] if connections[alias].features.supports_update_conflicts_with_target else None
+            Product.objects.bulk_create(
+                products, update_conflicts=True, unique_fields=unique_fields, update_fields=UPSERT_FIELDS
+            )
+            upserted = len(products)
+
+        if delete_ids:
+            # Cascades to the FAQs (and their signals)
+            deleted = Product.objects.filter(shop_id=shop_id, shopify_id__in=delete_ids).delete()[1].get('faq_app.Product', 0)
+    return upserted, deleted
+
+
+def apply_product_events(events, received=None):
+    """
+    Write coalesced events. `events`: {(shop_id, product_id): (topic, payload)},
+    `received`: {(shop_id, topic): number of webhooks}. Returns {'upserted': n, 'deleted': n}.
+    Raises RETRYABLE_ERRORS only; any other failure drops the events that cause it.
+    """
+    upserts, deletes = {}, {}
+    for (shop_id, product_id), (topic, payload) in events.items():
+        if topic == 'products/delete':
+            deletes.setdefault(shop_id, []).append(product_id)
+        else:
+            upserts.setdefault(shop_id, []).append((product_id, payload))
+
+    upserted = deleted = 0
+    now = timezone.now()
+    shops = Shop.objects.in_bulk(list(upserts)) if upserts else {}
+    for shop_id in {**upserts, **deletes}:
+        shop = shops.get(shop_id)
+        try:
+            written = write_shop_events(shop_id, shop, upserts.get(shop_id), deletes.get(shop_id), now)
+        except RETRYABLE_ERRORS:
+            raise
+        except Exception as e:
+            # One bad payload must not sink the batch: find it by applying the events one by one
+            logger.warning("Product webhook batch of shop %s failed, applying events one by one: %s", shop_id, e)
+            written = [0, 0]
+            for (event_shop_id, product_id), (topic, payload) in events.items():
+                if event_shop_id != shop_id:
+                    continue
+                is_delete = topic == 'products/delete'
+                try:
+                    one = write_shop_events(
+                        shop_id, shop, None if is_delete else [(product_id, payload)], [product_id] if is_delete else None, now
+                    )
+                except RETRYABLE_ERRORS:
+                    raise
+                except Exception as error:
+                    logger.exception("Dropped %s webhook for product %s of shop %s: %s", topic, product_id, shop_id, error)
+                    WEBHOOK_EVENTS.inc(topic=topic, result='dropped')
+                    continue
+                written[0] += one[0]
+                written[1] += one[1]
+        upserted += written[0]
+        deleted += written[1]
+
+    if received:
+        with transaction.atomic():
+            for (shop_id, topic), count in received.items():
+                WebhookRegistration.objects.filter(shop_id=shop_id, topic=topic).update(
+                    last_received_at=now, total_received=F('total_received') + count
+                )
+
+    # bulk_create sends no signals
+    for shop_id in upserts:
+        invalidate_storefront_cache(shop_id)
+    WEBHOOK_PRODUCT_WRITES.inc(upserted, operation='upsert')
+    WEBHOOK_PRODUCT_WRITES.inc(deleted, operation='delete')
+    return {'upserted': upserted, 'deleted': deleted}
+
+
+class ProductEventBuffer:
+    def __init__(self, flush_size=500, window=2.0, autostart=True, max_attempts=5):
+        self.flush_size = flush_size
+        self.window = window
+        self.autostart = autostart
+        self.max_attempts = max_attempts
+        self._events = {}
+        self._attempts = {} # key -> failed flushes of the queued event
+        self._received = Counter()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def enqueue(self, shop_id, topic, payload):
+        key = (shop_id, str(payload['id']))
+        with self._lock:
+            self._received[(shop_id, topic)] += 1
+            queued = self._events.get(key)
+            if queued is not None and topic != 'products/delete' and queued[0] != 'products/delete' and is_older(payload, queued[1]):
+                result = 'stale'
+            else:
+                result = 'coalesced' if queued is not None else 'queued'
+                self._events[key] = (topic, payload)
+                self._attempts.pop(key, None)
+            pending = len(self._events)
+        WEBHOOK_EVENTS.inc(topic=topic, result=result)
+        if self.autostart:
+            self._ensure_thread()
+        if pending >= self.flush_size:
+            self._wakeup.set()
+
+    def pending(self):
+        with self._lock:
+            return len(self._events)
+
+    def flush(self):
+        """
+        Apply everything queued so far. Returns apply_product_events()' summary.
+        """
+        with self._lock:
+            events, self._events = self._events, {}
+            attempts, self._attempts = self._attempts, {}
+            received, self._received = self._received, Counter()
+        if not events and not received:
+            return {'upserted': 0, 'deleted': 0}
+        try:
+            return apply_product_events(events, received)
+        except RETRYABLE_ERRORS as e:
+            # Shopify will not resend: requeue unless something newer arrived meanwhile
+            logger.exception("Applying %s product webhook events failed, requeued: %s", len(events), e)
+            with self._lock:
+                for key, event in events.items():
+                    tries = attempts.get(key, 0) + 1
+                    if tries >= self.max_attempts:
+                        logger.error("Dropped %s webhook for product %s of shop %s after %s attempts",
+                                     event[0], key[1], key[0], tries)
+                        WEBHOOK_EVENTS.inc(topic=event[0], result='dropped')
+                    elif key not in self._events:
+                        self._events[key] = event
+                        self._attempts[key] = tries
+                self._received.update(received)
+        except Exception as e:
+            logger.exception("Applying %s product webhook events failed, dropped: %s", len(events), e)
+        return {'upserted': 0, 'deleted': 0}
+
+    def _ensure_thread(self):
+        # Threads do not survive fork: start one per worker process
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='product-webhooks', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.window)
+            self._wakeup.clear()
+            release_connections()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.exception("Product webhook flush error: %s", e)
+
+
+_buffer = ProductEventBuffer(
+    flush_size=getattr(settings, 'PRODUCT_WEBHOOK_FLUSH_SIZE', 500),
+    window=getattr(settings, 'PRODUCT_WEBHOOK_COALESCE_WINDOW', 2.0),
+    max_attempts=getattr(settings, 'PRODUCT_WEBHOOK_MAX_ATTEMPTS', 5),
+)
+atexit.register(_buffer.flush)
+
+
+def receive_product_event(shop_id, topic, payload):
+    """
+    Queue a verified product webhook, or apply it at once if PRODUCT_WEBHOOK_BUFFERED is False.
+    """
+    if getattr(settings, 'PRODUCT_WEBHOOK_BUFFERED', True):
+        _buffer.enqueue(shop_id, topic, payload)
+    else:
+        WEBHOOK_EVENTS.inc(topic=topic, result='queued')
+        apply_product_events({(shop_id, str(payload['id'])): (topic, payload)}, {(shop_id, topic): 1})
+
+
+def flush_product_events():
+    return _buffer.flush()
@@ -0,0 +1,200 @@
+"""
+Online move of a shop's tenant rows to another shard (manage.py move_shop_shard).
+
+1. MOVING: the shop keeps reading and writing its current shard while its
+   rows are copied to the target in primary-key chunks.
+2. READ_ONLY: once every process has seen that state (SHARD_MAP_CACHE_TTL),
+   rows changed or created since the copy started are copied again and rows
+   deleted meanwhile are removed from the target. Writes get a 503 only
+   during this step.
+3. The map points at the target (ACTIVE). After another settle period, when
+   no process still reads the old shard, logs the buffered sink wrote there
+   meanwhile are copied over and the source rows are deleted.
+
+A failed move puts the map entry back on the source; whatever it copied is
+wiped from the target by the next attempt. Rows keep their primary keys, so
+shards must hand out disjoint auto-increment ranges (MySQL
+auto_increment_offset / auto_increment_increment): a copy that would
+overwrite another shop's row aborts the move.
+"""
+import logging
+import time
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+from ..db_connections import release_connections
+from ..metrics import SHARD_MOVE_ROWS, SHARD_MOVES
+from ..models import ActivityLog, BulkGenerationJob, FAQ, FAQDesign, FAQItem, Product, ShopShard
+from ..sharding import (
+    ACTIVE, MOVING, READ_ONLY, TENANT_MODELS, invalidate_shard_map, mirror_shop, shard_for, shards,
+)
+from .shop_deletion import delete_chunk
+from .storefront_cache import invalidate_storefront_cache
+
+logger = logging.getLogger(__name__)
+
+SHARD_MOVE_CHUNK_SIZE = getattr(settings, 'SHARD_MOVE_CHUNK_SIZE', 1000)
+
+# Parents before children
+MOVE_ORDER = (FAQDesign, BulkGenerationJob, Product, FAQ, FAQItem, ActivityLog)
+
+
+class ShardMoveError(Exception):
+    pass
+
+
+def shop_rows(model, alias, shop_id):
+    return model.objects.using(alias).filter(**{TENANT_MODELS[model._meta.label]: shop_id})
+
+
+def pk_chunks(queryset, chunk_size):
+    """
+    Primary keys of `queryset` in ascending chunks (keyset pagination).
+    """
+    last = None
+    while True:
+        rows = queryset.order_by('pk')
+        if last is not None:
+            rows = rows.filter(pk__gt=last)
+        pks = list(rows.values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return
+        last = pks[-1]
+        yield pks
+
+
+def set_state(shop_id, alias, state, **fields):
+    ShopShard.objects.using(DEFAULT_DB_ALIAS).update_or_create(
+        shop_id=shop_id, defaults={'alias': alias, 'state': state, **fields}
+    )
+    invalidate_shard_map(shop_id)
+
+
+def copy_rows(model, shop_id, objs, target):
+    """
+    Upsert `objs` on the target shard as they are (auto_now columns included).
+    """
+    if not objs:
+        return 0
+    pks = [obj.pk for obj in objs]
+    lookup = TENANT_MODELS[model._meta.label]
+    if model.objects.using(target).filter(pk__in=pks).exclude(**{lookup: shop_id}).exists():
+        raise ShardMoveError(f"{model._meta.db_table}: primary keys already used by another shop on {target}")
+
+    auto_now = [f.attname for f in model._meta.concrete_fields if getattr(f, 'auto_now', False)]
+    stamps = [[getattr(obj, name) for name in auto_now] for obj in objs]
+    # MySQL upserts on any unique key and rejects an explicit conflict target
+    unique_fields = [model._meta.pk.name] if connections[target].features.supports_update_conflicts_with_target else None
+    model.objects.using(target).bulk_create(
+        objs, update_conflicts=True, unique_fields=unique_fields,
+        update_fields=[f.name for f in model._meta.concrete_fields if not f.primary_key],
+    )
+    if auto_now:
+        # bulk_create stamped them with the current time; bulk_update writes values as given
+        for obj, values in zip(objs, stamps):
+            for name, value in zip(auto_now, values):
+                setattr(obj, name, value)
+        model.objects.using(target).bulk_update(objs, auto_now)
+    SHARD_MOVE_ROWS.inc(len(objs), table=model._meta.db_table)
+    return len(objs)
+
+
+def copy_all(model, shop_id, source, target, chunk_size):
+    copied = 0
+    for pks in pk_chunks(shop_rows(model, source, shop_id), chunk_size):
+        copied += copy_rows(model, shop_id, list(model.objects.using(source).filter(pk__in=pks)), target)
+        release_connections()
+    return copied
+
+
+def copy_missing(model, shop_id, source, target, chunk_size, changed_since=None):
+    """
+    Copy source rows absent from the target, plus those updated since `changed_since`.
+    """
+    copied = 0
+    for pks in pk_chunks(shop_rows(model, source, shop_id), chunk_size):
+        present = set(model.objects.using(target).filter(pk__in=pks).values_list('pk', flat=True))
+        missing = [pk for pk in pks if pk not in present]
+        copied += copy_rows(model, shop_id, list(model.objects.using(source).filter(pk__in=missing)), target)
+    if changed_since is not None and any(f.name == 'updated_at' for f in model._meta.concrete_fields):
+        for pks in pk_chunks(shop_rows(model, source, shop_id).filter(updated_at__gte=changed_since), chunk_size):
+            copied += copy_rows(model, shop_id, list(model.objects.using(source).filter(pk__in=pks)), target)
+    return copied
+
+
+def delete_missing(model, shop_id, source, target, chunk_size):
+    """
+    Remove target rows that no longer exist on the source.
+    """
+    deleted = 0
+    for pks in pk_chunks(shop_rows(model, target, shop_id), chunk_size):
+        present = set(model.objects.using(source).filter(pk__in=pks).values_list('pk', flat=True))
+        gone = [pk for pk in pks if pk not in present]
+        if gone:
+            deleted += model.objects.using(target).filter(pk__in=gone)._raw_delete(target)
+    return deleted
+
+
+def delete_all(model, shop_id, alias, chunk_size):
+    deleted = 0
+    while True:
+        count = delete_chunk(shop_rows(model, alias, shop_id), chunk_size)
+        if not count:
+            return deleted
+        deleted += count
+        release_connections()
+
+
+def move_shop(shop, target, chunk_size=None, settle=None, keep_source=False):
+    """
+    Move `shop`'s tenant rows to the `target` alias. Returns {table: rows copied}.
+    Raises ShardMoveError.
+    """
+    chunk_size = chunk_size or SHARD_MOVE_CHUNK_SIZE
+    settle = getattr(settings, 'SHARD_MAP_CACHE_TTL', 5) if settle is None else settle
+    if target not in shards():
+        raise ShardMoveError(f"{target} is not one of TENANT_SHARDS ({', '.join(shards())})")
+    invalidate_shard_map(shop.pk)
+    source, state = shard_for(shop.pk)
+    if source == target:
+        raise ShardMoveError(f"{shop.shop_domain} is already on {target}")
+    if state != ACTIVE:
+        logger.warning("Restarting the interrupted move of %s (%s)", shop.shop_domain, state)
+
+    copied = {}
+    logger.info("Moving %s from %s to %s", shop.shop_domain, source, target)
+    set_state(shop.pk, source, MOVING)
+    try:
+        mirror_shop(shop, target)
+        # Leftovers of an earlier attempt
+        for model in reversed(MOVE_ORDER):
+            delete_all(model, shop.pk, target, chunk_size)
+
+        copy_started = timezone.now()
+        for model in MOVE_ORDER:
+            copied[model._meta.db_table] = copy_all(model, shop.pk, source, target, chunk_size)
+
+        set_state(shop.pk, source, READ_ONLY)
+        time.sleep(settle)
+        for model in reversed(MOVE_ORDER):
+            delete_missing(model, shop.pk, source, target, chunk_size)
+        for model in MOVE_ORDER:
+            copied[model._meta.db_table] += copy_missing(model, shop.pk, source, target, chunk_size, changed_since=copy_started)
+
+        set_state(shop.pk, target, ACTIVE, moved_at=timezone.now())
+    except Exception:
+        set_state(shop.pk, source, ACTIVE)
+        SHARD_MOVES.inc(status='failed')
+        raise
+    SHARD_MOVES.inc(status='completed')
+    invalidate_storefront_cache(shop.pk)
+    logger.info("Moved %s to %s", shop.shop_domain, target, extra={'copied': copied})
+
+    if not keep_source:
+        time.sleep(settle)
+        copied[ActivityLog._meta.db_table] += copy_missing(ActivityLog, shop.pk, source, target, chunk_size)
+        for model in reversed(MOVE_ORDER):
+            delete_all(model, shop.pk, source, chunk_size)
+        if source != DEFAULT_DB_ALIAS:
+            type(shop).objects.using(source).filter(pk=shop.pk)._raw_delete(source)
+    return copied
@@ -0,0 +1,177 @@
+"""
+Background deletion of uninstalled shops.
+
+shop.delete() makes Django collect every dependent row in memory to emulate
+cascades and send signals: for a large catalogue with a long log history it
+takes minutes, holds locks throughout and can exhaust memory. Uninstall
+instead marks the shop inactive and schedules a ShopDeletionJob, which a
+ShopDeleter thread works through table by table, children before parents,
+with raw DELETEs of at most SHOP_DELETION_CHUNK_SIZE primary keys (no
+collection, no signals; caches are invalidated explicitly).
+
+Progress is saved after every chunk and each step only deletes what is left,
+so running a job again is safe: interrupted or failed jobs are resumed with
+`manage.py resume_shop_deletions`. A reinstall (auth sync) reactivates the
+shop and cancels its job; the shop row is never deleted while active.
+"""
+import logging
+import threading
+import time
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from ..authentication import invalidate_shop_cache
+from ..db_connections import close_thread_connections, release_connections
+from ..metrics import SHOP_DELETION_JOBS, SHOP_DELETION_ROWS
+from ..models import (
+    ActivityLog, ActivityLogDailyStat, AIUsageDaily, APIConfiguration, BulkGenerationJob, FAQ, FAQDesign,
+    FAQItem, Product, RequestProfile, Shop, ShopDeletionJob, ShopShard, WebhookRegistration,
+)
+from ..sharding import invalidate_shard_map, shard_shop_rows, tenant
+from ..structured_logging import bind_request_id
+from .storefront_cache import invalidate_storefront_cache
+from subscriptions.models import Subscription
+
+logger = logging.getLogger(__name__)
+
+SHOP_DELETION_CHUNK_SIZE = getattr(settings, 'SHOP_DELETION_CHUNK_SIZE', 1000)
+# Between chunks, so other writers get the tables
+SHOP_DELETION_PAUSE = getattr(settings, 'SHOP_DELETION_PAUSE', 0.05)
+
+ACTIVE_STATUSES = ('PENDING', 'RUNNING')
+
+# (label, rows of a shop id) in dependency order: nothing below references a row above.
+# Steps run in the shop's tenant context, so shop-scoped rows are found on its shard.
+DELETION_STEPS = (
+    ('faq_items', lambda shop_id: FAQItem.objects.filter(faq__product__shop_id=shop_id)),
+    ('faqs', lambda shop_id: FAQ.objects.filter(product__shop_id=shop_id)),
+    ('activity_logs', lambda shop_id: ActivityLog.objects.filter(shop_id=shop_id)),
+    ('activity_log_daily_stats', lambda shop_id: ActivityLogDailyStat.objects.filter(shop_id=shop_id)),
+    ('ai_usage_daily', lambda shop_id: AIUsageDaily.objects.filter(shop_id=shop_id)),
+    ('request_profiles', lambda shop_id: RequestProfile.objects.filter(shop_id=shop_id)),
+    ('webhook_registrations', lambda shop_id: WebhookRegistration.objects.filter(shop_id=shop_id)),
+    ('bulk_generation_jobs', lambda shop_id: BulkGenerationJob.objects.filter(shop_id=shop_id)),
+    ('faq_designs', lambda shop_id: FAQDesign.objects.filter(shop_id=shop_id)),
+    ('api_configurations', lambda shop_id: APIConfiguration.objects.filter(shop_id=shop_id)),
+    ('subscriptions', lambda shop_id: Subscription.objects.filter(shop_id=shop_id)),
+    ('products', lambda shop_id: Product.objects.filter(shop_id=shop_id)),
+    ('shard_shop', shard_shop_rows),
+    ('shop', lambda shop_id: Shop.objects.filter(pk=shop_id, is_active=False)),
+    ('shop_shard', lambda shop_id: ShopShard.objects.filter(shop_id=shop_id)),
+)
+
+
+def delete_chunk(queryset, chunk_size):
+    """
+    Delete up to `chunk_size` rows of `queryset` with one raw DELETE.
+    Returns the number of deleted rows.
+    """
+    pks = list(queryset.order_by().values_list('pk', flat=True)[:chunk_size])
+    if not pks:
+        return 0
+    # _raw_delete: a single statement, no related-object collection, no signals
+    return queryset.model.objects.filter(pk__in=pks)._raw_delete(queryset.db)
+
+
+def schedule_shop_deletion(shop):
+    """
+    Deactivate `shop` and return its deletion job, creating one (and starting
+    its thread once the transaction commits) unless one is already active.
+    """
+    if shop.is_active:
+        shop.is_active = False
+        shop.save(update_fields=['is_active', 'updated_at']) # Signal drops the shop and storefront caches
+
+    job = ShopDeletionJob.objects.filter(shop_id=shop.pk, status__in=ACTIVE_STATUSES).first()
+    if job is not None:
+        return job
+    job = ShopDeletionJob.objects.create(shop_id=shop.pk, shop_domain=shop.shop_domain)
+    transaction.on_commit(lambda: ShopDeleter(job.id).start())
+    logger.info("Scheduled deletion of shop %s", shop.shop_domain, extra={'job_id': job.id})
+    return job
+
+
+def cancel_shop_deletion(shop):
+    """
+    Stop any active deletion of `shop` (reinstall). Rows already deleted stay deleted.
+    """
+    cancelled = ShopDeletionJob.objects.filter(shop_id=shop.pk, status__in=ACTIVE_STATUSES).update(
+        status='CANCELLED', updated_at=timezone.now()
+    )
+    if cancelled:
+        logger.info("Cancelled deletion of reinstalled shop %s", shop.shop_domain)
+    return cancelled
+
+
+def run_shop_deletion(job_id, chunk_size=None, pause=None):
+    """
+    Work through a deletion job until done, cancelled or failed. Returns the job.
+    """
+    chunk_size = chunk_size or SHOP_DELETION_CHUNK_SIZE
+    pause = SHOP_DELETION_PAUSE if pause is None else pause
+
+    job = ShopDeletionJob.objects.get(pk=job_id)
+    if job.status in ('COMPLETED', 'CANCELLED'):
+        return job
+
+    job.status = 'RUNNING'
+    job.attempts += 1
+    job.error_message = None
+    job.save(update_fields=['status', 'attempts', 'error_message', 'updated_at'])
+    logger.info("Deleting shop %s", job.shop_domain, extra={'job_id': job.id, 'attempt': job.attempts})
+
+    try:
+        with tenant(job.shop_id):
+            for label, rows in DELETION_STEPS:
+                job.current_step = label
+                job.save(update_fields=['current_step', 'updated_at'])
+                while True:
+                    release_connections()
+                    # A reinstall cancels the job between chunks
+                    job.refresh_from_db(fields=['status'])
+                    if job.status == 'CANCELLED':
+                        logger.info("Deletion of %s cancelled", job.shop_domain, extra={'job_id': job.id})
+                        return job
+
+                    deleted = delete_chunk(rows(job.shop_id), chunk_size)
+                    if not deleted:
+                        break
+                    job.deleted_rows[label] = job.deleted_rows.get(label, 0) + deleted
+                    job.save(update_fields=['deleted_rows', 'updated_at'])
+                    SHOP_DELETION_ROWS.inc(deleted, table=label)
+                    if pause:
+                        time.sleep(pause)
+
+        job.status = 'COMPLETED'
+        job.current_step = None
+        job.completed_at = timezone.now()
+        job.save(update_fields=['status', 'current_step', 'completed_at', 'updated_at'])
+        logger.info("Deleted shop %s", job.shop_domain, extra={'job_id': job.id, 'deleted_rows': job.deleted_rows})
+    except Exception as e:
+        logger.exception("Deletion of shop %s failed: %s", job.shop_domain, e)
+        job.status = 'FAILED'
+        job.error_message = str(e)
+        job.save(update_fields=['status', 'error_message', 'updated_at'])
+    finally:
+        SHOP_DELETION_JOBS.inc(status=job.status)
+        # Raw deletes send no signals
+        invalidate_shop_cache(job.shop_domain)
+        invalidate_storefront_cache(job.shop_id)
+        invalidate_shard_map(job.shop_id)
+    return job
+
+
+class ShopDeleter(threading.Thread):
+    def __init__(self, job_id):
+        super().__init__()
+        self.job_id = job_id
+        self.daemon = True
+
+    def run(self):
+        bind_request_id(f"shop-deletion-{self.job_id}")
+        try:
+            run_shop_deletion(self.job_id)
+        except ShopDeletionJob.DoesNotExist:
+            logger.error("Shop deletion job %s not found", self.job_id)
+        finally:
+            close_thread_connections()
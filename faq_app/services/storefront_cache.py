@@ -0,0 +1,68 @@
+"""
+Cache of rendered storefront FAQ payloads.
+
+Each entry holds the JSON body plus its brotli/gzip encodings, so a payload
+is rendered and compressed once per content version instead of per request.
+Keys embed a per-shop version (bumped by signals on FAQ, product, design,
+shop and subscription changes) and the plans version, so invalidation never
+has to find individual entries.
+"""
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from subscriptions.entitlements import PLANS_VERSION_KEY, get_plans_version
+from ..compression import precompress
+from ..metrics import STOREFRONT_CACHE
+from ..renderers import ORJSONRenderer
+
+STOREFRONT_CACHE_TTL = getattr(settings, 'STOREFRONT_CACHE_TTL', 300)
+
+
+def shop_version_key(shop_id):
+    return f"storefront:version:{shop_id}"
+
+
+def payload_key(shop_id, product_id, handle):
+    """
+    Cache key for one storefront lookup at the current content version.
+    Compute it before reading the database: a change made while the payload
+    is being built then bumps the version and the stale entry is never read.
+    """
+    version_key = shop_version_key(shop_id)
+    cached = cache.get_many([version_key, PLANS_VERSION_KEY])
+    shop_version = cached.get(version_key)
+    if shop_version is None:
+        shop_version = time.time_ns()
+        cache.add(version_key, shop_version, None)
+        shop_version = cache.get(version_key, shop_version)
+    lookup = hashlib.md5(f"{product_id or ''}|{handle or ''}".encode()).hexdigest()
+    return f"storefront:faq:{shop_id}:{shop_version}:{get_plans_version(cached)}:{lookup}"
+
+
+def invalidate_storefront_cache(shop_id):
+    cache.set(shop_version_key(shop_id), time.time_ns(), None)
+
+
+def get_payload(key):
+    entry = cache.get(key)
+    STOREFRONT_CACHE.inc(result='miss' if entry is None else 'hit')
+    return entry
+
+
+def store_payload(key, data):
+    """
+    Render, compress and cache a payload. Returns the cache entry.
+    """
+    body = ORJSONRenderer().render(data)
+    entry = {'body': body, 'encodings': precompress(body)}
+    cache.set(key, entry, STOREFRONT_CACHE_TTL)
+    return entry
+
+
+def payload_response(entry):
+    response = HttpResponse(entry['body'], content_type='application/json')
+    # Picked up by CompressionMiddleware
+    response.precompressed = entry['encodings']
+    return response
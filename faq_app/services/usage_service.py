@@ -0,0 +1,105 @@
+from datetime import timedelta
+from django.db.models import F, Sum
+from django.utils import timezone
+from ..models import AIUsageDaily
+
+# Anthropic list prices in USD per million tokens: (input, output)
+MODEL_PRICING = {
+    'claude-3-haiku-20240307': (0.25, 1.25),
+    'claude-3-sonnet-20240229': (3.00, 15.00),
+    'claude-3-5-sonnet-20240620': (3.00, 15.00),
+    'claude-3-opus-20240229': (15.00, 75.00),
+}
+
+
+def estimate_cost(model, input_tokens, output_tokens):
+    """
+    Estimated USD cost for a token count. Unknown models cost 0.
+    """
+    input_price, output_price = MODEL_PRICING.get(model, (0, 0))
+    return round((input_tokens * input_price + output_tokens * output_price) / 1_000_000, 6)
+
+
+def record_usage(shop, model, input_tokens=0, output_tokens=0, latency_ms=0, error=False):
+    """
+    Add one AI call to the shop's daily usage row using atomic increments.
+    """
+    row, _ = AIUsageDaily.objects.get_or_create(shop=shop, date=timezone.now().date(), model=model)
+    AIUsageDaily.objects.filter(pk=row.pk).update(
+        request_count=F('request_count') + 1,
+        error_count=F('error_count') + (1 if error else 0),
+        input_tokens=F('input_tokens') + int(input_tokens or 0),
+        output_tokens=F('output_tokens') + int(output_tokens or 0),
+        total_latency_ms=F('total_latency_ms') + int(latency_ms or 0),
+    )
+
+
+def tokens_used_this_month(shop):
+    """
+    Total input + output tokens for the current calendar month (reads at most 31 rows per model).
+    """
+    month_start = timezone.now().date().replace(day=1)
+    totals = AIUsageDaily.objects.filter(shop=shop, date__gte=month_start).aggregate(
+        input_tokens=Sum('input_tokens'),
+        output_tokens=Sum('output_tokens'),
+    )
+    return (totals['input_tokens'] or 0) + (totals['output_tokens'] or 0)
+
+
+def check_token_budget(shop, api_config=None):
+    """
+    Returns (allowed, used, budget). Shops without a budget are always allowed.
+    """
+    budget = api_config.monthly_token_budget if api_config else None
+    if not budget:
+        return True, None, budget
+    used = tokens_used_this_month(shop)
+    return used < budget, used, budget
+
+
+def get_usage_rollup(shop, days=30):
+    """
+    Usage totals, per-model and per-day breakdowns for the last `days` days,
+    computed from the aggregated daily table only.
+    """
+    end = timezone.now().date()
+    start = end - timedelta(days=days - 1)
+    rows = AIUsageDaily.objects.filter(shop=shop, date__gte=start).order_by('date', 'model')
+
+    totals = {'requests': 0, 'errors': 0, 'input_tokens': 0, 'output_tokens': 0, 'estimated_cost_usd': 0.0}
+    by_model = {}
+    by_day = {}
+
+    for row in rows:
+        cost = estimate_cost(row.model, row.input_tokens, row.output_tokens)
+
+        model_entry = by_model.setdefault(row.model, {
+            'model': row.model, 'requests': 0, 'errors': 0,
+            'input_tokens': 0, 'output_tokens': 0, 'total_latency_ms': 0, 'estimated_cost_usd': 0.0,
+        })
+        day_entry = by_day.setdefault(row.date, {
+            'date': row.date.isoformat(), 'requests': 0, 'input_tokens': 0, 'output_tokens': 0, 'estimated_cost_usd': 0.0,
+        })
+
+        for entry in (totals, model_entry, day_entry):
+            entry['requests'] += row.request_count
+            entry['input_tokens'] += row.input_tokens
+            entry['output_tokens'] += row.output_tokens
+            entry['estimated_cost_usd'] += cost
+        totals['errors'] += row.error_count
+        model_entry['errors'] += row.error_count
+        model_entry['total_latency_ms'] += row.total_latency_ms
+
+    for entry in by_model.values():
+        entry['avg_latency_ms'] = round(entry['total_latency_ms'] / entry['requests']) if entry['requests'] else 0
+        entry['estimated_cost_usd'] = round(entry['estimated_cost_usd'], 6)
+    for entry in by_day.values():
+        entry['estimated_cost_usd'] = round(entry['estimated_cost_usd'], 6)
+    totals['estimated_cost_usd'] = round(totals['estimated_cost_usd'], 6)
+
+    return {
+        'period': {'start': start.isoformat(), 'end': end.isoformat(), 'days': days},
+        'totals': totals,
+        'by_model': list(by_model.values()),
+        'by_day': list(by_day.values()),
+    }
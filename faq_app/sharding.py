@@ -0,0 +1,243 @@
+"""
+Tenant sharding.
+
+Shop-scoped tables (TENANT_MODELS) can live on any of the TENANT_SHARDS
+database aliases (settings: `default` plus one per DB_SHARD_HOSTS entry).
+Shops, plans, usage counters and everything else stay on `default`, and so
+does the shard map: one ShopShard row per shop, written when the shop is
+created (crc32 of the domain picks the shard) and changed only by
+`manage.py move_shop_shard`. A shop without a row lives on `default`. Each
+shard keeps a copy of the shops it hosts so its foreign keys hold.
+
+ShardRouter sends a tenant model to its shop's shard: the shop comes from
+the instance the query is about (a Shop, or a row with a shop_id), else from
+the tenant context, which ShopifyAuthentication / the storefront views set
+per request (TenantMiddleware scopes it) and threads set with `tenant()`.
+Shops on `default` fall through to ReplicaRouter. With a single shard the
+router does nothing.
+
+Map entries are memoized per process for SHARD_MAP_CACHE_TTL seconds; a move
+waits that long between its steps so every process sees each state change.
+Writes to a READ_ONLY shop (the last moments of a move) fail with a 503.
+"""
+import contextlib
+import contextvars
+import threading
+import time
+import zlib
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+# label -> lookup from the model to its shop id
+TENANT_MODELS = {
+    'faq_app.Product': 'shop_id',
+    'faq_app.FAQ': 'product__shop_id',
+    'faq_app.FAQItem': 'faq__product__shop_id',
+    'faq_app.ActivityLog': 'shop_id',
+    'faq_app.FAQDesign': 'shop_id',
+    'faq_app.BulkGenerationJob': 'shop_id',
+}
+
+ACTIVE = 'ACTIVE'
+MOVING = 'MOVING'
+READ_ONLY = 'READ_ONLY'
+
+_tenant = contextvars.ContextVar('tenant', default=None)
+
+_map_lock = threading.Lock()
+_shard_map = {} # shop id -> (expires at, alias, state)
+
+
+class TenantState:
+    def __init__(self, shop_id=None):
+        self.shop_id = shop_id
+
+
+class ShardMoveInProgress(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'This shop is being moved, try again in a few seconds.'
+    default_code = 'shard_move_in_progress'
+
+
+def shards():
+    return list(getattr(settings, 'TENANT_SHARDS', [DEFAULT_DB_ALIAS]))
+
+
+def sharding_enabled():
+    return len(shards()) > 1
+
+
+def current_shop_id():
+    state = _tenant.get()
+    return state.shop_id if state is not None else None
+
+
+def activate_shop(shop_id):
+    """
+    Route the rest of this request (or thread) to `shop_id`'s shard.
+    """
+    state = _tenant.get()
+    if state is None:
+        _tenant.set(TenantState(shop_id))
+    else:
+        state.shop_id = shop_id
+
+
+@contextlib.contextmanager
+def tenant(shop_id):
+    token = _tenant.set(TenantState(shop_id))
+    try:
+        yield
+    finally:
+        _tenant.reset(token)
+
+
+def shard_for(shop_id):
+    """
+    (alias, state) of a shop, from the map.
+    """
+    if not sharding_enabled():
+        return DEFAULT_DB_ALIAS, ACTIVE
+    entry = _shard_map.get(shop_id)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1], entry[2]
+    from .models import ShopShard
+    row = ShopShard.objects.using(DEFAULT_DB_ALIAS).filter(shop_id=shop_id).values_list('alias', 'state').first()
+    alias, state = row or (DEFAULT_DB_ALIAS, ACTIVE)
+    with _map_lock:
+        _shard_map[shop_id] = (time.monotonic() + getattr(settings, 'SHARD_MAP_CACHE_TTL', 5), alias, state)
+    return alias, state
+
+
+def db_for_shop(shop_id):
+    """
+    Alias holding a shop's tenant rows (for transaction.atomic(using=...)).
+    """
+    return shard_for(shop_id)[0]
+
+
+def invalidate_shard_map(shop_id=None):
+    with _map_lock:
+        if shop_id is None:
+            _shard_map.clear()
+        else:
+            _shard_map.pop(shop_id, None)
+
+
+def shard_shop_rows(shop_id):
+    """
+    The shard's copy of a shop row (none for shops on `default`).
+    """
+    from .models import Shop
+    alias = db_for_shop(shop_id)
+    if alias == DEFAULT_DB_ALIAS:
+        return Shop.objects.none()
+    return Shop.objects.using(alias).filter(pk=shop_id)
+
+
+def pick_shard(shop_domain):
+    aliases = shards()
+    return aliases[zlib.crc32(shop_domain.encode()) % len(aliases)]
+
+
+def mirror_shop(shop, alias):
+    """
+    Copy the shop row to a shard (its foreign keys point at it). Idempotent.
+    """
+    if alias == DEFAULT_DB_ALIAS:
+        return
+    type(shop).objects.using(alias).bulk_create([shop], ignore_conflicts=True)
+
+
+def assign_shard(shop):
+    """
+    Place a new shop on a shard. Returns the alias.
+    """
+    from .models import ShopShard
+    alias = pick_shard(shop.shop_domain)
+    mirror_shop(shop, alias)
+    ShopShard.objects.using(DEFAULT_DB_ALIAS).get_or_create(shop_id=shop.pk, defaults={'alias': alias})
+    invalidate_shard_map(shop.pk)
+    return alias
+
+
+def group_by_shard(objs):
+    """
+    [(alias, objs)] for rows with a shop_id; [(None, objs)] (routers decide) without sharding.
+    """
+    if not sharding_enabled():
+        return [(None, objs)] if objs else []
+    groups = {}
+    for obj in objs:
+        groups.setdefault(db_for_shop(obj.shop_id), []).append(obj)
+    return list(groups.items())
+
+
+def shop_for_hints(hints):
+    from .models import Shop
+    instance = hints.get('instance')
+    if isinstance(instance, Shop):
+        return instance.pk
+    shop_id = getattr(instance, 'shop_id', None)
+    if shop_id is not None:
+        return shop_id
+    return current_shop_id()
+
+
+class ShardRouter:
+    def route(self, model, hints, write):
+        if model._meta.label not in TENANT_MODELS or not sharding_enabled():
+            return None
+        shop_id = shop_for_hints(hints)
+        if shop_id is None:
+            # e.g. an FAQ loaded outside any tenant context: stay where it came from
+            instance = hints.get('instance')
+            return getattr(getattr(instance, '_state', None), 'db', None)
+        alias, state = shard_for(shop_id)
+        if write and state == READ_ONLY:
+            raise ShardMoveInProgress()
+        # Shops on default keep their replica reads
+        return None if alias == DEFAULT_DB_ALIAS else alias
+
+    def db_for_read(self, model, **hints):
+        return self.route(model, hints, write=False)
+
+    def db_for_write(self, model, **hints):
+        return self.route(model, hints, write=True)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Shop rows are mirrored on every shard that holds their data
+        return True
+
+
+class TenantMiddleware:
+    """
+    Gives each request its own tenant context, filled in by authentication.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _tenant.set(TenantState())
+        try:
+            return self.get_response(request)
+        finally:
+            _tenant.reset(token)
+
+    async def __acall__(self, request):
+        token = _tenant.set(TenantState())
+        try:
+            return await self.get_response(request)
+        finally:
+            _tenant.reset(token)
@@ -0,0 +1,36 @@
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Shop, Product, FAQ, FAQDesign
+from .authentication import invalidate_shop_cache
+from .sharding import assign_shard, sharding_enabled
+from .services.storefront_cache import invalidate_storefront_cache
+
+
+@receiver([post_save, post_delete], sender=Shop)
+def shop_changed(sender, instance, **kwargs):
+    # Covers uninstall (delete), token refresh from auth sync and deactivation
+    invalidate_shop_cache(instance.shop_domain)
+    invalidate_storefront_cache(instance.id)
+
+
+@receiver(post_save, sender=Shop)
+def shop_created(sender, instance, created, using, **kwargs):
+    # Shard copies of the row (mirror_shop) are not new shops
+    if created and using == DEFAULT_DB_ALIAS and sharding_enabled():
+        assign_shard(instance)
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=FAQDesign)
+def storefront_content_changed(sender, instance, **kwargs):
+    invalidate_storefront_cache(instance.shop_id)
+
+
+@receiver([post_save, post_delete], sender=FAQ)
+def faq_changed(sender, instance, origin=None, **kwargs):
+    # A cascade from a product or shop delete is invalidated by that model's
+    # own signal; skipping it avoids loading each FAQ's product
+    if origin is not None and getattr(origin, 'model', type(origin)) is not FAQ:
+        return
+    invalidate_storefront_cache(instance.product.shop_id)
@@ -0,0 +1,176 @@
+"""
+Logging plumbing for the app loggers (configured in settings.LOGGING).
+
+- Per-module loggers: `logger = logging.getLogger(__name__)`.
+- RequestIdMiddleware binds an id per request (the incoming X-Request-ID or
+  a new one) that RequestIdFilter stamps on every record, so all lines of a
+  request can be grepped together. Background threads bind their own.
+- QueueStreamHandler only enqueues records; formatting and the stdout write
+  happen on a listener thread. If the queue is full, records are dropped
+  (and counted), so a slow stdout never stalls a request.
+- High-volume info lines pass `extra=SAMPLED`; SamplingFilter keeps
+  LOG_SAMPLE_RATE of them. Warnings and errors are never sampled.
+"""
+import contextvars
+import copy
+import json
+import logging
+import queue
+import random
+import re
+import sys
+import uuid
+from logging.handlers import QueueHandler, QueueListener
+
+_request_id = contextvars.ContextVar('request_id', default=None)
+
+SAMPLED = {'sampled': True}
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+# Accept ids from a proxy / the Remix app only if they look like ids
+VALID_REQUEST_ID = re.compile(r'^[A-Za-z0-9._:-]{1,64}$')
+
+# Attributes of every LogRecord; anything else came in through `extra`
+RESERVED_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+INTERNAL_ATTRS = {'request_id', 'sampled'}
+
+
+def get_request_id():
+    return _request_id.get()
+
+
+def new_request_id():
+    return uuid.uuid4().hex
+
+
+def bind_request_id(request_id=None):
+    """
+    Bind a request id to the current context. Returns the token for reset_request_id.
+    """
+    return _request_id.set(request_id or new_request_id())
+
+
+def reset_request_id(token):
+    _request_id.reset(token)
+
+
+def request_id_from_header(value):
+    if value and VALID_REQUEST_ID.match(value):
+        return value
+    return None
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = _request_id.get() or '-'
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record):
+        if not getattr(record, 'sampled', False) or record.levelno > logging.INFO:
+            return True
+        return self.rate >= 1 or random.random() < self.rate
+
+
+def record_extras(record):
+    return {
+        key: value for key, value in vars(record).items()
+        if key not in RESERVED_ATTRS and key not in INTERNAL_ATTRS and not key.startswith('_')
+    }
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    One JSON object per line: timestamp, level, logger, message, request_id,
+    fields passed through `extra`, and the traceback if any.
+    """
+    def format(self, record):
+        entry = {
+            "timestamp": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, 'request_id', '-'),
+        }
+        entry.update(record_extras(record))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+    def formatTime(self, record, datefmt=None):
+        return super().formatTime(record, '%Y-%m-%dT%H:%M:%S') + f".{int(record.msecs):03d}Z"
+
+
+class PlainFormatter(logging.Formatter):
+    """
+    Human-readable lines for local development; `extra` fields appended as key=value.
+    """
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s [%(name)s] [%(request_id)s] %(message)s')
+
+    def format(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = '-'
+        line = super().format(record)
+        extras = record_extras(record)
+        if extras:
+            line += ' ' + ' '.join(f"{key}={value}" for key, value in extras.items())
+        return line
+
+
+class QueueStreamHandler(QueueHandler):
+    """
+    Non-blocking handler: callers enqueue, a listener thread formats and
+    writes to the stream. Filters run on the calling thread, so the
+    request id context is still available.
+    """
+    def __init__(self, stream=None, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        self.target = logging.StreamHandler(stream or sys.stderr)
+        self.dropped = 0
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+
+    def setFormatter(self, fmt):
+        # Formatting happens on the listener thread
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Freeze everything the listener needs: args may be mutated later, exc_info holds frames
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.stack_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        # Wait until everything enqueued so far is written
+        if self.listener._thread is not None:
+            self.listener.stop()
+            self.listener.start()
+        self.target.flush()
+
+    def close(self):
+        # logging.shutdown() (atexit) flushes then closes every handler
+        if self.listener._thread is not None:
+            self.listener.stop()
+        self.target.flush()
+        super().close()
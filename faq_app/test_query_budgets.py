@@ -0,0 +1,454 @@
+"""
+Query budgets for every route in faq_app/urls.py and subscriptions/urls.py.
+
+Each case runs the same request against a shop seeded at SMALL and at LARGE
+size (products with FAQs, logs, stats, usage rows, subscriptions history,
+profiles), with every cache cold. The query count must be identical at both
+sizes (no N+1) and within the route's entry in QUERY_BUDGETS. A route
+without an entry fails test_every_route_has_a_budget: new endpoints must be
+budgeted here, and a budget only goes up in a reviewed change.
+
+External calls (Shopify REST / GraphQL, Anthropic) are mocked with fixed-size
+answers, so the product sync budget is per Shopify page of SYNC_PAGE_SIZE products.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock, patch
+
+import jwt
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from subscriptions import urls as subscription_urls
+from subscriptions.models import Plan, Subscription
+from . import urls as faq_urls
+from .authentication import _token_cache
+from .models import (
+    ActivityLog, ActivityLogDailyStat, AIUsageDaily, APIConfiguration, BulkGenerationJob,
+    FAQ, FAQDesign, FAQItem, Product, RequestProfile, Shop,
+)
+from .tests import install_search_index
+
+SMALL, LARGE = 2, 25 # LARGE is over the page size (20)
+SYNC_PAGE_SIZE = 3
+INTERNAL_SECRET = 'my_dev_secret'
+
+# (url name, method) -> max queries for one cold-cache request, authentication included
+QUERY_BUDGETS = {
+    ('health config', 'GET'): 0,
+    ('api-root', 'GET'): 1,
+    # Internal (X-Internal-Secret)
+    ('auth-sync', 'POST'): 10,
+    ('auth-uninstall', 'POST'): 4,
+    ('internal-request-stats', 'GET'): 0,
+    ('internal-request-stats', 'DELETE'): 0,
+    ('internal-profiling', 'POST'): 2,
+    ('internal-profiles', 'GET'): 1,
+    ('internal-profile-detail', 'GET'): 1,
+    ('internal-profile-detail', 'DELETE'): 1,
+    # Shopify webhooks (HMAC), applied synchronously under the test settings
+    ('webhooks-products', 'POST'): 9,
+    # Storefront (public)
+    ('storefront-faq', 'GET'): 6,
+    ('storefront-products-search', 'GET'): 3,
+    ('storefront-faq-search', 'GET'): 2,
+    ('async-storefront-faq', 'GET'): 6,
+    ('async-storefront-products-search', 'GET'): 3,
+    # Admin app
+    ('async-generate-faq', 'POST'): 19,
+    ('shop-list', 'GET'): 3,
+    ('shop-list', 'POST'): 3,
+    ('shop-detail', 'GET'): 2,
+    ('shop-detail', 'PUT'): 4,
+    ('shop-detail', 'PATCH'): 3,
+    ('shop-detail', 'DELETE'): 20,
+    ('product-list', 'GET'): 4,
+    ('product-list', 'POST'): 6,
+    ('product-sync', 'POST'): 28, # SYNC_PAGE_SIZE upserts: grows with the Shopify catalog, not local data
+    ('product-detail', 'GET'): 3,
+    ('product-detail', 'PUT'): 6,
+    ('product-detail', 'PATCH'): 4,
+    ('product-detail', 'DELETE'): 8,
+    ('faq-list', 'GET'): 3,
+    ('faq-list', 'POST'): 7,
+    ('faq-generate-faq', 'POST'): 20,
+    ('faq-detail', 'GET'): 2,
+    ('faq-detail', 'PUT'): 8,
+    ('faq-detail', 'PATCH'): 4,
+    ('faq-detail', 'DELETE'): 5,
+    ('faqitem-list', 'GET'): 4,
+    ('faqitem-list', 'POST'): 10,
+    ('faqitem-detail', 'GET'): 2,
+    ('faqitem-detail', 'PUT'): 10,
+    ('faqitem-detail', 'PATCH'): 9,
+    ('faqitem-detail', 'DELETE'): 9,
+    ('activitylog-list', 'GET'): 3,
+    ('activitylog-clear', 'DELETE'): 5,
+    ('activitylog-stats', 'GET'): 3,
+    ('activitylog-detail', 'GET'): 2,
+    ('config-list', 'GET'): 3,
+    ('config-list', 'POST'): 3,
+    ('config-keys', 'GET'): 3,
+    ('config-keys', 'POST'): 4,
+    ('config-detail', 'GET'): 2,
+    ('config-detail', 'PUT'): 5,
+    ('config-detail', 'PATCH'): 3,
+    ('config-detail', 'DELETE'): 3,
+    ('design-list', 'GET'): 3,
+    ('design-detail', 'GET'): 3,
+    ('design-detail', 'PUT'): 4,
+    ('design-detail', 'PATCH'): 4,
+    ('bulk-start', 'POST'): 5,
+    ('bulk-cancel', 'POST'): 3,
+    ('bulk-status', 'GET'): 2,
+    ('usage-list', 'GET'): 4,
+    # Subscriptions
+    ('plan-list', 'GET'): 3,
+    ('plan-detail', 'GET'): 2,
+    ('subscription-list', 'GET'): 2,
+    ('subscription-current', 'GET'): 2,
+    ('subscription-subscribe', 'POST'): 5,
+    ('subscription-cancel', 'POST'): 3,
+    ('subscription-callback', 'GET'): 3,
+}
+
+
+def iter_patterns(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from iter_patterns(pattern.url_patterns)
+        else:
+            yield pattern
+
+
+def route_methods(callback):
+    """
+    HTTP methods a route answers, or None for plain function views.
+    """
+    actions = getattr(callback, 'actions', None) # ViewSets: {'get': 'list', ...}
+    if actions:
+        return {method.upper() for method in actions}
+    view_class = getattr(callback, 'cls', None) or getattr(callback, 'view_class', None)
+    if view_class is not None:
+        return {
+            method.upper() for method in view_class.http_method_names
+            if method not in ('head', 'options') and hasattr(view_class, method)
+        }
+    return None
+
+
+def registered_routes():
+    """
+    {url name: methods or None} for faq_app/urls.py and subscriptions/urls.py.
+    """
+    routes = {}
+    for urlconf in (faq_urls, subscription_urls):
+        for pattern in iter_patterns(urlconf.urlpatterns):
+            methods = route_methods(pattern.callback)
+            if methods is None:
+                routes.setdefault(pattern.name, None)
+            else:
+                routes[pattern.name] = (routes.get(pattern.name) or set()) | methods
+    return routes
+
+
+def session_token(shop):
+    secret = os.environ.get('SHOPIFY_API_SECRET', 'your_secret_here')
+    return jwt.encode(
+        {"dest": f"https://{shop.shop_domain}", "exp": datetime.utcnow() + timedelta(minutes=10)},
+        secret, algorithm='HS256'
+    )
+
+
+def cold_caches():
+    cache.clear()
+    _token_cache.clear()
+
+
+def seed(size):
+    """
+    A shop on the Unlimited plan with `size` rows of everything it owns.
+    """
+    now = timezone.now()
+    shop = Shop.objects.create(shop_domain=f"budget-{size}.myshopify.com", shop_name=f"Budget {size}",
+                               shopify_access_token_encrypted='token')
+    APIConfiguration.objects.create(shop=shop, shopify_store_url=f"https://{shop.shop_domain}",
+                                    shopify_access_token_encrypted='token', monthly_token_budget=10 ** 9)
+    FAQDesign.objects.create(shop=shop)
+
+    plans = Plan.objects.bulk_create([
+        Plan(name=f"Legacy {size}-{i}", price=1 + i, features={'products_limit': 10}) for i in range(size)
+    ])
+    plan = Plan.objects.create(name='Unlimited', price=49, features={
+        'products_limit': 1000, 'max_ai_questions': 10, 'design_customization': True, 'ai_generation': True,
+    })
+    Subscription.objects.bulk_create([
+        Subscription(shop=shop, plan=old_plan, status='cancelled', shopify_charge_id=f"gid://shopify/AppSubscription/{size}{i}")
+        for i, old_plan in enumerate(plans)
+    ])
+    subscription = Subscription.objects.create(shop=shop, plan=plan, status='active', activated_on=now,
+                                               shopify_charge_id=f"gid://shopify/AppSubscription/{size}999")
+
+    products = Product.objects.bulk_create([
+        Product(shop=shop, shopify_id=f"{size}{i:05d}", title=f"Budget product {i}", handle=f"product-{i}", has_faq=True)
+        for i in range(size)
+    ])
+    faqs = FAQ.objects.bulk_create([
+        FAQ(product=product, html_content='', num_questions=2,
+            questions_answers=[{"question": "Q?", "answer": "R."}] * 2,
+            questions_answers_en=[{"question": "Q?", "answer": "A."}] * 2)
+        for product in products
+    ])
+    items = FAQItem.objects.bulk_create([
+        FAQItem(faq=faq, language=language, position=position, question="Q?", answer=answer)
+        for faq in faqs for language, answer in (('fr', "R."), ('en', "A.")) for position in range(2)
+    ])
+    logs = ActivityLog.objects.bulk_create([
+        ActivityLog(id=f"log-{size}-{i}", shop=shop, level='success', operation='generate_faq', message=f"Log {i}")
+        for i in range(size)
+    ])
+    ActivityLogDailyStat.objects.bulk_create([
+        ActivityLogDailyStat(shop=shop, date=(now - timedelta(days=i)).date(), level='success', operation='generate_faq', count=3)
+        for i in range(size)
+    ])
+    AIUsageDaily.objects.bulk_create([
+        AIUsageDaily(shop=shop, date=(now - timedelta(days=i)).date(), model='claude-3-haiku-20240307',
+                     request_count=1, input_tokens=100, output_tokens=200)
+        for i in range(size)
+    ])
+    profiles = RequestProfile.objects.bulk_create([
+        RequestProfile(shop=shop, method='GET', path='/api/products/', duration_ms=1.0, profiler='sampling',
+                       expires_at=now + timedelta(hours=1))
+        for _ in range(size)
+    ])
+    BulkGenerationJob.objects.create(shop=shop, status='RUNNING', total_products=size)
+
+    return SimpleNamespace(
+        size=size, shop=shop, token=session_token(shop), plan=plan, subscription=subscription,
+        product=products[0], faq=faqs[0], item=items[0], log=logs[0], profile=profiles[0],
+    )
+
+
+def call(path, method='GET', data=None, status=200, auth=True, secret=False, **headers):
+    return dict(path=path, method=method, data=data, status=status, auth=auth, secret=secret, headers=headers)
+
+
+def no_active_job(fx):
+    BulkGenerationJob.objects.filter(shop=fx.shop).delete()
+    Product.objects.filter(shop=fx.shop).update(has_faq=False)
+
+
+def pending_subscription(fx):
+    Subscription.objects.create(shop=fx.shop, plan=fx.plan, status='pending', shopify_charge_id="gid://shopify/AppSubscription/77")
+
+
+def product_webhook(fx):
+    body = json.dumps({"id": int(fx.product.shopify_id), "title": "Renamed", "handle": "product-0",
+                       "updated_at": "2024-01-01T00:00:00Z", "images": []})
+    return call('/api/webhooks/products/', 'POST', body, auth=False, content_type='application/json',
+                HTTP_X_SHOPIFY_TOPIC='products/update', HTTP_X_SHOPIFY_SHOP_DOMAIN=fx.shop.shop_domain,
+                HTTP_X_SHOPIFY_HMAC_SHA256=verify_signature(body))
+
+
+def verify_signature(body):
+    secret = os.environ.get('SHOPIFY_API_SECRET', 'your_secret_here')
+    return base64.b64encode(hmac.new(secret.encode(), body.encode(), hashlib.sha256).digest()).decode()
+
+
+def new_shop_domain(fx):
+    return f"created-{fx.size}.myshopify.com"
+
+
+# (url name, method) -> fx -> request, plus an optional setup step run before measuring
+CASES = {
+    ('health config', 'GET'): lambda fx: call('/api/health/', auth=False),
+    ('api-root', 'GET'): lambda fx: call('/api/'),
+    ('auth-sync', 'POST'): lambda fx: call('/api/auth/sync/', 'POST', {"shop": fx.shop.shop_domain, "access_token": "new"}, auth=False, secret=True),
+    ('auth-uninstall', 'POST'): lambda fx: call('/api/auth/uninstall/', 'POST', {"shop": fx.shop.shop_domain}, status=202, auth=False, secret=True),
+    ('webhooks-products', 'POST'): product_webhook,
+    ('internal-request-stats', 'GET'): lambda fx: call('/api/internal/request-stats/', auth=False, secret=True),
+    ('internal-request-stats', 'DELETE'): lambda fx: call('/api/internal/request-stats/', 'DELETE', status=204, auth=False, secret=True),
+    ('internal-profiling', 'POST'): lambda fx: call('/api/internal/profiling/', 'POST', {"shop": fx.shop.shop_domain, "minutes": 5}, auth=False, secret=True),
+    ('internal-profiles', 'GET'): lambda fx: call(f'/api/internal/profiles/?shop={fx.shop.shop_domain}', auth=False, secret=True),
+    ('internal-profile-detail', 'GET'): lambda fx: call(f'/api/internal/profiles/{fx.profile.pk}/', auth=False, secret=True),
+    ('internal-profile-detail', 'DELETE'): lambda fx: call(f'/api/internal/profiles/{fx.profile.pk}/', 'DELETE', status=204, auth=False, secret=True),
+    ('storefront-faq', 'GET'): lambda fx: call(f'/api/storefront/faq/?shop={fx.shop.shop_domain}&handle=product-0', auth=False),
+    ('storefront-products-search', 'GET'): lambda fx: call(f'/api/storefront/products/search/?shop={fx.shop.shop_domain}&q=Budget', auth=False),
+    ('storefront-faq-search', 'GET'): lambda fx: call(f'/api/storefront/faq/search/?shop={fx.shop.shop_domain}&q=Q&language=en', auth=False),
+    ('async-storefront-faq', 'GET'): lambda fx: call(f'/api/async/storefront/faq/?shop={fx.shop.shop_domain}&handle=product-0', auth=False),
+    ('async-storefront-products-search', 'GET'): lambda fx: call(f'/api/async/storefront/products/search/?shop={fx.shop.shop_domain}&q=Budget', auth=False),
+    ('async-generate-faq', 'POST'): lambda fx: call('/api/async/faq/generate-faq/', 'POST', {"productId": fx.product.shopify_id}),
+    ('shop-list', 'GET'): lambda fx: call('/api/shops/'),
+    ('shop-list', 'POST'): lambda fx: call('/api/shops/', 'POST', {"shop_domain": new_shop_domain(fx), "shop_name": "Created"}, status=201),
+    ('shop-detail', 'GET'): lambda fx: call(f'/api/shops/{fx.shop.pk}/'),
+    ('shop-detail', 'PUT'): lambda fx: call(f'/api/shops/{fx.shop.pk}/', 'PUT', {"shop_domain": fx.shop.shop_domain, "shop_name": "Renamed"}),
+    ('shop-detail', 'PATCH'): lambda fx: call(f'/api/shops/{fx.shop.pk}/', 'PATCH', {"shop_name": "Renamed"}),
+    ('shop-detail', 'DELETE'): lambda fx: call(f'/api/shops/{fx.shop.pk}/', 'DELETE', status=204),
+    ('product-list', 'GET'): lambda fx: call('/api/products/'),
+    ('product-list', 'POST'): lambda fx: call('/api/products/', 'POST', {"shop": fx.shop.pk, "shopify_id": f"new-{fx.size}", "title": "New"}, status=201),
+    ('product-sync', 'POST'): lambda fx: call('/api/products/sync/', 'POST', {}),
+    ('product-detail', 'GET'): lambda fx: call(f'/api/products/{fx.product.pk}/'),
+    ('product-detail', 'PUT'): lambda fx: call(f'/api/products/{fx.product.pk}/', 'PUT', {"shop": fx.shop.pk, "shopify_id": fx.product.pk, "title": "Renamed"}),
+    ('product-detail', 'PATCH'): lambda fx: call(f'/api/products/{fx.product.pk}/', 'PATCH', {"title": "Renamed"}),
+    ('product-detail', 'DELETE'): lambda fx: call(f'/api/products/{fx.product.pk}/', 'DELETE', status=204),
+    ('faq-list', 'GET'): lambda fx: call('/api/faq/'),
+    ('faq-list', 'POST'): lambda fx: call('/api/faq/', 'POST', {"product": fx.product.pk, "questions_answers": [{"question": "Q?", "answer": "R."}], "num_questions": 1, "html_content": "<p></p>"}, status=201),
+    ('faq-generate-faq', 'POST'): lambda fx: call('/api/faq/generate-faq/', 'POST', {"productId": fx.product.shopify_id}),
+    ('faq-detail', 'GET'): lambda fx: call(f'/api/faq/{fx.faq.pk}/'),
+    ('faq-detail', 'PUT'): lambda fx: call(f'/api/faq/{fx.faq.pk}/', 'PUT', {"product": fx.product.pk, "questions_answers": [{"question": "Q?", "answer": "R."}], "num_questions": 1, "html_content": "<p></p>"}),
+    ('faq-detail', 'PATCH'): lambda fx: call(f'/api/faq/{fx.faq.pk}/', 'PATCH', {"num_questions": 1}),
+    ('faq-detail', 'DELETE'): lambda fx: call(f'/api/faq/{fx.faq.pk}/', 'DELETE', status=204),
+    ('faqitem-list', 'GET'): lambda fx: call(f'/api/faq-items/?faq={fx.faq.pk}&search=Q'),
+    ('faqitem-list', 'POST'): lambda fx: call('/api/faq-items/', 'POST', {"faq": fx.faq.pk, "language": "fr", "question": "New?", "answer": "Yes."}, status=201),
+    ('faqitem-detail', 'GET'): lambda fx: call(f'/api/faq-items/{fx.item.pk}/'),
+    ('faqitem-detail', 'PUT'): lambda fx: call(f'/api/faq-items/{fx.item.pk}/', 'PUT', {"faq": fx.faq.pk, "language": "fr", "question": "Q2?", "answer": "R2."}),
+    ('faqitem-detail', 'PATCH'): lambda fx: call(f'/api/faq-items/{fx.item.pk}/', 'PATCH', {"answer": "R2."}),
+    ('faqitem-detail', 'DELETE'): lambda fx: call(f'/api/faq-items/{fx.item.pk}/', 'DELETE', status=204),
+    ('activitylog-list', 'GET'): lambda fx: call('/api/logs/'),
+    ('activitylog-clear', 'DELETE'): lambda fx: call('/api/logs/clear/', 'DELETE'),
+    ('activitylog-stats', 'GET'): lambda fx: call('/api/logs/stats/?by_operation=true'),
+    ('activitylog-detail', 'GET'): lambda fx: call(f'/api/logs/{fx.log.pk}/'),
+    ('config-list', 'GET'): lambda fx: call('/api/config/'),
+    ('config-list', 'POST'): lambda fx: call('/api/config/', 'POST', {"shop": fx.shop.pk, "shopify_store_url": "https://x", "shopify_access_token_encrypted": "t"}, status=400),
+    ('config-keys', 'GET'): lambda fx: call('/api/config/keys/'),
+    ('config-keys', 'POST'): lambda fx: call('/api/config/keys/', 'POST', {"custom_prompt": "Be brief", "claude_model": "claude-3-haiku-20240307"}),
+    ('config-detail', 'GET'): lambda fx: call(f'/api/config/{fx.shop.api_configuration.pk}/'),
+    ('config-detail', 'PUT'): lambda fx: call(f'/api/config/{fx.shop.api_configuration.pk}/', 'PUT', {"shop": fx.shop.pk, "shopify_store_url": "https://x", "shopify_access_token_encrypted": "t"}),
+    ('config-detail', 'PATCH'): lambda fx: call(f'/api/config/{fx.shop.api_configuration.pk}/', 'PATCH', {"custom_prompt": "Be brief"}),
+    ('config-detail', 'DELETE'): lambda fx: call(f'/api/config/{fx.shop.api_configuration.pk}/', 'DELETE', status=204),
+    ('design-list', 'GET'): lambda fx: call('/api/design/'),
+    ('design-detail', 'GET'): lambda fx: call(f'/api/design/{fx.shop.faq_design.pk}/'),
+    ('design-detail', 'PUT'): lambda fx: call(f'/api/design/{fx.shop.faq_design.pk}/', 'PUT', {"question_color": "#000000"}),
+    ('design-detail', 'PATCH'): lambda fx: call(f'/api/design/{fx.shop.faq_design.pk}/', 'PATCH', {"question_color": "#000000"}),
+    ('bulk-start', 'POST'): lambda fx: call('/api/bulk/start/', 'POST', {"mode": "ALL"}),
+    ('bulk-cancel', 'POST'): lambda fx: call('/api/bulk/cancel/', 'POST', {}),
+    ('bulk-status', 'GET'): lambda fx: call('/api/bulk/status/'),
+    ('usage-list', 'GET'): lambda fx: call('/api/usage/'),
+    ('plan-list', 'GET'): lambda fx: call('/api/subscriptions/plans/'),
+    ('plan-detail', 'GET'): lambda fx: call(f'/api/subscriptions/plans/{fx.plan.pk}/'),
+    ('subscription-list', 'GET'): lambda fx: call('/api/subscriptions/'),
+    ('subscription-current', 'GET'): lambda fx: call('/api/subscriptions/current/'),
+    ('subscription-subscribe', 'POST'): lambda fx: call('/api/subscriptions/subscribe/', 'POST', {"plan_id": fx.plan.pk}),
+    ('subscription-cancel', 'POST'): lambda fx: call('/api/subscriptions/cancel/', 'POST', {}),
+    ('subscription-callback', 'GET'): lambda fx: call(f'/api/subscriptions/callback/?shop={fx.shop.shop_domain}&charge_id=77', status=302, auth=False),
+}
+
+SETUP = {
+    ('bulk-start', 'POST'): no_active_job,
+    ('subscription-callback', 'GET'): pending_subscription,
+}
+
+
+def shopify_products_response(*args, **kwargs):
+    response = Mock(status_code=200, headers={})
+    response.json.return_value = {"products": [
+        {"id": 9000 + i, "title": f"Synced {i}", "handle": f"synced-{i}", "vendor": "V", "product_type": "T",
+         "body_html": "", "images": [], "created_at": "2024-01-01T00:00:00Z", "updated_at": "2024-01-01T00:00:00Z"}
+        for i in range(SYNC_PAGE_SIZE)
+    ]}
+    return response
+
+
+def anthropic_response():
+    response = Mock(status_code=200)
+    response.raise_for_status.return_value = None
+    response.json.return_value = {
+        "content": [{"text": json.dumps({lang: [{"question": "Q?", "answer": "A."}] for lang in ('fr', 'en', 'es')})}],
+        "usage": {"input_tokens": 10, "output_tokens": 20},
+    }
+    return response
+
+
+def shopify_graphql(query, variables=None):
+    if 'appSubscriptionCreate' in query:
+        return json.dumps({"data": {"appSubscriptionCreate": {
+            "userErrors": [], "confirmationUrl": "https://example.com/confirm",
+            "appSubscription": {"id": "gid://shopify/AppSubscription/78", "status": "PENDING"},
+        }}})
+    if 'appSubscriptionCancel' in query:
+        return json.dumps({"data": {"appSubscriptionCancel": {"userErrors": [], "appSubscription": {"status": "CANCELLED"}}}})
+    return json.dumps({"data": {"node": {"status": "ACTIVE"}}})
+
+
+class QueryBudgetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        install_search_index() # Search routes
+        super().setUpClass()
+
+    def setUp(self):
+        mocks = [
+            patch.dict(os.environ, {"ANTHROPIC_API_KEY": "test-key", "INTERNAL_API_SECRET": INTERNAL_SECRET}),
+            patch('faq_app.views.requests.get', side_effect=shopify_products_response),
+            patch('faq_app.services.ai_service.requests.post', return_value=anthropic_response()),
+            patch('faq_app.services.ai_service.get_async_client', return_value=Mock(post=AsyncMock(return_value=anthropic_response()))),
+            patch('faq_app.views.BulkFAQGenerator'), # No job thread
+            patch('subscriptions.views.shopify.GraphQL', return_value=Mock(execute=Mock(side_effect=shopify_graphql))),
+        ]
+        for mock in mocks:
+            mock.start()
+            self.addCleanup(mock.stop)
+
+    def measure(self, key, size):
+        """
+        (status, queries) for one cold-cache request of `key` at `size`,
+        rolled back afterwards.
+        """
+        with transaction.atomic():
+            fx = seed(size)
+            if key in SETUP:
+                SETUP[key](fx)
+            request = CASES[key](fx)
+            client = APIClient()
+            headers = dict(request['headers'])
+            if request['auth']:
+                headers['HTTP_AUTHORIZATION'] = f"Bearer {fx.token}"
+            if request['secret']:
+                headers['HTTP_X_INTERNAL_SECRET'] = INTERNAL_SECRET
+            cold_caches()
+            send = getattr(client, request['method'].lower())
+            if request['method'] != 'GET' and 'content_type' not in headers:
+                headers['format'] = 'json'
+            with CaptureQueriesContext(connection) as queries:
+                response = send(request['path'], request['data'], **headers)
+            transaction.set_rollback(True)
+        cold_caches()
+        self.assertEqual(response.status_code, request['status'],
+                         f"{key} at size {size}: {getattr(response, 'content', b'')[:300]!r}")
+        return [query['sql'] for query in queries.captured_queries]
+
+    def test_every_route_has_a_budget(self):
+        routes = registered_routes()
+        missing = []
+        for name, methods in routes.items():
+            if methods is None:
+                if not any(key[0] == name for key in QUERY_BUDGETS):
+                    missing.append((name, '*'))
+                continue
+            missing.extend((name, method) for method in sorted(methods) if (name, method) not in QUERY_BUDGETS)
+        self.assertEqual(missing, [], "Add these routes to QUERY_BUDGETS and CASES")
+
+        stale = [key for key in QUERY_BUDGETS if key[0] not in routes]
+        self.assertEqual(stale, [], "QUERY_BUDGETS entries for routes that no longer exist")
+        self.assertEqual(set(CASES), set(QUERY_BUDGETS))
+
+    def test_query_counts_are_flat_and_within_budget(self):
+        for key, budget in QUERY_BUDGETS.items():
+            with self.subTest(route=key):
+                small = self.measure(key, SMALL)
+                large = self.measure(key, LARGE)
+                self.assertEqual(
+                    len(small), len(large),
+                    f"{key}: {len(small)} queries at {SMALL} rows, {len(large)} at {LARGE}:\n" + '\n'.join(large)
+                )
+                self.assertLessEqual(len(large), budget, f"{key} over budget:\n" + '\n'.join(large))
@@ -1,10 +1,24 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
 from rest_framework import status
-from .models import Shop, Product, FAQ
+from rest_framework.exceptions import AuthenticationFailed
+from .models import Shop, Product, FAQ, FAQItem, APIConfiguration, AIUsageDaily, ActivityLog, ActivityLogDailyStat
+from .services.activity_log import ActivityLogSink, log_activity
+from .services.log_retention import add_months, delete_in_chunks, prune_activity_logs
+from .services.activity_stats import rebuild_stats
+from .services.ai_service import generate_faq_for_product
+from .serializers import ProductSerializer
+from unittest.mock import patch, Mock, AsyncMock
+from asgiref.sync import sync_to_async
+import gzip
+import json
 import jwt
 import os
+import tempfile
 from datetime import datetime, timedelta
 
 class ShopModelTest(TestCase):
@@ -136,3 +150,1416 @@ class TestStorefrontProductSearch(TestCase):
         response = self.client.get('/api/storefront/products/search/?q=Apple')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
+
+class AIUsageTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.shop = Shop.objects.create(shop_domain="usage.myshopify.com", shop_name="Usage Shop")
+        self.client.force_authenticate(user=self.shop)
+        self.product = Product.objects.create(shop=self.shop, shopify_id="555", title="Usage Product")
+        self.config = APIConfiguration.objects.create(
+            shop=self.shop,
+            shopify_store_url="https://usage.myshopify.com",
+            shopify_access_token_encrypted="token",
+        )
+
+    def _mock_anthropic(self, mock_post, input_tokens=120, output_tokens=480):
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.raise_for_status.return_value = None
+        mock_post.return_value.json.return_value = {
+            "model": "claude-3-haiku-20240307",
+            "content": [{"text": json.dumps({"fr": [{"question": "Q?", "answer": "R!"}], "en": [], "es": []})}],
+            "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens},
+        }
+
+    @patch.dict(os.environ, {"ANTHROPIC_API_KEY": "test-key"})
+    @patch('faq_app.services.ai_service.requests.post')
+    def test_usage_is_aggregated_per_day_and_model(self, mock_post):
+        self._mock_anthropic(mock_post)
+        generate_faq_for_product(self.product, self.config, num_questions=1)
+        generate_faq_for_product(self.product, self.config, num_questions=1)
+
+        row = AIUsageDaily.objects.get(shop=self.shop)
+        self.assertEqual(row.request_count, 2)
+        self.assertEqual(row.input_tokens, 240)
+        self.assertEqual(row.output_tokens, 960)
+
+    @patch.dict(os.environ, {"ANTHROPIC_API_KEY": "test-key"})
+    @patch('faq_app.services.ai_service.requests.post')
+    def test_budget_blocks_dispatch(self, mock_post):
+        self._mock_anthropic(mock_post)
+        self.config.monthly_token_budget = 500
+        self.config.save()
+
+        generate_faq_for_product(self.product, self.config, num_questions=1)
+        result = generate_faq_for_product(self.product, self.config, num_questions=1)
+
+        self.assertEqual(result.get('code'), 'token_budget_exceeded')
+        self.assertEqual(mock_post.call_count, 1)
+
+    @patch.dict(os.environ, {"ANTHROPIC_API_KEY": "test-key"})
+    @patch('faq_app.services.ai_service.requests.post')
+    def test_generate_endpoint_sets_duration_and_usage_endpoint(self, mock_post):
+        self._mock_anthropic(mock_post)
+        response = self.client.post('/api/faq/generate-faq/', {"productId": "555"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(FAQ.objects.get(product=self.product).generation_duration_seconds)
+
+        response = self.client.get('/api/usage/?days=7')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['totals']['requests'], 1)
+        self.assertEqual(response.data['totals']['input_tokens'], 120)
+        self.assertEqual(response.data['by_model'][0]['model'], "claude-3-haiku-20240307")
+        self.assertIsNone(response.data['budget']['monthly_token_budget'])
+
+class AsyncViewsTest(TestCase):
+    def setUp(self):
+        self.shop = Shop.objects.create(shop_domain="async.myshopify.com", shop_name="Async Shop")
+        self.product = Product.objects.create(shop=self.shop, shopify_id="777", title="Async Product", handle="async-product")
+        FAQ.objects.create(
+            product=self.product,
+            questions_answers=[{"question": "Q?", "answer": "A!"}],
+            html_content="",
+            num_questions=1
+        )
+
+    async def test_async_storefront_faq_matches_sync(self):
+        url = f'/api/storefront/faq/?shop={self.shop.shop_domain}&handle=async-product'
+        sync_response = await sync_to_async(APIClient().get)(url)
+        async_response = await self.async_client.get(url.replace('/api/', '/api/async/'))
+        self.assertEqual(async_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(async_response.json(), sync_response.json())
+
+    async def test_async_product_search(self):
+        response = await self.async_client.get(f'/api/async/storefront/products/search/?shop={self.shop.shop_domain}&q=Async')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([p['title'] for p in response.json()], ["Async Product"])
+
+    @patch.dict(os.environ, {"ANTHROPIC_API_KEY": "test-key"})
+    @patch('faq_app.services.ai_service.get_async_client')
+    async def test_async_generate_faq(self, mock_client):
+        ai_response = Mock()
+        ai_response.raise_for_status.return_value = None
+        ai_response.json.return_value = {
+            "content": [{"text": json.dumps({"fr": [{"question": "Q?", "answer": "R!"}], "en": [], "es": []})}],
+            "usage": {"input_tokens": 10, "output_tokens": 20},
+        }
+        mock_client.return_value.post = AsyncMock(return_value=ai_response)
+
+        secret = os.environ.get('SHOPIFY_API_SECRET', 'your_secret_here')
+        token = jwt.encode({"dest": "https://async.myshopify.com", "exp": datetime.utcnow() + timedelta(minutes=10)}, secret, algorithm='HS256')
+
+        response = await self.async_client.post(
+            '/api/async/faq/generate-faq/',
+            {"productId": "777"},
+            content_type='application/json',
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['count'], 1)
+        self.assertEqual(await AIUsageDaily.objects.filter(shop=self.shop).acount(), 1)
+
+    async def test_async_generate_requires_auth(self):
+        response = await self.async_client.post('/api/async/faq/generate-faq/', {"productId": "777"}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+class AuthenticationCacheTest(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        from .authentication import _token_cache
+        _token_cache.clear()
+        cache.clear()
+        self.shop = Shop.objects.create(shop_domain="auth-cache.myshopify.com", shop_name="Auth Shop")
+        secret = os.environ.get('SHOPIFY_API_SECRET', 'your_secret_here')
+        self.token = jwt.encode(
+            {"dest": "https://auth-cache.myshopify.com", "exp": datetime.utcnow() + timedelta(minutes=10)},
+            secret, algorithm='HS256'
+        )
+
+    def _authenticate(self, token=None):
+        from django.test import RequestFactory
+        from .authentication import ShopifyAuthentication
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token or self.token}')
+        return ShopifyAuthentication().authenticate(request)[0]
+
+    def test_second_request_skips_decode_and_db(self):
+        first = self._authenticate()
+        with patch('faq_app.authentication.jwt.decode') as mock_decode, self.assertNumQueries(0):
+            second = self._authenticate()
+        mock_decode.assert_not_called()
+        self.assertEqual(second.pk, self.shop.pk)
+        self.assertIsNot(first, second)
+
+    def test_uninstall_invalidates_shop(self):
+        self._authenticate()
+        Shop.objects.get(pk=self.shop.pk).delete()
+        with self.assertNumQueries(2):  # lookup misses, then the existing auto-create flow runs
+            shop = self._authenticate()
+        self.assertNotEqual(shop.pk, self.shop.pk)
+
+    def test_uninstall_reaches_other_workers(self):
+        from django.core.cache.backends.filebased import FileBasedCache
+        from .authentication import peek_cached_shop, shop_cache_key
+        with tempfile.TemporaryDirectory() as location:
+            shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}
+            with override_settings(CACHES=shared):
+                self._authenticate()
+                # Another worker: its own cache client on the same store
+                other_worker = FileBasedCache(location, {})
+                self.assertIsNotNone(other_worker.get(shop_cache_key(self.shop.shop_domain)))
+                Shop.objects.get(pk=self.shop.pk).delete()
+                self.assertIsNone(other_worker.get(shop_cache_key(self.shop.shop_domain)))
+                self.assertIsNone(peek_cached_shop(self.shop.shop_domain))
+
+    def test_expired_token_is_not_served_from_cache(self):
+        from .authentication import _token_cache
+        self._authenticate()
+        _token_cache.set(self.token, self.shop.shop_domain, 0)
+        with patch('faq_app.authentication.jwt.decode', side_effect=jwt.ExpiredSignatureError):
+            with self.assertRaises(AuthenticationFailed):
+                self._authenticate()
+
+class ActivityLogSinkTest(TestCase):
+    def setUp(self):
+        self.shop = Shop.objects.create(shop_domain="sink.myshopify.com", shop_name="Sink Shop")
+
+    def test_log_activity_writes_synchronously_in_tests(self):
+        log_activity(self.shop, 'info', 'manual_sync', "Synced")
+        self.assertEqual(ActivityLog.objects.filter(shop=self.shop).count(), 1)
+
+    def test_buffered_entries_are_written_in_one_bulk_insert(self):
+        sink = ActivityLogSink(flush_size=500, autostart=False)
+        for i in range(50):
+            sink.enqueue(ActivityLog(id=f"log-{i}", shop=self.shop, level='success', operation='generate_faq_bulk', message="ok"))
+        self.assertEqual(ActivityLog.objects.count(), 0)
+
+        with CaptureQueriesContext(connection) as queries:
+            written = sink.flush()
+        self.assertEqual(written, 50)
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('INSERT INTO "activity_logs"')]), 1)
+        self.assertEqual(sink.pending(), 0)
+
+    def test_bad_row_does_not_drop_batch(self):
+        sink = ActivityLogSink(autostart=False)
+        sink.enqueue(ActivityLog(id="dup", shop=self.shop, level='info', operation='op', message="first"))
+        sink.enqueue(ActivityLog(id="dup", shop=self.shop, level='info', operation='op', message="second"))
+        sink.enqueue(ActivityLog(id="ok", shop=self.shop, level='info', operation='op', message="third"))
+        self.assertEqual(sink.flush(), 2)
+
+
+class ActivityLogRetentionTest(TestCase):
+    def setUp(self):
+        self.shop = Shop.objects.create(shop_domain="retention.myshopify.com", shop_name="Retention Shop")
+        now = timezone.now()
+        for i in range(5):
+            ActivityLog.objects.create(id=f"old-{i}", shop=self.shop, level='info', operation='op', message="old", timestamp=now - timedelta(days=120))
+        for i in range(3):
+            ActivityLog.objects.create(id=f"new-{i}", shop=self.shop, level='info', operation='op', message="new", timestamp=now - timedelta(days=2))
+        self.cutoff = (now - timedelta(days=90)).date()
+
+    def test_prune_archives_then_deletes_expired_rows(self):
+        with tempfile.TemporaryDirectory() as archive_dir:
+            result = prune_activity_logs(self.cutoff, archive_dir=archive_dir, chunk_size=2)
+            self.assertEqual(result['deleted'], 5)
+            self.assertEqual(result['archived'], 5)
+
+            lines = []
+            for name in os.listdir(archive_dir):
+                with gzip.open(os.path.join(archive_dir, name), 'rt') as f:
+                    lines += [json.loads(line) for line in f]
+        self.assertEqual(sorted(line['id'] for line in lines), [f"old-{i}" for i in range(5)])
+        self.assertEqual(sorted(ActivityLog.objects.values_list('id', flat=True)), ["new-0", "new-1", "new-2"])
+
+    def test_dry_run_keeps_rows(self):
+        result = prune_activity_logs(self.cutoff, dry_run=True)
+        self.assertEqual(result['would_delete'], 5)
+        self.assertEqual(ActivityLog.objects.count(), 8)
+
+    def test_delete_in_chunks_uses_bounded_statements(self):
+        with CaptureQueriesContext(connection) as queries:
+            deleted = delete_in_chunks(ActivityLog.objects.filter(shop=self.shop), chunk_size=3)
+        self.assertEqual(deleted, 8)
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('DELETE')]), 3)
+
+    def test_add_months_crosses_year(self):
+        self.assertEqual(add_months(datetime(2026, 11, 1).date(), 3), datetime(2027, 2, 1).date())
+
+
+class ActivityLogStatsTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.shop = Shop.objects.create(shop_domain="stats.myshopify.com", shop_name="Stats Shop")
+        self.client.force_authenticate(user=self.shop)
+
+    def test_log_writes_maintain_daily_counters(self):
+        log_activity(self.shop, 'success', 'generate_faq', "ok")
+        log_activity(self.shop, 'success', 'generate_faq', "ok")
+        log_activity(self.shop, 'error', 'manual_sync', "failed")
+
+        sink = ActivityLogSink(autostart=False)
+        for i in range(4):
+            sink.enqueue(ActivityLog(id=f"bulk-{i}", shop=self.shop, level='success', operation='generate_faq', message="ok"))
+        sink.flush()
+
+        counters = {(s.level, s.operation): s.count for s in ActivityLogDailyStat.objects.filter(shop=self.shop)}
+        self.assertEqual(counters, {('success', 'generate_faq'): 6, ('error', 'manual_sync'): 1})
+
+    def test_stats_endpoint_reads_rollups_with_range_and_operations(self):
+        today = timezone.now().date()
+        ActivityLogDailyStat.objects.create(shop=self.shop, date=today, level='success', operation='generate_faq', count=5)
+        ActivityLogDailyStat.objects.create(shop=self.shop, date=today, level='error', operation='generate_faq', count=2)
+        ActivityLogDailyStat.objects.create(shop=self.shop, date=today - timedelta(days=10), level='success', operation='manual_sync', count=7)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/logs/stats/', {'start': (today - timedelta(days=3)).isoformat(), 'by_operation': 'true'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['level_counts'], {'error': 2, 'success': 5})
+        self.assertEqual(response.data['operation_counts'], {'generate_faq': {'error': 2, 'success': 5}})
+        self.assertFalse([q for q in queries if 'activity_logs"' in q['sql'] or 'activity_logs`' in q['sql']])
+
+        response = self.client.get('/api/logs/stats/')
+        self.assertEqual(response.data['level_counts'], {'error': 2, 'success': 12})
+        self.assertNotIn('operation_counts', response.data)
+
+        response = self.client.get('/api/logs/stats/', {'start': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_rebuild_reconciles_with_raw_logs(self):
+        now = timezone.now()
+        ActivityLog.objects.create(id="a", shop=self.shop, level='info', operation='op', message="m", timestamp=now)
+        ActivityLog.objects.create(id="b", shop=self.shop, level='info', operation='op', message="m", timestamp=now - timedelta(days=1))
+        ActivityLogDailyStat.objects.create(shop=self.shop, date=now.date(), level='info', operation='op', count=99)
+
+        self.assertEqual(rebuild_stats(shop=self.shop), 2)
+        self.assertEqual(
+            sorted(ActivityLogDailyStat.objects.values_list('date', 'count')),
+            [((now - timedelta(days=1)).date(), 1), (now.date(), 1)]
+        )
+
+    def test_clear_drops_counters(self):
+        log_activity(self.shop, 'info', 'op', "m")
+        response = self.client.delete('/api/logs/clear/')
+        self.assertEqual(response.data['deleted'], 1)
+        self.assertFalse(ActivityLogDailyStat.objects.filter(shop=self.shop).exists())
+
+    @override_settings(ACTIVITY_LOG_BUFFERED=True)
+    def test_clear_drops_buffered_logs(self):
+        sink = ActivityLogSink(autostart=False)
+        with patch('faq_app.services.activity_log._sink', sink):
+            log_activity(self.shop, 'info', 'op', "m")
+            self.assertEqual(sink.pending(), 1)
+            response = self.client.delete('/api/logs/clear/')
+            self.assertEqual(response.data['deleted'], 1)
+            self.assertEqual(sink.flush(), 0)
+        self.assertFalse(ActivityLog.objects.filter(shop=self.shop).exists())
+        self.assertFalse(ActivityLogDailyStat.objects.filter(shop=self.shop).exists())
+
+    def test_logs_cannot_be_written_around_the_rollups(self):
+        log_activity(self.shop, 'error', 'op', "m")
+        log = ActivityLog.objects.get(shop=self.shop)
+        self.assertEqual(self.client.delete(f'/api/logs/{log.pk}/').status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+        self.assertEqual(self.client.patch(f'/api/logs/{log.pk}/', {'level': 'info'}, format='json').status_code,
+                         status.HTTP_405_METHOD_NOT_ALLOWED)
+        response = self.client.post('/api/logs/', {'id': 'x', 'shop': self.shop.pk, 'level': 'info', 'operation': 'op', 'message': "m"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+        self.assertEqual(self.client.get('/api/logs/stats/').data['level_counts'], {'error': 1})
+        self.assertEqual(ActivityLog.objects.filter(shop=self.shop).count(), 1)
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.shop = Shop.objects.create(shop_domain="pages.myshopify.com", shop_name="Pages Shop")
+        self.client.force_authenticate(user=self.shop)
+        for i in range(45):
+            Product.objects.create(shop=self.shop, shopify_id=f"p{i:03d}", title=f"Product {i}")
+        # Many rows sharing one timestamp: the pk tie-breaker must keep pages stable
+        Product.objects.filter(shopify_id__lt="p030").update(updated_at=timezone.now() - timedelta(days=1))
+
+    def test_default_stays_page_number(self):
+        response = self.client.get('/api/products/')
+        self.assertEqual(response.data['count'], 45)
+        self.assertEqual(len(response.data['results']), 20)
+
+    def test_cursor_walk_visits_every_row_once(self):
+        seen = []
+        url = '/api/products/?pagination=cursor'
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            self.assertFalse([q for q in queries if 'COUNT(*)' in q['sql'] or 'OFFSET' in q['sql']])
+            seen += [p['shopify_id'] for p in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(len(seen), 45)
+        self.assertEqual(len(set(seen)), 45)
+        self.assertEqual(seen[:15], [f"p{i:03d}" for i in range(44, 29, -1)])
+
+    def test_previous_link_returns_previous_page(self):
+        first = self.client.get('/api/products/?pagination=cursor')
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(
+            [p['shopify_id'] for p in back.data['results']],
+            [p['shopify_id'] for p in first.data['results']]
+        )
+        self.assertIsNone(back.data['previous'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/products/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ORJSONRendererTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.shop = Shop.objects.create(shop_domain="json.myshopify.com", shop_name="JSON Shop")
+        self.client.force_authenticate(user=self.shop)
+        self.product = Product.objects.create(shop=self.shop, shopify_id="json-1", title="JSON Product", handle="json-product")
+        self.qa = [{"question": "Livraison ?", "answer": "Oui, en 48h\u2028partout."}]
+        self.faq = FAQ.objects.create(product=self.product, questions_answers=self.qa, questions_answers_en=self.qa, html_content="", num_questions=1)
+
+    def test_output_matches_stdlib_renderer(self):
+        from decimal import Decimal
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import ORJSONRenderer
+        data = {
+            "when": timezone.now(),
+            "day": timezone.now().date(),
+            "price": Decimal("4.99"),
+            "text": "héllo\u2028wörld",
+            "nested": [{"a": None, "b": True, "c": 1.5}],
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_raw_json_is_spliced_without_decoding(self):
+        from .renderers import ORJSONRenderer, RawJSON, ORJSON_FRAGMENT
+        if ORJSON_FRAGMENT is None:
+            self.skipTest("orjson.Fragment not available")
+        with patch('faq_app.renderers.json.loads') as loads:
+            rendered = ORJSONRenderer().render({"faq": RawJSON('[{"question": "Q"}]')})
+        loads.assert_not_called()
+        self.assertEqual(rendered, b'{"faq":[{"question": "Q"}]}')
+
+    def test_stdlib_fallback_decodes_raw_json(self):
+        from .renderers import ORJSONRenderer, RawJSON
+        with patch('faq_app.renderers.orjson', None):
+            rendered = ORJSONRenderer().render({"faq": RawJSON('[{"question": "Q"}]')})
+        self.assertEqual(json.loads(rendered), {"faq": [{"question": "Q"}]})
+
+    def test_faq_endpoints_embed_stored_json(self):
+        response = self.client.get('/api/faq/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        faq = json.loads(response.content)['results'][0]
+        self.assertEqual(faq['questions_answers'], self.qa)
+        self.assertEqual(faq['questions_answers_en'], self.qa)
+        self.assertIsNone(faq['questions_answers_es'])
+        self.assertNotIn('\u2028'.encode(), response.content)
+
+        response = self.client.get('/api/storefront/faq/', {'shop': self.shop.shop_domain, 'handle': 'json-product'})
+        self.assertEqual(json.loads(response.content)['faq']['questions_answers'], self.qa)
+
+    def test_parser_accepts_json_body(self):
+        response = self.client.patch(f'/api/faq/{self.faq.pk}/', {"questions_answers": [{"question": "Q2", "answer": "A2"}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.faq.refresh_from_db()
+        self.assertEqual(self.faq.questions_answers, [{"question": "Q2", "answer": "A2"}])
+
+        response = self.client.generic('PATCH', f'/api/faq/{self.faq.pk}/', '{"is_active": ', content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CompressionTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.shop = Shop.objects.create(shop_domain="gzip.myshopify.com", shop_name="Gzip Shop")
+        self.product = Product.objects.create(shop=self.shop, shopify_id="gz-1", title="Gzip Product", handle="gzip-product")
+        self.qa = [{"question": f"Question {i} ?", "answer": "Une réponse assez longue pour compresser. " * 5} for i in range(10)]
+        self.faq = FAQ.objects.create(product=self.product, questions_answers=self.qa, html_content="", num_questions=10)
+        self.url = f'/api/storefront/faq/?shop={self.shop.shop_domain}&handle=gzip-product'
+
+    def test_negotiation(self):
+        from .compression import SUPPORTED_ENCODINGS, negotiate_encoding
+        self.assertEqual(negotiate_encoding('gzip, deflate'), 'gzip')
+        self.assertIsNone(negotiate_encoding('identity'))
+        self.assertIsNone(negotiate_encoding('gzip;q=0'))
+        self.assertIsNone(negotiate_encoding(''))
+        self.assertEqual(negotiate_encoding('*'), SUPPORTED_ENCODINGS[0])
+        self.assertEqual(negotiate_encoding('br;q=0.5, gzip;q=0.9'), 'gzip')
+
+    def test_storefront_payload_is_compressed_once_per_version(self):
+        import gzip as gzip_module
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(json.loads(gzip_module.decompress(response.content))['faq']['questions_answers'], self.qa)
+
+        with patch('faq_app.middleware.compress') as compress, CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        compress.assert_not_called()
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+        response = self.client.get(self.url)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(json.loads(response.content)['faq']['questions_answers'], self.qa)
+
+    def test_content_change_invalidates_cached_payload(self):
+        self.client.get(self.url)
+        self.faq.questions_answers = [{"question": "Nouvelle ?", "answer": "Oui."}]
+        self.faq.save()
+        response = self.client.get(self.url)
+        self.assertEqual(json.loads(response.content)['faq']['questions_answers'], [{"question": "Nouvelle ?", "answer": "Oui."}])
+
+    def test_small_bodies_are_not_compressed(self):
+        response = self.client.get('/api/storefront/faq/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class RequestInstrumentationTest(TestCase):
+    def setUp(self):
+        from .instrumentation import registry
+        self.registry = registry
+        registry.reset()
+        self.client = APIClient()
+        self.shop = Shop.objects.create(shop_domain="metrics.myshopify.com", shop_name="Metrics Shop")
+        self.client.force_authenticate(user=self.shop)
+        Product.objects.create(shop=self.shop, shopify_id="m-1", title="Metrics Product")
+
+    def test_unsampled_requests_are_not_recorded(self):
+        with patch('faq_app.instrumentation.REQUEST_INSTRUMENTATION_SAMPLE_RATE', 0.0):
+            self.client.get('/api/products/')
+        self.assertEqual(self.registry.snapshot(), {})
+
+    @patch('faq_app.instrumentation.REQUEST_INSTRUMENTATION_SAMPLE_RATE', 1.0)
+    def test_sampled_request_records_queries_and_size(self):
+        response = self.client.get('/api/products/')
+        stats = self.registry.snapshot()['GET product-list']
+        self.assertEqual(stats['count'], 1)
+        self.assertGreaterEqual(stats['avg_queries'], 2)
+        self.assertEqual(stats['avg_response_bytes'], len(response.content))
+        self.assertEqual(stats['latency_ms']['buckets']['le_inf'], 1)
+
+    @patch('faq_app.instrumentation.REQUEST_INSTRUMENTATION_SAMPLE_RATE', 1.0)
+    @patch('faq_app.instrumentation.REQUEST_SLOW_QUERY_COUNT', 1)
+    def test_slow_request_log_lists_top_queries(self):
+        with self.assertLogs('faq_app.instrumentation', 'WARNING') as logs:
+            self.client.get('/api/products/')
+        self.assertEqual(len(logs.records), 1)
+        entry = logs.records[0]
+        self.assertEqual(entry.endpoint, 'GET product-list')
+        self.assertTrue(entry.top_queries)
+        self.assertEqual(self.registry.snapshot()['GET product-list']['slow'], 1)
+
+    def test_outbound_calls_are_timed(self):
+        import requests as http
+        from .instrumentation import RequestRecorder
+        with RequestRecorder() as recorder:
+            with self.assertRaises(http.exceptions.ConnectionError):
+                http.get('http://127.0.0.1:9/', timeout=1)
+        self.assertEqual(recorder.outbound_count, 1)
+
+    def test_stats_endpoint_requires_internal_secret(self):
+        response = self.client.get('/api/internal/request-stats/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.get('/api/internal/request-stats/', HTTP_X_INTERNAL_SECRET=os.environ.get('INTERNAL_API_SECRET', 'my_dev_secret'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('endpoints', response.data)
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        from .metrics import REGISTRY
+        REGISTRY.reset()
+        self.client = APIClient()
+        self.shop = Shop.objects.create(shop_domain="prom.myshopify.com", shop_name="Prom Shop", shopify_access_token_encrypted="token")
+        self.secret = os.environ.get('INTERNAL_API_SECRET', 'my_dev_secret')
+
+    def test_exposition_format(self):
+        from .metrics import MetricsRegistry, Counter, Histogram
+        registry = MetricsRegistry()
+        counter = Counter('jobs_total', 'Jobs', ['status'], registry=registry)
+        histogram = Histogram('wait_seconds', 'Wait', buckets=(1, 5), registry=registry)
+        counter.inc(status='DONE')
+        counter.inc(2, status='say "hi"')
+        histogram.observe(0.5)
+        histogram.observe(3)
+        histogram.observe(10)
+        text = registry.expose()
+        self.assertIn('# TYPE jobs_total counter', text)
+        self.assertIn('jobs_total{status="DONE"} 1\n', text)
+        self.assertIn('jobs_total{status="say \\"hi\\""} 2\n', text)
+        self.assertIn('wait_seconds_bucket{le="1"} 1\n', text)
+        self.assertIn('wait_seconds_bucket{le="5"} 2\n', text)
+        self.assertIn('wait_seconds_bucket{le="+Inf"} 3\n', text)
+        self.assertIn('wait_seconds_sum 13.5\n', text)
+        self.assertIn('wait_seconds_count 3\n', text)
+
+    def test_multiprocess_files_are_merged(self):
+        from .metrics import MetricsRegistry, Counter, Gauge
+        with tempfile.TemporaryDirectory() as tmp:
+            registry = MetricsRegistry(tmp)
+            counter = Counter('syncs_total', 'Syncs', registry=registry)
+            gauge = Gauge('running', 'Running', registry=registry)
+            counter.inc(3)
+            gauge.set(1)
+            # Files left behind by another worker that has since exited
+            with open(os.path.join(tmp, 'metrics-999999999-1.json'), 'w') as f:
+                json.dump({'syncs_total': [[[], 4]], 'running': [[[], 7]]}, f)
+            samples = registry.collect()
+            self.assertEqual(samples['syncs_total'][()], 7)
+            self.assertEqual(samples['running'][()], 1)
+            # Folded into the dead-process totals, which the next collect still counts
+            self.assertFalse(os.path.exists(os.path.join(tmp, 'metrics-999999999-1.json')))
+            self.assertEqual(registry.collect()['syncs_total'][()], 7)
+
+    def test_reused_pid_does_not_overwrite_dead_worker(self):
+        from .metrics import MetricsRegistry, Counter, DEAD_FILE
+        with tempfile.TemporaryDirectory() as tmp:
+            registry = MetricsRegistry(tmp)
+            counter = Counter('syncs_total', 'Syncs', registry=registry)
+            counter.inc()
+            # An earlier process that had this process's pid
+            with open(os.path.join(tmp, f'metrics-{os.getpid()}-0.json'), 'w') as f:
+                json.dump({'syncs_total': [[[], 5]]}, f)
+            samples = registry.collect()
+            files = sorted(os.listdir(tmp))
+        self.assertEqual(samples['syncs_total'][()], 6)
+        self.assertEqual(files, sorted([DEAD_FILE, 'metrics-dead.lock', registry.process_file_name()]))
+
+    def test_metrics_endpoint_requires_secret(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION=f'Bearer {self.secret}')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('# TYPE faq_http_requests_total counter', response.content.decode())
+
+    def test_requests_are_counted_per_view(self):
+        from .metrics import HTTP_REQUESTS
+        self.client.force_authenticate(user=self.shop)
+        self.client.get('/api/products/')
+        self.assertEqual(HTTP_REQUESTS.values[('product-list', 'GET', '200')], 1)
+
+    def test_storefront_cache_hits_and_misses(self):
+        from .metrics import STOREFRONT_CACHE
+        from .services.storefront_cache import get_payload, store_payload
+        get_payload('metrics-test-key')
+        store_payload('metrics-test-key', {'faqs': []})
+        get_payload('metrics-test-key')
+        self.assertEqual(STOREFRONT_CACHE.values, {('miss',): 1, ('hit',): 1})
+
+    @patch('faq_app.views.time.sleep')
+    @patch('faq_app.views.requests.get')
+    def test_sync_retries_after_shopify_throttling(self, mock_get, mock_sleep):
+        from .metrics import SHOPIFY_REQUESTS, SHOPIFY_THROTTLE_WAIT, SYNC_PRODUCTS
+        throttled = Mock(status_code=429, headers={'Retry-After': '2.0'})
+        page = Mock(status_code=200, headers={})
+        page.json.return_value = {'products': [{
+            'id': 1, 'title': 'P', 'handle': 'p', 'vendor': 'V', 'product_type': 'T', 'body_html': '',
+            'images': [], 'created_at': '2024-01-01T00:00:00Z', 'updated_at': '2024-01-01T00:00:00Z',
+        }]}
+        mock_get.side_effect = [throttled, page]
+        self.client.force_authenticate(user=self.shop)
+        response = self.client.post('/api/products/sync/')
+        self.assertEqual(response.status_code, 200)
+        mock_sleep.assert_called_once_with(2.0)
+        self.assertEqual(SHOPIFY_REQUESTS.values, {('429',): 1, ('200',): 1})
+        self.assertEqual(SHOPIFY_THROTTLE_WAIT.values[()][-1], 2.0)
+        self.assertEqual(SYNC_PRODUCTS.values, {('created',): 1})
+
+
+class StructuredLoggingTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.shop = Shop.objects.create(shop_domain="logs.myshopify.com", shop_name="Logs Shop")
+
+    def test_request_id_is_echoed_and_bound_to_log_records(self):
+        import logging
+        from .structured_logging import RequestIdFilter
+        logger = logging.getLogger('faq_app.views_storefront')
+        request_id_filter = RequestIdFilter()
+        logger.addFilter(request_id_filter)
+        try:
+            with self.assertLogs(logger, 'INFO') as logs:
+                response = self.client.get('/api/storefront/faq/', {'shop': 'missing.myshopify.com', 'handle': 'x'},
+                                           HTTP_X_REQUEST_ID='req-123')
+        finally:
+            logger.removeFilter(request_id_filter)
+        self.assertTrue(logs.records)
+        self.assertEqual(response['X-Request-ID'], 'req-123')
+        self.assertTrue(all(record.request_id == 'req-123' for record in logs.records))
+
+    def test_invalid_request_id_is_replaced(self):
+        response = self.client.get('/api/storefront/faq/', HTTP_X_REQUEST_ID='bad id\n')
+        self.assertRegex(response['X-Request-ID'], r'^[0-9a-f]{32}$')
+
+    def test_json_formatter_includes_extra_fields(self):
+        import logging
+        from .structured_logging import JSONFormatter
+        record = logging.LogRecord('faq_app.test', logging.WARNING, __file__, 1, "Slow %s", ('GET x',), None)
+        record.request_id = 'abc'
+        record.latency_ms = 12.5
+        entry = json.loads(JSONFormatter().format(record))
+        self.assertEqual(entry['message'], 'Slow GET x')
+        self.assertEqual(entry['level'], 'WARNING')
+        self.assertEqual(entry['request_id'], 'abc')
+        self.assertEqual(entry['latency_ms'], 12.5)
+
+    def test_sampling_only_drops_flagged_info_records(self):
+        import logging
+        from .structured_logging import SamplingFilter
+        sampler = SamplingFilter(rate=0)
+
+        def record(level, sampled):
+            r = logging.LogRecord('faq_app.test', level, __file__, 1, 'msg', (), None)
+            if sampled:
+                r.sampled = True
+            return r
+        self.assertFalse(sampler.filter(record(logging.INFO, True)))
+        self.assertTrue(sampler.filter(record(logging.INFO, False)))
+        self.assertTrue(sampler.filter(record(logging.WARNING, True)))
+
+    def test_queue_handler_writes_from_listener_thread(self):
+        import io
+        import logging
+        from .structured_logging import JSONFormatter, QueueStreamHandler, RequestIdFilter, bind_request_id, reset_request_id
+        stream = io.StringIO()
+        handler = QueueStreamHandler(stream)
+        handler.setFormatter(JSONFormatter())
+        handler.addFilter(RequestIdFilter())
+        logger = logging.getLogger('faq_app.test_queue')
+        logger.addHandler(handler)
+        token = bind_request_id('queued')
+        try:
+            logger.warning("Shop %s", "a.myshopify.com", extra={'count': 3})
+        finally:
+            reset_request_id(token)
+            logger.removeHandler(handler)
+        handler.close()
+        entry = json.loads(stream.getvalue())
+        self.assertEqual(entry['message'], 'Shop a.myshopify.com')
+        self.assertEqual(entry['request_id'], 'queued')
+        self.assertEqual(entry['count'], 3)
+
+
+class RequestProfilingTest(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.client = APIClient()
+        self.secret = os.environ.get('INTERNAL_API_SECRET', 'my_dev_secret')
+        self.shop = Shop.objects.create(shop_domain="prof.myshopify.com", shop_name="Prof Shop")
+        self.client.force_authenticate(user=self.shop)
+        Product.objects.create(shop=self.shop, shopify_id="prof-1", title="Profiled Product")
+
+    def test_unflagged_requests_are_not_profiled(self):
+        from .models import RequestProfile
+        response = self.client.get('/api/products/', HTTP_X_SHOP_DOMAIN=self.shop.shop_domain)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_signed_header_profiles_request_with_sql_trace(self):
+        import marshal
+        from .profiling import make_profile_token
+        response = self.client.get('/api/products/', HTTP_X_PROFILE_REQUEST=make_profile_token())
+        profile_id = response['X-Profile-Id']
+        detail = self.client.get(f'/api/internal/profiles/{profile_id}/', HTTP_X_INTERNAL_SECRET=self.secret)
+        self.assertEqual(detail.data['shop_domain'], self.shop.shop_domain)
+        self.assertEqual(detail.data['profiler'], 'cprofile')
+        self.assertTrue(any('products' in q['sql'] for q in detail.data['sql_trace']))
+        download = self.client.get(f'/api/internal/profiles/{profile_id}/', {'download': 'pstats'}, HTTP_X_INTERNAL_SECRET=self.secret)
+        self.assertTrue(marshal.loads(download.content))
+
+    def test_forged_token_is_ignored(self):
+        response = self.client.get('/api/products/', HTTP_X_PROFILE_REQUEST='ops:forged:signature')
+        self.assertNotIn('X-Profile-Id', response)
+
+    def test_shop_flag_enables_profiling_until_quota(self):
+        from .models import RequestProfile
+        response = self.client.post('/api/internal/profiling/', {'shop': self.shop.shop_domain, 'minutes': 10},
+                                    format='json', HTTP_X_INTERNAL_SECRET=self.secret)
+        self.assertIsNotNone(response.data['profile_requests_until'])
+        with patch('faq_app.profiling.PROFILE_MAX_PER_SHOP', 2):
+            for _ in range(2):
+                # First request refreshes the shop cache entry the flag is read from
+                self.client.get('/api/storefront/faq/', {'shop': self.shop.shop_domain, 'handle': 'none'})
+            self.client.get('/api/storefront/faq/', {'shop': self.shop.shop_domain, 'handle': 'none'})
+            self.client.get('/api/storefront/faq/', {'shop': self.shop.shop_domain, 'handle': 'none'})
+        self.assertEqual(RequestProfile.objects.filter(shop=self.shop).count(), 2)
+
+    def test_profiles_are_size_capped_and_expire(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import RequestProfile
+        from .profiling import RequestProfiler, trim_pstats, purge_expired_profiles
+        with RequestProfiler('cprofile') as profiler:
+            json.dumps([{"n": i} for i in range(1000)])
+        stats, _ = profiler.result()
+        data, truncated = trim_pstats(stats, 600)
+        self.assertTrue(truncated)
+        self.assertLessEqual(len(data or b''), 600)
+
+        RequestProfile.objects.create(method='GET', path='/old', duration_ms=1, profiler='cprofile',
+                                      expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(purge_expired_profiles(), 1)
+
+    def test_sampling_profiler_collects_collapsed_stacks(self):
+        import time as _time
+        from .profiling import RequestProfiler
+        with RequestProfiler('sampling') as profiler:
+            deadline = _time.perf_counter() + 0.1
+            while _time.perf_counter() < deadline:
+                sum(range(1000))
+        _, collapsed = profiler.result()
+        self.assertTrue(collapsed)
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in collapsed))
+
+    def test_internal_endpoints_require_secret(self):
+        self.assertEqual(self.client.get('/api/internal/profiles/').status_code, 401)
+        self.assertEqual(self.client.post('/api/internal/profiling/', {}).status_code, 401)
+
+
+class ShopDeletionTest(TestCase):
+    def setUp(self):
+        from subscriptions.models import Plan, Subscription
+        self.client = APIClient()
+        self.secret = os.environ.get('INTERNAL_API_SECRET', 'my_dev_secret')
+        self.shop = Shop.objects.create(shop_domain="gone.myshopify.com", shop_name="Gone Shop")
+        APIConfiguration.objects.create(shop=self.shop)
+        plan = Plan.objects.create(name="Deletion Plan", price=0)
+        Subscription.objects.create(shop=self.shop, plan=plan, status='active')
+        for i in range(5):
+            product = Product.objects.create(shop=self.shop, shopify_id=f"gone-{i}", title=f"Product {i}")
+            FAQ.objects.create(product=product, questions_answers=[], html_content="<p></p>", num_questions=0)
+            ActivityLog.objects.create(id=f"gone-{i}", shop=self.shop, product=product, level='info', operation='sync', message="sync")
+        self.other = Shop.objects.create(shop_domain="kept.myshopify.com", shop_name="Kept Shop")
+        Product.objects.create(shop=self.other, shopify_id="kept-1", title="Kept")
+
+    def uninstall(self):
+        return self.client.post('/api/auth/uninstall/', {'shop': self.shop.shop_domain}, format='json',
+                                HTTP_X_INTERNAL_SECRET=self.secret)
+
+    def test_uninstall_deactivates_and_schedules(self):
+        from .models import ShopDeletionJob
+        with patch('faq_app.services.shop_deletion.ShopDeleter') as deleter:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.uninstall()
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job = ShopDeletionJob.objects.get(pk=response.data['job_id'])
+        deleter.assert_called_once_with(job.id)
+        self.shop.refresh_from_db()
+        self.assertFalse(self.shop.is_active)
+        self.assertEqual(Product.objects.filter(shop=self.shop).count(), 5)
+
+        # A repeated webhook reuses the pending job
+        with patch('faq_app.services.shop_deletion.ShopDeleter'):
+            self.assertEqual(self.uninstall().data['job_id'], job.id)
+
+    def test_uninstalled_shop_is_not_served(self):
+        from django.core.cache import cache
+        cache.clear()
+        FAQ.objects.filter(product_id="gone-0").update(questions_answers=[{"question": "Q?", "answer": "A."}], num_questions=1)
+        storefront = {'shop': self.shop.shop_domain, 'product_id': 'gone-0'}
+        secret = os.environ.get('SHOPIFY_API_SECRET', 'your_secret_here')
+        token = jwt.encode({"dest": f"https://{self.shop.shop_domain}", "exp": datetime.utcnow() + timedelta(minutes=10)},
+                           secret, algorithm='HS256')
+        # Warm the shop and payload caches first
+        self.assertEqual(self.client.get('/api/storefront/faq/', storefront).status_code, 200)
+        self.assertEqual(self.client.get('/api/products/', HTTP_AUTHORIZATION=f'Bearer {token}').status_code, 200)
+
+        with patch('faq_app.services.shop_deletion.ShopDeleter'):
+            self.assertEqual(self.uninstall().status_code, status.HTTP_202_ACCEPTED)
+        for url in ('/api/storefront/faq/', '/api/async/storefront/faq/', '/api/storefront/products/search/',
+                    '/api/async/storefront/products/search/', '/api/storefront/faq/search/'):
+            self.assertEqual(self.client.get(url, {**storefront, 'q': 'Q'}).status_code, 404, url)
+        # AuthenticationFailed; DRF answers 403 as ShopifyAuthentication sends no WWW-Authenticate
+        self.assertEqual(self.client.get('/api/products/', HTTP_AUTHORIZATION=f'Bearer {token}').status_code, 403)
+        response = self.client.get('/api/products/', HTTP_X_SHOP_DOMAIN=self.shop.shop_domain, HTTP_X_INTERNAL_SECRET=self.secret)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(Shop.objects.filter(shop_domain=self.shop.shop_domain).count(), 1) # Not auto-created again
+
+    def test_deletion_removes_every_row_in_chunks(self):
+        from subscriptions.models import Subscription
+        from .models import ShopDeletionJob
+        from .services.shop_deletion import run_shop_deletion, schedule_shop_deletion
+        with patch('faq_app.services.shop_deletion.ShopDeleter'):
+            job = schedule_shop_deletion(self.shop)
+        with CaptureQueriesContext(connection) as ctx:
+            job = run_shop_deletion(job.id, chunk_size=2, pause=0)
+        self.assertEqual(job.status, 'COMPLETED')
+        self.assertEqual(job.deleted_rows['products'], 5)
+        self.assertEqual(job.deleted_rows['shop'], 1)
+        self.assertFalse(Shop.objects.filter(pk=self.shop.pk).exists())
+        self.assertFalse(FAQ.objects.filter(product__shop_id=self.shop.pk).exists())
+        self.assertFalse(ActivityLog.objects.filter(shop_id=self.shop.pk).exists())
+        self.assertFalse(Subscription.objects.filter(shop_id=self.shop.pk).exists())
+        self.assertTrue(Product.objects.filter(shop=self.other).exists())
+        deletes = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('DELETE FROM "products"')]
+        self.assertEqual(len(deletes), 3)
+
+        # Running it again (e.g. after a crash) is a no-op
+        ShopDeletionJob.objects.filter(pk=job.pk).update(status='FAILED')
+        self.assertEqual(run_shop_deletion(job.id, pause=0).status, 'COMPLETED')
+
+    def test_failed_job_resumes_where_it_stopped(self):
+        from django.core.management import call_command
+        from .models import ShopDeletionJob
+        from .services import shop_deletion
+        with patch('faq_app.services.shop_deletion.ShopDeleter'):
+            job = shop_deletion.schedule_shop_deletion(self.shop)
+        original = shop_deletion.delete_chunk
+        with patch('faq_app.services.shop_deletion.delete_chunk',
+                   side_effect=lambda qs, size: original(qs, size) if qs.model in (FAQItem, FAQ) else 1 / 0):
+            job = shop_deletion.run_shop_deletion(job.id, pause=0)
+        self.assertEqual(job.status, 'FAILED')
+        self.assertEqual(job.current_step, 'activity_logs')
+        self.assertFalse(FAQ.objects.filter(product__shop_id=self.shop.pk).exists())
+
+        call_command('resume_shop_deletions', stdout=tempfile.TemporaryFile('w+'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('COMPLETED', 2))
+        self.assertFalse(Shop.objects.filter(pk=self.shop.pk).exists())
+
+    def test_reinstall_cancels_deletion(self):
+        from .services.shop_deletion import run_shop_deletion, schedule_shop_deletion
+        with patch('faq_app.services.shop_deletion.ShopDeleter'):
+            job = schedule_shop_deletion(self.shop)
+        response = self.client.post('/api/auth/sync/', {'shop': self.shop.shop_domain, 'access_token': 'again'},
+                                    format='json', HTTP_X_INTERNAL_SECRET=self.secret)
+        self.assertEqual(response.status_code, 200)
+        job = run_shop_deletion(job.id, pause=0)
+        self.assertEqual(job.status, 'CANCELLED')
+        self.shop.refresh_from_db()
+        self.assertTrue(self.shop.is_active)
+        self.assertEqual(Product.objects.filter(shop=self.shop).count(), 5)
+
+    def test_every_shop_relation_is_deleted(self):
+        from .services.shop_deletion import DELETION_STEPS
+        covered = {rows(self.shop.pk).model for _, rows in DELETION_STEPS}
+        for relation in Shop._meta.related_objects:
+            self.assertIn(relation.related_model, covered, relation.related_model.__name__)
+        for relation in Product._meta.related_objects:
+            self.assertIn(relation.related_model, covered, relation.related_model.__name__)
+
+
+class ProductWebhookTest(TestCase):
+    def setUp(self):
+        from subscriptions.models import Plan, Subscription
+        from .models import WebhookRegistration
+        self.client = APIClient()
+        self.shop = Shop.objects.create(shop_domain="hooks.myshopify.com", shop_name="Hooks Shop")
+        plan = Plan.objects.create(name="Hooks Plan", price=10, features={'products_limit': 3})
+        Subscription.objects.create(shop=self.shop, plan=plan, status='active')
+        Product.objects.create(shop=self.shop, shopify_id="701", title="Old title", handle="old")
+        self.registration = WebhookRegistration.objects.create(id="wh-1", shop=self.shop, topic='products/update', address="https://x")
+
+    def payload(self, product_id, title, updated_at="2024-05-01T10:00:00Z"):
+        return {"id": product_id, "title": title, "handle": title.lower().replace(' ', '-'), "vendor": "V",
+                "product_type": "T", "body_html": "<p>Body</p>", "updated_at": updated_at,
+                "images": [{"src": "https://cdn.example.com/p.png"}]}
+
+    def post(self, topic, payload, secret=None):
+        import base64
+        import hashlib
+        import hmac
+        body = json.dumps(payload)
+        key = secret or os.environ.get('SHOPIFY_API_SECRET', 'your_secret_here')
+        signature = base64.b64encode(hmac.new(key.encode(), body.encode(), hashlib.sha256).digest()).decode()
+        return self.client.post('/api/webhooks/products/', body, content_type='application/json',
+                                HTTP_X_SHOPIFY_TOPIC=topic, HTTP_X_SHOPIFY_SHOP_DOMAIN=self.shop.shop_domain,
+                                HTTP_X_SHOPIFY_HMAC_SHA256=signature)
+
+    def test_invalid_hmac_is_rejected(self):
+        response = self.post('products/update', self.payload(701, "Hacked"), secret="wrong")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(Product.objects.get(pk="701").title, "Old title")
+
+    def test_update_create_and_delete_are_applied(self):
+        self.assertEqual(self.post('products/update', self.payload(701, "New title")).status_code, 200)
+        product = Product.objects.get(pk="701")
+        self.assertEqual((product.title, product.image_url), ("New title", "https://cdn.example.com/p.png"))
+
+        self.post('products/create', self.payload(702, "Created"))
+        self.assertTrue(Product.objects.filter(shop=self.shop, pk="702").exists())
+        self.post('products/delete', {"id": 702})
+        self.assertFalse(Product.objects.filter(pk="702").exists())
+
+        self.registration.refresh_from_db()
+        self.assertEqual(self.registration.total_received, 1)
+        self.assertIsNotNone(self.registration.last_received_at)
+
+    def test_buffer_coalesces_bursts_per_product(self):
+        from .services.product_webhooks import ProductEventBuffer
+        buffer = ProductEventBuffer(autostart=False)
+        for minute in range(5):
+            buffer.enqueue(self.shop.pk, 'products/update', self.payload(701, f"Edit {minute}", f"2024-05-01T10:0{minute}:00Z"))
+        # Delivered late: older than what is queued
+        buffer.enqueue(self.shop.pk, 'products/update', self.payload(701, "Stale", "2024-05-01T09:00:00Z"))
+        buffer.enqueue(self.shop.pk, 'products/create', self.payload(703, "Other"))
+        self.assertEqual(buffer.pending(), 2)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(buffer.flush(), {'upserted': 2, 'deleted': 0})
+        self.assertEqual(sum(1 for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "products"')), 1)
+        self.assertEqual(Product.objects.get(pk="701").title, "Edit 4")
+        self.assertTrue(Product.objects.filter(pk="703").exists())
+        self.registration.refresh_from_db()
+        self.assertEqual(self.registration.total_received, 6)
+
+    def test_failed_flush_requeues_events(self):
+        from django.db import OperationalError
+        from .services.product_webhooks import ProductEventBuffer
+        buffer = ProductEventBuffer(autostart=False)
+        buffer.enqueue(self.shop.pk, 'products/update', self.payload(701, "Retried"))
+        with patch('faq_app.services.product_webhooks.apply_product_events', side_effect=OperationalError("db down")):
+            buffer.flush()
+        self.assertEqual(buffer.pending(), 1)
+        buffer.flush()
+        self.assertEqual(Product.objects.get(pk="701").title, "Retried")
+
+    def test_requeue_stops_after_max_attempts(self):
+        from django.db import OperationalError
+        from .services.product_webhooks import ProductEventBuffer
+        buffer = ProductEventBuffer(autostart=False, max_attempts=3)
+        buffer.enqueue(self.shop.pk, 'products/update', self.payload(701, "Never applied"))
+        with patch('faq_app.services.product_webhooks.apply_product_events', side_effect=OperationalError("db down")):
+            for _ in range(2):
+                buffer.flush()
+                self.assertEqual(buffer.pending(), 1)
+            buffer.flush()
+        self.assertEqual(buffer.pending(), 0)
+        with patch('faq_app.services.product_webhooks.apply_product_events', side_effect=RuntimeError("bug")):
+            buffer.enqueue(self.shop.pk, 'products/update', self.payload(701, "Not retried"))
+            buffer.flush()
+        self.assertEqual(buffer.pending(), 0)
+
+    def test_bad_event_is_dropped_without_its_batch(self):
+        from .services.product_webhooks import ProductEventBuffer
+        buffer = ProductEventBuffer(autostart=False)
+        buffer.enqueue(self.shop.pk, 'products/create', {"id": 702, "handle": "no-title"})
+        buffer.enqueue(self.shop.pk, 'products/update', self.payload(701, "Applied"))
+        self.assertEqual(buffer.flush(), {'upserted': 1, 'deleted': 0})
+        self.assertEqual(buffer.pending(), 0)
+        self.assertEqual(Product.objects.get(pk="701").title, "Applied")
+        self.assertFalse(Product.objects.filter(pk="702").exists())
+
+    def test_payload_without_required_fields_is_rejected(self):
+        response = self.post('products/update', {"id": 701, "handle": "no-title"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('title', response.data['error'])
+        self.assertEqual(self.post('products/delete', {"id": 701}).status_code, 200)
+
+    def test_creates_respect_plan_product_limit(self):
+        from .services.product_webhooks import ProductEventBuffer
+        buffer = ProductEventBuffer(autostart=False)
+        for product_id in range(800, 805):
+            buffer.enqueue(self.shop.pk, 'products/create', self.payload(product_id, f"New {product_id}"))
+        buffer.enqueue(self.shop.pk, 'products/update', self.payload(701, "Still updated"))
+        self.assertEqual(buffer.flush()['upserted'], 3)
+        self.assertEqual(Product.objects.filter(shop=self.shop).count(), 3)
+        self.assertEqual(Product.objects.get(pk="701").title, "Still updated")
+
+    def test_unknown_shop_and_topic_are_acknowledged(self):
+        self.shop.is_active = False
+        self.shop.save()
+        self.assertEqual(self.post('products/update', self.payload(701, "Ignored")).data['status'], 'ignored')
+        self.assertEqual(self.post('orders/create', {"id": 1}).data['status'], 'ignored')
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTest(TestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        from django.core.cache import cache
+        from .authentication import _token_cache
+        from .db_routing import _lag_checked
+        cache.clear()
+        _token_cache.clear()
+        _lag_checked.clear()
+        self.client = APIClient()
+        # Same shop on both databases, a product title that tells them apart
+        self.shop = Shop.objects.create(shop_domain="replica.myshopify.com", shop_name="Replica Shop")
+        Shop.objects.using('replica').create(pk=self.shop.pk, shop_domain=self.shop.shop_domain, shop_name="Replica Shop")
+        Product.objects.create(shop=self.shop, shopify_id="501", title="Primary copy", handle="copy")
+        Product.objects.using('replica').create(shop_id=self.shop.pk, shopify_id="501", title="Replica copy", handle="copy")
+        token = jwt.encode({"dest": f"https://{self.shop.shop_domain}", "exp": datetime.utcnow() + timedelta(minutes=10)},
+                           os.environ.get('SHOPIFY_API_SECRET', 'your_secret_here'), algorithm='HS256')
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + token)
+
+    def search_titles(self):
+        response = self.client.get('/api/storefront/products/search/', {'shop': self.shop.shop_domain})
+        return [p['title'] for p in response.data]
+
+    def list_titles(self):
+        response = self.client.get('/api/products/')
+        return [p['title'] for p in response.data['results']]
+
+    def test_opted_in_reads_use_replica(self):
+        self.assertEqual(self.search_titles(), ["Replica copy"])
+        self.assertEqual(self.list_titles(), ["Replica copy"])
+        # retrieve is not opted in
+        self.assertEqual(self.client.get('/api/products/501/').data['title'], "Primary copy")
+
+    def test_write_pins_request_then_shop_to_primary(self):
+        from .db_routing import ReplicaRouter, RoutingState, _state
+        router = ReplicaRouter()
+        state = RoutingState()
+        state.replica_allowed = True
+        token = _state.set(state)
+        try:
+            self.assertEqual(router.db_for_read(Product), 'replica')
+            self.assertEqual(router.db_for_write(Product), 'default')
+            self.assertEqual(router.db_for_read(Product), 'default')
+        finally:
+            _state.reset(token)
+
+        response = self.client.patch('/api/products/501/', {'title': "Edited"}, format='json')
+        self.assertEqual(response.status_code, 200)
+        # The shop reads its own write on the next request
+        self.assertEqual(self.list_titles(), ["Edited"])
+        self.assertEqual(self.search_titles(), ["Edited"])
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        with patch('faq_app.db_routing.measure_lag', return_value=60.0):
+            self.assertEqual(self.search_titles(), ["Primary copy"])
+
+    def test_no_replicas_configured_reads_primary(self):
+        with self.settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(self.search_titles(), ["Primary copy"])
+
+
+class DBConnectionLifecycleTest(TestCase):
+    def setUp(self):
+        from .metrics import REGISTRY
+        REGISTRY.reset()
+
+    def test_release_closes_obsolete_connections_outside_transactions(self):
+        from .db_connections import release_connections
+        from .metrics import DB_CONNECTIONS_CLOSED
+        idle = Mock(alias='default', in_atomic_block=False, connection=object())
+        idle.close_if_unusable_or_obsolete.side_effect = lambda: setattr(idle, 'connection', None)
+        busy = Mock(alias='replica', in_atomic_block=True, connection=object())
+        with patch('faq_app.db_connections.connections') as connections:
+            connections.all.return_value = [idle, busy]
+            release_connections()
+        busy.close_if_unusable_or_obsolete.assert_not_called()
+        self.assertEqual(DB_CONNECTIONS_CLOSED.values, {('default', 'obsolete'): 1})
+
+    def test_thread_exit_closes_connections_and_opens_are_counted(self):
+        from .db_connections import _connection_opened, close_thread_connections
+        from .metrics import DB_CONNECTIONS_CLOSED, DB_CONNECTIONS_OPENED
+        _connection_opened(sender=None, connection=Mock(alias='default'))
+        open_conn = Mock(alias='default', in_atomic_block=False, connection=object())
+        unused = Mock(alias='replica', in_atomic_block=False, connection=None)
+        with patch('faq_app.db_connections.connections') as connections:
+            connections.all.return_value = [open_conn, unused]
+            close_thread_connections()
+        open_conn.close.assert_called_once()
+        unused.close.assert_not_called()
+        self.assertEqual(DB_CONNECTIONS_OPENED.values, {('default',): 1})
+        self.assertEqual(DB_CONNECTIONS_CLOSED.values, {('default', 'thread_exit'): 1})
+
+    def test_bulk_job_thread_releases_connections(self):
+        from .services.bulk_service import BulkFAQGenerator
+        with patch('faq_app.services.bulk_service.close_thread_connections') as close:
+            BulkFAQGenerator(job_id=0).run() # Missing job
+        close.assert_called_once()
+
+
+@override_settings(TENANT_SHARDS=['default', 'shard_1'])
+class ShardingTest(TestCase):
+    databases = {'default', 'shard_1'}
+
+    def setUp(self):
+        from django.core.cache import cache
+        from .authentication import _token_cache
+        from .sharding import invalidate_shard_map
+        cache.clear()
+        _token_cache.clear()
+        invalidate_shard_map()
+        self.client = APIClient()
+        # Placement hashes the domain: pin it
+        with patch('faq_app.sharding.pick_shard', return_value='shard_1'):
+            self.shop = Shop.objects.create(shop_domain="sharded.myshopify.com", shop_name="Sharded Shop")
+        token = jwt.encode({"dest": f"https://{self.shop.shop_domain}", "exp": datetime.utcnow() + timedelta(minutes=10)},
+                           os.environ.get('SHOPIFY_API_SECRET', 'your_secret_here'), algorithm='HS256')
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + token)
+
+    def create_content(self):
+        from .models import FAQDesign
+        from .sharding import tenant
+        # Queryset writes carry no instance to route by: they follow the tenant context
+        with tenant(self.shop.pk):
+            product = Product.objects.create(shop=self.shop, shopify_id="901", title="Sharded product", handle="sharded")
+            FAQ.objects.create(product=product, questions_answers=[{"question": "Q", "answer": "A"}], html_content="", num_questions=1)
+            FAQDesign.objects.create(shop=self.shop, title="Sharded FAQ")
+            log_activity(shop=self.shop, level='info', operation='sync', message="Synced")
+        return product
+
+    def test_new_shop_is_mapped_and_mirrored(self):
+        from .models import ShopShard
+        self.assertEqual(ShopShard.objects.get(shop_id=self.shop.pk).alias, 'shard_1')
+        self.assertTrue(Shop.objects.using('shard_1').filter(pk=self.shop.pk).exists())
+
+    def test_tenant_rows_live_on_the_shop_shard(self):
+        self.create_content()
+        for model in (Product, FAQ, ActivityLog):
+            self.assertEqual(model.objects.using('shard_1').count(), 1, model.__name__)
+            self.assertEqual(model.objects.using('default').count(), 0, model.__name__)
+        self.assertEqual(self.shop.products.count(), 1)
+
+        response = self.client.get('/api/products/')
+        self.assertEqual([p['title'] for p in response.data['results']], ["Sharded product"])
+        response = self.client.get('/api/storefront/faq/', {'shop': self.shop.shop_domain, 'product_id': '901'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_move_shop_copies_then_switches(self):
+        from django.core.management import call_command
+        from .models import FAQDesign, ShopShard
+        self.create_content()
+        call_command('move_shop_shard', self.shop.shop_domain, 'default', settle=0, stdout=tempfile.TemporaryFile('w+'))
+
+        entry = ShopShard.objects.get(shop_id=self.shop.pk)
+        self.assertEqual((entry.alias, entry.state), ('default', 'ACTIVE'))
+        for model in (Product, FAQ, ActivityLog, FAQDesign):
+            self.assertEqual(model.objects.using('default').count(), 1, model.__name__)
+            self.assertEqual(model.objects.using('shard_1').count(), 0, model.__name__)
+        self.assertFalse(Shop.objects.using('shard_1').filter(pk=self.shop.pk).exists())
+        response = self.client.get('/api/products/')
+        self.assertEqual([p['title'] for p in response.data['results']], ["Sharded product"])
+
+    def test_read_only_shop_rejects_writes(self):
+        from .models import ShopShard
+        from .sharding import invalidate_shard_map
+        self.create_content()
+        ShopShard.objects.filter(shop_id=self.shop.pk).update(state='READ_ONLY')
+        invalidate_shard_map()
+        self.assertEqual(self.client.get('/api/products/').status_code, 200)
+        response = self.client.patch('/api/products/901/', {'title': "Edited"}, format='json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(Product.objects.using('shard_1').get(pk="901").title, "Sharded product")
+
+
+class FAQItemTest(TestCase):
+    def setUp(self):
+        from .services.faq_service import save_generated_faq
+        self.client = APIClient()
+        self.shop = Shop.objects.create(shop_domain="items.myshopify.com", shop_name="Items Shop")
+        self.client.force_authenticate(user=self.shop)
+        self.product = Product.objects.create(shop=self.shop, shopify_id="701", title="Kettle")
+        self.faq = save_generated_faq(self.product, {
+            'fr': [{"question": "Capacité ?", "answer": "1,7 litre."}, {"question": "Garantie ?", "answer": "Deux ans."}],
+            'en': [{"question": "Capacity?", "answer": "1.7 litres."}],
+        })
+
+    def test_generation_writes_items(self):
+        items = list(self.faq.items.order_by('language', 'position').values_list('language', 'position', 'question'))
+        self.assertEqual(items, [('en', 0, "Capacity?"), ('fr', 0, "Capacité ?"), ('fr', 1, "Garantie ?")])
+
+    def test_item_edit_refreshes_only_its_language(self):
+        item = self.faq.items.get(language='fr', position=1)
+        response = self.client.patch(f'/api/faq-items/{item.pk}/', {'answer': "Trois ans."}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post('/api/faq-items/', {'faq': self.faq.pk, 'language': 'fr', 'question': "Couleur ?", 'answer': "Noir."}, format='json')
+        self.assertEqual(response.data['position'], 2)
+
+        self.faq.refresh_from_db()
+        self.assertEqual([e['answer'] for e in self.faq.questions_answers], ["1,7 litre.", "Trois ans.", "Noir."])
+        self.assertEqual(self.faq.num_questions, 3)
+        self.assertEqual(self.faq.questions_answers_en, [{"question": "Capacity?", "answer": "1.7 litres."}])
+
+        response = self.client.patch(f'/api/faq-items/{item.pk}/', {'language': 'en'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_shops_faq_is_rejected(self):
+        other = Shop.objects.create(shop_domain="other-items.myshopify.com", shop_name="Other")
+        self.client.force_authenticate(user=other)
+        response = self.client.post('/api/faq-items/', {'faq': self.faq.pk, 'language': 'fr', 'question': "?", 'answer': "!"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.faq.items.count(), 3)
+        self.assertEqual(self.client.get('/api/faq-items/').data['count'], 0)
+
+    def test_search_and_count_use_items(self):
+        # JSON keys are not content
+        response = self.client.get('/api/faq/', {'search': 'question'})
+        self.assertEqual(response.data['count'], 0)
+        response = self.client.get('/api/faq/', {'search': 'Garantie'})
+        self.assertEqual(response.data['count'], 1)
+        response = self.client.get('/api/products/')
+        self.assertEqual(response.data['results'][0]['faqs_count'], 2)
+        self.assertEqual(ProductSerializer(self.product).data['faqs_count'], 2)
+
+
+def install_search_index():
+    """
+    Tables are built without migrations in tests: apply the full-text index
+    migration by hand (idempotent).
+    """
+    from importlib import import_module
+    migration = import_module('faq_app.migrations.0021_faq_items_search_index')
+    with connection.schema_editor() as schema_editor:
+        migration.add_search_index(None, schema_editor)
+
+
+class FAQSearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        install_search_index() # Before the class transaction: SQLite DDL
+        super().setUpClass()
+
+    def setUp(self):
+        from .services.faq_service import save_generated_faq
+        self.client = APIClient()
+        self.shop = Shop.objects.create(shop_domain="search.myshopify.com", shop_name="Search Shop")
+        self.client.force_authenticate(user=self.shop)
+        kettle = Product.objects.create(shop=self.shop, shopify_id="801", title="Kettle", handle="kettle")
+        mug = Product.objects.create(shop=self.shop, shopify_id="802", title="Mug", handle="mug")
+        self.kettle_faq = save_generated_faq(kettle, {
+            'fr': [{"question": "Quelle capacité ?", "answer": "1,7 litre, idéal pour le thé."}],
+            'en': [
+                {"question": "Is it good for tea?", "answer": "Yes, tea and coffee: it stops at 80°C for green tea."},
+                {"question": "What capacity?", "answer": "1.7 litres <approx>."},
+            ],
+        })
+        save_generated_faq(mug, {'fr': [{"question": "Lave-vaisselle ?", "answer": "Oui."}],
+                                 'en': [{"question": "Dishwasher safe?", "answer": "Yes, no tea stains."}]})
+
+    def search(self, **params):
+        response = self.client.get('/api/storefront/faq/search/', {'shop': self.shop.shop_domain, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['results']
+
+    def test_storefront_search_is_ranked_and_highlighted(self):
+        results = self.search(q="green tea", language='en')
+        self.assertEqual([r['question'] for r in results], ["Is it good for tea?", "Dishwasher safe?"])
+        self.assertEqual(results[0]['handle'], "kettle")
+        self.assertEqual(results[0]['highlight']['question'], "Is it good for <mark>tea</mark>?")
+        self.assertIn("for <mark>green</mark> <mark>tea</mark>.", results[0]['highlight']['answer'])
+        self.assertGreater(results[0]['score'], results[1]['score'])
+
+        results = self.search(q="capacity", language='en')
+        self.assertEqual(results[0]['highlight']['answer'], "1.7 litres &lt;approx&gt;.")
+        self.assertEqual(len(self.search(q="capacite")), 1) # fr by default, accents folded
+        self.assertEqual(len(self.search(q="tea", product_id="gid://shopify/Product/802", language='en')), 1)
+        self.assertEqual(self.search(q="\"*) OR"), [])
+
+    def test_index_follows_item_edits(self):
+        item = self.kettle_faq.items.get(language='en', position=1)
+        self.client.patch(f'/api/faq-items/{item.pk}/', {'answer': "Enough for six cups."}, format='json')
+        self.assertEqual([r['answer'] for r in self.search(q="cups", language='en')], ["Enough for six cups."])
+        self.client.delete(f'/api/faq-items/{item.pk}/')
+        self.assertEqual(self.search(q="cups", language='en'), [])
+
+    def test_admin_search_uses_index(self):
+        response = self.client.get('/api/faq/', {'search': 'stains'})
+        self.assertEqual([f['product'] for f in response.data['results']], ["802"])
+        response = self.client.get('/api/faq/', {'search': 'stains', 'language': 'fr'})
+        self.assertEqual(response.data['count'], 0)
+        response = self.client.get('/api/faq/', {'search': 'Kettle'})
+        self.assertEqual(response.data['count'], 1)
+
+    def test_admin_search_is_scoped_to_the_shop(self):
+        from .services.faq_service import save_generated_faq
+        other = Shop.objects.create(shop_domain="other-search.myshopify.com", shop_name="Other")
+        save_generated_faq(Product.objects.create(shop=other, shopify_id="803", title="Pot", handle="pot"),
+                           {'en': [{"question": "Stains?", "answer": "No stains."}]})
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/faq/', {'search': 'stains'})
+        self.assertEqual([f['product'] for f in response.data['results']], ["802"])
+        # The item subquery itself is filtered by shop, not just the outer FAQs
+        sql = next(q['sql'] for q in ctx.captured_queries if 'faq_items_fts MATCH' in q['sql'])
+        self.assertIn(f'U2."shop_id" = {self.shop.pk}', sql)
+
+
+class ShopLanguagesTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.shop = Shop.objects.create(shop_domain="locales.myshopify.com", shop_name="Locales Shop", languages=['de', 'en'])
+        self.client.force_authenticate(user=self.shop)
+        self.product = Product.objects.create(shop=self.shop, shopify_id="901", title="Teapot", handle="teapot")
+
+    @patch.dict(os.environ, {"ANTHROPIC_API_KEY": "test-key"})
+    def test_prompt_asks_for_enabled_languages_only(self):
+        from .services.ai_service import build_anthropic_request
+        _, _, payload = build_anthropic_request(self.product, num_questions=5)
+        self.assertIn('2 language(s): German (de), English (en)', payload['system'])
+        self.assertIn('"de": [', payload['system'])
+        self.assertNotIn('"fr": [', payload['system'])
+        _, _, single = build_anthropic_request(self.product, num_questions=5, languages=['de'])
+        _, _, default = build_anthropic_request(self.product, num_questions=5, languages=['fr', 'en', 'es'])
+        self.assertLess(single['max_tokens'], payload['max_tokens'])
+        self.assertLess(payload['max_tokens'], default['max_tokens'])
+
+    @patch('faq_app.services.ai_service.generate_faq_for_product')
+    def test_generation_stores_and_serves_any_language(self, mock_generate):
+        mock_generate.return_value = {
+            "de": [{"question": "Wie groß?", "answer": "1 Liter."}, {"question": "Spülmaschine?", "answer": "Ja."}],
+            "en": [{"question": "How big?", "answer": "1 litre."}],
+            "fr": [{"question": "Ignorée ?", "answer": "Oui."}],
+        }
+        response = self.client.post('/api/faq/generate-faq/', {"productId": "901"}, format='json')
+        self.assertEqual(response.data['details'], {'de': 2, 'en': 1})
+        self.assertEqual(mock_generate.call_args.kwargs['languages'], ['de', 'en'])
+
+        # questions_answers holds the primary language, the one num_questions counts
+        faq = FAQ.objects.get(product=self.product)
+        self.assertEqual((faq.num_questions, faq.questions_answers), (2, mock_generate.return_value['de']))
+        self.assertEqual(sorted(faq.items.values_list('language', flat=True)), ['de', 'de', 'en'])
+        self.assertEqual(self.client.get('/api/products/').data['results'][0]['faqs_count'], 2)
+
+        response = self.client.get('/api/storefront/faq/', {'shop': self.shop.shop_domain, 'product_id': '901'})
+        payload = json.loads(response.content)['faq']
+        self.assertEqual(payload['questions_answers'], mock_generate.return_value['de'])
+        self.assertEqual(payload['questions_answers_en'], mock_generate.return_value['en'])
+        self.assertEqual(payload['translations'], {})
+
+        # Item edits in the primary language rewrite its column and count
+        item = faq.items.get(language='de', position=1)
+        self.client.delete(f'/api/faq-items/{item.pk}/')
+        faq.refresh_from_db()
+        self.assertEqual((faq.num_questions, faq.questions_answers), (1, mock_generate.return_value['de'][:1]))
+
+        # The FAQ API's questions_answers is the primary language too
+        response = self.client.patch(f'/api/faq/{faq.pk}/', {'questions_answers': [{"question": "Farbe?", "answer": "Rot."}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(faq.items.filter(language='de').values_list('question', flat=True)), ["Farbe?"])
+        self.assertFalse(faq.items.filter(language='fr').exists())
+
+    def test_primary_language_change_rebuilds_caches(self):
+        from .services.faq_service import save_generated_faq
+        self.shop.languages = ['fr', 'en', 'es']
+        self.shop.save()
+        fr = [{"question": "Quelle taille ?", "answer": "1 litre."}]
+        en = [{"question": "How big?", "answer": "1 litre."}, {"question": "Colour?", "answer": "Red."}]
+        faq = save_generated_faq(self.product, {'fr': fr, 'en': en, 'es': []})
+        FAQItem.objects.create(faq=faq, language='de', position=0, question="Wie groß?", answer="1 Liter.")
+
+        response = self.client.patch(f'/api/shops/{self.shop.pk}/', {'languages': ['de', 'fr', 'en']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        faq.refresh_from_db()
+        self.assertEqual((faq.questions_answers, faq.num_questions), ([{"question": "Wie groß?", "answer": "1 Liter."}], 1))
+        self.assertEqual(faq.questions_answers_en, en)
+        payload = json.loads(self.client.get('/api/storefront/faq/', {'shop': self.shop.shop_domain, 'product_id': '901'}).content)['faq']
+        self.assertEqual(payload['questions_answers'], [{"question": "Wie groß?", "answer": "1 Liter."}])
+        self.assertEqual(payload['translations'], {'fr': fr})
+        self.assertEqual(self.client.get('/api/products/').data['results'][0]['faqs_count'], 1)
+
+        # English primary: its list moves to questions_answers, _en is no longer a cache
+        self.client.patch(f'/api/shops/{self.shop.pk}/', {'languages': ['en', 'de']}, format='json')
+        faq.refresh_from_db()
+        self.assertEqual((faq.questions_answers, faq.questions_answers_en, faq.num_questions), (en, None, 2))
+
+    def test_languages_are_validated(self):
+        url = f'/api/shops/{self.shop.pk}/'
+        for bad in ([], ['de', 'de'], ['de', 'EN!'], 'de'):
+            response = self.client.patch(url, {'languages': bad}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, bad)
+        response = self.client.patch(url, {'languages': ['pt-BR', 'en']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        faq = FAQ.objects.create(product=self.product, questions_answers=[], num_questions=0)
+        response = self.client.post('/api/faq-items/', {'faq': faq.pk, 'language': 'es', 'question': "¿?", 'answer': "Sí."}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
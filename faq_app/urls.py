@@ -1,28 +1,44 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
-    ShopViewSet, ProductViewSet, FAQViewSet, 
+    ShopViewSet, ProductViewSet, FAQViewSet, FAQItemViewSet,
     ActivityLogViewSet, ConfigViewSet, HealthCheckView,
     SyncAuthView, FAQDesignViewSet, UninstallShopView,
-    BulkActionViewSet
+    BulkActionViewSet, AIUsageViewSet, ProductWebhookView
 )
 
-from .views_storefront import StorefrontFAQView, StorefrontProductSearchView
+from .views_storefront import StorefrontFAQSearchView, StorefrontFAQView, StorefrontProductSearchView
+from . import views_async
+from .views_internal import (
+    ProfilingControlView, RequestProfileDetailView, RequestProfileListView, RequestStatsView,
+)
 
 router = DefaultRouter()
 router.register(r'shops', ShopViewSet)
 router.register(r'products', ProductViewSet)
 router.register(r'faq', FAQViewSet)
+router.register(r'faq-items', FAQItemViewSet)
 router.register(r'logs', ActivityLogViewSet)
 router.register(r'config', ConfigViewSet, basename='config')
 router.register(r'design', FAQDesignViewSet, basename='design')
 router.register(r'bulk', BulkActionViewSet, basename='bulk')
+router.register(r'usage', AIUsageViewSet, basename='usage')
 
 urlpatterns = [
     path('health/', HealthCheckView.as_view(), name='health config'),
     path('auth/sync/', SyncAuthView.as_view(), name='auth-sync'),
     path('auth/uninstall/', UninstallShopView.as_view(), name='auth-uninstall'),
+    path('webhooks/products/', ProductWebhookView.as_view(), name='webhooks-products'),
     path('storefront/faq/', StorefrontFAQView.as_view(), name='storefront-faq'),
     path('storefront/products/search/', StorefrontProductSearchView.as_view(), name='storefront-products-search'),
+    path('storefront/faq/search/', StorefrontFAQSearchView.as_view(), name='storefront-faq-search'),
+    # Async variants, served without blocking a worker thread under ASGI
+    path('async/storefront/faq/', views_async.storefront_faq, name='async-storefront-faq'),
+    path('async/storefront/products/search/', views_async.storefront_product_search, name='async-storefront-products-search'),
+    path('async/faq/generate-faq/', views_async.generate_faq, name='async-generate-faq'),
+    path('internal/request-stats/', RequestStatsView.as_view(), name='internal-request-stats'),
+    path('internal/profiling/', ProfilingControlView.as_view(), name='internal-profiling'),
+    path('internal/profiles/', RequestProfileListView.as_view(), name='internal-profiles'),
+    path('internal/profiles/<int:pk>/', RequestProfileDetailView.as_view(), name='internal-profile-detail'),
     path('', include(router.urls)),
 ]
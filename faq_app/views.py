@@ -1,20 +1,66 @@
 from rest_framework import viewsets, status, permissions, generics, filters
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Count
+from django.utils.dateparse import parse_date
 from django.utils import timezone
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+import logging
 import requests
 import os
+import time
 
-from .models import Shop, Product, FAQ, ActivityLog, APIConfiguration, WebhookRegistration, FAQDesign
+from .models import Shop, Product, FAQ, FAQItem, ActivityLog, APIConfiguration, WebhookRegistration, FAQDesign
 from .serializers import (
-    ShopSerializer, ProductSerializer, FAQSerializer, 
+    ShopSerializer, ProductSerializer, FAQSerializer, FAQItemSerializer,
     ActivityLogSerializer, APIConfigurationSerializer, 
-    WebhookRegistrationSerializer, FAQDesignSerializer
+    WebhookRegistrationSerializer, FAQDesignSerializer, with_active_faqs, with_raw_json, with_translations
 )
 from .authentication import ShopifyAuthentication
+from .pagination import OptionalCursorPagination
+from .services.activity_log import flush_activity_log, log_activity
+from .services.faq_items import next_position, refresh_cache
+from .services.faq_search import search_terms, with_search_rank
+from .services.log_retention import delete_in_chunks
+from .services.activity_stats import discard_stats, get_log_stats
+from .services.shop_deletion import cancel_shop_deletion, schedule_shop_deletion
+from .services.product_webhooks import PRODUCT_TOPICS, missing_fields, product_defaults, receive_product_event, verify_webhook
+from .metrics import SHOPIFY_REQUESTS, SHOPIFY_THROTTLE_WAIT, SYNC_PRODUCTS
+from subscriptions.entitlements import get_entitlements
+
+logger = logging.getLogger(__name__)
+
+# Admin API origin; `{shop}` is the shop domain. Overridden to point at a local fake (benchmarks)
+SHOPIFY_API_BASE_URL = getattr(settings, 'SHOPIFY_API_BASE_URL', None) or 'https://{shop}'
+SHOPIFY_API_VERSION = '2024-01'
+
+# Shopify answers 429 with Retry-After when the app exceeds its API call limit
+SHOPIFY_MAX_RETRIES = 5
+SHOPIFY_MAX_RETRY_WAIT = 10
+
+
+def shopify_get(url, headers):
+    """
+    GET a Shopify Admin API URL, waiting out 429 throttling responses.
+    """
+    for attempt in range(SHOPIFY_MAX_RETRIES + 1):
+        response = requests.get(url, headers=headers)
+        SHOPIFY_REQUESTS.inc(status=response.status_code)
+        if response.status_code != 429 or attempt == SHOPIFY_MAX_RETRIES:
+            return response
+        try:
+            wait = float(response.headers.get('Retry-After', 2))
+        except ValueError:
+            wait = 2.0
+        wait = min(max(wait, 0), SHOPIFY_MAX_RETRY_WAIT)
+        SHOPIFY_THROTTLE_WAIT.observe(wait)
+        time.sleep(wait)
+    return response
+
 
 class ShopViewSet(viewsets.ModelViewSet):
     queryset = Shop.objects.all()
@@ -40,11 +86,13 @@ class ProductViewSet(viewsets.ModelViewSet):
     filterset_fields = ['has_faq']
     search_fields = ['title', 'handle', 'vendor', 'shopify_id']
     ordering_fields = ['created_at', 'updated_at', 'title']
+    pagination_class = OptionalCursorPagination
+    cursor_ordering = ('-updated_at', '-pk') # index (shop, updated_at)
 
     def get_queryset(self):
         if not self.request.user.is_authenticated:
             return Product.objects.none()
-        return Product.objects.filter(shop=self.request.user)
+        return with_active_faqs(Product.objects.filter(shop=self.request.user), self.request.user.primary_language)
 
     @action(detail=False, methods=['post'])
     def sync(self, request):
@@ -55,26 +103,15 @@ class ProductViewSet(viewsets.ModelViewSet):
         shop_domain = shop.shop_domain
         access_token = shop.shopify_access_token_encrypted # TODO: Decrypt if needed
         
-        # Check active subscription to determine product limit
-        product_limit = 1
-        try:
-             # NEW LOGIC FOR FOREIGNKEY
-             active_subscription = shop.subscriptions.filter(status='active').order_by('-created_at').first()
-             
-             if active_subscription and active_subscription.plan:
-                  product_limit = active_subscription.plan.features.get('products_limit', 250)
-             else:
-                  product_limit = 1 # Free tier limit updated to 1
-        except Exception as e:
-             print(f"Sync subscription check error: {e}")
-             product_limit = 1
+        # Plan product limit (Free tier limit is 1)
+        product_limit = get_entitlements(shop).features.get('products_limit', 250)
 
         # Pagination Logic
         products_synced_count = 0
         created_count = 0
         updated_count = 0
         
-        url = f"https://{shop_domain}/admin/api/2024-01/products.json?limit=250" # Max allowed by Shopify per page
+        url = f"{SHOPIFY_API_BASE_URL.format(shop=shop_domain)}/admin/api/{SHOPIFY_API_VERSION}/products.json?limit=250" # Max allowed by Shopify per page
         headers = {
             "X-Shopify-Access-Token": access_token,
             "Content-Type": "application/json"
@@ -82,7 +119,7 @@ class ProductViewSet(viewsets.ModelViewSet):
         
         while url and products_synced_count < product_limit:
             try:
-                response = requests.get(url, headers=headers)
+                response = shopify_get(url, headers)
                 
                 if response.status_code != 200:
                     return Response({"error": "Shopify API Error", "details": response.text}, status=status.HTTP_400_BAD_REQUEST)
@@ -96,31 +133,17 @@ class ProductViewSet(viewsets.ModelViewSet):
                     if products_synced_count >= product_limit:
                         break
                         
-                    # Extract image URL from Shopify product data
-                    image_url = None
-                    if p_data.get('images') and len(p_data['images']) > 0:
-                        image_url = p_data['images'][0].get('src')
-                    
                     product, created = Product.objects.update_or_create(
                         shop=shop,
                         shopify_id=str(p_data['id']),
-                        defaults={
-                            'title': p_data['title'],
-                            'handle': p_data['handle'],
-                            'vendor': p_data['vendor'],
-                            'product_type': p_data['product_type'],
-                            'body_html': p_data['body_html'] or "",
-                            'image_url': image_url,
-                            'shopify_created_at': p_data['created_at'],
-                            'shopify_updated_at': p_data['updated_at'],
-                            'last_synced_at': timezone.now()
-                        }
+                        defaults=product_defaults(p_data)
                     )
                     
                     if created:
                         created_count += 1
                     else:
                         updated_count += 1
+                    SYNC_PRODUCTS.inc(result='created' if created else 'updated')
                         
                     products_synced_count += 1
                 
@@ -141,12 +164,11 @@ class ProductViewSet(viewsets.ModelViewSet):
                 url = next_url
                 
             except Exception as e:
-                print(f"Sync error loop: {e}")
+                logger.exception("Product sync failed for %s: %s", shop_domain, e)
                 return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
         # Log success
-        ActivityLog.objects.create(
-            id=str(os.urandom(16).hex()),
+        log_activity(
             shop=shop,
             level='success',
             operation='manual_sync',
@@ -156,15 +178,35 @@ class ProductViewSet(viewsets.ModelViewSet):
         return Response({"status": "success", "count": products_synced_count})
 
 
+class FAQSearchFilter(filters.SearchFilter):
+    """
+    ?search= matches the product title or, through the full-text index, the
+    text of the FAQ's items (?language= narrows the items searched).
+    """
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not search_terms(query):
+            return queryset
+        # Scoped to the shop: the full-text match must not scan every tenant's items
+        items = FAQItem.objects.filter(faq__product__shop=request.user)
+        language = request.query_params.get('language')
+        if language:
+            items = items.filter(language=language)
+        return queryset.filter(
+            Q(product__title__icontains=query) | Q(pk__in=with_search_rank(items, query).values('faq_id'))
+        )
+
+
 class FAQViewSet(viewsets.ModelViewSet):
     queryset = FAQ.objects.all()
     serializer_class = FAQSerializer
     authentication_classes = [ShopifyAuthentication]
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter, DjangoFilterBackend]
+    filter_backends = [FAQSearchFilter, filters.OrderingFilter, DjangoFilterBackend]
     filterset_fields = ['product']
-    search_fields = ['product__title', 'questions_answers']
     ordering_fields = ['created_at', 'updated_at']
+    pagination_class = OptionalCursorPagination
+    cursor_ordering = ('-created_at', '-pk') # indexed created_at
 
     def get_queryset(self):
         if not self.request.user.is_authenticated:
@@ -175,7 +217,11 @@ class FAQViewSet(viewsets.ModelViewSet):
         product_id = self.request.query_params.get('product_id')
         if product_id:
             queryset = queryset.filter(product__shopify_id=product_id)
-            
+
+        # Read-only responses embed the stored JSON text without decoding it
+        if self.action in ('list', 'retrieve'):
+            queryset = with_translations(with_raw_json(queryset), self.request.user.languages)
+
         return queryset
 
 
@@ -194,13 +240,7 @@ class FAQViewSet(viewsets.ModelViewSet):
         
         # Check subscription limits
         try:
-            max_ai_questions = 3 # Default Free limit
-            
-            active_subscription = shop.subscriptions.filter(status='active').order_by('-created_at').first()
-            if active_subscription and active_subscription.plan:
-                 features = active_subscription.plan.features
-                 max_ai_questions = features.get('max_ai_questions', 3)
-            
+            max_ai_questions = get_entitlements(shop).features.get('max_ai_questions', 3) # Default Free limit 3
         except Exception as e:
              return Response({"error": f"Subscription check failed: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -214,6 +254,7 @@ class FAQViewSet(viewsets.ModelViewSet):
             
             # Generate FAQ
             from .services.ai_service import generate_faq_for_product
+            from .services.faq_service import extract_valid_faqs, question_count, save_generated_faq
             requested_num = request.data.get('num_questions', 5)
             try:
                 requested_num = int(requested_num)
@@ -223,87 +264,115 @@ class FAQViewSet(viewsets.ModelViewSet):
             # Cap at plan limit
             num_questions = min(requested_num, max_ai_questions)
             
-            # Wrapper for validation
-            def is_valid_faq(f):
-                return isinstance(f, dict) and 'question' in f and 'answer' in f
+            # Call AI Service
+            started = time.monotonic()
+            faqs_data = generate_faq_for_product(product, api_config, num_questions=num_questions, languages=shop.languages)
+            duration_seconds = int(round(time.monotonic() - started))
 
-            def filter_valid_faqs(raw_list):
-                if not isinstance(raw_list, list):
-                    return []
-                return [f for f in raw_list if is_valid_faq(f)]
+            if isinstance(faqs_data, dict) and faqs_data.get('code') == 'token_budget_exceeded':
+                return Response({"error": faqs_data['error']}, status=status.HTTP_429_TOO_MANY_REQUESTS)
 
             # Extract languages
-            valid_faqs_fr = []
-            valid_faqs_en = []
-            valid_faqs_es = []
-            
-            # Call AI Service
-            faqs_data = generate_faq_for_product(product, api_config, num_questions=num_questions)
+            languages = extract_valid_faqs(faqs_data, shop.languages)
 
-            if isinstance(faqs_data, dict):
-                valid_faqs_fr = filter_valid_faqs(faqs_data.get('fr', []))
-                valid_faqs_en = filter_valid_faqs(faqs_data.get('en', []))
-                valid_faqs_es = filter_valid_faqs(faqs_data.get('es', []))
-            elif isinstance(faqs_data, list):
-                # Fallback if AI messes up and returns a flat list (assume FR)
-                valid_faqs_fr = filter_valid_faqs(faqs_data)
-
-            if not valid_faqs_fr and not valid_faqs_en and not valid_faqs_es:
+            if not any(languages.values()):
                 return Response(
                     {"error": "AI generated empty or invalid content", "raw_data": faqs_data}, 
                     status=status.HTTP_422_UNPROCESSABLE_ENTITY
                 )
 
             # Update or create
-            faq, created = FAQ.objects.get_or_create(product=product, defaults={
-                'questions_answers': valid_faqs_fr or [], # Default FR (required by model)
-                'questions_answers_en': valid_faqs_en,
-                'questions_answers_es': valid_faqs_es,
-                'num_questions': len(valid_faqs_fr), # Track FR count as primary
-                'html_content': "", 
-                'is_active': True
-            })
-            
-            if not created:
-                faq.questions_answers = valid_faqs_fr or []
-                faq.questions_answers_en = valid_faqs_en
-                faq.questions_answers_es = valid_faqs_es
-                faq.num_questions = len(valid_faqs_fr)
-                faq.save()
+            faq = save_generated_faq(product, languages, duration_seconds=duration_seconds)
             
             # Log generation success
             try:
-                ActivityLog.objects.create(
-                    id=str(os.urandom(16).hex()),
+                log_activity(
                     shop=shop,
                     level='success',
                     operation='generate_faq',
-                    message=f"Generated {len(valid_faqs_fr)} questions for product '{product.title}'."
+                    message=f"Generated {question_count(languages)} questions for product '{product.title}'."
                 )
             except Exception as e:
-                print(f"Log creation failed: {e}")
+                logger.exception("Log creation failed: %s", e)
 
             return Response({
                 "status": "success", 
                 "faq_id": faq.id, 
-                "count": len(valid_faqs_fr),
-                "details": {
-                    "fr": len(valid_faqs_fr),
-                    "en": len(valid_faqs_en),
-                    "es": len(valid_faqs_es)
-                }
+                "count": question_count(languages),
+                "details": {lang: len(items) for lang, items in languages.items()}
             })
             
         except Product.DoesNotExist:
             return Response({"error": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
-            import traceback
-            traceback.print_exc()
-            print(f"[GenerateFAQView] Error: {e}")
+            logger.exception("FAQ generation failed: %s", e)
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class ActivityLogViewSet(viewsets.ModelViewSet):
+class FAQItemViewSet(viewsets.ModelViewSet):
+    """
+    One question/answer of an FAQ. Every write rewrites the FAQ's JSON cache
+    for the item's language, under a lock on the FAQ row so concurrent edits
+    of the same FAQ apply one after the other.
+    """
+    queryset = FAQItem.objects.all()
+    serializer_class = FAQItemSerializer
+    authentication_classes = [ShopifyAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [filters.SearchFilter, DjangoFilterBackend]
+    filterset_fields = ['faq', 'language']
+    search_fields = ['question', 'answer']
+
+    def get_queryset(self):
+        if not self.request.user.is_authenticated:
+            return FAQItem.objects.none()
+        return FAQItem.objects.filter(faq__product__shop=self.request.user).order_by('faq_id', 'language', 'position')
+
+    def _locked_faq(self, faq_id):
+        return FAQ.objects.select_for_update().get(pk=faq_id, product__shop=self.request.user)
+
+    def perform_create(self, serializer):
+        faq = serializer.validated_data['faq']
+        language = serializer.validated_data['language']
+        with transaction.atomic(using=faq._state.db):
+            try:
+                faq = self._locked_faq(faq.pk)
+            except FAQ.DoesNotExist:
+                raise ValidationError({'faq': "FAQ not found."})
+            serializer.save(faq=faq, position=next_position(faq, language))
+            refresh_cache(faq, language, self.request.user.primary_language)
+
+    def perform_update(self, serializer):
+        item = serializer.instance
+        with transaction.atomic(using=item._state.db):
+            faq = self._locked_faq(item.faq_id)
+            serializer.save()
+            refresh_cache(faq, item.language, self.request.user.primary_language)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic(using=instance._state.db):
+            faq = self._locked_faq(instance.faq_id)
+            instance.delete()
+            refresh_cache(faq, instance.language, self.request.user.primary_language)
+
+
+def parse_date_param(value):
+    """
+    Optional YYYY-MM-DD query parameter. Raises ValueError on bad input.
+    """
+    if not value:
+        return None
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(value)
+    return parsed
+
+
+class ActivityLogViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Read-only: logs are written by log_activity(), which also maintains the
+    daily rollups behind `stats`; `clear` deletes both.
+    """
     queryset = ActivityLog.objects.all()
     serializer_class = ActivityLogSerializer
     authentication_classes = [ShopifyAuthentication]
@@ -311,6 +380,9 @@ class ActivityLogViewSet(viewsets.ModelViewSet):
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['level', 'operation', 'message', 'product_title']
     ordering_fields = ['timestamp', 'level']
+    pagination_class = OptionalCursorPagination
+    cursor_ordering = ('-timestamp', '-pk') # index (shop, timestamp)
+    replica_read_actions = ('list', 'stats')
 
     def get_queryset(self):
         if not self.request.user.is_authenticated:
@@ -319,25 +391,62 @@ class ActivityLogViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['delete'])
     def clear(self, request):
+        # Write out buffered entries first, or the next flush would bring them (and their counters) back
+        flush_activity_log()
         logs = ActivityLog.objects.filter(shop=request.user) # Changed request.shop to request.user
-        logs.delete()
-        return Response({'status': 'cleared'})
+        # Batched so a long history never holds locks across the whole table
+        deleted = delete_in_chunks(logs, chunk_size=1000)
+        discard_stats(shop=request.user)
+        return Response({'status': 'cleared', 'deleted': deleted})
 
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """
-        Get summary stats for logs.
+        Get summary stats for logs, from the daily rollups.
+        Optional: ?start=YYYY-MM-DD&end=YYYY-MM-DD&by_operation=true
         """
-        # Simple aggregation - Clear ordering to fix group by
-        stats = self.get_queryset().order_by().values('level').annotate(count=Count('level'))
-        
+        try:
+            start = parse_date_param(request.query_params.get('start'))
+            end = parse_date_param(request.query_params.get('end'))
+        except ValueError:
+            return Response({"error": "Dates must be YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+
+        by_operation = request.query_params.get('by_operation', 'false').lower() in ('1', 'true', 'yes')
+
         # Format: { level_counts: { success: 10, error: 2, ... } }
-        data = { "level_counts": {} }
-        for item in stats:
-            data["level_counts"][item['level']] = item['count']
-            
+        return Response(get_log_stats(request.user, start=start, end=end, by_operation=by_operation))
+
+class AIUsageViewSet(viewsets.ViewSet):
+    """
+    AI token usage and estimated cost rollups for the authenticated shop.
+    """
+    authentication_classes = [ShopifyAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        from .services.usage_service import get_usage_rollup, tokens_used_this_month
+
+        shop = request.user
+        try:
+            days = int(request.query_params.get('days', 30))
+        except ValueError:
+            return Response({"error": "Invalid 'days' parameter"}, status=status.HTTP_400_BAD_REQUEST)
+        days = max(1, min(days, 366))
+
+        data = get_usage_rollup(shop, days=days)
+
+        budget = None
+        if hasattr(shop, 'api_configuration'):
+            budget = shop.api_configuration.monthly_token_budget
+        used = tokens_used_this_month(shop)
+        data['budget'] = {
+            "monthly_token_budget": budget,
+            "used_this_month": used,
+            "remaining": max(budget - used, 0) if budget else None
+        }
         return Response(data)
 
+
 class APIConfigurationViewSet(viewsets.ModelViewSet):
     queryset = APIConfiguration.objects.all()
     serializer_class = APIConfigurationSerializer
@@ -364,11 +473,8 @@ class APIConfigurationViewSet(viewsets.ModelViewSet):
             'use_default_keys': True
         })
         
-        # Check Plan: Prioritize highest price if multiple active (overlap handling)
-        plan_name = "Gratuit"
-        subscription = shop.subscriptions.filter(status__iexact='active').order_by('-plan__price', '-created_at').first()
-        if subscription and subscription.plan:
-             plan_name = subscription.plan.name
+        # Check Plan: highest price wins if multiple active (overlap handling)
+        plan_name = get_entitlements(shop).plan_name or "Gratuit"
         
         is_unlimited = (plan_name == 'Unlimited')
         
@@ -458,6 +564,8 @@ class SyncAuthView(APIView):
                 'is_active': True 
             }
         )
+        # Reinstalled while its data was being deleted
+        cancel_shop_deletion(shop)
         
         # Also update API Config if it exists
         APIConfiguration.objects.update_or_create(
@@ -479,9 +587,9 @@ class SyncAuthView(APIView):
                     plan=free_plan,
                     status='active'
                 )
-                print(f"Assigned default 'Gratuit' plan to {shop_domain}")
+                logger.info("Assigned default 'Gratuit' plan to %s", shop_domain)
             except Plan.DoesNotExist:
-                print("Error: 'Gratuit' plan not found. Run seed_plans.py.")
+                logger.error("'Gratuit' plan not found. Run seed_plans.py.")
         
         return Response({"status": "synced"})
 
@@ -490,6 +598,9 @@ class UninstallShopView(APIView):
     """
     Internal endpoint to clean up shop data upon uninstall.
     Secured by X-Internal-Secret.
+
+    The shop is deactivated immediately; its data is deleted in the background
+    (services/shop_deletion.py) and the response carries the deletion job id.
     """
     authentication_classes = []
     permission_classes = [permissions.AllowAny]
@@ -498,33 +609,64 @@ class UninstallShopView(APIView):
         secret = request.headers.get('X-Internal-Secret')
         internal_secret = os.environ.get('INTERNAL_API_SECRET', 'my_dev_secret')
         
-        print(f"[{timezone.now()}] [UninstallShopView] Request received.")
-        print(f"[{timezone.now()}] [UninstallShopView] Secret provided: {'******' if secret else 'NONE'}")
-        
         if secret != internal_secret:
-             print(f"[{timezone.now()}] [UninstallShopView] Unauthorized: Invalid secret.")
+             logger.warning("Uninstall rejected: invalid secret (provided: %s)", bool(secret))
              return Response({"error": "Unauthorized"}, status=status.HTTP_401_UNAUTHORIZED)
              
         shop_domain = request.data.get('shop')
-        print(f"[{timezone.now()}] [UninstallShopView] Target shop: {shop_domain}")
         
         if not shop_domain:
              return Response({"error": "Missing shop domain"}, status=status.HTTP_400_BAD_REQUEST)
              
         try:
             shop = Shop.objects.get(shop_domain=shop_domain)
-            # Delete shop - this cascades to Products, FAQs, Logs, Config, etc.
-            count, deleted_dict = shop.delete()
-            print(f"[{timezone.now()}] [UninstallShopView] Success! Deleted: {deleted_dict}")
-            return Response({"status": "deleted", "message": f"Shop {shop_domain} and all data removed.", "details": deleted_dict})
+            job = schedule_shop_deletion(shop)
+            logger.info("Uninstalled shop %s", shop_domain, extra={'job_id': job.id})
+            return Response(
+                {"status": "scheduled", "message": f"Shop {shop_domain} deactivated, data deletion scheduled.", "job_id": job.id},
+                status=status.HTTP_202_ACCEPTED
+            )
         except Shop.DoesNotExist:
-            print(f"[{timezone.now()}] [UninstallShopView] Shop {shop_domain} NOT FOUND.")
+            logger.info("Uninstall: shop %s not found", shop_domain)
             return Response({"status": "ignored", "message": "Shop not found or already deleted."})
         except Exception as e:
-            print(f"[{timezone.now()}] [UninstallShopView] ERROR: {str(e)}")
+            logger.exception("Uninstall of %s failed: %s", shop_domain, e)
             return Response({"error": str(e)}, status=500)
 
 
+class ProductWebhookView(APIView):
+    """
+    Shopify products/create, products/update and products/delete webhooks.
+    Secured by the X-Shopify-Hmac-Sha256 signature; events are queued and
+    applied in coalesced batches (services/product_webhooks.py).
+    """
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request):
+        body = request.body # Raw bytes, read before DRF parses them
+        if not verify_webhook(body, request.headers.get('X-Shopify-Hmac-Sha256')):
+            logger.warning("Product webhook rejected: invalid HMAC")
+            return Response({"error": "Unauthorized"}, status=status.HTTP_401_UNAUTHORIZED)
+
+        topic = request.headers.get('X-Shopify-Topic')
+        shop_domain = request.headers.get('X-Shopify-Shop-Domain')
+        # Anything but a 2xx makes Shopify retry, so unknown shops and topics are acknowledged
+        if topic not in PRODUCT_TOPICS:
+            return Response({"status": "ignored", "message": f"Unsupported topic {topic}."})
+        shop_id = Shop.objects.filter(shop_domain=shop_domain, is_active=True).values_list('pk', flat=True).first()
+        if shop_id is None:
+            return Response({"status": "ignored", "message": "Shop not found or inactive."})
+        if not isinstance(request.data, dict):
+            return Response({"error": "Invalid payload"}, status=status.HTTP_400_BAD_REQUEST)
+        missing = missing_fields(topic, request.data)
+        if missing:
+            return Response({"error": f"Missing product fields: {', '.join(missing)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        receive_product_event(shop_id, topic, request.data)
+        return Response({"status": "queued"})
+
+
 class FAQDesignViewSet(viewsets.GenericViewSet, generics.RetrieveUpdateAPIView):
     """
     Manage visual customization settings.
@@ -544,12 +686,7 @@ class FAQDesignViewSet(viewsets.GenericViewSet, generics.RetrieveUpdateAPIView):
         
         # Inject plan name
         data = serializer.data
-        # Inject plan name - Prioritize expensive
-        shop = request.user
-        plan_name = "Gratuit"
-        subscription = shop.subscriptions.filter(status__iexact='active').order_by('-plan__price', '-created_at').first()
-        if subscription and subscription.plan:
-             plan_name = subscription.plan.name
+        plan_name = get_entitlements(request.user).plan_name or "Gratuit"
         
         # If serializer.data is immutable (ReturnDict), copying might be needed depending on DRF version,
         # but usually it allows assignment or we cast to dict. Safe approach:
@@ -559,15 +696,15 @@ class FAQDesignViewSet(viewsets.GenericViewSet, generics.RetrieveUpdateAPIView):
         return Response(data)
 
     def update(self, request, *args, **kwargs):
-        print(f"[{timezone.now()}] [FAQDesignViewSet] Update request received for {request.user}")
-        print(f"[{timezone.now()}] [FAQDesignViewSet] Data: {request.data}")
-        
+        # Field names only: custom_css can be large
+        logger.debug("FAQ design update for %s", request.user, extra={'fields': sorted(request.data)})
+
         partial = kwargs.pop('partial', False)
         instance = self.get_object()
         serializer = self.get_serializer(instance, data=request.data, partial=partial)
         
         if not serializer.is_valid():
-             print(f"[{timezone.now()}] [FAQDesignViewSet] Validation Errors: {serializer.errors}")
+             logger.info("FAQ design validation errors for %s", request.user, extra={'errors': serializer.errors})
              return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         self.perform_update(serializer)
@@ -582,13 +719,8 @@ class FAQDesignViewSet(viewsets.GenericViewSet, generics.RetrieveUpdateAPIView):
     def perform_update(self, serializer):
         shop = self.request.user
         
-        # Check subscription status - Prioritize expensive
-        subscription = shop.subscriptions.filter(status__iexact='active').order_by('-plan__price', '-created_at').first()
-        can_customize = False
-        if subscription and subscription.status == 'active':
-            features = subscription.plan.features
-            if isinstance(features, dict):
-                can_customize = features.get('design_customization', False)
+        # Check plan features
+        can_customize = get_entitlements(shop).features.get('design_customization', False)
         
         # If not allowed to customize, revert premium fields to defaults
         if not can_customize:
@@ -628,8 +760,7 @@ class BulkActionViewSet(viewsets.ViewSet):
             )
             
         # Check Plan Restriction
-        active_sub = shop.subscriptions.filter(status='active').order_by('-created_at').first()
-        plan_name = active_sub.plan.name if active_sub and active_sub.plan else "Free"
+        plan_name = get_entitlements(shop).plan_name or "Free"
         
         if plan_name != "Unlimited":
              return Response(
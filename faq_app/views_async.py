@@ -0,0 +1,200 @@
+"""
+Async (ASGI) variants of the storefront and FAQ generation endpoints.
+
+These are plain Django async views: under an ASGI server they never hold a
+worker thread while waiting on the database driver thread pool or on the
+Anthropic API, so one worker can keep hundreds of requests in flight.
+Response bodies match their synchronous DRF counterparts.
+"""
+import json
+import logging
+import time
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework import exceptions
+
+from .authentication import ShopifyAuthentication, get_active_shop
+from .db_routing import replica_reads
+from .models import Shop, Product, FAQ, FAQDesign, APIConfiguration
+from .serializers import FAQSerializer, ProductSerializer, FAQDesignSerializer, with_active_faqs, with_raw_json, with_translations
+from .sharding import activate_shop
+from .services.activity_log import log_activity
+from .services.ai_service import agenerate_faq_for_product
+from .services.faq_service import extract_valid_faqs, question_count, save_generated_faq
+from .services.storefront_cache import get_payload, payload_key, payload_response, store_payload
+from .views_storefront import DEFAULT_DESIGN, product_lookups
+from subscriptions.entitlements import get_entitlements
+
+logger = logging.getLogger(__name__)
+
+
+@replica_reads
+@require_GET
+async def storefront_faq(request):
+    """
+    Async variant of StorefrontFAQView.
+    """
+    shop_domain = request.GET.get('shop')
+    product_id = request.GET.get('product_id')
+    handle = request.GET.get('handle')
+
+    if not shop_domain:
+        return JsonResponse({"error": "Missing 'shop' parameter"}, status=400)
+    if not product_id and not handle:
+        return JsonResponse({"error": "Missing 'product_id' or 'handle' parameter"}, status=400)
+
+    try:
+        shop = await sync_to_async(get_active_shop)(shop_domain)
+    except Shop.DoesNotExist:
+        return JsonResponse({"error": "Shop not found"}, status=404)
+    activate_shop(shop.pk)
+
+    # Shares cache entries with StorefrontFAQView
+    cache_key = await sync_to_async(payload_key)(shop.id, product_id, handle)
+    cached = await sync_to_async(get_payload)(cache_key)
+    if cached is not None:
+        return payload_response(cached)
+
+    product = None
+    for lookup in product_lookups(product_id, handle):
+        product = await Product.objects.filter(shop=shop, **lookup).afirst()
+        if product:
+            break
+
+    if not product:
+        return JsonResponse({"error": "Product not found"}, status=404)
+
+    faq = await with_translations(with_raw_json(FAQ.objects.filter(product=product, is_active=True)), shop.languages).order_by('-created_at').afirst()
+    if faq is None:
+        return JsonResponse({"error": "No active FAQ found for this product"}, status=404)
+
+    design = await FAQDesign.objects.filter(shop=shop).afirst()
+    if design is not None:
+        # FAQDesignSerializer resolves plan fields through the ORM
+        design_data = await sync_to_async(lambda: FAQDesignSerializer(design).data)()
+    else:
+        design_data = DEFAULT_DESIGN
+
+    entry = await sync_to_async(store_payload)(cache_key, {
+        "faq": FAQSerializer(faq).data,
+        "design": design_data
+    })
+    return payload_response(entry)
+
+
+@replica_reads
+@require_GET
+async def storefront_product_search(request):
+    """
+    Async variant of StorefrontProductSearchView.
+    """
+    shop_domain = request.GET.get('shop')
+    query = request.GET.get('q', '').strip()
+
+    if not shop_domain:
+        return JsonResponse({"error": "Missing 'shop' parameter"}, status=400)
+
+    shop = await Shop.objects.filter(shop_domain=shop_domain, is_active=True).afirst()
+    if shop is None:
+        return JsonResponse({"detail": "No Shop matches the given query."}, status=404)
+    activate_shop(shop.pk)
+
+    products = Product.objects.filter(shop=shop)
+    if query:
+        products = products.filter(title__icontains=query)
+
+    products = [p async for p in with_active_faqs(products[:20], shop.primary_language)]
+    data = await sync_to_async(lambda: ProductSerializer(products, many=True).data)()
+    return JsonResponse(data, safe=False)
+
+
+def _authenticate(request):
+    try:
+        result = ShopifyAuthentication().authenticate(request)
+    except exceptions.AuthenticationFailed as e:
+        return None, str(e.detail)
+    if result is None:
+        return None, "Authentication credentials were not provided."
+    return result[0], None
+
+
+def _max_ai_questions(shop):
+    return get_entitlements(shop).features.get('max_ai_questions', 3)
+
+
+def _save_and_log(shop, product, languages, duration_seconds):
+    faq = save_generated_faq(product, languages, duration_seconds=duration_seconds)
+    try:
+        log_activity(
+            shop=shop,
+            level='success',
+            operation='generate_faq',
+            message=f"Generated {question_count(languages)} questions for product '{product.title}'."
+        )
+    except Exception as e:
+        logger.exception("Log creation failed: %s", e)
+    return faq
+
+
+@csrf_exempt
+@require_POST
+async def generate_faq(request):
+    """
+    Async variant of FAQViewSet.generate_faq. The Anthropic call is awaited
+    with httpx instead of blocking a thread for its whole duration.
+    """
+    shop, auth_error = await sync_to_async(_authenticate)(request)
+    if shop is None:
+        return JsonResponse({"status": "error", "code": 401, "message": auth_error}, status=401)
+
+    try:
+        body = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({"error": "Invalid JSON body"}, status=400)
+
+    product_id = body.get('productId')
+    if not product_id:
+        return JsonResponse({"error": "Missing productId"}, status=400)
+
+    try:
+        max_ai_questions = await sync_to_async(_max_ai_questions)(shop)
+    except Exception as e:
+        return JsonResponse({"error": f"Subscription check failed: {str(e)}"}, status=500)
+
+    product = await Product.objects.select_related('shop').filter(shop=shop, shopify_id=product_id).afirst()
+    if product is None:
+        return JsonResponse({"error": "Product not found"}, status=404)
+
+    api_config = await APIConfiguration.objects.filter(shop=shop).afirst()
+
+    try:
+        requested_num = int(body.get('num_questions', 5))
+    except (TypeError, ValueError):
+        requested_num = 5
+    num_questions = min(requested_num, max_ai_questions)
+
+    started = time.monotonic()
+    faqs_data = await agenerate_faq_for_product(product, api_config, num_questions=num_questions, languages=shop.languages)
+    duration_seconds = int(round(time.monotonic() - started))
+
+    if isinstance(faqs_data, dict) and faqs_data.get('code') == 'token_budget_exceeded':
+        return JsonResponse({"error": faqs_data['error']}, status=429)
+
+    languages = extract_valid_faqs(faqs_data, shop.languages)
+    if not any(languages.values()):
+        return JsonResponse({"error": "AI generated empty or invalid content", "raw_data": faqs_data}, status=422)
+
+    try:
+        faq = await sync_to_async(_save_and_log)(shop, product, languages, duration_seconds)
+    except Exception as e:
+        logger.exception("Async FAQ generation failed: %s", e)
+        return JsonResponse({"error": str(e)}, status=500)
+
+    return JsonResponse({
+        "status": "success",
+        "faq_id": faq.id,
+        "count": question_count(languages),
+        "details": {lang: len(items) for lang, items in languages.items()}
+    })
@@ -0,0 +1,162 @@
+"""
+Operational endpoints for the Remix app / ops, secured by X-Internal-Secret.
+"""
+import hmac
+import os
+from datetime import timedelta
+from django.db.models import F
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status, permissions
+from .instrumentation import REQUEST_INSTRUMENTATION_SAMPLE_RATE, LATENCY_BUCKETS_MS, registry
+from .metrics import REGISTRY
+from .models import RequestProfile, Shop
+from .profiling import PROFILE_TOKEN_MAX_AGE, make_profile_token
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def has_internal_secret(request):
+    secret = request.headers.get('X-Internal-Secret') or ''
+    # Prometheus scrapers send credentials as a bearer token
+    authorization = request.headers.get('Authorization') or ''
+    if not secret and authorization.startswith('Bearer '):
+        secret = authorization[len('Bearer '):]
+    internal_secret = os.environ.get('INTERNAL_API_SECRET', 'my_dev_secret')
+    return hmac.compare_digest(secret, internal_secret)
+
+
+class RequestStatsView(APIView):
+    """
+    Per-endpoint latency histograms and query / outbound / size averages
+    for sampled requests of this worker process.
+    DELETE resets the counters.
+    """
+    authentication_classes = [] # No auth required, self-secured
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        if not has_internal_secret(request):
+            return Response({"error": "Unauthorized"}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response({
+            "pid": os.getpid(),
+            "sample_rate": REQUEST_INSTRUMENTATION_SAMPLE_RATE,
+            "latency_buckets_ms": list(LATENCY_BUCKETS_MS),
+            "endpoints": registry.snapshot(),
+        })
+
+    def delete(self, request):
+        if not has_internal_secret(request):
+            return Response({"error": "Unauthorized"}, status=status.HTTP_401_UNAUTHORIZED)
+        registry.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint (text exposition format). Merges every worker
+    process when METRICS_MULTIPROC_DIR is set, see metrics.py.
+    """
+    if not has_internal_secret(request):
+        return HttpResponse('Unauthorized\n', status=401, content_type='text/plain')
+    return HttpResponse(REGISTRY.expose(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+PROFILE_LIST_FIELDS = (
+    'id', 'request_id', 'method', 'path', 'status_code', 'duration_ms',
+    'query_count', 'db_ms', 'profiler', 'size_bytes', 'truncated', 'created_at', 'expires_at',
+)
+
+
+class ProfilingControlView(APIView):
+    """
+    POST {"shop": domain, "minutes": n} profiles the shop's requests for n
+    minutes (0 turns it off). The response also carries a token: send it as
+    X-Profile-Request to profile any single request, for PROFILE_TOKEN_MAX_AGE seconds.
+    """
+    authentication_classes = [] # No auth required, self-secured
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request):
+        if not has_internal_secret(request):
+            return Response({"error": "Unauthorized"}, status=status.HTTP_401_UNAUTHORIZED)
+        data = {"token": make_profile_token(), "token_max_age": PROFILE_TOKEN_MAX_AGE}
+
+        shop_domain = request.data.get('shop')
+        if shop_domain:
+            try:
+                minutes = int(request.data.get('minutes', 30))
+            except (TypeError, ValueError):
+                return Response({"error": "minutes must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                shop = Shop.objects.get(shop_domain=shop_domain)
+            except Shop.DoesNotExist:
+                return Response({"error": "Shop not found"}, status=status.HTTP_404_NOT_FOUND)
+            shop.profile_requests_until = timezone.now() + timedelta(minutes=minutes) if minutes > 0 else None
+            shop.save(update_fields=['profile_requests_until', 'updated_at'])
+            data.update(shop=shop_domain, profile_requests_until=shop.profile_requests_until)
+        return Response(data)
+
+
+class RequestProfileListView(APIView):
+    """
+    Stored request profiles (metadata only), newest first. ?shop= filters.
+    """
+    authentication_classes = [] # No auth required, self-secured
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        if not has_internal_secret(request):
+            return Response({"error": "Unauthorized"}, status=status.HTTP_401_UNAUTHORIZED)
+        profiles = RequestProfile.objects.filter(expires_at__gt=timezone.now())
+        if request.query_params.get('shop'):
+            profiles = profiles.filter(shop__shop_domain=request.query_params['shop'])
+        profiles = profiles.order_by('-created_at').values(*PROFILE_LIST_FIELDS, shop_domain=F('shop__shop_domain'))
+        return Response(list(profiles[:200]))
+
+
+class RequestProfileDetailView(APIView):
+    """
+    One profile. ?download=pstats (load with pstats.Stats), collapsed (flame
+    graph input) or sql; metadata with the SQL trace by default. DELETE removes it.
+    (Not ?format=: DRF reserves it for renderer selection.)
+    """
+    authentication_classes = [] # No auth required, self-secured
+    permission_classes = [permissions.AllowAny]
+
+    def get_profile(self, pk):
+        return RequestProfile.objects.select_related('shop').filter(pk=pk, expires_at__gt=timezone.now()).first()
+
+    def get(self, request, pk):
+        if not has_internal_secret(request):
+            return Response({"error": "Unauthorized"}, status=status.HTTP_401_UNAUTHORIZED)
+        profile = self.get_profile(pk)
+        if profile is None:
+            return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        output = request.query_params.get('download')
+        if output == 'pstats':
+            if not profile.pstats:
+                return Response({"error": "No pstats for this profile"}, status=status.HTTP_404_NOT_FOUND)
+            response = HttpResponse(bytes(profile.pstats), content_type='application/octet-stream')
+            response['Content-Disposition'] = f'attachment; filename="profile-{profile.id}.pstats"'
+            return response
+        if output == 'collapsed':
+            response = HttpResponse(profile.collapsed_stacks, content_type='text/plain; charset=utf-8')
+            response['Content-Disposition'] = f'attachment; filename="profile-{profile.id}.collapsed"'
+            return response
+        if output == 'sql':
+            return Response(profile.sql_trace)
+
+        data = {field: getattr(profile, field) for field in PROFILE_LIST_FIELDS}
+        data['shop_domain'] = profile.shop.shop_domain if profile.shop else None
+        data['sql_trace'] = profile.sql_trace
+        return Response(data)
+
+    def delete(self, request, pk):
+        if not has_internal_secret(request):
+            return Response({"error": "Unauthorized"}, status=status.HTTP_401_UNAUTHORIZED)
+        RequestProfile.objects.filter(pk=pk).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -1,12 +1,47 @@
-from django.utils import timezone
+import logging
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
-from .models import Shop, Product, FAQ, FAQDesign
-from .serializers import FAQSerializer, ProductSerializer, FAQDesignSerializer
+from .models import Shop, Product, FAQ, FAQDesign, FAQItem
+from .serializers import FAQSerializer, ProductSerializer, FAQDesignSerializer, with_active_faqs, with_raw_json, with_translations
+from .authentication import get_active_shop
+from .sharding import activate_shop
+from .services.faq_search import highlight, with_search_rank
+from .services.storefront_cache import get_payload, payload_key, payload_response, store_payload
+from .structured_logging import SAMPLED
 from django.shortcuts import get_object_or_404
 from django.db.models import Q
 
+logger = logging.getLogger(__name__)
+
+# Returned when the shop never customized its FAQ design
+DEFAULT_DESIGN = {
+    "question_color": "#1e293b",
+    "answer_color": "#475569",
+    "background_color": "#ffffff",
+    "border_color": "#e2e8f0",
+    "font_size": 16,
+    "border_radius": 12,
+    "custom_css": ""
+}
+
+
+def product_lookups(product_id, handle):
+    """
+    Ordered product lookup strategies for storefront requests:
+    exact ID, numeric ID (GID prefix stripped), then handle.
+    """
+    lookups = []
+    if product_id:
+        lookups.append({'shopify_id': product_id})
+        clean_id = str(product_id).replace("gid://shopify/Product/", "")
+        if clean_id != product_id:
+            lookups.append({'shopify_id': clean_id})
+    if handle:
+        lookups.append({'handle': handle})
+    return lookups
+
+
 class StorefrontFAQView(APIView):
     """
     Public API endpoint to fetch FAQs for a specific product.
@@ -17,64 +52,55 @@ class StorefrontFAQView(APIView):
     """
     permission_classes = [permissions.AllowAny]
     authentication_classes = []
+    replica_read_actions = ('get',) # See db_routing.py
 
     def get(self, request):
         shop_domain = request.query_params.get('shop')
         product_id = request.query_params.get('product_id')
         handle = request.query_params.get('handle')
 
-        print(f"[{timezone.now()}] [StorefrontFAQView] Request: shop={shop_domain}, product_id={product_id}, handle={handle}")
+        # Hottest endpoint: request lines are sampled
+        logger.info("Storefront FAQ request shop=%s product_id=%s handle=%s", shop_domain, product_id, handle, extra=SAMPLED)
 
         if not shop_domain:
-            print(f"[{timezone.now()}] [StorefrontFAQView] Error: Missing shop parameter")
             return Response({"error": "Missing 'shop' parameter"}, status=status.HTTP_400_BAD_REQUEST)
 
         if not product_id and not handle:
-            print(f"[{timezone.now()}] [StorefrontFAQView] Error: Missing product_id or handle")
             return Response({"error": "Missing 'product_id' or 'handle' parameter"}, status=status.HTTP_400_BAD_REQUEST)
 
         # Find the shop
         try:
-            shop = Shop.objects.get(shop_domain=shop_domain)
+            shop = get_active_shop(shop_domain)
         except Shop.DoesNotExist:
-            print(f"[{timezone.now()}] [StorefrontFAQView] Error: Shop {shop_domain} not found")
+            logger.info("Storefront FAQ: shop %s not found", shop_domain)
             return Response({"error": "Shop not found"}, status=status.HTTP_404_NOT_FOUND)
+        activate_shop(shop.pk)
+
+        # Rendered + compressed payload for the current content version
+        cache_key = payload_key(shop.id, product_id, handle)
+        cached = get_payload(cache_key)
+        if cached is not None:
+            return payload_response(cached)
 
-        # Find the product
+        # Find the product: exact ID, clean ID, then handle
         product = None
-        
-        # Strategy 1: exact match
-        if product_id:
+        for lookup in product_lookups(product_id, handle):
             try:
-                product = Product.objects.get(shop=shop, shopify_id=product_id)
-                print(f"[{timezone.now()}] [StorefrontFAQView] Found product by exact ID: {product}")
-            except Product.DoesNotExist:
-                # Strategy 2: numeric string (remove 'gid://shopify/Product/')
-                clean_id = str(product_id).replace("gid://shopify/Product/", "")
-                try:
-                    product = Product.objects.get(shop=shop, shopify_id=clean_id)
-                    print(f"[{timezone.now()}] [StorefrontFAQView] Found product by clean ID: {product}")
-                except Product.DoesNotExist:
-                    pass
-        
-        # Strategy 3: Handle
-        if not product and handle:
-            try:
-                product = Product.objects.get(shop=shop, handle=handle)
-                print(f"[{timezone.now()}] [StorefrontFAQView] Found product by handle: {product}")
+                product = Product.objects.get(shop=shop, **lookup)
+                logger.debug("Found product by %s: %s", lookup, product)
+                break
             except Product.DoesNotExist:
                 pass
 
         if not product:
-            print(f"[{timezone.now()}] [StorefrontFAQView] Error: Product not found for shop {shop_domain}. ID: {product_id}, Handle: {handle}")
+            logger.debug("Product not found for shop %s, id=%s handle=%s", shop_domain, product_id, handle)
             return Response({"error": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
 
         # Get the active FAQ
         try:
-            faq = FAQ.objects.filter(product=product, is_active=True).latest('created_at')
-            print(f"[{timezone.now()}] [StorefrontFAQView] Found FAQ: {faq.id}")
+            faq = with_translations(with_raw_json(FAQ.objects.filter(product=product, is_active=True)), shop.languages).latest('created_at')
         except FAQ.DoesNotExist:
-            print(f"[{timezone.now()}] [StorefrontFAQView] Warning: No active FAQ for product {product}")
+            logger.debug("No active FAQ for product %s", product)
             return Response({"error": "No active FAQ found for this product"}, status=status.HTTP_404_NOT_FOUND)
 
         # Get design settings
@@ -84,21 +110,13 @@ class StorefrontFAQView(APIView):
             design_data = FAQDesignSerializer(design).data
         except FAQDesign.DoesNotExist:
             # Return default design if none exists
-            design_data = {
-                "question_color": "#1e293b",
-                "answer_color": "#475569",
-                "background_color": "#ffffff",
-                "border_color": "#e2e8f0",
-                "font_size": 16,
-                "border_radius": 12,
-                "custom_css": ""
-            }
+            design_data = DEFAULT_DESIGN
 
         serializer = FAQSerializer(faq)
-        return Response({
+        return payload_response(store_payload(cache_key, {
             "faq": serializer.data,
             "design": design_data
-        })
+        }))
 
 
 class StorefrontProductSearchView(APIView):
@@ -110,6 +128,7 @@ class StorefrontProductSearchView(APIView):
     """
     permission_classes = [permissions.AllowAny]
     authentication_classes = []
+    replica_read_actions = ('get',) # See db_routing.py
 
     def get(self, request):
         shop_domain = request.query_params.get('shop')
@@ -119,7 +138,8 @@ class StorefrontProductSearchView(APIView):
             return Response({"error": "Missing 'shop' parameter"}, status=status.HTTP_400_BAD_REQUEST)
 
         # Find the shop
-        shop = get_object_or_404(Shop, shop_domain=shop_domain)
+        shop = get_object_or_404(Shop, shop_domain=shop_domain, is_active=True)
+        activate_shop(shop.pk)
 
         # Filter products
         products = Product.objects.filter(shop=shop)
@@ -128,7 +148,76 @@ class StorefrontProductSearchView(APIView):
             products = products.filter(title__icontains=query)
         
         # Limit results to 20 to avoid over-fetching
-        products = products[:20]
+        products = with_active_faqs(products[:20], shop.primary_language)
 
         serializer = ProductSerializer(products, many=True)
         return Response(serializer.data)
+
+
+class StorefrontFAQSearchView(APIView):
+    """
+    Public API endpoint to search within a shop's FAQs (full-text, ranked).
+    Query Params:
+    - shop: The shop domain (e.g., my-shop.myshopify.com)
+    - q: The search query
+    - language: One of the shop's languages (optional, default: its primary language)
+    - product_id: Restrict to one product's FAQ (optional)
+    - limit: Number of results, up to 50 (optional, default 10)
+    """
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+    replica_read_actions = ('get',) # See db_routing.py
+    max_limit = 50
+
+    def get(self, request):
+        shop_domain = request.query_params.get('shop')
+        query = request.query_params.get('q', '').strip()
+        language = request.query_params.get('language')
+        product_id = request.query_params.get('product_id')
+
+        if not shop_domain:
+            return Response({"error": "Missing 'shop' parameter"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), self.max_limit)
+        except ValueError:
+            return Response({"error": "Invalid 'limit' parameter"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            shop = get_active_shop(shop_domain)
+        except Shop.DoesNotExist:
+            return Response({"error": "Shop not found"}, status=status.HTTP_404_NOT_FOUND)
+        activate_shop(shop.pk)
+
+        language = language or shop.primary_language
+        if language not in shop.languages:
+            return Response({"error": f"Unsupported language '{language}'"}, status=status.HTTP_400_BAD_REQUEST)
+
+        items = FAQItem.objects.filter(
+            faq__product__shop=shop, faq__is_active=True, language=language
+        ).select_related('faq__product').only(
+            'id', 'faq_id', 'language', 'position', 'question', 'answer',
+            'faq__product_id', 'faq__product__title', 'faq__product__handle',
+        )
+        if product_id:
+            ids = [lookup['shopify_id'] for lookup in product_lookups(product_id, None)]
+            items = items.filter(faq__product__shopify_id__in=ids)
+        items = with_search_rank(items, query).order_by('-rank', 'pk')[:limit]
+
+        return Response({
+            "query": query,
+            "language": language,
+            "results": [{
+                "faq_id": item.faq_id,
+                "product_id": item.faq.product_id,
+                "product_title": item.faq.product.title,
+                "handle": item.faq.product.handle,
+                "position": item.position,
+                "question": item.question,
+                "answer": item.answer,
+                "highlight": {
+                    "question": highlight(item.question, query, length=None),
+                    "answer": highlight(item.answer, query),
+                },
+                "score": round(item.rank, 4),
+            } for item in items],
+        })
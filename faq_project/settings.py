@@ -57,7 +57,18 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so every log line of the request carries its id
+    'faq_app.middleware.RequestIdMiddleware',
+    'faq_app.middleware.MetricsMiddleware',
+    # Measures the rest of the stack and the view
+    'faq_app.middleware.RequestInstrumentationMiddleware',
+    # After instrumentation: shares its SQL recorder when the request is sampled
+    'faq_app.middleware.ProfilingMiddleware',
+    'faq_app.db_routing.ReplicaRoutingMiddleware',
+    'faq_app.sharding.TenantMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    # Before anything that reads or rewrites the response body
+    'faq_app.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -81,11 +92,119 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
+    # orjson-backed; both fall back to DRF's stdlib JSON if orjson is missing
+    'DEFAULT_RENDERER_CLASSES': [
+        'faq_app.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'faq_app.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
     'EXCEPTION_HANDLER': 'faq_app.exceptions.custom_exception_handler',
 }
 
+# Activity logs are queued in-process and written with bulk_create
+ACTIVITY_LOG_BUFFERED = os.environ.get('ACTIVITY_LOG_BUFFERED', 'True') == 'True'
+ACTIVITY_LOG_FLUSH_SIZE = int(os.environ.get('ACTIVITY_LOG_FLUSH_SIZE', 200))
+ACTIVITY_LOG_FLUSH_INTERVAL = float(os.environ.get('ACTIVITY_LOG_FLUSH_INTERVAL', 2.0))
+# Logs older than this are removed by `manage.py prune_activity_logs`
+ACTIVITY_LOG_RETENTION_DAYS = int(os.environ.get('ACTIVITY_LOG_RETENTION_DAYS', 90))
+ACTIVITY_LOG_ARCHIVE_DIR = os.environ.get('ACTIVITY_LOG_ARCHIVE_DIR') or None
+
+# Responses smaller than this are sent uncompressed (brotli if installed, else gzip)
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 860))
+# Shared by every worker and host: entitlements, subscriptions, shop lookups,
+# storefront payloads and replica pins are invalidated by signals in the worker
+# that made the change, which a per-process LocMemCache would never see.
+# Redis if REDIS_URL is set, else Memcached if MEMCACHED_LOCATION is set, else
+# the database (run `manage.py createcachetable` once).
+if os.environ.get('REDIS_URL'):
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+        'KEY_PREFIX': 'faq',
+    }}
+elif os.environ.get('MEMCACHED_LOCATION'):
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        'LOCATION': os.environ['MEMCACHED_LOCATION'],
+        'KEY_PREFIX': 'faq',
+    }}
+else:
+    CACHES = {'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+    }}
+
+# Rendered storefront FAQ payloads; entries are invalidated on content changes anyway
+STOREFRONT_CACHE_TTL = int(os.environ.get('STOREFRONT_CACHE_TTL', 300))
+
+# Fraction of requests instrumented (0 = off); see faq_app/instrumentation.py
+REQUEST_INSTRUMENTATION_SAMPLE_RATE = float(os.environ.get('REQUEST_INSTRUMENTATION_SAMPLE_RATE', 0.0))
+REQUEST_SLOW_MS = int(os.environ.get('REQUEST_SLOW_MS', 1000))
+REQUEST_SLOW_QUERY_COUNT = int(os.environ.get('REQUEST_SLOW_QUERY_COUNT', 50))
+
+# /metrics: shared directory for gunicorn workers (empty it on deploy); unset = per-process
+METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR') or None
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5.0))
+
+# Shopify Admin API origin template, e.g. http://127.0.0.1:8001/{shop} for the benchmark fake
+SHOPIFY_API_BASE_URL = os.environ.get('SHOPIFY_API_BASE_URL') or None
+# Pause between products in bulk generation jobs (seconds)
+BULK_GENERATION_DELAY = float(os.environ.get('BULK_GENERATION_DELAY', 0.5))
+
+# Uninstalled shops are deleted in the background, this many rows per DELETE
+SHOP_DELETION_CHUNK_SIZE = int(os.environ.get('SHOP_DELETION_CHUNK_SIZE', 1000))
+SHOP_DELETION_PAUSE = float(os.environ.get('SHOP_DELETION_PAUSE', 0.05))
+
+# Product webhooks are queued and applied in batches; bursts for one product within the window collapse to the last event
+PRODUCT_WEBHOOK_BUFFERED = os.environ.get('PRODUCT_WEBHOOK_BUFFERED', 'True') == 'True'
+PRODUCT_WEBHOOK_COALESCE_WINDOW = float(os.environ.get('PRODUCT_WEBHOOK_COALESCE_WINDOW', 2.0))
+PRODUCT_WEBHOOK_FLUSH_SIZE = int(os.environ.get('PRODUCT_WEBHOOK_FLUSH_SIZE', 500))
+PRODUCT_WEBHOOK_MAX_ATTEMPTS = int(os.environ.get('PRODUCT_WEBHOOK_MAX_ATTEMPTS', 5))
+
+# On-demand request profiling (faq_app/profiling.py): 'cprofile' or 'sampling'
+PROFILER = os.environ.get('PROFILER', 'cprofile')
+PROFILE_MAX_BYTES = int(os.environ.get('PROFILE_MAX_BYTES', 2 * 1024 * 1024))
+PROFILE_MAX_PER_SHOP = int(os.environ.get('PROFILE_MAX_PER_SHOP', 50))
+PROFILE_RETENTION_HOURS = int(os.environ.get('PROFILE_RETENTION_HOURS', 72))
+
+# App logging: leveled per-module loggers, JSON lines (LOG_FORMAT=plain for local dev)
+# written from a queue thread; see faq_app/structured_logging.py
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+# Share of high-volume info lines (e.g. one per storefront request) kept
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 0.01))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {'()': 'faq_app.structured_logging.JSONFormatter'},
+        'plain': {'()': 'faq_app.structured_logging.PlainFormatter'},
+    },
+    'filters': {
+        'request_id': {'()': 'faq_app.structured_logging.RequestIdFilter'},
+        'sampling': {'()': 'faq_app.structured_logging.SamplingFilter', 'rate': LOG_SAMPLE_RATE},
+    },
+    'handlers': {
+        'app': {
+            'class': 'faq_app.structured_logging.QueueStreamHandler',
+            'stream': 'ext://sys.stdout',
+            'formatter': LOG_FORMAT,
+            'filters': ['request_id', 'sampling'],
+        },
+    },
+    'loggers': {
+        'faq_app': {'handlers': ['app'], 'level': LOG_LEVEL, 'propagate': False},
+        'subscriptions': {'handlers': ['app'], 'level': LOG_LEVEL, 'propagate': False},
+    },
+}
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'FAQ App API',
     'DESCRIPTION': 'API for the Shopify FAQ App',
@@ -129,9 +248,35 @@ DATABASES = {
         'OPTIONS': {
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
         },
+        # Persistent connections, checked before reuse (see faq_app/db_connections.py).
+        # Django's MySQL backend has no pool: each worker thread keeps one connection,
+        # so the server sees up to workers x threads (+ background threads) of them.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', 'True') == 'True',
     }
 }
 
+# Read replicas (faq_app/db_routing.py): comma-separated hosts sharing the primary's credentials
+DATABASE_REPLICAS = []
+for index, host in enumerate(h.strip() for h in os.environ.get('DB_REPLICA_HOSTS', '').split(',') if h.strip()):
+    DATABASES[f'replica_{index}'] = {**DATABASES['default'], 'HOST': host}
+    DATABASE_REPLICAS.append(f'replica_{index}')
+# Tenant shards (faq_app/sharding.py): `default` plus comma-separated hosts sharing its credentials
+TENANT_SHARDS = ['default']
+for index, host in enumerate(h.strip() for h in os.environ.get('DB_SHARD_HOSTS', '').split(',') if h.strip()):
+    DATABASES[f'shard_{index + 1}'] = {**DATABASES['default'], 'HOST': host}
+    TENANT_SHARDS.append(f'shard_{index + 1}')
+# Seconds a process trusts its copy of a shard map entry; shard moves wait this long between steps
+SHARD_MAP_CACHE_TTL = int(os.environ.get('SHARD_MAP_CACHE_TTL', 5))
+# Rows per copy / DELETE when `manage.py move_shop_shard` moves a shop
+SHARD_MOVE_CHUNK_SIZE = int(os.environ.get('SHARD_MOVE_CHUNK_SIZE', 1000))
+# Shard routing first: tenant rows on another shard never go to a replica of default
+DATABASE_ROUTERS = ['faq_app.sharding.ShardRouter', 'faq_app.db_routing.ReplicaRouter']
+# Replicas further behind are skipped; a shop that wrote reads from the primary for REPLICA_PIN_SECONDS
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 5.0))
+REPLICA_LAG_CHECK_INTERVAL = float(os.environ.get('REPLICA_LAG_CHECK_INTERVAL', 5.0))
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
+
 # Silence the database version check for older MySQL versions
 SILENCED_SYSTEM_CHECKS = ['models.W042']
 
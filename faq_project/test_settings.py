@@ -4,5 +4,26 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    # Only used by the routing tests, which enable it with DATABASE_REPLICAS
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db_replica.sqlite3',
+    },
+    # Only used by the sharding tests, which enable it with TENANT_SHARDS
+    'shard_1': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db_shard_1.sqlite3',
+    },
 }
+DATABASE_REPLICAS = []
+TENANT_SHARDS = ['default']
+
+# One process: a local cache keeps cache lookups out of the query budgets
+CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+# Write activity logs synchronously so tests can read them back immediately
+ACTIVITY_LOG_BUFFERED = False
+
+# Apply product webhooks during the request
+PRODUCT_WEBHOOK_BUFFERED = False
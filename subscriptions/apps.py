@@ -6,3 +6,6 @@ class SubscriptionsConfig(AppConfig):
 
 
     name = 'subscriptions'
+
+    def ready(self):
+        from . import signals  # noqa: F401
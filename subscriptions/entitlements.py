@@ -0,0 +1,144 @@
+"""
+Resolve a shop's effective plan and features.
+
+Every view used to run its own "active subscription -> plan.features" query,
+each with a slightly different ordering. get_entitlements() is the single
+implementation: the highest priced active subscription wins (newest first on
+ties), feature keys are normalized, and the result is memoized on the shop
+instance for the request and cached across requests until a Subscription or
+Plan changes (see signals.py).
+"""
+import time
+from django.conf import settings
+from django.core.cache import cache
+from .models import Subscription
+
+ENTITLEMENTS_CACHE_TTL = getattr(settings, 'ENTITLEMENTS_CACHE_TTL', 300)
+PLANS_VERSION_KEY = 'entitlements:plans_version'
+
+# Features of a shop without an active subscription
+FREE_FEATURES = {
+    'products_limit': 1,
+    'max_questions': 10,
+    'max_ai_questions': 3,
+    'design_customization': False,
+    'ai_generation': False,
+}
+
+# Legacy/alternate feature names -> canonical name
+FEATURE_ALIASES = {
+    'max_products': 'products_limit',
+}
+
+
+def normalize_features(features):
+    """
+    Return a copy of a plan's features with canonical keys filled in from their
+    aliases. Original keys are kept so existing API consumers keep working.
+    """
+    if not isinstance(features, dict):
+        return {}
+    normalized = dict(features)
+    for alias, canonical in FEATURE_ALIASES.items():
+        if alias in features and canonical not in features:
+            normalized[canonical] = features[alias]
+    return normalized
+
+
+class Entitlements:
+    def __init__(self, plan_id=None, plan_name=None, plan_price=None, features=None):
+        self.plan_id = plan_id
+        self.plan_name = plan_name
+        self.plan_price = plan_price
+        self.features = features if features is not None else dict(FREE_FEATURES)
+
+    @property
+    def has_plan(self):
+        return self.plan_id is not None
+
+    def to_cache(self):
+        return {
+            'plan_id': self.plan_id,
+            'plan_name': self.plan_name,
+            'plan_price': self.plan_price,
+            'features': self.features,
+        }
+
+    def __repr__(self):
+        return f"<Entitlements plan={self.plan_name!r}>"
+
+
+def _shop_key(shop_id):
+    return f'entitlements:shop:{shop_id}'
+
+
+def current_subscription_cache_key(shop_id):
+    """
+    Cached SubscriptionViewSet.current payload; invalidated together with entitlements.
+    """
+    return f'subscriptions:current:{shop_id}'
+
+
+def get_plans_version(cached=None):
+    """
+    Current plans version. Anything cached that embeds plan data stores this
+    value and treats a mismatch as a miss.
+    """
+    plans_version = (cached or {}).get(PLANS_VERSION_KEY) or cache.get(PLANS_VERSION_KEY)
+    if plans_version is None:
+        plans_version = time.time_ns()
+        cache.set(PLANS_VERSION_KEY, plans_version, None)
+    return plans_version
+
+
+def _resolve(shop):
+    subscription = (
+        Subscription.objects
+        .filter(shop=shop, status__iexact='active')
+        .select_related('plan')
+        .order_by('-plan__price', '-created_at')
+        .first()
+    )
+    if not subscription or not subscription.plan:
+        return Entitlements()
+    plan = subscription.plan
+    return Entitlements(
+        plan_id=plan.id,
+        plan_name=plan.name,
+        plan_price=str(plan.price),
+        features=normalize_features(plan.features),
+    )
+
+
+def get_entitlements(shop):
+    """
+    Effective plan and features for a shop.
+    """
+    memo = getattr(shop, '_entitlements', None)
+    if memo is not None:
+        return memo
+
+    shop_key = _shop_key(shop.pk)
+    cached = cache.get_many([PLANS_VERSION_KEY, shop_key])
+    plans_version = get_plans_version(cached)
+
+    entry = cached.get(shop_key)
+    if entry is not None and entry.get('plans_version') == plans_version:
+        entitlements = Entitlements(**entry['data'])
+    else:
+        entitlements = _resolve(shop)
+        cache.set(shop_key, {'plans_version': plans_version, 'data': entitlements.to_cache()}, ENTITLEMENTS_CACHE_TTL)
+
+    shop._entitlements = entitlements
+    return entitlements
+
+
+def invalidate_shop_entitlements(shop_id):
+    cache.delete_many([_shop_key(shop_id), current_subscription_cache_key(shop_id)])
+
+
+def invalidate_all_entitlements():
+    """
+    Plans are shared by many shops; bumping the version orphans every cached entry.
+    """
+    cache.set(PLANS_VERSION_KEY, time.time_ns(), None)
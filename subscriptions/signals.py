@@ -0,0 +1,17 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Plan, Subscription
+from .entitlements import invalidate_shop_entitlements, invalidate_all_entitlements
+from faq_app.services.storefront_cache import invalidate_storefront_cache
+
+
+@receiver([post_save, post_delete], sender=Subscription)
+def subscription_changed(sender, instance, **kwargs):
+    invalidate_shop_entitlements(instance.shop_id)
+    # Storefront design fields depend on the plan
+    invalidate_storefront_cache(instance.shop_id)
+
+
+@receiver([post_save, post_delete], sender=Plan)
+def plan_changed(sender, instance, **kwargs):
+    invalidate_all_entitlements()
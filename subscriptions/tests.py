@@ -2,8 +2,11 @@ from django.test import TestCase
 from rest_framework.test import APIClient
 from rest_framework import status
 from faq_app.models import Shop
+from django.core.cache import cache
 from .models import Plan, Subscription
+from .entitlements import _shop_key, get_entitlements
 from unittest.mock import patch
+import tempfile
 
 class SubscriptionTest(TestCase):
     def setUp(self):
@@ -68,3 +71,123 @@ class SubscriptionTest(TestCase):
         sub = Subscription.objects.get(shop=self.shop)
         self.assertEqual(sub.status, 'active')
         self.assertIsNotNone(sub.activated_on)
+
+class EntitlementsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.shop = Shop.objects.create(shop_domain="ent-test.myshopify.com", shop_name="Ent Shop")
+        self.basic = Plan.objects.create(name="Basic", price=4.99, features={"max_products": 50, "max_ai_questions": 5})
+        self.pro = Plan.objects.create(name="Pro", price=15.00, features={"max_products": 500, "design_customization": True})
+
+    def fresh_shop(self):
+        # New instance per "request", like ShopifyAuthentication returns
+        return Shop.objects.get(pk=self.shop.pk)
+
+    def fresh_shop_without_query(self):
+        return Shop(pk=self.shop.pk, shop_domain=self.shop.shop_domain)
+
+    def test_free_defaults_without_subscription(self):
+        entitlements = get_entitlements(self.fresh_shop())
+        self.assertIsNone(entitlements.plan_name)
+        self.assertEqual(entitlements.features['products_limit'], 1)
+        self.assertEqual(entitlements.features['max_ai_questions'], 3)
+
+    def test_highest_price_active_plan_wins_and_keys_are_normalized(self):
+        Subscription.objects.create(shop=self.shop, plan=self.pro, status='active')
+        Subscription.objects.create(shop=self.shop, plan=self.basic, status='active')
+
+        entitlements = get_entitlements(self.fresh_shop())
+        self.assertEqual(entitlements.plan_name, "Pro")
+        self.assertEqual(entitlements.features['products_limit'], 500)
+        self.assertEqual(entitlements.features['max_products'], 500)
+
+    def test_cached_per_request_and_across_requests(self):
+        Subscription.objects.create(shop=self.shop, plan=self.basic, status='active')
+        shop = self.fresh_shop()
+        get_entitlements(shop)
+        with self.assertNumQueries(0):
+            get_entitlements(shop)
+            get_entitlements(self.fresh_shop_without_query())
+
+    def test_invalidated_on_subscription_and_plan_save(self):
+        sub = Subscription.objects.create(shop=self.shop, plan=self.basic, status='active')
+        self.assertEqual(get_entitlements(self.fresh_shop()).plan_name, "Basic")
+
+        sub.plan = self.pro
+        sub.save()
+        self.assertEqual(get_entitlements(self.fresh_shop()).plan_name, "Pro")
+
+        self.pro.features = {"max_products": 900}
+        self.pro.save()
+        self.assertEqual(get_entitlements(self.fresh_shop()).features['products_limit'], 900)
+
+        sub.status = 'cancelled'
+        sub.save()
+        self.assertIsNone(get_entitlements(self.fresh_shop()).plan_name)
+
+    def test_invalidation_reaches_other_workers(self):
+        from django.core.cache.backends.filebased import FileBasedCache
+        from django.test import override_settings
+        from faq_app.services.storefront_cache import shop_version_key
+        from faq_project import settings as production
+        # Deployed workers share one cache (tests use a local one for query budgets)
+        self.assertNotIn('locmem', production.CACHES['default']['BACKEND'])
+
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location,
+        }}):
+            # Another worker: its own backend instance, sharing only the cache storage
+            other_worker = FileBasedCache(location, {})
+            sub = Subscription.objects.create(shop=self.shop, plan=self.basic, status='active')
+            self.assertEqual(get_entitlements(self.fresh_shop()).plan_name, "Basic")
+            self.assertIsNotNone(other_worker.get(_shop_key(self.shop.pk)))
+            version = other_worker.get(shop_version_key(self.shop.pk))
+
+            sub.plan = self.pro
+            sub.save()
+            self.assertIsNone(other_worker.get(_shop_key(self.shop.pk)))
+            self.assertNotEqual(other_worker.get(shop_version_key(self.shop.pk)), version)
+
+class CurrentSubscriptionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.shop = Shop.objects.create(shop_domain="current-test.myshopify.com", shop_name="Current Shop")
+        self.client.force_authenticate(user=self.shop)
+        self.basic = Plan.objects.create(name="Basic", price=4.99)
+        self.pro = Plan.objects.create(name="Pro", price=15.00)
+
+    def test_no_subscription(self):
+        response = self.client.get('/api/subscriptions/current/')
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_overlapping_active_plan_is_pending_downgrade(self):
+        Subscription.objects.create(shop=self.shop, plan=self.basic, status='active')
+        Subscription.objects.create(shop=self.shop, plan=self.pro, status='active')
+
+        response = self.client.get('/api/subscriptions/current/')
+        self.assertEqual(response.data['plan_name'], "Pro")
+        self.assertEqual(response.data['pending_downgrade_plan'], "Basic")
+
+    def test_later_pending_subscription_is_pending_downgrade(self):
+        Subscription.objects.create(shop=self.shop, plan=self.pro, status='active')
+        Subscription.objects.create(shop=self.shop, plan=self.basic, status='pending')
+
+        response = self.client.get('/api/subscriptions/current/')
+        self.assertEqual(response.data['plan_name'], "Pro")
+        self.assertEqual(response.data['pending_downgrade_plan'], "Basic")
+
+    def test_single_query_then_cached_until_subscription_changes(self):
+        for plan in (self.basic, self.pro):
+            Subscription.objects.create(shop=self.shop, plan=plan, status='active')
+        Subscription.objects.create(shop=self.shop, plan=self.basic, status='pending')
+
+        with self.assertNumQueries(1):
+            self.client.get('/api/subscriptions/current/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/subscriptions/current/')
+        self.assertEqual(response.data['plan_name'], "Pro")
+
+        Subscription.objects.filter(plan=self.pro).get().delete()
+        response = self.client.get('/api/subscriptions/current/')
+        self.assertEqual(response.data['plan_name'], "Basic")
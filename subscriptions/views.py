@@ -3,17 +3,63 @@ from rest_framework.response import Response
 from rest_framework.decorators import action
 from django.shortcuts import get_object_or_404
 from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
 from .models import Plan, Subscription
 from django.utils import timezone
 from .serializers import PlanSerializer, SubscriptionSerializer
+from .entitlements import PLANS_VERSION_KEY, get_plans_version, current_subscription_cache_key
 from faq_app.authentication import Shop
 import shopify
+import logging
 import os
 import ssl
 import json
 # BYPASS SSL VERIFICATION FOR DEV - Fixes [SSL: CERTIFICATE_VERIFY_FAILED]
 ssl._create_default_https_context = ssl._create_unverified_context
 
+logger = logging.getLogger(__name__)
+
+CURRENT_SUBSCRIPTION_CACHE_TTL = getattr(settings, 'CURRENT_SUBSCRIPTION_CACHE_TTL', 300)
+
+
+def build_current_subscription(shop):
+    """
+    Serialized current subscription with its pending downgrade, from a single query.
+    The current plan is the highest priced active one; a second active plan
+    (overlap) or a pending subscription created after it is the downgrade.
+    Returns None when the shop has no active subscription.
+    """
+    subscriptions = list(
+        Subscription.objects
+        .filter(shop=shop)
+        .filter(Q(status__iexact='active') | Q(status='pending'))
+        .select_related('plan', 'pending_plan')
+    )
+
+    active = sorted(
+        (s for s in subscriptions if s.status.lower() == 'active'),
+        key=lambda s: (s.plan.price, s.created_at),
+        reverse=True
+    )
+    if not active:
+        return None
+    subscription = active[0]
+
+    # 1. Overlapping active plan (lower price)
+    pending_downgrade_plan = active[1].plan.name if len(active) > 1 else None
+
+    # 2. Pending subscription created AFTER the current active one
+    if not pending_downgrade_plan:
+        pending = [s for s in subscriptions if s.status == 'pending' and s.created_at > subscription.created_at]
+        if pending:
+            pending_downgrade_plan = max(pending, key=lambda s: s.created_at).plan.name
+
+    data = dict(SubscriptionSerializer(subscription).data)
+    data['pending_downgrade_plan'] = pending_downgrade_plan
+    return data
+
+
 class PlanViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Plan.objects.filter(is_active=True)
     serializer_class = PlanSerializer
@@ -32,42 +78,19 @@ class SubscriptionViewSet(viewsets.ViewSet):
             return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
 
         try:
-            subscription = Subscription.objects.filter(
-                shop=shop,
-                status__iexact='active'
-            ).order_by('-plan__price', '-created_at').select_related('plan').first()
-            
-            # DEBUG: Print all subs to understand why access is lost
-            all_subs = Subscription.objects.filter(shop=shop).order_by('-created_at')
-            print(f"[CURRENT_DEBUG] Shop: {shop.shop_domain}")
-            for s in all_subs:
-                print(f" - ID: {s.id}, Plan: {s.plan.name}, Status: {s.status}, Created: {s.created_at}")
-            
-            if not subscription:
-                return Response(None, status=status.HTTP_204_NO_CONTENT)
-                
-            # Determine if there is a pending downgrade or overlapping plan
-            pending_downgrade_plan = None
-            
-            # 1. Check for overlapping active plan (lower price)
-            active_subs = Subscription.objects.filter(shop=shop, status__iexact='active').order_by('-plan__price', '-created_at')
-            if active_subs.count() > 1:
-                # The first one is 'current' (highest price), the second is likely the downgrade
-                pending_downgrade_plan = active_subs[1].plan.name
-            
-            # 2. Check for pending subscription created AFTER the current active one
-            if not pending_downgrade_plan and subscription:
-                pending_sub = Subscription.objects.filter(
-                    shop=shop, 
-                    status='pending', 
-                    created_at__gt=subscription.created_at
-                ).order_by('-created_at').first()
-                if pending_sub:
-                    pending_downgrade_plan = pending_sub.plan.name
+            cache_key = current_subscription_cache_key(shop.id)
+            cached = cache.get_many([PLANS_VERSION_KEY, cache_key])
+            plans_version = get_plans_version(cached)
+            entry = cached.get(cache_key)
+
+            if entry is not None and entry['plans_version'] == plans_version:
+                data = entry['data']
+            else:
+                data = build_current_subscription(shop)
+                cache.set(cache_key, {'plans_version': plans_version, 'data': data}, CURRENT_SUBSCRIPTION_CACHE_TTL)
 
-            serializer = SubscriptionSerializer(subscription)
-            data = serializer.data
-            data['pending_downgrade_plan'] = pending_downgrade_plan
+            if data is None:
+                return Response(None, status=status.HTTP_204_NO_CONTENT)
             return Response(data)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -107,11 +130,9 @@ class SubscriptionViewSet(viewsets.ViewSet):
             # Get existing active subscription (safe, takes latest if multiple, case-insensitive)
             existing_sub = Subscription.objects.filter(shop=shop, status__iexact='active').order_by('-created_at').first()
             
-            print(f"[SUBSCRIBE] Plan requested: {plan.name}, ID: {plan.id}, Price: {plan.price}")
-            if existing_sub:
-                 print(f"[SUBSCRIBE] Found existing active sub: {existing_sub.id} - Plan: {existing_sub.plan.name} - Price: {existing_sub.plan.price}")
-            else:
-                 print(f"[SUBSCRIBE] No existing active subscription found in DB for shop {shop.shop_domain}")
+            logger.info("Subscribe %s to plan %s (id %s, price %s); current subscription: %s",
+                        shop.shop_domain, plan.name, plan.id, plan.price,
+                        f"{existing_sub.id} ({existing_sub.plan.name}, {existing_sub.plan.price})" if existing_sub else None)
             
             # Determine replacement behavior based on price comparison
             if existing_sub:
@@ -121,13 +142,13 @@ class SubscriptionViewSet(viewsets.ViewSet):
                 if new_price > current_price:
                     # Upgrade: apply immediately with automatic proration
                     replacement_behavior = "APPLY_IMMEDIATELY"
-                    print(f"[SUBSCRIBE] Upgrade detected: {existing_sub.plan.name} (${current_price}) → {plan.name} (${new_price})")
-                    print(f"[SUBSCRIBE] Using APPLY_IMMEDIATELY - Shopify will prorate automatically")
+                    logger.info("Upgrade %s (%s) -> %s (%s): APPLY_IMMEDIATELY, Shopify prorates",
+                                existing_sub.plan.name, current_price, plan.name, new_price)
                 elif new_price < current_price:
                     # Downgrade: apply at next billing cycle
                     replacement_behavior = "APPLY_ON_NEXT_BILLING_CYCLE"
-                    print(f"[SUBSCRIBE] Downgrade detected: {existing_sub.plan.name} (${current_price}) → {plan.name} (${new_price})")
-                    print(f"[SUBSCRIBE] Using APPLY_ON_NEXT_BILLING_CYCLE - will activate at period end")
+                    logger.info("Downgrade %s (%s) -> %s (%s): APPLY_ON_NEXT_BILLING_CYCLE",
+                                existing_sub.plan.name, current_price, plan.name, new_price)
                 else:
                     # Same price (e.g., interval change)
                     replacement_behavior = "APPLY_IMMEDIATELY"
@@ -197,7 +218,6 @@ class SubscriptionViewSet(viewsets.ViewSet):
             # Add replacementBehavior if there's an existing subscription
             if replacement_behavior:
                 variables["replacementBehavior"] = replacement_behavior
-                print(f"[SUBSCRIBE] Adding replacementBehavior: {replacement_behavior}")
             
             # Execute
             client = shopify.GraphQL()
@@ -301,7 +321,7 @@ class SubscriptionViewSet(viewsets.ViewSet):
         # Get shop from URL parameters (not from request.user)
         shop_domain = request.GET.get('shop')
         charge_id = request.GET.get('charge_id') # Shopify sends this
-        print(f"[CALLBACK] Received callback for shop: {shop_domain}, charge_id: {charge_id}")
+        logger.info("Subscription callback for shop %s, charge_id %s", shop_domain, charge_id)
         
         if not shop_domain:
             return Response({"error": "Missing shop parameter"}, status=status.HTTP_400_BAD_REQUEST)
@@ -309,9 +329,8 @@ class SubscriptionViewSet(viewsets.ViewSet):
         try:
             from faq_app.models import Shop
             shop = Shop.objects.get(shop_domain=shop_domain)
-            print(f"[CALLBACK] Found shop in database: {shop.id}")
         except Shop.DoesNotExist:
-            print(f"[CALLBACK] ERROR: Shop not found: {shop_domain}")
+            logger.warning("Subscription callback: shop %s not found", shop_domain)
             return Response({"error": "Shop not found"}, status=status.HTTP_404_NOT_FOUND)
         
         # 1. Find subscription by charge_id first so we get the exact one
@@ -325,10 +344,10 @@ class SubscriptionViewSet(viewsets.ViewSet):
              sub = Subscription.objects.filter(shop=shop).order_by('-created_at').first()
              
         if not sub:
-              print(f"[CALLBACK] ERROR: No subscription found")
+              logger.warning("Subscription callback: no subscription for %s", shop_domain)
               return Response({"error": "No subscription found"}, status=status.HTTP_400_BAD_REQUEST)
               
-        print(f"[CALLBACK] Found subscription ID: {sub.id}, status: {sub.status}, charge_id: {sub.shopify_charge_id}")
+        logger.debug("Subscription callback matched subscription %s (status %s, charge %s)", sub.id, sub.status, sub.shopify_charge_id)
 
         # 2. Verify status on Shopify via GraphQL
         shop_domain = shop.shop_domain
@@ -355,20 +374,19 @@ class SubscriptionViewSet(viewsets.ViewSet):
             result = client.execute(query, {"id": gid})
             data = json.loads(result)
             
-            print(f"[CALLBACK] Shopify GraphQL response: {data}")
-            
+            logger.debug("Subscription status response from Shopify", extra={'response': data})
+
             if 'data' not in data or not data['data']['node']:
-                 print(f"[CALLBACK] ERROR: Subscription not found on Shopify")
+                 logger.warning("Subscription %s not found on Shopify", gid)
                  return Response({"error": "Subscription not found on Shopify"}, status=status.HTTP_404_NOT_FOUND)
             
             status_value = data['data']['node']['status']
-            print(f"[CALLBACK] Shopify subscription status: {status_value}")
             
             if status_value == 'ACTIVE':
                  sub.status = 'active'
                  sub.activated_on = timezone.now()
                  sub.save()
-                 print(f"[CALLBACK] ✓ Subscription activated! ID: {sub.id}")
+                 logger.info("Subscription %s activated for %s", sub.id, shop_domain)
                  
                  store_name = shop_domain.replace('.myshopify.com', '')
                  # Redirect to products page after successful subscription
@@ -377,7 +395,7 @@ class SubscriptionViewSet(viewsets.ViewSet):
                  import django.shortcuts
                  return django.shortcuts.redirect(frontend_url)
             else:
-                 print(f"[CALLBACK] Subscription status is {status_value}, not activating")
+                 logger.info("Subscription %s status is %s, not activating", sub.id, status_value)
              
             return Response({"error": f"Subscription status is {status_value}"})
             